@@ -0,0 +1,411 @@
+from HTTPCore import CHTTP
+from Response import Response
+import asyncio
+import JSONCodec
+
+class AsyncCHTTPClient:
+    def __init__(self):
+        """
+        Initializes the AsyncCHTTPClient instance.
+
+        Requests run on a curl multi handle whose sockets and timers are watched by the running
+        asyncio event loop, so thousands of requests can be in flight on one thread. The client is
+        bound to the first event loop it is used on.
+
+        Raises:
+            Exception: If the session creation fails.
+        """
+        self.capsule = CHTTP.create_session()
+        if self.capsule is None:
+            raise Exception("Failed to create session.")
+
+        self.multi = CHTTP.create_multi(self._on_socket, self._on_timer)
+        self.loop = None
+        self.futures = {}
+        self.streams = {}
+        self.watched = {}
+        self.timer = None
+
+    def set_user_agent(self, user_agent):
+        """
+        Sets the User-Agent header for HTTP requests.
+
+        Parameters:
+            user_agent (str): The User-Agent string to be used in HTTP requests.
+
+        Example:
+            client.set_user_agent("MyCustomUserAgent/1.0")
+        """
+        CHTTP.set_user_agent(self.capsule, user_agent)
+
+    def set_proxy(self, proxy_url):
+        """
+        Sets the proxy URL for HTTP requests.
+
+        Parameters:
+            proxy_url (str): The URL of the proxy server.
+
+        Example:
+            client.set_proxy("http://proxy.example.com:8080")
+        """
+        CHTTP.set_proxy(self.capsule, proxy_url)
+
+    def set_cookie_file(self, cookie_file_path):
+        """
+        Sets the path to the cookie file for HTTP requests.
+
+        Parameters:
+            cookie_file_path (str): The path to the cookie file.
+
+        Example:
+            client.set_cookie_file("/path/to/cookiefile")
+        """
+        CHTTP.set_cookie_file(self.capsule, cookie_file_path)
+
+    def set_ssl_cert(self, cert_file_path):
+        """
+        Sets the path to the SSL certificate file for secure HTTP connections.
+
+        Parameters:
+            cert_file_path (str): The path to the SSL certificate file.
+
+        Example:
+            client.set_ssl_cert("/path/to/cert.pem")
+        """
+        CHTTP.set_ssl_cert(self.capsule, cert_file_path)
+
+    def set_ssl_key(self, key_file_path):
+        """
+        Sets the path to the SSL key file for secure HTTP connections.
+
+        Parameters:
+            key_file_path (str): The path to the SSL key file.
+
+        Example:
+            client.set_ssl_key("/path/to/key.pem")
+        """
+        CHTTP.set_ssl_key(self.capsule, key_file_path)
+
+    def set_timeout(self, timeout_seconds):
+        """
+        Sets the timeout for HTTP requests.
+
+        Parameters:
+            timeout_seconds (int): The timeout duration in seconds.
+
+        Example:
+            client.set_timeout(60)
+        """
+        CHTTP.set_timeout(self.capsule, timeout_seconds)
+
+    def set_buffer_size_hint(self, size_hint):
+        """
+        Sets the initial size of the response buffer.
+
+        Parameters:
+            size_hint (int): The initial buffer size in bytes.
+
+        Example:
+            client.set_buffer_size_hint(1024 * 1024)
+        """
+        CHTTP.set_buffer_size_hint(self.capsule, size_hint)
+
+    def set_max_response_size(self, max_size):
+        """
+        Sets the maximum size of a response body. Larger responses fail with a RuntimeError.
+
+        Parameters:
+            max_size (int): The maximum body size in bytes, or 0 for no limit.
+
+        Example:
+            client.set_max_response_size(50 * 1024 * 1024)
+        """
+        CHTTP.set_max_response_size(self.capsule, max_size)
+
+    def set_http_version(self, version):
+        """
+        Sets the HTTP version for requests.
+
+        With HTTP/2, requests running at the same time against one host are multiplexed as streams over
+        a single connection instead of opening one connection each.
+
+        Parameters:
+            version (str): "1.1" (the default), "2" for HTTP/2 negotiated over TLS, or "2-prior-knowledge"
+                for HTTP/2 without TLS (h2c) to servers known to speak it.
+
+        Raises:
+            ValueError: If the version is not one of the above.
+            RuntimeError: If libcurl was built without HTTP/2 support.
+
+        Example:
+            client.set_http_version("2")
+        """
+        versions = {"1.1": CHTTP.HTTP_1_1, "2": CHTTP.HTTP_2, "2-prior-knowledge": CHTTP.HTTP_2_PRIOR_KNOWLEDGE}
+        if version not in versions:
+            raise ValueError('version must be "1.1", "2" or "2-prior-knowledge".')
+        CHTTP.set_http_version(self.capsule, versions[version])
+
+    def set_max_concurrent_streams(self, max_streams):
+        """
+        Sets how many requests may share one HTTP/2 connection. Once a connection carries this many
+        streams, further requests open another connection.
+
+        Parameters:
+            max_streams (int): The stream limit per connection, or 0 for the libcurl default (100).
+
+        Example:
+            client.set_max_concurrent_streams(32)
+        """
+        CHTTP.set_max_concurrent_streams(self.capsule, max_streams)
+
+    def set_accept_encoding(self, encodings=""):
+        """
+        Sets which compressed response encodings to accept. Compressed responses are decompressed in C before
+        they reach Python.
+
+        Parameters:
+            encodings (str or None): A comma-separated list such as "gzip, br", "" for every encoding libcurl
+                supports, or None to stop asking for compression.
+
+        Example:
+            client.set_accept_encoding()
+        """
+        CHTTP.set_accept_encoding(self.capsule, encodings)
+
+    async def request(self, method, url, payload=None):
+        """
+        Performs an HTTP request without blocking the event loop.
+
+        Parameters:
+            method (str): The HTTP method, such as "GET" or "POST".
+            url (str): The URL for the request.
+            payload (dict, str or bytes-like, optional): The request body. A dictionary is serialized to JSON
+                bytes with JSONCodec.dumps, as the synchronous clients do.
+
+        Returns:
+            Response: The status code, body bytes and headers. Headers are parsed and the body is decoded on first access.
+
+        Raises:
+            RuntimeError: If the transfer fails.
+
+        Example:
+            response = await client.request("GET", "http://example.com")
+            print(response.status_code, response.text)
+        """
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError("AsyncCHTTPClient is bound to a different event loop.")
+
+        if isinstance(payload, dict):
+            payload = JSONCodec.dumps(payload)
+
+        future = loop.create_future()
+        transfer_id = CHTTP.multi_add(self.multi, self.capsule, method, url, payload)
+        self.futures[transfer_id] = future
+        try:
+            status, body, headers, error = await future
+        except asyncio.CancelledError:
+            if self.futures.pop(transfer_id, None) is not None:
+                CHTTP.multi_remove(self.multi, transfer_id)
+            raise
+
+        if error is not None:
+            raise RuntimeError(error)
+        return Response(status, body, headers)
+
+    async def get(self, url):
+        """
+        Performs an HTTP GET request.
+
+        Example:
+            response = await client.get("http://example.com")
+        """
+        return await self.request("GET", url)
+
+    async def post(self, url, payload):
+        """
+        Performs an HTTP POST request.
+
+        Example:
+            response = await client.post("http://example.com/api", {"key": "value"})
+        """
+        return await self.request("POST", url, payload)
+
+    async def put(self, url, payload):
+        """
+        Performs an HTTP PUT request.
+
+        Example:
+            response = await client.put("http://example.com/api/1", {"key": "new_value"})
+        """
+        return await self.request("PUT", url, payload)
+
+    async def delete(self, url):
+        """
+        Performs an HTTP DELETE request.
+
+        Example:
+            response = await client.delete("http://example.com/api/1")
+        """
+        return await self.request("DELETE", url)
+
+    async def head(self, url):
+        """
+        Performs an HTTP HEAD request.
+
+        Example:
+            response = await client.head("http://example.com")
+        """
+        return await self.request("HEAD", url)
+
+    async def stream(self, method, url, payload=None, chunk_size=65536):
+        """
+        Performs an HTTP request and yields the response body in chunks as it arrives.
+
+        The transfer is paused while the consumer is behind, so memory use stays around
+        chunk_size regardless of the body size.
+
+        Parameters:
+            method (str): The HTTP method, such as "GET" or "POST".
+            url (str): The URL for the request.
+            payload (dict, str or bytes-like, optional): The request body. A dictionary is serialized to JSON
+                bytes with JSONCodec.dumps, as the synchronous clients do.
+            chunk_size (int): The size of the yielded chunks in bytes. The last chunk may be shorter.
+
+        Yields:
+            bytes: The next chunk of the response body.
+
+        Raises:
+            RuntimeError: If the transfer fails.
+
+        Example:
+            async for chunk in client.stream("GET", "http://example.com/export.csv"):
+                parser.feed(chunk)
+        """
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError("AsyncCHTTPClient is bound to a different event loop.")
+
+        if isinstance(payload, dict):
+            payload = JSONCodec.dumps(payload)
+
+        state = _StreamState(chunk_size)
+        transfer_id = CHTTP.multi_add(self.multi, self.capsule, method, url, payload, state.on_data)
+        self.streams[transfer_id] = state
+        try:
+            while True:
+                if len(state.buffer) >= chunk_size or (state.done and state.buffer):
+                    chunk = bytes(state.buffer[:chunk_size])
+                    del state.buffer[:chunk_size]
+                    if state.paused:
+                        state.paused = False
+                        CHTTP.multi_resume(self.multi, transfer_id)
+                    yield chunk
+                elif state.done:
+                    if state.error is not None:
+                        raise RuntimeError(state.error)
+                    return
+                else:
+                    state.waiter = loop.create_future()
+                    await state.waiter
+        finally:
+            if self.streams.pop(transfer_id, None) is not None:
+                CHTTP.multi_remove(self.multi, transfer_id)
+
+    def _on_socket(self, fd, action):
+        watched = self.watched.pop(fd, 0)
+        if watched & CHTTP.POLL_IN:
+            self.loop.remove_reader(fd)
+        if watched & CHTTP.POLL_OUT:
+            self.loop.remove_writer(fd)
+
+        if action == CHTTP.POLL_REMOVE:
+            return
+        if action & CHTTP.POLL_IN:
+            self.loop.add_reader(fd, self._on_ready, fd, CHTTP.CSELECT_IN)
+        if action & CHTTP.POLL_OUT:
+            self.loop.add_writer(fd, self._on_ready, fd, CHTTP.CSELECT_OUT)
+        self.watched[fd] = action
+
+    def _on_timer(self, timeout_ms):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if timeout_ms >= 0:
+            self.timer = self.loop.call_later(timeout_ms / 1000.0, self._on_ready, CHTTP.SOCKET_TIMEOUT, 0)
+
+    def _on_ready(self, fd, events):
+        if fd == CHTTP.SOCKET_TIMEOUT:
+            self.timer = None
+        for transfer_id, result in CHTTP.multi_socket_action(self.multi, fd, events):
+            state = self.streams.pop(transfer_id, None)
+            if state is not None:
+                state.finish(result[3])
+                continue
+            future = self.futures.pop(transfer_id, None)
+            if future is not None and not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """
+        Closes the client and cancels requests that are still running.
+
+        Example:
+            await client.close()
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        for fd, watched in self.watched.items():
+            if watched & CHTTP.POLL_IN:
+                self.loop.remove_reader(fd)
+            if watched & CHTTP.POLL_OUT:
+                self.loop.remove_writer(fd)
+        self.watched.clear()
+
+        CHTTP.multi_close(self.multi)
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        for state in self.streams.values():
+            state.finish("Client closed.")
+        self.streams.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class _StreamState:
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.paused = False
+        self.done = False
+        self.error = None
+        self.waiter = None
+
+    def on_data(self, chunk):
+        if len(self.buffer) >= self.chunk_size:
+            self.paused = True
+            return False
+        self.buffer += chunk
+        if len(self.buffer) >= self.chunk_size:
+            self._wake()
+        return True
+
+    def finish(self, error):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+        self.waiter = None
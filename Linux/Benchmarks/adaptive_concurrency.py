@@ -0,0 +1,104 @@
+"""
+Per-host concurrency: unlimited vs a HostScheduler with AIMD limits.
+
+--threads workers, each with its own session, fetch from a local server that
+answers at most --capacity requests at once and rejects the rest with 429.
+Every worker retries a rejected request at once until it has --requests
+successes, the way a naive client would. The table shows the successful
+request rate, how many 429s the server had to send, and the per-host limit
+the scheduler settled on. Without a scheduler most of the load the server
+sees is rejected; with one, the limit backs off to about the capacity.
+
+The batch rows send the same total through HostScheduler.request_many, which
+splits one big batch into rounds that fit the host's current limit.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.adaptive_concurrency --threads 64 --capacity 16 --delay 10
+"""
+
+import argparse
+import threading
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+from Response import Response
+from Scheduler import HostScheduler
+
+
+class BatchClient:
+    """Adapts a bare session to the http_request_many interface HostScheduler.request_many expects."""
+
+    def __init__(self, module):
+        self.module = module
+        self.session = module.create_session()
+
+    def http_request_many(self, requests, max_in_flight=16):
+        return self.module.http_request_many(self.session, requests, max_in_flight)
+
+
+def run_threads(module, url, scheduler, args):
+    rejected = [0] * args.threads
+
+    def worker(slot):
+        session = module.create_session()
+        send = lambda: Response(*module.http_get(session, url))
+        done = 0
+        while done < args.requests:
+            response = scheduler.call(url, send) if scheduler else send()
+            if response.status_code == 200:
+                done += 1
+            else:
+                rejected[slot] += 1
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return args.threads * args.requests / elapsed, sum(rejected)
+
+
+def run_batch(module, url, scheduler, args):
+    client = BatchClient(module)
+    pending = [("GET", url)] * (args.threads * args.requests)
+    rejected = 0
+    start = time.perf_counter()
+    while pending:
+        results = scheduler.request_many(client, pending)
+        retry = [request for request, (status, _, _) in zip(pending, results) if status != 200]
+        rejected += len(retry)
+        pending = retry
+    elapsed = time.perf_counter() - start
+    return args.threads * args.requests / elapsed, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=50, help="successful requests per thread")
+    parser.add_argument("--capacity", type=int, default=16, help="requests the server answers at once")
+    parser.add_argument("--delay", type=int, default=10, help="server delay in milliseconds")
+    parser.add_argument("--rate", type=float, default=None, help="token bucket rate per host, requests per second")
+    args = parser.parse_args()
+
+    print(f"{'module':<8}{'mode':>14}{'ok req/s':>12}{'429s':>10}{'limit':>8}")
+    for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+        with LocalServer() as server:
+            url = server.url(f"/?capacity={args.capacity}&delay={args.delay}")
+            for mode in ("unlimited", "aimd", "aimd batch"):
+                scheduler = None if mode == "unlimited" else HostScheduler(max_limit=args.threads, rate=args.rate)
+                if mode == "aimd batch":
+                    rate, rejected = run_batch(module, url, scheduler, args)
+                else:
+                    rate, rejected = run_threads(module, url, scheduler, args)
+                limit = scheduler.snapshot().popitem()[1]["limit"] if scheduler else "-"
+                print(f"{name:<8}{mode:>14}{rate:>12.1f}{rejected:>10}{limit:>8}")
+
+
+if __name__ == "__main__":
+    main()
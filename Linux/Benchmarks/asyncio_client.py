@@ -0,0 +1,77 @@
+"""
+AsyncCHTTPClient vs blocking CHTTP calls wrapped in run_in_executor.
+
+Every request is issued from a coroutine against the local server. The
+executor variant pays a thread hop per request and is capped by the pool
+size; the native client keeps every request in flight on the loop thread.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.asyncio_client --requests 2000 --concurrency 500 --delay 20
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from HTTPCore import CHTTP
+
+from AsyncCHTTP import AsyncCHTTPClient
+from Benchmarks.local_server import LocalServer
+
+
+async def run_native(url, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with AsyncCHTTPClient() as client:
+        async def fetch():
+            async with semaphore:
+                await client.get(url)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch() for _ in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+async def run_executor(url, requests, concurrency, workers):
+    local = threading.local()
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    def blocking_get():
+        if not hasattr(local, "session"):
+            local.session = CHTTP.create_session()
+        return CHTTP.http_get(local.session, url)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        async def fetch():
+            async with semaphore:
+                await loop.run_in_executor(executor, blocking_get)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch() for _ in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--delay", type=int, default=20, help="server delay in milliseconds")
+    parser.add_argument("--workers", type=int, default=32, help="executor pool size")
+    args = parser.parse_args()
+
+    with LocalServer() as server:
+        url = server.url(f"/?delay={args.delay}")
+        native = asyncio.run(run_native(url, args.requests, args.concurrency))
+        executor = asyncio.run(run_executor(url, args.requests, args.concurrency, args.workers))
+
+    print(f"{'client':<24}{'req/s':>12}")
+    print(f"{'AsyncCHTTPClient':<24}{native:>12.1f}")
+    print(f"{'run_in_executor':<24}{executor:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
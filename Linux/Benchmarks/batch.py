@@ -0,0 +1,44 @@
+"""
+Sequential http_get vs the curl_multi batch API.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.batch --urls 500 --delay 20 --max-in-flight 64
+"""
+
+import argparse
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=200)
+    parser.add_argument("--delay", type=int, default=20, help="server delay in milliseconds")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    args = parser.parse_args()
+
+    with LocalServer() as server:
+        urls = [server.url(f"/?delay={args.delay}&n={i}") for i in range(args.urls)]
+        print(f"{'module':<8}{'mode':>12}{'req/s':>12}")
+        for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+            session = module.create_session()
+
+            start = time.perf_counter()
+            for url in urls:
+                module.http_get(session, url)
+            sequential = len(urls) / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            module.http_get_many(session, urls, args.max_in_flight)
+            batch = len(urls) / (time.perf_counter() - start)
+
+            print(f"{name:<8}{'sequential':>12}{sequential:>12.1f}")
+            print(f"{name:<8}{'batch':>12}{batch:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Response body throughput of CHTTP across body sizes from 1 KB to 100 MB.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.body_size --repeat 5
+"""
+
+import argparse
+import time
+
+from HTTPCore import CHTTP
+
+from Benchmarks.local_server import LocalServer
+
+SIZES = [
+    ("1 KB", 1024),
+    ("16 KB", 16 * 1024),
+    ("256 KB", 256 * 1024),
+    ("1 MB", 1024 * 1024),
+    ("10 MB", 10 * 1024 * 1024),
+    ("100 MB", 100 * 1024 * 1024),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size-hint", action="store_true", help="set the buffer size hint to the body size")
+    args = parser.parse_args()
+
+    with LocalServer() as server:
+        session = CHTTP.create_session()
+        print(f"{'body':>8}{'ms/request':>14}{'MB/s':>10}")
+        for label, size in SIZES:
+            if args.size_hint:
+                CHTTP.set_buffer_size_hint(session, size)
+            url = server.url(f"/?size={size}&binary=1")
+
+            _, body, _ = CHTTP.http_get(session, url)
+            assert len(body) == size
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                CHTTP.http_get(session, url)
+            elapsed = (time.perf_counter() - start) / args.repeat
+
+            print(f"{label:>8}{elapsed * 1000:>14.2f}{size / elapsed / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Per-call cost of the module functions vs the Session methods vs the client.
+
+Each row sends --requests small GETs to the local server on one session and
+shows the wall time and the CPU time this process spent per call. The server
+runs in its own process, so the CPU column is the client's own cost, and the
+difference between rows is the binding layer: argument parsing, the session
+lookup and, for the client, the Python wrapper. The modes are:
+
+    function  http_get(session, url), a METH_VARARGS call that builds an
+              argument tuple and parses it
+    method    session.get(url), a vectorcall method with no tuple
+    keyword   session.get(url=url), the same with a keyword argument
+    client    CHTTPClient.http_get(url) with no policies set
+    policies  CHTTPClient.http_get(url) with a retry policy, which goes
+              through the scheduler/retry/hedging wrapper
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.call_overhead --requests 5000
+"""
+
+import argparse
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+import Resilience
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient
+
+
+def measure(call, requests):
+    call()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(requests):
+        call()
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    return wall / requests * 1e6, cpu / requests * 1e6
+
+
+def scenarios(module, url):
+    session = module.Session()
+    client = CHTTPClient(module)
+    retrying = CHTTPClient(module)
+    retrying.set_retry_policy(Resilience.RetryPolicy(retries=2))
+    return [
+        ("function", lambda: module.http_get(session, url)),
+        ("method", lambda: session.get(url)),
+        ("keyword", lambda: session.get(url=url)),
+        ("client", lambda: client.http_get(url)),
+        ("policies", lambda: retrying.http_get(url)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'module':<8}{'mode':>10}{'wall us':>10}{'cpu us':>10}")
+    with LocalServer() as server:
+        url = server.url("/?size=0")
+        for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+            for mode, call in scenarios(module, url):
+                wall, cpu = measure(call, args.requests)
+                print(f"{name:<8}{mode:>10}{wall:>10.1f}{cpu:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
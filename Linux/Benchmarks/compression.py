@@ -0,0 +1,72 @@
+"""
+Bytes on the wire and wall time with and without compression, for JSON
+bodies of typical API sizes.
+
+Downloads compare a plain session with one that accepts compressed responses
+(set_accept_encoding), which the local server answers with gzip. Uploads
+compare a plain POST with one whose body is gzipped above a threshold
+(set_request_compression). Wire bytes come from the session's timing of the
+last request.
+
+Over loopback the network is free, so compression only adds CPU time here
+(including the server's gzip and gunzip in Python); divide the wire bytes by
+your link's bandwidth to see what it saves.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.compression --records 10 100 1000 10000 --repeat 50
+    python -m Benchmarks.compression --level 1
+"""
+
+import argparse
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer, json_records
+
+
+def measure(module, session, request, repeat, wire_key):
+    request()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        request()
+    elapsed = (time.perf_counter() - start) / repeat
+    return module.get_timing(session)[wire_key], elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        help="JSON records per body (about 150 bytes each)")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--threshold", type=int, default=1024, help="request compression threshold in bytes")
+    parser.add_argument("--level", type=int, default=-1, help="request compression level (-1 for the zlib default)")
+    args = parser.parse_args()
+
+    with LocalServer() as server:
+        print(f"{'module':<8}{'direction':>10}{'records':>9}{'body':>11}{'mode':>7}{'wire':>11}{'ms/req':>9}")
+        for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+            for records in args.records:
+                url = server.url(f"/?json={records}&type=application/json")
+                for mode in ("plain", "gzip"):
+                    session = module.create_session()
+                    if mode == "gzip":
+                        module.set_accept_encoding(session, "")
+                    body_size = len(module.http_get(session, url)[1])
+                    wire, ms = measure(module, session, lambda: module.http_get(session, url),
+                                       args.repeat, "size_download")
+                    print(f"{name:<8}{'download':>10}{records:>9}{body_size:>11}{mode:>7}{wire:>11}{ms:>9.3f}")
+
+                payload = json_records(records)
+                for mode in ("plain", "gzip"):
+                    session = module.create_session()
+                    if mode == "gzip":
+                        module.set_request_compression(session, args.threshold, args.level)
+                    wire, ms = measure(module, session, lambda: module.http_post(session, server.url("/"), payload),
+                                       args.repeat, "size_upload")
+                    print(f"{name:<8}{'upload':>10}{records:>9}{len(payload):>11}{mode:>7}{wire:>11}{ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
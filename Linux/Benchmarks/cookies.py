@@ -0,0 +1,145 @@
+"""
+Request latency of short-lived clients that persist cookies to a file, each
+with its own jar or through a SessionPool sharing one jar.
+
+The cookie file starts with --cookies cookies for the local server, as a
+long-running crawler's jar would. They are scoped to /static, which the
+requests never ask for, because libcurl sends at most 150 cookies. Every request takes a client, sends one
+GET and gives the client back, from --threads threads at once. The modes are:
+
+    per client    a new CHTTPClient per request that calls set_cookie_file,
+                  so every request reads the file and writes it on close
+    shared pool   SessionPool(cookie_file=...), which reads the file once and
+                  writes the shared jar at most every --flush seconds
+
+The table shows the mean and p99 latency per request, the cookie file writes
+(counted from its modification time) and whether every request sent the
+cookie the first one was given. Per-client jars lose it under concurrency:
+each close rewrites the whole file with only that client's cookies, and
+libcurl 7.88 truncates the file before renaming the new copy over it, so a
+client that loads it meanwhile starts with an empty jar.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.cookies --requests 2000 --cookies 2000 --threads 4 --flush 1
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from HTTPCore import CHTTP
+
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient, SessionPool
+
+
+def write_jar(path, host, count):
+    with open(path, "w") as file:
+        file.write("# Netscape HTTP Cookie File\n")
+        for i in range(count):
+            file.write(f"{host}\tFALSE\t/static\tFALSE\t0\tcookie{i}\t{'v' * 32}\n")
+
+
+class Writes:
+    """Counts the writes of a file by polling its modification time from a background thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        last = os.stat(self.path).st_mtime_ns
+        while not self.stopped.wait(0.001):
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != last:
+                self.count += 1
+                last = mtime
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.count
+
+
+def run(get, threads, requests):
+    latencies = []
+    sent = []
+    per_thread = requests // threads
+
+    def worker():
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            cookie = get()
+            latencies.append((time.perf_counter() - start) * 1e6)
+            sent.append("session=first" in cookie)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, all(sent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--cookies", type=int, default=2000, help="cookies in the file to start with")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--flush", type=float, default=1.0, help="pool cookie flush interval in seconds")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "cookies.txt")
+    print(f"{'mode':<13}{'mean us':>10}{'p99 us':>10}{'writes':>8}  cookie kept")
+    try:
+        with LocalServer() as server:
+            login = server.url("/?size=0&set_cookie=session%3Dfirst")
+            url = server.url("/?size=64")
+
+            def per_client():
+                with CHTTPClient(CHTTP) as client:
+                    client.set_cookie_file(path)
+                    return client.http_get(url).headers.get("x-cookie", "")
+
+            write_jar(path, server.host, args.cookies)
+            with CHTTPClient(CHTTP) as client:
+                client.set_cookie_file(path)
+                client.http_get(login)
+            writes = Writes(path)
+            latencies, kept = run(per_client, args.threads, args.requests)
+            report("per client", latencies, writes.stop(), kept)
+
+            write_jar(path, server.host, args.cookies)
+            pool = SessionPool(CHTTP, max_size=args.threads, cookie_file=path, cookie_flush_interval=args.flush)
+            with pool.session() as client:
+                client.http_get(login)
+
+            def shared():
+                with pool.session() as client:
+                    return client.http_get(url).headers.get("x-cookie", "")
+
+            writes = Writes(path)
+            latencies, kept = run(shared, args.threads, args.requests)
+            pool.close()
+            pool.template.close()
+            report("shared pool", latencies, writes.stop(), kept)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def report(name, latencies, writes, kept):
+    latencies.sort()
+    print(f"{name:<13}{sum(latencies) / len(latencies):>10.0f}{latencies[int(len(latencies) * 0.99) - 1]:>10.0f}"
+          f"{writes:>8}  {'yes' if kept else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Request latency with host lookups answered by a slow resolver, with and
+without a shared DNSCache.
+
+The hosts are fake names (api-0.test, api-1.test, ...) that a stub resolver,
+standing in for a hosts file behind a slow DNS server, maps to the local
+server after sleeping --dns-ms milliseconds. Every request goes through a
+new client, as short-lived workers do, so each one opens a connection and
+needs its host's address. The modes are:
+
+    per request   DNSCache with a near-zero TTL, so every request waits for
+                  the resolver, like a client without a cache
+    ttl           a shared DNSCache with --ttl and no refresh, so requests
+                  wait again every time an entry expires
+    ttl+refresh   the same with refresh_ahead=0.5, so the background thread
+                  re-resolves hot hosts before they expire
+    prefetch      ttl+refresh with every host prefetched before the clock
+                  starts (the lookups that wait for the prefetch count as hits)
+
+The table shows the median, p99 and maximum request latency and the cache's
+hit, miss and refresh counters. The run lasts long enough for entries to
+expire several times at the default TTL.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.dns_cache --requests 2000 --hosts 8 --dns-ms 20 --ttl 0.5
+"""
+
+import argparse
+import socket
+import statistics
+import time
+
+from HTTPCore import CHTTP
+
+import Resolver
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient
+
+
+class StubResolver:
+    """Answers lookups from a table of host names to addresses after a fixed delay, counting the calls."""
+
+    def __init__(self, table, delay):
+        self.table = table
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, host, port):
+        self.calls += 1
+        time.sleep(self.delay)
+        if host not in self.table:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return self.table[host]
+
+
+def run(cache, urls, requests):
+    latencies = []
+    for i in range(requests):
+        url = urls[i % len(urls)]
+        start = time.perf_counter()
+        with CHTTPClient(CHTTP) as client:
+            client.set_resolver(cache)
+            client.http_get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--dns-ms", type=float, default=20.0, help="stub resolver latency in milliseconds")
+    parser.add_argument("--ttl", type=float, default=0.5, help="cache TTL in seconds")
+    args = parser.parse_args()
+
+    names = [f"api-{i}.test" for i in range(args.hosts)]
+    modes = (
+        ("per request", dict(ttl=1e-6, refresh_ahead=0.0), False),
+        ("ttl", dict(ttl=args.ttl, refresh_ahead=0.0), False),
+        ("ttl+refresh", dict(ttl=args.ttl, refresh_ahead=0.5), False),
+        ("prefetch", dict(ttl=args.ttl, refresh_ahead=0.5), True),
+    )
+    print(f"{'mode':<13}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'hits':>8}{'misses':>8}{'refreshes':>10}")
+    with LocalServer() as server:
+        urls = [f"http://{name}:{server.port}/?size=64" for name in names]
+        for name, options, prefetch in modes:
+            stub = StubResolver({host: [server.host] for host in names}, args.dns_ms / 1000)
+            with Resolver.DNSCache(resolve=stub, **options) as cache:
+                if prefetch:
+                    cache.prefetch(urls)
+                    for host in names:
+                        cache.lookup(host, server.port)
+                latencies = sorted(run(cache, urls, args.requests))
+                stats = cache.stats()
+            p99 = latencies[int(len(latencies) * 0.99) - 1]
+            print(f"{name:<13}{statistics.median(latencies):>9.2f}{p99:>9.2f}{latencies[-1]:>9.2f}"
+                  f"{stats['hits']:>8}{stats['misses']:>8}{stats['refreshes']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+http_download vs http_get + open().write() for large files.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.download --size 100 --repeat 3
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100, help="file size in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    with LocalServer() as server, tempfile.TemporaryDirectory() as directory:
+        url = server.url(f"/?size={size}&binary=1")
+        path = os.path.join(directory, "download.bin")
+        print(f"{'module':<8}{'method':>16}{'s/file':>10}{'MB/s':>10}{'peak RSS MB':>14}")
+
+        for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+            session = module.create_session()
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                module.http_download(session, url, path, False)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"{name:<8}{'http_download':>16}{elapsed:>10.3f}{args.size / elapsed:>10.1f}{peak_rss_mb():>14.1f}")
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                _, body, _ = module.http_get(session, url)
+                with open(path, "wb") as f:
+                    f.write(body)
+                    f.flush()
+                    os.fsync(f.fileno())
+                del body
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"{name:<8}{'http_get+write':>16}{elapsed:>10.3f}{args.size / elapsed:>10.1f}{peak_rss_mb():>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Local h2c (HTTP/2 without TLS, prior knowledge) server used as a stand-in
+upstream by the HTTP/2 benchmarks.
+
+It answers the same query parameters as Benchmarks.local_server:
+
+    delay   milliseconds to sleep before answering (simulates network wait)
+    size    number of body bytes to send back (default 2)
+    status  HTTP status code to answer with (default 200)
+    echo    when set, POST/PUT bodies are sent back instead of `size` bytes
+    type    Content-Type to answer with (default application/octet-stream)
+
+Streams are answered concurrently on one asyncio loop, so a delayed request
+does not hold up the other streams of its connection. The server needs the
+`h2` package (pip install h2).
+
+Run it on its own with:
+
+    python -m Benchmarks.h2_server --port 8080
+"""
+
+import argparse
+import asyncio
+import subprocess
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+    import h2.settings
+except ImportError:
+    h2 = None
+
+
+class H2Protocol(asyncio.Protocol):
+    def __init__(self, max_streams):
+        self.connection = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        self.max_streams = max_streams
+        self.transport = None
+        self.requests = {}
+        self.window_waiters = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connection.initiate_connection()
+        self.connection.update_settings({h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: self.max_streams})
+        self.transport.write(self.connection.data_to_send())
+
+    def connection_lost(self, exc):
+        for waiter in self.window_waiters.values():
+            if not waiter.done():
+                waiter.cancel()
+        self.window_waiters.clear()
+
+    def data_received(self, data):
+        try:
+            events = self.connection.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.connection.data_to_send())
+            self.transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.requests[event.stream_id] = (dict(event.headers), bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                if event.stream_id in self.requests:
+                    self.requests[event.stream_id][1].extend(event.data)
+                self.connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                if event.stream_id in self.requests:
+                    asyncio.ensure_future(self._respond(event.stream_id, *self.requests.pop(event.stream_id)))
+            elif isinstance(event, h2.events.StreamReset):
+                self.requests.pop(event.stream_id, None)
+                self._wake(event.stream_id)
+            elif isinstance(event, h2.events.WindowUpdated):
+                self._wake(event.stream_id)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.connection.data_to_send())
+
+    def _wake(self, stream_id):
+        stream_ids = list(self.window_waiters) if stream_id == 0 else [stream_id]
+        for waiting_id in stream_ids:
+            waiter = self.window_waiters.pop(waiting_id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    async def _respond(self, stream_id, headers, request_body):
+        query = parse_qs(urlsplit(headers.get(":path", "/")).query)
+        params = {key: values[-1] for key, values in query.items()}
+
+        delay = float(params.get("delay", 0))
+        if delay:
+            await asyncio.sleep(delay / 1000.0)
+
+        if "echo" in params:
+            body = bytes(request_body)
+        else:
+            body = b"x" * int(params.get("size", 2))
+
+        try:
+            self.connection.send_headers(stream_id, [
+                (":status", params.get("status", "200")),
+                ("content-type", params.get("type", "application/octet-stream")),
+                ("content-length", str(len(body))),
+            ], end_stream=not body)
+            self.transport.write(self.connection.data_to_send())
+
+            view = memoryview(body)
+            while view:
+                window = min(self.connection.local_flow_control_window(stream_id),
+                             self.connection.max_outbound_frame_size)
+                if window <= 0:
+                    self.window_waiters[stream_id] = asyncio.get_running_loop().create_future()
+                    await self.window_waiters[stream_id]
+                    continue
+                self.connection.send_data(stream_id, view[:window].tobytes(), end_stream=len(view) <= window)
+                self.transport.write(self.connection.data_to_send())
+                view = view[window:]
+        except (h2.exceptions.StreamClosedError, asyncio.CancelledError):
+            pass
+
+
+class LocalH2Server:
+    """
+    Runs the h2c server in a subprocess so it does not compete with the
+    benchmark for the GIL.
+
+    Example:
+        with LocalH2Server() as server:
+            client.set_http_version("2-prior-knowledge")
+            client.http_get(server.url("/?size=1024"))
+    """
+
+    def __init__(self, host="127.0.0.1", max_streams=1000):
+        if h2 is None:
+            raise RuntimeError("LocalH2Server needs the h2 package (pip install h2).")
+        self.host = host
+        self.max_streams = max_streams
+        self.port = None
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "Benchmarks.h2_server", "--host", self.host, "--port", "0",
+             "--max-streams", str(self.max_streams)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.port = int(self.process.stdout.readline())
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+
+    def url(self, path="/"):
+        return f"http://{self.host}:{self.port}{path}"
+
+
+async def serve(host, port, max_streams):
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(lambda: H2Protocol(max_streams), host, port, backlog=1024)
+    print(server.sockets[0].getsockname()[1], flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local h2c benchmark server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-streams", type=int, default=1000,
+                        help="SETTINGS_MAX_CONCURRENT_STREAMS advertised to clients")
+    args = parser.parse_args()
+
+    if h2 is None:
+        sys.exit("The h2c server needs the h2 package (pip install h2).")
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_streams))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
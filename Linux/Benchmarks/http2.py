@@ -0,0 +1,71 @@
+"""
+HTTP/1.1 vs HTTP/2 (h2c, prior knowledge) for concurrent batches to one host.
+
+Each batch keeps --max-in-flight requests running at once. Over HTTP/1.1 every
+in-flight request needs its own connection; over HTTP/2 they are multiplexed
+as streams, so the connection count drops to one per --max-streams requests.
+Connections are counted from the per-host stats of the session.
+The h2c stand-in is a single-threaded pure-Python server, so its req/s is
+bounded by the server's CPU well before the client's; compare connection
+counts across protocols and req/s across client changes.
+
+The HTTP/2 side runs against Benchmarks.h2_server, which needs the h2
+package. libcurl 7.88 cannot reuse h2c connections (every request after the
+first fails with "Error in the HTTP2 framing layer"); run this against a newer
+libcurl.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.http2 --urls 1000 --delay 20 --max-in-flight 100
+    python -m Benchmarks.http2 --max-streams 16
+"""
+
+import argparse
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.h2_server import LocalH2Server
+from Benchmarks.local_server import LocalServer
+
+
+def run(module, server, http_version, args):
+    session = module.create_session()
+    stats = module.create_stats()
+    module.set_stats(session, stats)
+    module.set_http_version(session, http_version)
+    module.set_max_concurrent_streams(session, args.max_streams)
+
+    urls = [server.url(f"/?delay={args.delay}&size={args.size}&n={i}") for i in range(args.urls)]
+    start = time.perf_counter()
+    results = module.http_get_many(session, urls, args.max_in_flight)
+    elapsed = time.perf_counter() - start
+
+    host = module.stats_snapshot(stats).popitem()[1]
+    errors = sum(1 for _, _, error in results if error is not None)
+    return len(urls) / elapsed, host["new_connections"], errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=1000)
+    parser.add_argument("--delay", type=int, default=20, help="server delay in milliseconds")
+    parser.add_argument("--size", type=int, default=1024, help="response body size in bytes")
+    parser.add_argument("--max-in-flight", type=int, default=100)
+    parser.add_argument("--max-streams", type=int, default=0,
+                        help="HTTP/2 streams per connection (0 for the libcurl default of 100)")
+    args = parser.parse_args()
+
+    print(f"{'module':<8}{'protocol':>10}{'req/s':>12}{'connections':>13}{'errors':>8}")
+    for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+        with LocalServer() as server:
+            rate, connections, errors = run(module, server, module.HTTP_1_1, args)
+        print(f"{name:<8}{'http/1.1':>10}{rate:>12.1f}{connections:>13}{errors:>8}")
+
+        with LocalH2Server() as server:
+            rate, connections, errors = run(module, server, module.HTTP_2_PRIOR_KNOWLEDGE, args)
+        print(f"{name:<8}{'h2c':>10}{rate:>12.1f}{connections:>13}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
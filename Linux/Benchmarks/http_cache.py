@@ -0,0 +1,97 @@
+"""
+Repeated GETs of the same endpoints with and without a ResponseCache.
+
+Each row fetches --urls endpoints round-robin --requests times on one
+client. The server waits --delay milliseconds before answering and sends
+--size bytes, as a config or catalog service would. The modes are:
+
+    no cache      every request is a full round trip with the whole body
+    fresh         a cache and Cache-Control: max-age=3600, so only the first
+                  request to each URL goes to the server
+    revalidate    a cache and Cache-Control: no-cache with an ETag, so every
+                  request is a conditional round trip answered with 304
+    disk restart  the revalidate mode with a new cache on a disk tier that
+                  an earlier cache filled, as after a process restart
+
+The table shows the mean and p99 latency per call, the response body bytes
+received over the network (304 answers carry none) and the cache counters.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.http_cache --requests 2000 --urls 10 --size 65536 --delay 1
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+from HTTPCore import CHTTP
+
+import HTTPCache
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient
+
+
+def run(client, cache, urls, requests):
+    latencies = []
+    received = 0
+    hits = 0
+    for i in range(requests):
+        start = time.perf_counter()
+        client.http_get(urls[i % len(urls)])
+        latencies.append((time.perf_counter() - start) * 1e6)
+        # A cache hit sends no request, so the last timing still belongs to an earlier one.
+        if cache is not None and cache.stats()["hits"] > hits:
+            hits += 1
+        else:
+            received += client.last_timing()["size_download"]
+    return latencies, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--urls", type=int, default=10)
+    parser.add_argument("--size", type=int, default=65536, help="response body bytes")
+    parser.add_argument("--delay", type=float, default=1.0, help="server wait in milliseconds")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    print(f"{'mode':<14}{'mean us':>10}{'p99 us':>10}{'MB received':>13}  counters")
+    try:
+        with LocalServer() as server:
+            def urls(cache_control):
+                return [server.url(f"/?size={args.size}&delay={args.delay}&etag=v{i}&cache_control={cache_control}")
+                        for i in range(args.urls)]
+
+            filler = CHTTPClient(CHTTP)
+            filler.set_cache(HTTPCache.ResponseCache(directory=directory))
+            for url in urls("no-cache"):
+                filler.http_get(url)
+
+            modes = (
+                ("no cache", None, urls("max-age%3D3600")),
+                ("fresh", HTTPCache.ResponseCache(), urls("max-age%3D3600")),
+                ("revalidate", HTTPCache.ResponseCache(), urls("no-cache")),
+                ("disk restart", HTTPCache.ResponseCache(directory=directory), urls("no-cache")),
+            )
+            for name, cache, mode_urls in modes:
+                with CHTTPClient(CHTTP) as client:
+                    client.set_cache(cache)
+                    client.http_get(server.url("/?size=0"))
+                    latencies, received = run(client, cache, mode_urls, args.requests)
+                latencies.sort()
+                counters = ""
+                if cache is not None:
+                    stats = cache.stats()
+                    counters = " ".join(f"{key}={stats[key]}" for key in
+                                        ("hits", "disk_hits", "misses", "revalidations", "not_modified"))
+                print(f"{name:<14}{sum(latencies) / len(latencies):>10.0f}"
+                      f"{latencies[int(len(latencies) * 0.99) - 1]:>10.0f}{received / 1e6:>13.2f}  {counters}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Cold-start cost of importing the clients, measured with python -X importtime.
+
+Each scenario runs in a fresh interpreter --repeat times after one warm-up run
+that writes the bytecode caches. The table shows the median wall time of the
+interpreter minus that of an empty one, the median import time of the modules
+the scenario added (the cumulative time of its top-level imports), and the
+slowest of those modules.
+
+--check also verifies that importing HTTPLib loads no backend extension and
+opens no socket, and with --budget that it stays under the given number of
+milliseconds. It exits with status 1 when a check fails, so it can guard
+worker cold start in CI.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.import_time --repeat 10
+    python -m Benchmarks.import_time --check --budget 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCENARIOS = (
+    ("import HTTPLib", "import HTTPLib"),
+    ("HTTPLib.create_client()", "import HTTPLib; HTTPLib.create_client()"),
+    ("import CHTTP", "import CHTTP"),
+    ("import CPHTTP", "import CPHTTP"),
+    ("import AsyncCHTTP", "import AsyncCHTTP"),
+)
+
+CHECK = """
+import socket, sys
+def refuse(*args, **kwargs):
+    raise AssertionError("network access during import")
+socket.socket.connect = socket.socket.connect_ex = refuse
+import HTTPLib
+loaded = [name for name in sys.modules if name.startswith("HTTPCore")]
+assert not loaded, "import HTTPLib loaded " + ", ".join(loaded)
+"""
+
+
+def run(code):
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, env=env)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            modules[name.strip()] = int(cumulative)
+    return elapsed, modules
+
+
+def measure(code, baseline_modules, repeat):
+    run(code)
+    walls, totals, slowest = [], [], {}
+    for _ in range(repeat):
+        elapsed, modules = run(code)
+        added = {name: us for name, us in modules.items() if name not in baseline_modules}
+        walls.append(elapsed)
+        totals.append(sum(added.values()))
+        for name, us in added.items():
+            slowest.setdefault(name, []).append(us)
+    top = sorted(((statistics.median(values), name) for name, values in slowest.items()), reverse=True)[:3]
+    return statistics.median(walls), statistics.median(totals) / 1000.0, top
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--check", action="store_true", help="fail if import HTTPLib has side effects")
+    parser.add_argument("--budget", type=float, default=None, help="maximum milliseconds for import HTTPLib")
+    args = parser.parse_args()
+
+    run("pass")
+    baseline_walls = []
+    baseline_modules = set()
+    for _ in range(args.repeat):
+        elapsed, modules = run("pass")
+        baseline_walls.append(elapsed)
+        baseline_modules.update(modules)
+    baseline = statistics.median(baseline_walls)
+
+    print(f"{'scenario':<26}{'wall ms':>10}{'import ms':>11}  slowest modules (ms)")
+    results = {}
+    for label, code in SCENARIOS:
+        wall, imports, top = measure(code, baseline_modules, args.repeat)
+        results[label] = imports
+        slowest = ", ".join(f"{name} {us / 1000.0:.1f}" for us, name in top)
+        print(f"{label:<26}{(wall - baseline) * 1000:>10.1f}{imports:>11.1f}  {slowest}")
+
+    failures = []
+    if args.check:
+        try:
+            run(CHECK)
+        except RuntimeError as e:
+            failures.append(str(e))
+    if args.budget is not None and results["import HTTPLib"] > args.budget:
+        failures.append(f"import HTTPLib took {results['import HTTPLib']:.1f} ms, over the {args.budget} ms budget.")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+CPU time per JSON request: str round trip vs bytes straight through.
+
+The str path is what callers did before post_json: json.dumps into a str
+(which the extension encodes to UTF-8 again), then decode the response body to
+a str and json.loads it. The bytes paths serialize straight to UTF-8 bytes
+and parse straight from the response bytes, with the standard library and,
+when it is installed, orjson. The local server echoes the request body, so
+requests and responses carry the same JSON.
+
+CPU time is the client process only; the server runs in a subprocess.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.json_path --records 10 100 1000 --repeat 500
+"""
+
+import argparse
+import json
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+import JSONCodec
+from Benchmarks.local_server import LocalServer, json_records
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def str_path(module, session, url, value):
+    status, body, headers = module.http_post(session, url, json.dumps(value))
+    return json.loads(body.decode("utf-8"))
+
+
+def bytes_path(dumps, loads):
+    def run(module, session, url, value):
+        status, body, headers = module.http_post(session, url, dumps(value), "application/json")
+        return loads(body)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    paths = [
+        ("str+json", str_path),
+        ("bytes+json", bytes_path(lambda value: json.dumps(value, separators=(",", ":")).encode("utf-8"), json.loads)),
+    ]
+    if orjson is not None:
+        paths.append(("bytes+orjson", bytes_path(orjson.dumps, orjson.loads)))
+    else:
+        print("orjson is not installed; skipping the orjson path.")
+    print(f"JSONCodec uses {'orjson' if orjson is not None and JSONCodec.loads is orjson.loads else 'json'}.")
+
+    with LocalServer() as server:
+        url = server.url("/?echo=1")
+        print(f"{'module':<8}{'records':>9}{'path':>15}{'cpu us/req':>12}{'wall us/req':>13}")
+        for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+            session = module.create_session()
+            for records in args.records:
+                value = json.loads(json_records(records))
+                for path_name, path in paths:
+                    assert path(module, session, url, value) == value
+                    cpu_start, wall_start = time.process_time(), time.perf_counter()
+                    for _ in range(args.repeat):
+                        path(module, session, url, value)
+                    cpu = (time.process_time() - cpu_start) / args.repeat * 1e6
+                    wall = (time.perf_counter() - wall_start) / args.repeat * 1e6
+                    print(f"{name:<8}{records:>9}{path_name:>15}{cpu:>12.1f}{wall:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
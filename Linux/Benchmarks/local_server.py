@@ -0,0 +1,391 @@
+"""
+Local HTTP/1.1 server used as a stand-in upstream by the benchmarks.
+
+The server answers every method on every path. Its behaviour is driven by
+query parameters so a benchmark can shape the response without extra routes:
+
+    delay   milliseconds to sleep before answering (simulates network wait)
+    size    number of body bytes to send back (default 2)
+    status  HTTP status code to answer with (default 200)
+    echo    when set, POST/PUT bodies (plain or chunked) are sent back instead of `size` bytes
+    binary  when set, the `size` body bytes cycle through all 256 byte values
+    type    Content-Type to answer with (default application/octet-stream)
+    json    when set, the body is a JSON array of this many records (see json_records)
+
+Caching headers can be added to exercise revalidation:
+
+    etag           sent as the ETag; a request whose If-None-Match names it gets a 304
+    last_modified  seconds since the epoch sent as Last-Modified; a request whose If-Modified-Since
+                   is not older gets a 304
+    cache_control  sent as the Cache-Control header
+    set_cookie     sent as a Set-Cookie header, e.g. set_cookie=session%3Dabc
+
+Every answer carries the request's Cookie header in an X-Cookie header.
+
+Faults can be injected to exercise retries and hedging:
+
+    fail         the first `fail` requests with the same `key` fail instead of answering normally
+    fail_status  status code of those failures (default 503); 0 closes the connection without an answer
+    retry_after  Retry-After header value sent with the failures
+    slow         probability (0 to 1) that a request sleeps an extra `slow_delay` milliseconds
+    capacity     requests with this parameter that arrive while `capacity` of them are already being
+                 answered get a 429 (with `retry_after` if given) instead
+    slow_first   the first `slow_first` requests with the same `key` sleep an extra `slow_delay`
+                 milliseconds; when the client closes the connection meanwhile, the answer is dropped
+                 and counted as cancelled
+    counts       when set, the body is a JSON object with the number of requests seen for `key` and
+                 how many of its slow answers were cancelled: {"requests": n, "cancelled": n}
+
+Every answer carries the request method in an X-Method header. Open-ended
+`Range: bytes=N-` requests are answered with 206 or 416. Bodies are
+gzipped when the request accepts gzip, and gzipped request bodies are
+decompressed before they are echoed.
+
+LocalServer(tls=True) serves HTTPS with a self-signed certificate for
+127.0.0.1 made with the openssl command; pass its ca_file to the client.
+
+Run it on its own with:
+
+    python -m Benchmarks.local_server --port 8080
+"""
+
+import argparse
+import functools
+import gzip
+import json
+import os
+import random
+import select
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+@functools.lru_cache(maxsize=16)
+def json_records(count):
+    """Returns a JSON array of `count` API-style records, as UTF-8 bytes."""
+    return json.dumps([
+        {
+            "id": i,
+            "name": f"user-{i}",
+            "email": f"user-{i}@example.com",
+            "active": i % 3 != 0,
+            "score": round(i * 1.618 % 100, 3),
+            "tags": ["alpha", "beta", "gamma"][: i % 3 + 1],
+            "created_at": f"2024-01-{i % 28 + 1:02d}T12:00:00Z",
+        }
+        for i in range(count)
+    ]).encode("utf-8")
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self):
+        query = parse_qs(urlsplit(self.path).query)
+        return {key: values[-1] for key, values in query.items()}
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    raise ConnectionResetError("client aborted the chunked upload")
+                size = int(line.split(b";")[0], 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        return body
+
+    def _send_failure(self, status, params):
+        self.send_response(status)
+        if "retry_after" in params:
+            self.send_header("Retry-After", params["retry_after"])
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _inject_fault(self, params):
+        if "fail" in params:
+            with self.server.lock:
+                seen = self.server.fail_counts.get(params.get("key"), 0)
+                self.server.fail_counts[params.get("key")] = seen + 1
+            if seen < int(params["fail"]):
+                status = int(params.get("fail_status", 503))
+                if status == 0:
+                    self.close_connection = True
+                    return True
+                self._send_failure(status, params)
+                return True
+
+        if "slow_first" in params:
+            key = params.get("key")
+            with self.server.lock:
+                seen = self.server.request_counts.get(key, 0) - 1
+            if seen < int(params["slow_first"]) and \
+                    not self._sleep_unless_closed(float(params.get("slow_delay", 0)) / 1000.0):
+                with self.server.lock:
+                    self.server.cancelled[key] = self.server.cancelled.get(key, 0) + 1
+                self.close_connection = True
+                return True
+
+        if random.random() < float(params.get("slow", 0)):
+            time.sleep(float(params.get("slow_delay", 0)) / 1000.0)
+        return False
+
+    def _sleep_unless_closed(self, seconds):
+        """Sleeps for seconds; returns False as soon as the client closes the connection instead."""
+        if isinstance(self.connection, ssl.SSLSocket):
+            time.sleep(seconds)
+            return True
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            readable, _, _ = select.select([self.connection], [], [], min(remaining, 0.01))
+            if readable:
+                try:
+                    if not self.connection.recv(1, socket.MSG_PEEK):
+                        return False
+                except OSError:
+                    return False
+                # A pipelined request is waiting; it does not end this one.
+                time.sleep(min(remaining, 0.01))
+
+    def _send_counts(self, key):
+        with self.server.lock:
+            body = json.dumps({"requests": self.server.request_counts.get(key, 0),
+                               "cancelled": self.server.cancelled.get(key, 0)}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond(self, send_body=True):
+        params = self._params()
+        request_body = self._read_body()
+
+        if "counts" in params:
+            self._send_counts(params.get("key"))
+            return
+        if "key" in params:
+            with self.server.lock:
+                self.server.request_counts[params["key"]] = self.server.request_counts.get(params["key"], 0) + 1
+
+        if self._inject_fault(params):
+            return
+
+        if "capacity" in params:
+            with self.server.lock:
+                admitted = self.server.active < int(params["capacity"])
+                if admitted:
+                    self.server.active += 1
+            if not admitted:
+                self._send_failure(429, params)
+                return
+            try:
+                self._answer(params, request_body, send_body)
+            finally:
+                with self.server.lock:
+                    self.server.active -= 1
+        else:
+            self._answer(params, request_body, send_body)
+
+    def _answer(self, params, request_body, send_body):
+        delay = float(params.get("delay", 0))
+        if delay:
+            time.sleep(delay / 1000.0)
+
+        size = int(params.get("size", 2))
+        if "echo" in params:
+            body = request_body
+        elif "json" in params:
+            body = json_records(int(params["json"]))
+        elif "binary" in params:
+            body = (bytes(range(256)) * (size // 256 + 1))[:size]
+        else:
+            body = b"x" * size
+
+        status = int(params.get("status", 200))
+        headers = {}
+        if "cache_control" in params:
+            headers["Cache-Control"] = params["cache_control"]
+        if "set_cookie" in params:
+            headers["Set-Cookie"] = params["set_cookie"]
+        headers["X-Cookie"] = self.headers.get("Cookie", "")
+        if "etag" in params:
+            headers["ETag"] = f'"{params["etag"]}"'
+        if "last_modified" in params:
+            headers["Last-Modified"] = formatdate(float(params["last_modified"]), usegmt=True)
+        if status == 200 and self._not_modified(params, headers):
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        byte_range = self.headers.get("Range", "")
+        if status == 200 and byte_range.startswith("bytes=") and byte_range.endswith("-"):
+            start = int(byte_range[len("bytes="):-1])
+            if start >= len(body):
+                status, headers["Content-Range"], body = 416, f"bytes */{len(body)}", b""
+            else:
+                status, headers["Content-Range"] = 206, f"bytes {start}-{len(body) - 1}/{len(body)}"
+                body = body[start:]
+
+        if "gzip" in self.headers.get("Accept-Encoding", "") and "Content-Range" not in headers:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+        self.send_header("Content-Type", params.get("type", "application/octet-stream"))
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Method", self.command)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _not_modified(self, params, headers):
+        if "ETag" in headers and "If-None-Match" in self.headers:
+            return headers["ETag"] in (tag.strip() for tag in self.headers["If-None-Match"].split(","))
+        if "last_modified" in params and "If-Modified-Since" in self.headers:
+            try:
+                since = parsedate_to_datetime(self.headers["If-Modified-Since"]).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(float(params["last_modified"])) <= since
+        return False
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def do_PUT(self):
+        self._respond()
+
+    def do_DELETE(self):
+        self._respond()
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+
+class LocalHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.fail_counts = {}
+        self.request_counts = {}
+        self.cancelled = {}
+        self.active = 0
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_certificate(directory, host):
+    """Writes a self-signed certificate and key for host into directory and returns their paths."""
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", f"/CN={host}",
+         "-addext", f"subjectAltName=IP:{host}", "-keyout", keyfile, "-out", certfile],
+        check=True, capture_output=True,
+    )
+    return certfile, keyfile
+
+
+class LocalServer:
+    """
+    Runs the local server in a subprocess so it does not compete with the
+    benchmark for the GIL.
+
+    With tls=True the server speaks HTTPS with a fresh self-signed
+    certificate, and ca_file is the path clients must trust.
+
+    Example:
+        with LocalServer() as server:
+            client.http_get(server.url("/?size=1024"))
+    """
+
+    def __init__(self, host="127.0.0.1", tls=False):
+        self.host = host
+        self.tls = tls
+        self.port = None
+        self.process = None
+        self.ca_file = None
+        self._directory = None
+
+    def __enter__(self):
+        command = [sys.executable, "-m", "Benchmarks.local_server", "--host", self.host, "--port", "0"]
+        if self.tls:
+            self._directory = tempfile.mkdtemp()
+            self.ca_file, keyfile = make_certificate(self._directory, self.host)
+            command += ["--certfile", self.ca_file, "--keyfile", keyfile]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        self.port = int(self.process.stdout.readline())
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+    def url(self, path="/"):
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://{self.host}:{self.port}{path}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP/1.1 benchmark server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--certfile", help="serve HTTPS with this certificate")
+    parser.add_argument("--keyfile", help="private key of --certfile")
+    args = parser.parse_args()
+
+    server = LocalHTTPServer((args.host, args.port), LocalHandler)
+    if args.certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(args.certfile, args.keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    print(server.server_address[1], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
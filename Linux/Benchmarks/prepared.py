@@ -0,0 +1,90 @@
+"""
+Per-call overhead of prepared requests vs the one-shot request functions.
+
+Each row sends --requests requests of one kind to the local server on a
+single session and shows the wall time and the CPU time this process spent
+per call. The server runs in its own process, so the CPU column is the
+client's own cost: argument parsing, building the header list, converting
+the body, setting curl options and libcurl's work on the request and
+response. The modes are:
+
+    oneshot      http_get / http_post(url, body, content_type) every call
+    prepared     the same request compiled once and sent with http_prepared
+    alternating  two prepared requests sent in turn, so every call switches
+                 the session's options from one to the other
+    client       the same through CHTTPClient.http_get / http_post
+    client send  the same through CHTTPClient.prepare() and send()
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.prepared --requests 5000
+"""
+
+import argparse
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient
+
+
+def measure(call, requests):
+    call()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(requests):
+        call()
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    return wall / requests * 1e6, cpu / requests * 1e6
+
+
+def scenarios(module, server, body):
+    session = module.create_session()
+    client = CHTTPClient(module)
+    get_url = server.url("/?size=64")
+    post_url = server.url("/?size=64&kind=post")
+    content_type = "application/json"
+
+    get = module.create_prepared("GET", get_url)
+    post = module.create_prepared("POST", post_url, body, None, content_type)
+    other = module.create_prepared("POST", server.url("/?size=64&kind=other"), body, None, content_type)
+    client_get = client.prepare("GET", get_url)
+    client_post = client.prepare("POST", post_url, body, content_type=content_type)
+    turn = [post, other]
+
+    def alternate():
+        turn.reverse()
+        return module.http_prepared(session, turn[0])
+
+    return [
+        ("GET", "oneshot", lambda: module.http_get(session, get_url)),
+        ("GET", "prepared", lambda: module.http_prepared(session, get)),
+        ("POST", "oneshot", lambda: module.http_post(session, post_url, body, content_type)),
+        ("POST", "prepared", lambda: module.http_prepared(session, post)),
+        ("POST", "alternating", alternate),
+        ("GET", "client", lambda: client.http_get(get_url)),
+        ("GET", "client send", lambda: client.send(client_get)),
+        ("POST", "client", lambda: client.http_post(post_url, body)),
+        ("POST", "client send", lambda: client.send(client_post)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--body-size", type=int, default=256, help="POST body bytes")
+    args = parser.parse_args()
+
+    body = "x" * args.body_size
+    print(f"{'module':<8}{'method':>7}{'mode':>13}{'wall us':>10}{'cpu us':>10}")
+    with LocalServer() as server:
+        for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+            for method, mode, call in scenarios(module, server, body):
+                wall, cpu = measure(call, args.requests)
+                print(f"{name:<8}{method:>7}{mode:>13}{wall:>10.1f}{cpu:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+One process vs a multiprocessing.Pool vs ProcessPoolFetcher for fetch + parse.
+
+Every request fetches a JSON array of --records records from the local server
+and reduces it to a small summary in Python, the CPU-bound part that keeps a
+single process on one core. The three modes are:
+
+    single   http_request_many batches and the parsing both in this process
+    pool     multiprocessing.Pool workers fetch and parse, results are pickled
+    fetcher  ProcessPoolFetcher workers fetch and parse, results come back
+             through shared memory
+
+The raw rows run the same modes without the parsing step, which shows the
+cost of moving whole bodies between processes. Workers only help when there
+are idle cores; on a single-core machine the multi-process rows measure
+overhead, not scaling.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.process_pool --urls 2000 --records 200 --workers 4
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from HTTPCore import CHTTP
+
+import JSONCodec
+from Benchmarks.local_server import LocalServer
+from Fetcher import ProcessPoolFetcher
+
+_session = None
+
+
+def summarize(status, body):
+    records = JSONCodec.loads(body)
+    active = [record for record in records if record["active"]]
+    return JSONCodec.dumps({"active": len(active), "score": sum(record["score"] for record in active)})
+
+
+def _pool_fetch(args):
+    global _session
+    if _session is None:
+        _session = CHTTP.create_session()
+    requests, parse = args
+    return [
+        (status, summarize(status, body) if parse and error is None else body, error)
+        for status, body, error in CHTTP.http_request_many(_session, requests, 16)
+    ]
+
+
+def run_single(requests, parse, args):
+    session = CHTTP.create_session()
+    start = time.perf_counter()
+    count = 0
+    for offset in range(0, len(requests), args.batch_size):
+        for status, body, error in CHTTP.http_request_many(session, requests[offset:offset + args.batch_size], 16):
+            if parse and error is None:
+                summarize(status, body)
+            count += 1
+    return count / (time.perf_counter() - start)
+
+
+def run_pool(requests, parse, args):
+    batches = [(requests[offset:offset + args.batch_size], parse) for offset in range(0, len(requests), args.batch_size)]
+    with multiprocessing.Pool(args.workers) as pool:
+        start = time.perf_counter()
+        count = sum(len(batch) for batch in pool.imap(_pool_fetch, batches))
+        return count / (time.perf_counter() - start)
+
+
+def run_fetcher(requests, parse, args):
+    with ProcessPoolFetcher(workers=args.workers, batch_size=args.batch_size,
+                            process=summarize if parse else None) as fetcher:
+        start = time.perf_counter()
+        count = sum(1 for _ in fetcher.fetch(requests, ordered=False))
+        return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=2000)
+    parser.add_argument("--records", type=int, default=200, help="JSON records per response")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {multiprocessing.cpu_count()} CPUs")
+    print(f"{'mode':<10}{'work':>8}{'req/s':>12}")
+    with LocalServer() as server:
+        requests = [("GET", server.url(f"/?json={args.records}&n={i}")) for i in range(args.urls)]
+        for parse in (True, False):
+            for name, run in (("single", run_single), ("pool", run_pool), ("fetcher", run_fetcher)):
+                rate = run(requests, parse, args)
+                print(f"{name:<10}{'parse' if parse else 'raw':>8}{rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Short-lived workers with isolated sessions vs sessions on a shared curl share.
+
+Every task creates a fresh session and makes a few requests, the way a job
+queue that builds a client per job does. Isolated sessions open a new
+connection (and, over HTTPS, repeat the DNS lookup and TLS handshake) for
+every task. Sessions cloned from a template attached to a share reuse the
+connections, DNS entries and TLS sessions the other tasks left behind.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.session_pool --tasks 2000 --threads 8
+    python -m Benchmarks.session_pool --url https://example.com/ --tasks 50
+"""
+
+import argparse
+import threading
+import time
+
+from HTTPCore import CHTTP
+
+from Benchmarks.local_server import LocalServer
+
+
+def run(url, tasks, threads, requests_per_task, make_session):
+    remaining = iter(range(tasks))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            session = make_session()
+            for _ in range(requests_per_task):
+                CHTTP.http_get(session, url)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return tasks / (time.perf_counter() - start)
+
+
+def benchmark(url, args):
+    template = CHTTP.create_session(CHTTP.create_share())
+    CHTTP.set_timeout(template, 30)
+
+    print(f"{'sessions':<10}{'tasks/s':>12}")
+    isolated = run(url, args.tasks, args.threads, args.requests, CHTTP.create_session)
+    print(f"{'isolated':<10}{isolated:>12.1f}")
+    shared = run(url, args.tasks, args.threads, args.requests, lambda: CHTTP.clone_session(template))
+    print(f"{'shared':<10}{shared:>12.1f}{shared / isolated:>9.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1, help="requests per task")
+    parser.add_argument("--url", help="benchmark against this URL instead of the local server")
+    args = parser.parse_args()
+
+    if args.url:
+        benchmark(args.url, args)
+        return
+    with LocalServer() as server:
+        benchmark(server.url("/"), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Memory soak test: RSS must stay flat across many requests on one session.
+
+Each module issues --requests GET requests on a single long-lived session
+and samples the process RSS. The first tenth of the run is treated as
+warm-up, and the run fails if RSS grows more than --max-growth MB after it.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.soak --requests 100000 --size 4096
+"""
+
+import argparse
+import resource
+import sys
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def soak(module, url, requests, samples):
+    session = module.create_session()
+    interval = max(requests // samples, 1)
+    warmup = max(requests // 10, 1)
+    baseline = None
+    peak = 0.0
+
+    for i in range(1, requests + 1):
+        module.http_get(session, url)
+        if i == warmup:
+            baseline = rss_mb()
+        if i % interval == 0:
+            rss = rss_mb()
+            peak = max(peak, rss)
+            print(f"  {i:>8} requests  rss {rss:8.1f} MB")
+
+    return baseline, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--size", type=int, default=4096, help="response body size in bytes")
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--max-growth", type=float, default=8.0, help="allowed RSS growth after warm-up, in MB")
+    args = parser.parse_args()
+
+    failed = False
+    with LocalServer() as server:
+        url = server.url(f"/?size={args.size}")
+        for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+            print(name)
+            baseline, peak = soak(module, url, args.requests, args.samples)
+            growth = peak - baseline
+            status = "ok" if growth <= args.max_growth else "FAILED"
+            print(f"  growth after warm-up {growth:.1f} MB: {status}")
+            failed = failed or growth > args.max_growth
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Cross-implementation benchmark suite with JSON output.
+
+Compares the CHTTP and CPHTTP extensions with the standard library's
+http.client and urllib against the local server on several axes:
+
+    latency    sequential requests: rate, p50/p99 latency, CPU time and RSS
+               per request, over keep-alive and new connections
+    body_size  response bodies from 0 B to 50 MB: throughput and latency
+    threads    one client per thread against a delayed server: rate
+
+The results are written as JSON. Pass a previous run with --baseline to
+fail (exit status 1) when a rate drops by more than --tolerance, so a
+regression in the C core shows up between releases.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.suite --output results.json
+    python -m Benchmarks.suite --baseline results.json --tolerance 0.15
+    python -m Benchmarks.suite --axes latency threads --quick
+"""
+
+import argparse
+import http.client
+import json
+import platform
+import resource
+import sys
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+
+BODY_SIZES = [0, 1024, 64 * 1024, 1024 * 1024, 10 * 1024 * 1024, 50 * 1024 * 1024]
+THREADS = [1, 2, 4, 8, 16]
+
+
+class CurlClient:
+    def __init__(self, module, keepalive):
+        self.module = module
+        self.session = module.create_session() if keepalive else None
+
+    def get(self, url):
+        session = self.session or self.module.create_session()
+        return self.module.http_get(session, url)[1]
+
+
+class HTTPClientClient:
+    def __init__(self, keepalive):
+        self.keepalive = keepalive
+        self.connection = None
+
+    def get(self, url):
+        parts = urlsplit(url)
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(parts.hostname, parts.port)
+        self.connection.request("GET", f"{parts.path}?{parts.query}")
+        body = self.connection.getresponse().read()
+        if not self.keepalive:
+            self.connection.close()
+            self.connection = None
+        return body
+
+
+class UrllibClient:
+    def __init__(self, keepalive):
+        pass
+
+    def get(self, url):
+        with urllib.request.urlopen(url) as response:
+            return response.read()
+
+
+IMPLEMENTATIONS = {
+    "CHTTP": (lambda keepalive: CurlClient(CHTTP, keepalive), True),
+    "CPHTTP": (lambda keepalive: CurlClient(CPHTTP, keepalive), True),
+    "http.client": (HTTPClientClient, True),
+    "urllib": (UrllibClient, False),
+}
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(percent / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(client, url, requests, expected_size=None):
+    client.get(url)
+    latencies = []
+    rss_before = rss_mb()
+    cpu_before = cpu_seconds()
+    start = time.perf_counter()
+    for _ in range(requests):
+        request_start = time.perf_counter()
+        body = client.get(url)
+        latencies.append(time.perf_counter() - request_start)
+        if expected_size is not None and len(body) != expected_size:
+            raise RuntimeError(f"expected {expected_size} body bytes, got {len(body)}")
+        del body
+    elapsed = time.perf_counter() - start
+    cpu = cpu_seconds() - cpu_before
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "rate": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "cpu_us_per_request": cpu / requests * 1e6,
+        "rss_mb": rss_mb(),
+        "rss_growth_kb_per_request": max(0.0, rss_mb() - rss_before) * 1024 / requests,
+    }
+
+
+def run_latency(server, implementations, args):
+    for name in implementations:
+        factory, supports_keepalive = IMPLEMENTATIONS[name]
+        for mode in ("keepalive", "new_connection"):
+            if mode == "keepalive" and not supports_keepalive:
+                continue
+            client = factory(mode == "keepalive")
+            result = measure(client, server.url("/?size=64"), args.requests)
+            yield dict(axis="latency", implementation=name, mode=mode, **result)
+
+
+def run_body_size(server, implementations, args):
+    for size in args.sizes:
+        requests = max(3, min(args.requests, (200 * 1024 * 1024) // max(size, 1)))
+        for name in implementations:
+            factory, supports_keepalive = IMPLEMENTATIONS[name]
+            client = factory(supports_keepalive)
+            result = measure(client, server.url(f"/?size={size}&binary=1"), requests, expected_size=size)
+            result["mb_per_second"] = size * result["rate"] / (1024 * 1024)
+            yield dict(axis="body_size", implementation=name, size=size, **result)
+
+
+def run_threads(server, implementations, args):
+    url = server.url(f"/?delay={args.delay}")
+    for name in implementations:
+        factory, supports_keepalive = IMPLEMENTATIONS[name]
+        for threads in args.threads:
+            clients = [factory(supports_keepalive) for _ in range(threads)]
+            per_thread = max(1, args.requests // 10)
+            barrier = threading.Barrier(threads + 1)
+
+            def worker(client):
+                barrier.wait()
+                for _ in range(per_thread):
+                    client.get(url)
+
+            workers = [threading.Thread(target=worker, args=(client,)) for client in clients]
+            for thread in workers:
+                thread.start()
+            cpu_before = cpu_seconds()
+            barrier.wait()
+            start = time.perf_counter()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            total = threads * per_thread
+            yield {
+                "axis": "threads",
+                "implementation": name,
+                "threads": threads,
+                "delay_ms": args.delay,
+                "requests": total,
+                "rate": total / elapsed,
+                "cpu_us_per_request": (cpu_seconds() - cpu_before) / total * 1e6,
+            }
+
+
+AXES = {"latency": run_latency, "body_size": run_body_size, "threads": run_threads}
+
+
+def result_key(result):
+    return tuple(result.get(field) for field in ("axis", "implementation", "mode", "size", "threads"))
+
+
+def compare(results, baseline, tolerance):
+    previous = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old and result["rate"] < old["rate"] * (1 - tolerance):
+            regressions.append((result_key(result), old["rate"], result["rate"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--axes", nargs="+", choices=sorted(AXES), default=list(AXES))
+    parser.add_argument("--implementations", nargs="+", choices=list(IMPLEMENTATIONS), default=list(IMPLEMENTATIONS))
+    parser.add_argument("--requests", type=int, default=2000, help="requests per measurement")
+    parser.add_argument("--delay", type=int, default=5, help="server delay in milliseconds for the threads axis")
+    parser.add_argument("--threads", type=int, nargs="+", default=THREADS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=BODY_SIZES, help="body sizes in bytes")
+    parser.add_argument("--quick", action="store_true", help="fewer requests and no bodies above 1 MB")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare rates against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative rate drop against the baseline")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.requests = min(args.requests, 200)
+        args.sizes = [size for size in args.sizes if size <= 1024 * 1024]
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "requests": args.requests,
+        },
+        "results": [],
+    }
+    with LocalServer() as server:
+        for axis in args.axes:
+            for result in AXES[axis](server, args.implementations, args):
+                print(json.dumps(result), file=sys.stderr)
+                report["results"].append(result)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance)
+        for key, old_rate, new_rate in regressions:
+            label = " ".join(str(field) for field in key if field is not None)
+            print(f"regression: {label}: {old_rate:.1f} -> {new_rate:.1f} req/s", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Tail latency with and without hedging, and retries against injected faults.
+
+The hedging part sends sequential GETs to a server where --slow of the
+requests stall for an extra --slow-delay milliseconds, once plainly and once
+with a fixed hedge delay and with the host's p95 as the delay. It reports the
+p50/p99/max latency seen by the caller and how many requests were answered
+by a hedge rather than the original.
+
+The retry part sends requests that the server fails --fail times before
+answering (503 with Retry-After: 0, or a dropped connection) and counts how
+many succeed with and without a RetryPolicy.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.tail_latency --requests 500 --slow 0.02 --slow-delay 200
+"""
+
+import argparse
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+from Resilience import HedgePolicy, RetryPolicy
+from Response import Response
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_hedging(module, server, hedge, args):
+    session = module.create_session()
+    stats = module.create_stats()
+    module.set_stats(session, stats)
+    policy = HedgePolicy(hedge) if hedge is not None else None
+
+    url = server.url(f"/?delay={args.delay}&slow={args.slow}&slow_delay={args.slow_delay}")
+    latencies = []
+    hedge_wins = 0
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        delay = policy.delay_for(url, lambda: module.stats_snapshot(stats)) if policy else None
+        if delay is None:
+            module.http_get(session, url)
+        elif module.http_hedged(session, "GET", url, None, delay)[3] > 0:
+            hedge_wins += 1
+        latencies.append(time.perf_counter() - start)
+    return percentile(latencies, 0.5), percentile(latencies, 0.99), max(latencies), hedge_wins
+
+
+def run_retries(module, server, fail_status, policy, args):
+    session = module.create_session()
+    succeeded = 0
+    for i in range(args.retry_requests):
+        url = server.url(f"/?fail={args.fail}&fail_status={fail_status}&retry_after=0&key={id(policy)}-{fail_status}-{i}")
+        send = lambda: Response(*module.http_get(session, url))
+        try:
+            response = policy.run(send) if policy else send()
+        except RuntimeError:
+            continue
+        if response.status_code == 200:
+            succeeded += 1
+    return succeeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--delay", type=int, default=2, help="normal server delay in milliseconds")
+    parser.add_argument("--slow", type=float, default=0.02, help="fraction of requests that stall")
+    parser.add_argument("--slow-delay", type=int, default=200, help="extra delay of a stalled request in milliseconds")
+    parser.add_argument("--hedge-delay", type=float, default=0.01, help="fixed hedge delay in seconds")
+    parser.add_argument("--retry-requests", type=int, default=50)
+    parser.add_argument("--fail", type=int, default=2, help="failures injected before each request succeeds")
+    args = parser.parse_args()
+
+    print(f"{'module':<8}{'hedging':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'hedge wins':>12}")
+    for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+        with LocalServer() as server:
+            for label, hedge in (("off", None), (f"{args.hedge_delay}s", args.hedge_delay), ("p95", "p95")):
+                p50, p99, slowest, wins = run_hedging(module, server, hedge, args)
+                print(f"{name:<8}{label:>10}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}{slowest * 1000:>10.1f}{wins:>12}")
+
+    print()
+    print(f"{'module':<8}{'fault':>12}{'no retry':>10}{'retry':>10}")
+    for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+        with LocalServer() as server:
+            for label, fail_status in (("503", 503), ("disconnect", 0)):
+                plain = run_retries(module, server, fail_status, None, args)
+                policy = RetryPolicy(retries=args.fail, backoff=0.01)
+                retried = run_retries(module, server, fail_status, policy, args)
+                print(f"{name:<8}{label:>12}{plain:>10}{retried:>10}")
+
+
+if __name__ == "__main__":
+    main()
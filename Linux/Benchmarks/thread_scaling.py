@@ -0,0 +1,64 @@
+"""
+Thread-scaling benchmark for the CHTTP and CPHTTP extensions.
+
+Each worker thread owns its own session and issues requests against the
+local server, which delays every answer to simulate network wait. With the
+GIL released around curl_easy_perform, throughput should grow roughly
+linearly with the thread count until the server saturates.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.thread_scaling --requests 200 --delay 20
+"""
+
+import argparse
+import threading
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+
+
+def run(module, url, threads, requests_per_thread):
+    sessions = [module.create_session() for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(session):
+        barrier.wait()
+        for _ in range(requests_per_thread):
+            module.http_get(session, url)
+
+    workers = [threading.Thread(target=worker, args=(session,)) for session in sessions]
+    for thread in workers:
+        thread.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return threads * requests_per_thread / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="requests per thread")
+    parser.add_argument("--delay", type=int, default=20, help="server delay in milliseconds")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with LocalServer() as server:
+        url = server.url(f"/?delay={args.delay}")
+        print(f"{'module':<8}{'threads':>8}{'req/s':>12}{'speedup':>10}")
+        for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+            baseline = None
+            for threads in args.threads:
+                rate = run(module, url, threads, args.requests)
+                baseline = baseline or rate
+                print(f"{name:<8}{threads:>8}{rate:>12.1f}{rate / baseline:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Upload throughput and client memory for in-memory, file and generator bodies.
+
+The streamed variants run first so the peak RSS column shows whether they
+stayed flat before the in-memory body is allocated.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.upload --size 100 --repeat 3
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from HTTPCore import CHTTP, CPHTTP
+
+from Benchmarks.local_server import LocalServer
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def chunks(size, chunk_size=1024 * 1024):
+    block = b"x" * chunk_size
+    for offset in range(0, size, chunk_size):
+        yield block[:min(chunk_size, size - offset)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100, help="upload size in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    with LocalServer() as server, tempfile.TemporaryDirectory() as directory:
+        url = server.url("/")
+        path = os.path.join(directory, "upload.bin")
+        with open(path, "wb") as f:
+            for chunk in chunks(size):
+                f.write(chunk)
+
+        print(f"{'module':<8}{'body':>10}{'s/upload':>10}{'MB/s':>10}{'peak RSS MB':>14}")
+        for body_kind in ("file", "generator", "bytes"):
+            for name, module in (("CHTTP", CHTTP), ("CPHTTP", CPHTTP)):
+                session = module.create_session()
+                payload = b"x" * size if body_kind == "bytes" else None
+
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    if body_kind == "file":
+                        with open(path, "rb") as f:
+                            module.http_post(session, url, f)
+                    elif body_kind == "generator":
+                        module.http_post(session, url, chunks(size))
+                    else:
+                        module.http_post(session, url, payload)
+                elapsed = (time.perf_counter() - start) / args.repeat
+                print(f"{name:<8}{body_kind:>10}{elapsed:>10.3f}{args.size / elapsed:>10.1f}{peak_rss_mb():>14.1f}")
+                del payload
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+First-request latency of fresh clients with and without warm().
+
+Every trial creates new clients against a local HTTPS server with a
+self-signed certificate (made with the openssl command) and times their
+first requests, the ones that pay DNS, TCP and TLS setup on a cold client.
+Warming happens before the clock starts. The modes are:
+
+    client cold   a new CHTTPClient's first http_get
+    client warm   the same after client.warm([url])
+    pool cold     --threads threads each making their first request through
+                  a new SessionPool at the same time
+    pool warm     the same after pool.warm([url], --threads)
+
+The table shows the median and maximum first-request latency over all
+trials and the new connections those requests opened.
+
+Usage (from the Linux directory):
+
+    python -m Benchmarks.warm_up --trials 50 --threads 8
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from HTTPCore import CHTTP
+
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient, SessionPool
+
+
+def timed_get(client, url):
+    start = time.perf_counter()
+    client.http_get(url)
+    return time.perf_counter() - start, client.last_timing()["num_connects"]
+
+
+def client_trial(server, url, warm):
+    with CHTTPClient(CHTTP) as client:
+        client.set_ca_file(server.ca_file)
+        if warm:
+            client.warm([url])
+        return [timed_get(client, url)]
+
+
+def pool_trial(server, url, warm, threads):
+    pool = SessionPool(CHTTP, max_size=threads)
+    pool.template.set_ca_file(server.ca_file)
+    pool.template.set_max_connections(threads * 2)
+    if warm:
+        pool.warm([url], threads)
+    clients = [pool.checkout() for _ in range(threads)]
+    results = []
+    barrier = threading.Barrier(threads)
+
+    def run(client):
+        barrier.wait()
+        results.append(timed_get(client, url))
+
+    workers = [threading.Thread(target=run, args=(client,)) for client in clients]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    for client in clients:
+        pool.checkin(client)
+    pool.close()
+    pool.template.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent first requests in the pool modes")
+    args = parser.parse_args()
+
+    modes = (
+        ("client cold", lambda server, url: client_trial(server, url, False)),
+        ("client warm", lambda server, url: client_trial(server, url, True)),
+        ("pool cold", lambda server, url: pool_trial(server, url, False, args.threads)),
+        ("pool warm", lambda server, url: pool_trial(server, url, True, args.threads)),
+    )
+    print(f"{'mode':<14}{'p50 ms':>10}{'max ms':>10}{'connects':>10}")
+    with LocalServer(tls=True) as server:
+        url = server.url("/?size=64")
+        for name, trial in modes:
+            latencies = []
+            connects = 0
+            for _ in range(args.trials):
+                for latency, opened in trial(server, url):
+                    latencies.append(latency * 1000)
+                    connects += opened
+            print(f"{name:<14}{statistics.median(latencies):>10.2f}{max(latencies):>10.2f}{connects:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Multi-process fetching for request lists too large for one core.
+
+ProcessPoolFetcher shards a request list into batches that worker processes
+pull from a shared queue. Each worker creates its own session inside the
+child process, so no curl handle crosses a fork(), runs its batches through
+http_request_many, and optionally post-processes every response before
+handing it back. Response bodies travel through per-worker shared-memory
+slots instead of being pickled: the worker writes a batch's bodies into a
+free slot and only the offsets cross the result queue, and the parent copies
+each body out once and hands the slot back. Needs Python 3.8 or later.
+"""
+
+import importlib
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+_POLL = 0.1
+
+
+def _worker(worker_id, module_name, configure, process, max_in_flight, tasks, results, free_slots, slot_names,
+            stop):
+    core = importlib.import_module(module_name)
+    session = core.create_session()
+    stats = core.create_stats()
+    core.set_stats(session, stats)
+    if configure is not None:
+        configure(core, session)
+
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    counters = {"pid": os.getpid(), "batches": 0, "requests": 0, "errors": 0, "bytes": 0, "overflows": 0,
+                "fetch_time": 0.0, "process_time": 0.0}
+    try:
+        while not stop.is_set():
+            try:
+                task = tasks.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+            if task is None:
+                break
+            generation, start, requests = task
+
+            started = time.perf_counter()
+            try:
+                batch = core.http_request_many(session, requests, max_in_flight)
+            except (TypeError, ValueError, RuntimeError) as e:
+                batch = [(0, None, str(e))] * len(requests)
+            fetched = time.perf_counter()
+            if process is not None:
+                batch = [_process(process, status, body, error) for status, body, error in batch]
+            counters["fetch_time"] += fetched - started
+            counters["process_time"] += time.perf_counter() - fetched
+
+            counters["batches"] += 1
+            counters["requests"] += len(batch)
+            counters["errors"] += sum(1 for _, _, error in batch if error is not None)
+            if not _send_batch(worker_id, generation, start, batch, slots, free_slots, results, stop, counters,
+                               lambda: core.stats_snapshot(stats)):
+                break
+    finally:
+        for slot in slots:
+            slot.close()
+
+
+def _take_slot(free_slots, stop):
+    while not stop.is_set():
+        try:
+            return free_slots.get(timeout=_POLL)
+        except queue.Empty:
+            pass
+    return None
+
+
+def _send_batch(worker_id, generation, start, batch, slots, free_slots, results, stop, counters, snapshot):
+    """
+    Writes the bodies of batch into shared-memory slots and posts their offsets. When a slot fills up, it is
+    posted as a partial message and the batch continues in the next free slot; only a body larger than a
+    whole slot goes through the queue. The last message carries the worker's counters. Returns False when
+    the fetcher is stopping.
+    """
+    slot = _take_slot(free_slots, stop)
+    if slot is None:
+        return False
+    buffer = slots[slot].buf
+    offset = 0
+    entries = []
+    overflow = {}
+    for i, (status, body, error) in enumerate(batch):
+        if body is None:
+            entries.append((i, status, -1, 0, error))
+            continue
+        size = len(body)
+        counters["bytes"] += size
+        if offset + size > len(buffer) and offset > 0 and size <= len(buffer):
+            results.put((worker_id, generation, start, slot, entries, overflow, None))
+            slot = _take_slot(free_slots, stop)
+            if slot is None:
+                return False
+            buffer = slots[slot].buf
+            offset = 0
+            entries = []
+            overflow = {}
+        if offset + size <= len(buffer):
+            buffer[offset:offset + size] = body
+            entries.append((i, status, offset, size, error))
+            offset += size
+        else:
+            entries.append((i, status, -1, 0, error))
+            overflow[i] = bytes(body)
+            counters["overflows"] += 1
+    results.put((worker_id, generation, start, slot, entries, overflow, dict(counters, hosts=snapshot())))
+    return True
+
+
+def _process(process, status, body, error):
+    if error is not None:
+        return status, None, error
+    try:
+        processed = process(status, body)
+        return status, None if processed is None else memoryview(processed).cast("B"), None
+    except Exception as e:
+        return status, None, f"process failed: {e!r}"
+
+
+class ProcessPoolFetcher:
+    """
+    Fetches large request lists on several worker processes.
+
+    Workers start when the fetcher is created and live until close(). Use it as a context manager so
+    they are shut down and the shared memory is released even when the loop over fetch() stops early.
+    Only one fetch() may run at a time.
+
+    Parameters:
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+        module: The extension module the workers use, HTTPCore.CHTTP (the default) or HTTPCore.CPHTTP.
+        batch_size (int): Requests per batch. A worker runs one batch at a time through http_request_many.
+        max_in_flight (int): Concurrent requests within a batch.
+        configure (callable or None): Called as configure(module, session) in each worker after its session
+            is created, e.g. to set a user agent or timeout. Must be a module-level function.
+        process (callable or None): Called as process(status, body) in the worker for every successful response;
+            its bytes-like return value (or None) replaces the body. Must be a module-level function.
+        buffer_size (int): Bytes per shared-memory slot. A batch whose bodies do not fit in one slot continues
+            in the next; only a body larger than a whole slot is sent through the result queue.
+        slots (int): Shared-memory slots per worker, so a worker can fill one while the parent reads another.
+        start_method (str or None): The multiprocessing start method, or None for the platform default.
+
+    Example:
+        with ProcessPoolFetcher(workers=8, process=extract_links) as fetcher:
+            for index, status, body, error in fetcher.fetch(urls, ordered=False):
+                handle(index, body)
+    """
+
+    def __init__(self, workers=None, module=None, batch_size=64, max_in_flight=16, configure=None, process=None,
+                 buffer_size=8 * 1024 * 1024, slots=2, start_method=None):
+        if module is None:
+            from HTTPCore import CHTTP as module
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self._context = multiprocessing.get_context(start_method)
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._stop = self._context.Event()
+        self._generation = 0
+        self._stats = [None] * self.workers
+        self._slots = []
+        self._free_slots = []
+        self._processes = []
+        try:
+            for worker_id in range(self.workers):
+                segments = [shared_memory.SharedMemory(create=True, size=buffer_size) for _ in range(slots)]
+                self._slots.append(segments)
+                free_slots = self._context.Queue()
+                for slot in range(slots):
+                    free_slots.put(slot)
+                self._free_slots.append(free_slots)
+                process_ = self._context.Process(
+                    target=_worker,
+                    args=(worker_id, module.__name__, configure, process, max_in_flight, self._tasks, self._results,
+                          free_slots, [segment.name for segment in segments], self._stop),
+                    daemon=True,
+                )
+                process_.start()
+                self._processes.append(process_)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def fetch(self, requests, ordered=True):
+        """
+        Fetches every request on the worker processes.
+
+        Parameters:
+            requests (iterable): URLs, or (method, url) and (method, url, body) tuples with str or bytes-like bodies.
+            ordered (bool): Whether to yield results in input order. With False they are yielded in the order
+                batches complete, which keeps fewer results waiting in memory.
+
+        Yields:
+            tuple: (index, status_code, body, error) per request. body is the response bytes, or what the process
+            function returned, and is None when the request failed; error is None on success.
+
+        Raises:
+            ValueError: If a request is malformed.
+            RuntimeError: If a worker process dies or the fetcher is closed.
+        """
+        if not self._processes:
+            raise RuntimeError("The fetcher is closed.")
+        requests = [("GET", request) if isinstance(request, str) else tuple(request) for request in requests]
+        for request in requests:
+            if len(request) not in (2, 3):
+                raise ValueError("Each request must be a URL or a (method, url[, body]) tuple.")
+        self._generation += 1
+        generation = self._generation
+        starts = range(0, len(requests), self.batch_size)
+        for start in starts:
+            self._tasks.put((generation, start, requests[start:start + self.batch_size]))
+
+        remaining = len(starts)
+        partial = {}
+        waiting = {}
+        next_start = 0
+        try:
+            while remaining:
+                batch_generation, start, items, final = self._receive()
+                if batch_generation != generation:
+                    continue
+                if not ordered:
+                    yield from items
+                    remaining -= final
+                    continue
+                partial.setdefault(start, []).extend(items)
+                if not final:
+                    continue
+                remaining -= 1
+                waiting[start] = partial.pop(start)
+                while next_start in waiting:
+                    batch = waiting.pop(next_start)
+                    next_start += len(batch)
+                    yield from batch
+        finally:
+            if remaining:
+                self._discard_tasks()
+
+    def _receive(self):
+        while True:
+            try:
+                worker_id, batch_generation, start, slot, entries, overflow, stats = self._results.get(timeout=_POLL)
+                break
+            except queue.Empty:
+                for worker_id, process_ in enumerate(self._processes):
+                    if not process_.is_alive():
+                        raise RuntimeError(f"Worker {worker_id} exited with code {process_.exitcode}.")
+
+        buffer = self._slots[worker_id][slot].buf
+        items = [
+            (start + i, status, bytes(buffer[offset:offset + size]) if offset >= 0 else overflow.get(i), error)
+            for i, status, offset, size, error in entries
+        ]
+        self._free_slots[worker_id].put(slot)
+        if stats is not None:
+            self._stats[worker_id] = stats
+        return batch_generation, start, items, stats is not None
+
+    def _discard_tasks(self):
+        # Results of batches already taken by a worker carry the old generation and are dropped on arrival.
+        while True:
+            try:
+                self._tasks.get_nowait()
+            except queue.Empty:
+                return
+
+    def worker_stats(self):
+        """
+        Returns the counters each worker reported with its latest batch.
+
+        Returns:
+            list of dict: One dict per worker, or None for a worker that has not finished a batch, with pid,
+            batches, requests, errors, bytes, overflows (bodies that did not fit in a slot), fetch_time and
+            process_time in seconds, and hosts, the worker session's per-host latency statistics.
+        """
+        return list(self._stats)
+
+    def close(self, timeout=5.0):
+        """
+        Stops the workers and releases the shared memory. Workers finish the batch they are running; those
+        that do not exit within timeout seconds are terminated.
+        """
+        self._discard_tasks()
+        for _ in self._processes:
+            self._tasks.put(None)
+        # Keep taking results so workers blocked on a free slot or a full result pipe can finish.
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(process_.is_alive() for process_ in self._processes):
+            try:
+                worker_id, _, _, slot, _, _, stats = self._results.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+            self._free_slots[worker_id].put(slot)
+            if stats is not None:
+                self._stats[worker_id] = stats
+        self._stop.set()
+        for process_ in self._processes:
+            if process_.is_alive():
+                process_.terminate()
+                process_.join()
+        self._processes = []
+
+        for segments in self._slots:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+        self._slots = []
@@ -23,10 +23,104 @@
 
 #include <Python.h>
 #include <curl/curl.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <stdint.h>
 #include <stdlib.h>
 #include <string.h>
+#include <sys/stat.h>
+#include <zlib.h>
+
+#ifdef _WIN32
+#include <io.h>
+#include <windows.h>
+#define monotonic_ms() ((long long)GetTickCount64())
+#define file_open(path, flags) _open(path, (flags) | _O_BINARY, _S_IREAD | _S_IWRITE)
+#define file_read _read
+#define file_write _write
+#define file_sync _commit
+#define file_close _close
+#define file_truncate(fd) _chsize_s(fd, 0)
+#define file_seek _lseeki64
+#define file_fstat _fstat64
+typedef struct _stat64 file_stat_t;
+#else
+#include <time.h>
+#include <unistd.h>
+static long long monotonic_ms(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (long long)now.tv_sec * 1000 + now.tv_nsec / 1000000;
+}
+#define file_open(path, flags) open(path, flags, 0644)
+#define file_read read
+#define file_write write
+#define file_sync fsync
+#define file_close close
+#define file_truncate(fd) ftruncate(fd, 0)
+#define file_seek lseek
+#define file_fstat fstat
+typedef struct stat file_stat_t;
+#endif
+
+#define BUFFER_INITIAL_CAPACITY 16384
+#define BUFFER_RETAINED_CAPACITY (1024 * 1024)
+
+typedef struct {
+    char *data;
+    size_t size;
+    size_t capacity;
+    size_t size_hint;
+    size_t max_size;
+    int overflow;
+} Buffer;
+
+/* CURLOPT_CURLU, which lets a prepared request hand libcurl its URL already parsed, needs libcurl 7.63. */
+#if LIBCURL_VERSION_NUM >= 0x073f00
+#define HAVE_CURLU 1
+#endif
+
+#define HISTOGRAM_SUB_BUCKETS 64
+#define HISTOGRAM_BUCKETS (HISTOGRAM_SUB_BUCKETS * 32)
+
+typedef struct {
+    CURLcode result;
+    long status;
+    curl_off_t namelookup;
+    curl_off_t connect;
+    curl_off_t appconnect;
+    curl_off_t pretransfer;
+    curl_off_t starttransfer;
+    curl_off_t total;
+    curl_off_t size_download;
+    curl_off_t size_upload;
+    long num_connects;
+} Timing;
+
+typedef struct {
+    char *host;
+    uint64_t counts[HISTOGRAM_BUCKETS];
+    uint64_t count;
+    uint64_t errors;
+    uint64_t new_connections;
+    uint64_t reused_connections;
+    curl_off_t min;
+    curl_off_t max;
+    curl_off_t total;
+    curl_off_t namelookup;
+    curl_off_t connect;
+    curl_off_t appconnect;
+    curl_off_t wait;
+    curl_off_t transfer;
+} HostStats;
+
+typedef struct {
+    HostStats **hosts;
+    Py_ssize_t count;
+} Stats;
 
 typedef struct {
+    PyObject_HEAD
     CURL *curl;
     char *user_agent;
     char *proxy;
@@ -34,332 +128,3930 @@ typedef struct {
     char *ssl_cert;
     char *ssl_key;
     long timeout;
-    char response_buffer[16384];
+    Buffer response;
+    Buffer headers;
+    CURLM *multi;
+    PyThread_type_lock lock;
+    PyObject *share;
+    CURLSH *curl_share;
+    Timing timing;
+    int has_timing;
+    PyObject *stats;
+    long max_streams;
+    long max_connections;
+    Py_ssize_t compress_threshold;
+    int compress_level;
+    /* The Prepared capsule whose options are set on curl, or NULL when curl is in its plain GET state. */
+    PyObject *prepared;
+    /* The CURLOPT_RESOLVE entries from set_resolve(). Handles duplicated for the length of a call borrow it. */
+    struct curl_slist *resolve;
+    PyObject *weakreflist;
 } Session;
 
-static size_t write_callback(void *contents, size_t size, size_t nmemb, void *userp) {
-    size_t total_size = size * nmemb;
-    Session *session = (Session *)userp;
+static PyTypeObject SessionType;
+
+typedef struct {
+    CURLSH *share;
+    PyThread_type_lock locks[CURL_LOCK_DATA_LAST];
+    /* Whether the share holds one cookie jar for its sessions. */
+    int cookies;
+    /* The file the shared cookie jar is loaded from and flushed to, or NULL. */
+    char *cookie_file;
+} Share;
+
+typedef struct {
+    char *method;
+    char *url;
+#ifdef HAVE_CURLU
+    CURLU *curlu;
+#endif
+    struct curl_slist *headers;
+    char *body;
+    size_t body_size;
+} Prepared;
+
+typedef struct {
+    const char *method;
+    const char *url;
+    const char *body;
+    Py_ssize_t body_size;
+    Py_buffer view;
+    struct curl_slist *headers;
+} BatchRequest;
+
+typedef struct {
+    Py_buffer view;
+    PyObject *readinto;
+    PyObject *read;
+    PyObject *iterator;
+    Py_buffer chunk;
+    Py_ssize_t offset;
+    curl_off_t size;
+    PyObject *error_type;
+    PyObject *error_value;
+    PyObject *error_traceback;
+    unsigned char *compressed;
+    size_t compressed_size;
+    struct curl_slist *headers;
+} RequestBody;
+
+typedef struct Transfer {
+    CURL *curl;
+    Py_ssize_t index;
+    struct Transfer *prev;
+    struct Transfer *next;
+    Buffer response;
+    Buffer headers;
+    PyObject *on_data;
+    struct curl_slist *resolve;
+    PyObject *session;
+} Transfer;
+
+typedef struct {
+    CURL *curl;
+    int fd;
+    curl_off_t resume_from;
+    curl_off_t written;
+    uint32_t crc;
+    int error;
+    struct curl_slist *resolve;
+} Download;
+
+typedef struct {
+    CURL *curl;
+    CURLM *multi;
+    struct curl_slist *resolve;
+    Buffer buffer;
+    size_t chunk_size;
+    int paused;
+    int done;
+    int recorded;
+    int busy;
+    CURLcode result;
+    PyObject *session;
+} Stream;
+
+typedef struct {
+    CURLM *multi;
+    PyObject *socket_callback;
+    PyObject *timer_callback;
+    Transfer *transfers;
+    Py_ssize_t next_id;
+} Multi;
+
+/* Returns the Session passed as a session argument, or NULL with TypeError set for anything else. */
+static Session* session_from_object(PyObject *obj) {
+    if (!PyObject_TypeCheck(obj, &SessionType)) {
+        PyErr_Format(PyExc_TypeError, "session must be a CHTTP.Session, not %.200s.", Py_TYPE(obj)->tp_name);
+        return NULL;
+    }
+    return (Session *)obj;
+}
+
+static void session_lock(Session *session) {
+    if (!PyThread_acquire_lock(session->lock, NOWAIT_LOCK)) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(session->lock, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+    }
+}
+
+/* Locks the session for a request. Returns -1 with RuntimeError set, and the lock released, once it is closed. */
+static int session_acquire(Session *session) {
+    session_lock(session);
+    if (session->curl == NULL) {
+        PyThread_release_lock(session->lock);
+        PyErr_SetString(PyExc_RuntimeError, "The session is closed.");
+        return -1;
+    }
+    return 0;
+}
+
+static void session_release(Session *session) {
+    PyThread_release_lock(session->lock);
+}
+
+/*
+ * Puts a handle back into the state of a plain GET without body or extra headers, so a request never
+ * inherits the method, body or headers of the one before it. POSTFIELDS goes first because setting it
+ * switches the handle to POST, and HTTPGET also clears NOBODY and UPLOAD.
+ */
+static void request_reset(CURL *curl) {
+    curl_easy_setopt(curl, CURLOPT_POSTFIELDS, NULL);
+    curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)-1);
+    curl_easy_setopt(curl, CURLOPT_READFUNCTION, NULL);
+    curl_easy_setopt(curl, CURLOPT_READDATA, NULL);
+    curl_easy_setopt(curl, CURLOPT_HTTPGET, 1L);
+    curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, NULL);
+    curl_easy_setopt(curl, CURLOPT_HTTPHEADER, NULL);
+#ifdef HAVE_CURLU
+    curl_easy_setopt(curl, CURLOPT_CURLU, NULL);
+#endif
+}
+
+/* Drops the options of the prepared request last executed on the session, if any. */
+static void session_unprepare(Session *session) {
+    if (session->prepared != NULL) {
+        request_reset(session->curl);
+        Py_CLEAR(session->prepared);
+    }
+}
+
+static struct curl_slist* slist_copy(const struct curl_slist *list) {
+    struct curl_slist *copy = NULL;
+    for (; list != NULL; list = list->next) {
+        struct curl_slist *appended = curl_slist_append(copy, list->data);
+        if (appended == NULL) {
+            curl_slist_free_all(copy);
+            return NULL;
+        }
+        copy = appended;
+    }
+    return copy;
+}
+
+/* Duplicates the session handle for a transfer that ends before the session lock is released. */
+static CURL* session_duphandle(Session *session) {
+    CURL *curl = curl_easy_duphandle(session->curl);
+    if (curl != NULL && session->curl_share != NULL) {
+        /* curl_easy_duphandle does not carry CURLOPT_SHARE over. */
+        curl_easy_setopt(curl, CURLOPT_SHARE, session->curl_share);
+    }
+    if (curl != NULL) {
+        curl_easy_setopt(curl, CURLOPT_HEADERFUNCTION, NULL);
+        curl_easy_setopt(curl, CURLOPT_HEADERDATA, NULL);
+        curl_easy_setopt(curl, CURLOPT_RESOLVE, session->resolve);
+        request_reset(curl);
+    }
+    return curl;
+}
+
+/* Duplicates the session handle for a transfer that may outlive the call, and the session. set_resolve() frees
+   the session's list, so the handle gets its own copy in *resolve, which the caller frees after the handle. */
+static CURL* session_duphandle_owned(Session *session, struct curl_slist **resolve) {
+    CURL *curl = session_duphandle(session);
+    if (curl != NULL && session->resolve != NULL) {
+        *resolve = slist_copy(session->resolve);
+        curl_easy_setopt(curl, CURLOPT_RESOLVE, *resolve);
+    }
+    return curl;
+}
+
+static void timing_capture(CURL *curl, CURLcode res, Timing *timing) {
+    memset(timing, 0, sizeof(Timing));
+    timing->result = res;
+    curl_easy_getinfo(curl, CURLINFO_RESPONSE_CODE, &timing->status);
+    curl_easy_getinfo(curl, CURLINFO_NAMELOOKUP_TIME_T, &timing->namelookup);
+    curl_easy_getinfo(curl, CURLINFO_CONNECT_TIME_T, &timing->connect);
+    curl_easy_getinfo(curl, CURLINFO_APPCONNECT_TIME_T, &timing->appconnect);
+    curl_easy_getinfo(curl, CURLINFO_PRETRANSFER_TIME_T, &timing->pretransfer);
+    curl_easy_getinfo(curl, CURLINFO_STARTTRANSFER_TIME_T, &timing->starttransfer);
+    curl_easy_getinfo(curl, CURLINFO_TOTAL_TIME_T, &timing->total);
+    curl_easy_getinfo(curl, CURLINFO_SIZE_DOWNLOAD_T, &timing->size_download);
+    curl_easy_getinfo(curl, CURLINFO_SIZE_UPLOAD_T, &timing->size_upload);
+    curl_easy_getinfo(curl, CURLINFO_NUM_CONNECTS, &timing->num_connects);
+}
+
+static PyObject* timing_to_dict(const Timing *timing) {
+    return Py_BuildValue("{s:l,s:d,s:d,s:d,s:d,s:d,s:d,s:L,s:L,s:l,s:O,s:z}",
+        "status", timing->status,
+        "namelookup_time", (double)timing->namelookup / 1000000.0,
+        "connect_time", (double)timing->connect / 1000000.0,
+        "appconnect_time", (double)timing->appconnect / 1000000.0,
+        "pretransfer_time", (double)timing->pretransfer / 1000000.0,
+        "starttransfer_time", (double)timing->starttransfer / 1000000.0,
+        "total_time", (double)timing->total / 1000000.0,
+        "size_download", (long long)timing->size_download,
+        "size_upload", (long long)timing->size_upload,
+        "num_connects", timing->num_connects,
+        "connection_reused", timing->num_connects == 0 && timing->result == CURLE_OK ? Py_True : Py_False,
+        "error", timing->result == CURLE_OK ? NULL : curl_easy_strerror(timing->result));
+}
+
+static size_t histogram_bucket(curl_off_t value) {
+    if (value < HISTOGRAM_SUB_BUCKETS * 2) {
+        return value < 0 ? 0 : (size_t)value;
+    }
+
+    unsigned int shift = 0;
+    while ((value >> shift) >= HISTOGRAM_SUB_BUCKETS * 2) {
+        shift++;
+    }
+    size_t bucket = (size_t)HISTOGRAM_SUB_BUCKETS * (shift + 1) + (size_t)((value >> shift) - HISTOGRAM_SUB_BUCKETS);
+    return bucket < HISTOGRAM_BUCKETS ? bucket : HISTOGRAM_BUCKETS - 1;
+}
+
+static curl_off_t histogram_bucket_max(size_t bucket) {
+    if (bucket < HISTOGRAM_SUB_BUCKETS * 2) {
+        return (curl_off_t)bucket;
+    }
+
+    unsigned int shift = (unsigned int)(bucket / HISTOGRAM_SUB_BUCKETS) - 1;
+    curl_off_t top = (curl_off_t)(bucket % HISTOGRAM_SUB_BUCKETS) + HISTOGRAM_SUB_BUCKETS;
+    return ((top + 1) << shift) - 1;
+}
+
+static curl_off_t host_stats_percentile(const HostStats *host, double percentile) {
+    uint64_t target = (uint64_t)(percentile / 100.0 * (double)host->count + 0.5);
+    uint64_t seen = 0;
+
+    if (target < 1) {
+        target = 1;
+    }
+    for (size_t i = 0; i < HISTOGRAM_BUCKETS; i++) {
+        seen += host->counts[i];
+        if (seen >= target) {
+            curl_off_t value = histogram_bucket_max(i);
+            return value < host->max ? value : host->max;
+        }
+    }
+    return host->max;
+}
+
+static HostStats* stats_host(Stats *stats, CURL *curl) {
+    const char *url = NULL;
+    curl_easy_getinfo(curl, CURLINFO_EFFECTIVE_URL, &url);
+    if (url == NULL) {
+        url = "";
+    }
+
+    const char *start = strstr(url, "://");
+    start = start ? start + 3 : url;
+    size_t length = strcspn(start, "/?#");
+    const char *at = memchr(start, '@', length);
+    if (at != NULL) {
+        length -= (size_t)(at + 1 - start);
+        start = at + 1;
+    }
+
+    for (Py_ssize_t i = 0; i < stats->count; i++) {
+        if (strlen(stats->hosts[i]->host) == length && memcmp(stats->hosts[i]->host, start, length) == 0) {
+            return stats->hosts[i];
+        }
+    }
+
+    HostStats **hosts = (HostStats **)realloc(stats->hosts, (stats->count + 1) * sizeof(HostStats *));
+    if (hosts == NULL) {
+        return NULL;
+    }
+    stats->hosts = hosts;
+
+    HostStats *host = (HostStats *)calloc(1, sizeof(HostStats));
+    char *name = (char *)malloc(length + 1);
+    if (host == NULL || name == NULL) {
+        free(host);
+        free(name);
+        return NULL;
+    }
+    memcpy(name, start, length);
+    name[length] = '\0';
+    host->host = name;
+    stats->hosts[stats->count++] = host;
+    return host;
+}
+
+/* Called with the GIL held, which serializes updates to a Stats shared by several sessions. */
+static void stats_record(PyObject *capsule, CURL *curl, const Timing *timing) {
+    Stats *stats = (Stats *)PyCapsule_GetPointer(capsule, "Stats");
+    HostStats *host = stats ? stats_host(stats, curl) : NULL;
+    if (host == NULL) {
+        PyErr_Clear();
+        return;
+    }
+
+    if (timing->result != CURLE_OK) {
+        host->errors++;
+        return;
+    }
+
+    host->counts[histogram_bucket(timing->total)]++;
+    if (host->count == 0 || timing->total < host->min) {
+        host->min = timing->total;
+    }
+    if (timing->total > host->max) {
+        host->max = timing->total;
+    }
+    host->count++;
+    host->total += timing->total;
+    host->namelookup += timing->namelookup;
+    host->connect += timing->connect > timing->namelookup ? timing->connect - timing->namelookup : 0;
+    host->appconnect += timing->appconnect > timing->connect ? timing->appconnect - timing->connect : 0;
+    host->wait += timing->starttransfer > timing->pretransfer ? timing->starttransfer - timing->pretransfer : 0;
+    host->transfer += timing->total > timing->starttransfer ? timing->total - timing->starttransfer : 0;
+    if (timing->num_connects > 0) {
+        host->new_connections += (uint64_t)timing->num_connects;
+    } else {
+        host->reused_connections++;
+    }
+}
+
+static PyObject* host_stats_to_dict(const HostStats *host) {
+    double count = host->count ? (double)host->count : 1.0;
+
+    return Py_BuildValue("{s:K,s:K,s:K,s:K,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d}",
+        "count", (unsigned long long)host->count,
+        "errors", (unsigned long long)host->errors,
+        "new_connections", (unsigned long long)host->new_connections,
+        "reused_connections", (unsigned long long)host->reused_connections,
+        "min", (double)host->min / 1000000.0,
+        "max", (double)host->max / 1000000.0,
+        "mean", (double)host->total / count / 1000000.0,
+        "p50", (double)host_stats_percentile(host, 50.0) / 1000000.0,
+        "p90", (double)host_stats_percentile(host, 90.0) / 1000000.0,
+        "p95", (double)host_stats_percentile(host, 95.0) / 1000000.0,
+        "p99", (double)host_stats_percentile(host, 99.0) / 1000000.0,
+        "p999", (double)host_stats_percentile(host, 99.9) / 1000000.0,
+        "dns", (double)host->namelookup / count / 1000000.0,
+        "connect", (double)host->connect / count / 1000000.0,
+        "tls", (double)host->appconnect / count / 1000000.0,
+        "wait", (double)host->wait / count / 1000000.0,
+        "transfer", (double)host->transfer / count / 1000000.0);
+}
+
+static void stats_clear(Stats *stats) {
+    for (Py_ssize_t i = 0; i < stats->count; i++) {
+        free(stats->hosts[i]->host);
+        free(stats->hosts[i]);
+    }
+    free(stats->hosts);
+    stats->hosts = NULL;
+    stats->count = 0;
+}
+
+static void session_record(Session *session, CURL *curl, CURLcode res) {
+    timing_capture(curl, res, &session->timing);
+    session->has_timing = 1;
+    if (session->stats != NULL) {
+        stats_record(session->stats, curl, &session->timing);
+    }
+}
+
+static CURLcode session_perform(Session *session) {
+    CURLcode res;
+
+    Py_BEGIN_ALLOW_THREADS
+    res = curl_easy_perform(session->curl);
+    Py_END_ALLOW_THREADS
+
+    session_record(session, session->curl, res);
+    return res;
+}
+
+/* Records a transfer that ran on its own handle after the lock was released. A closed session is skipped. */
+static void session_record_detached(Session *session, CURL *curl, CURLcode res) {
+    if (session_acquire(session) < 0) {
+        PyErr_Clear();
+        return;
+    }
+    session_record(session, curl, res);
+    session_release(session);
+}
+
+static int buffer_reserve(Buffer *buffer, size_t needed) {
+    if (needed <= buffer->capacity) {
+        return 0;
+    }
+
+    size_t capacity = buffer->capacity ? buffer->capacity : BUFFER_INITIAL_CAPACITY;
+    if (capacity < buffer->size_hint) {
+        capacity = buffer->size_hint;
+    }
+    while (capacity < needed) {
+        capacity = capacity > SIZE_MAX / 2 ? needed : capacity * 2;
+    }
+    if (buffer->max_size && capacity > buffer->max_size) {
+        capacity = buffer->max_size;
+    }
+
+    char *data = (char *)realloc(buffer->data, capacity);
+    if (data == NULL) {
+        return -1;
+    }
+    buffer->data = data;
+    buffer->capacity = capacity;
+    return 0;
+}
+
+static void buffer_reset(Buffer *buffer) {
+    size_t retained = buffer->size_hint > BUFFER_RETAINED_CAPACITY ? buffer->size_hint : BUFFER_RETAINED_CAPACITY;
+
+    if (buffer->capacity > retained) {
+        free(buffer->data);
+        buffer->data = NULL;
+        buffer->capacity = 0;
+    }
+    buffer->size = 0;
+    buffer->overflow = 0;
+}
+
+static void buffer_free(Buffer *buffer) {
+    free(buffer->data);
+    buffer->data = NULL;
+    buffer->size = 0;
+    buffer->capacity = 0;
+}
+
+static PyObject* buffer_to_bytes(Buffer *buffer) {
+    return PyBytes_FromStringAndSize(buffer->data ? buffer->data : "", (Py_ssize_t)buffer->size);
+}
+
+static PyObject* session_response(Session *session) {
+    PyObject *result = PyTuple_New(3);
+    if (result == NULL) {
+        return NULL;
+    }
+    PyObject *status = PyLong_FromLong(session->timing.status);
+    PyObject *body = buffer_to_bytes(&session->response);
+    PyObject *headers = buffer_to_bytes(&session->headers);
+    PyTuple_SET_ITEM(result, 0, status);
+    PyTuple_SET_ITEM(result, 1, body);
+    PyTuple_SET_ITEM(result, 2, headers);
+    if (status == NULL || body == NULL || headers == NULL) {
+        Py_DECREF(result);
+        return NULL;
+    }
+    return result;
+}
+
+static const char* buffer_strerror(Buffer *buffer, CURLcode res) {
+    if (res == CURLE_WRITE_ERROR && buffer->overflow) {
+        return "Response body exceeds the maximum response size.";
+    }
+    return curl_easy_strerror(res);
+}
+
+static size_t write_callback(void *contents, size_t size, size_t nmemb, void *userp) {
+    size_t total_size = size * nmemb;
+    Buffer *buffer = (Buffer *)userp;
+
+    if (buffer->max_size && buffer->size + total_size > buffer->max_size) {
+        buffer->overflow = 1;
+        return 0;
+    }
+    if (buffer_reserve(buffer, buffer->size + total_size) < 0) {
+        return 0;
+    }
+
+    memcpy(buffer->data + buffer->size, contents, total_size);
+    buffer->size += total_size;
+    return total_size;
+}
+
+static int body_get_buffer(PyObject *obj, Py_buffer *view) {
+    if (PyUnicode_Check(obj)) {
+        Py_ssize_t size;
+        const char *data = PyUnicode_AsUTF8AndSize(obj, &size);
+        if (data == NULL) {
+            return -1;
+        }
+        return PyBuffer_FillInfo(view, obj, (void *)data, size, 1, PyBUF_SIMPLE);
+    }
+    return PyObject_GetBuffer(obj, view, PyBUF_SIMPLE);
+}
+
+static int request_set_body(BatchRequest *request, PyObject *body) {
+    request->headers = NULL;
+    request->body = NULL;
+    request->body_size = 0;
+    request->view.obj = NULL;
+    if (body == Py_None) {
+        return 0;
+    }
+    if (!PyUnicode_Check(body) && !PyObject_CheckBuffer(body)) {
+        PyErr_SetString(PyExc_TypeError, "body must be str or a bytes-like object.");
+        return -1;
+    }
+    if (body_get_buffer(body, &request->view) < 0) {
+        return -1;
+    }
+    request->body = (const char *)request->view.buf;
+    request->body_size = request->view.len;
+    return 0;
+}
+
+static void request_release(BatchRequest *request) {
+    PyBuffer_Release(&request->view);
+    request->body = NULL;
+    request->body_size = 0;
+}
+
+static curl_off_t file_object_size(PyObject *file) {
+    file_stat_t st;
+    PyObject *fileno = PyObject_CallMethod(file, "fileno", NULL);
+    int fd = fileno ? PyLong_AsLong(fileno) : -1;
+    Py_XDECREF(fileno);
+    if (PyErr_Occurred() || file_fstat(fd, &st) != 0 || (st.st_mode & S_IFMT) != S_IFREG) {
+        PyErr_Clear();
+        return -1;
+    }
+
+    PyObject *position = PyObject_CallMethod(file, "tell", NULL);
+    long long offset = position ? PyLong_AsLongLong(position) : -1;
+    Py_XDECREF(position);
+    if (PyErr_Occurred() || offset < 0 || offset > (long long)st.st_size) {
+        PyErr_Clear();
+        return -1;
+    }
+    return (curl_off_t)(st.st_size - offset);
+}
+
+static int request_body_init(RequestBody *body, PyObject *obj) {
+    memset(body, 0, sizeof(RequestBody));
+    body->size = -1;
+
+    if (PyUnicode_Check(obj) || PyObject_CheckBuffer(obj)) {
+        return body_get_buffer(obj, &body->view);
+    }
+
+    if (PyObject_HasAttrString(obj, "readinto")) {
+        body->readinto = PyObject_GetAttrString(obj, "readinto");
+    } else if (PyObject_HasAttrString(obj, "read")) {
+        body->read = PyObject_GetAttrString(obj, "read");
+    } else {
+        body->iterator = PyObject_GetIter(obj);
+        if (body->iterator == NULL) {
+            PyErr_Clear();
+            PyErr_SetString(PyExc_TypeError, "body must be str, a bytes-like object, a file object or an iterable of chunks.");
+            return -1;
+        }
+        return 0;
+    }
+    if (body->readinto == NULL && body->read == NULL) {
+        return -1;
+    }
+    body->size = file_object_size(obj);
+    return 0;
+}
+
+static struct curl_slist* content_type_header(struct curl_slist *headers, const char *content_type) {
+    size_t size = strlen("Content-Type: ") + strlen(content_type) + 1;
+    char *header = (char *)malloc(size);
+    if (header == NULL) {
+        return NULL;
+    }
+    snprintf(header, size, "Content-Type: %s", content_type);
+    struct curl_slist *appended = curl_slist_append(headers, header);
+    free(header);
+    return appended;
+}
+
+static int request_body_set_content_type(RequestBody *body, const char *content_type) {
+    if (content_type == NULL) {
+        return 0;
+    }
+    struct curl_slist *headers = content_type_header(body->headers, content_type);
+    if (headers == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    body->headers = headers;
+    return 0;
+}
+
+/* Gzip an in-memory body of at least threshold bytes. Streamed and incompressible bodies are sent as is. */
+static int request_body_compress(RequestBody *body, Py_ssize_t threshold, int level) {
+    if (threshold <= 0 || body->view.obj == NULL || body->view.len < threshold || body->view.len > (Py_ssize_t)UINT_MAX) {
+        return 0;
+    }
+
+    z_stream stream;
+    memset(&stream, 0, sizeof(stream));
+    if (deflateInit2(&stream, level, Z_DEFLATED, 15 + 16, 8, Z_DEFAULT_STRATEGY) != Z_OK) {
+        PyErr_SetString(PyExc_RuntimeError, "Failed to initialize gzip compression.");
+        return -1;
+    }
+
+    uLong bound = deflateBound(&stream, (uLong)body->view.len);
+    if (bound > UINT_MAX) {
+        deflateEnd(&stream);
+        return 0;
+    }
+    unsigned char *compressed = (unsigned char *)malloc(bound);
+    if (compressed == NULL) {
+        deflateEnd(&stream);
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    int rc;
+    stream.next_in = (Bytef *)body->view.buf;
+    stream.avail_in = (uInt)body->view.len;
+    stream.next_out = compressed;
+    stream.avail_out = (uInt)bound;
+    Py_BEGIN_ALLOW_THREADS
+    rc = deflate(&stream, Z_FINISH);
+    Py_END_ALLOW_THREADS
+    size_t compressed_size = stream.total_out;
+    deflateEnd(&stream);
+
+    if (rc != Z_STREAM_END) {
+        free(compressed);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to compress the request body.");
+        return -1;
+    }
+    if (compressed_size >= (size_t)body->view.len) {
+        free(compressed);
+        return 0;
+    }
+
+    struct curl_slist *headers = curl_slist_append(body->headers, "Content-Encoding: gzip");
+    if (headers == NULL) {
+        free(compressed);
+        PyErr_NoMemory();
+        return -1;
+    }
+    body->headers = headers;
+    body->compressed = compressed;
+    body->compressed_size = compressed_size;
+    return 0;
+}
+
+static void request_body_release(RequestBody *body) {
+    PyBuffer_Release(&body->view);
+    PyBuffer_Release(&body->chunk);
+    Py_CLEAR(body->readinto);
+    Py_CLEAR(body->read);
+    Py_CLEAR(body->iterator);
+    Py_CLEAR(body->error_type);
+    Py_CLEAR(body->error_value);
+    Py_CLEAR(body->error_traceback);
+    free(body->compressed);
+    body->compressed = NULL;
+    curl_slist_free_all(body->headers);
+    body->headers = NULL;
+}
+
+static int request_body_restore_error(RequestBody *body) {
+    if (body->error_type == NULL) {
+        return 0;
+    }
+    PyErr_Restore(body->error_type, body->error_value, body->error_traceback);
+    body->error_type = NULL;
+    body->error_value = NULL;
+    body->error_traceback = NULL;
+    return 1;
+}
+
+static size_t request_body_read_callback(char *dest, size_t size, size_t nitems, void *userp) {
+    RequestBody *body = (RequestBody *)userp;
+    size_t capacity = size * nitems;
+    size_t copied = 0;
+    PyGILState_STATE gil = PyGILState_Ensure();
+
+    while (copied == 0) {
+        if (body->chunk.obj != NULL) {
+            size_t available = (size_t)(body->chunk.len - body->offset);
+            copied = available < capacity ? available : capacity;
+            memcpy(dest, (const char *)body->chunk.buf + body->offset, copied);
+            body->offset += (Py_ssize_t)copied;
+            if (body->offset >= body->chunk.len) {
+                PyBuffer_Release(&body->chunk);
+                body->offset = 0;
+            }
+            continue;
+        }
+
+        if (body->readinto != NULL) {
+            PyObject *view = PyMemoryView_FromMemory(dest, (Py_ssize_t)capacity, PyBUF_WRITE);
+            PyObject *result = view ? PyObject_CallFunctionObjArgs(body->readinto, view, NULL) : NULL;
+            Py_XDECREF(view);
+            if (result == NULL) {
+                goto error;
+            }
+            Py_ssize_t count = result == Py_None ? 0 : PyLong_AsSsize_t(result);
+            Py_DECREF(result);
+            if (count < 0 || (size_t)count > capacity) {
+                if (!PyErr_Occurred()) {
+                    PyErr_SetString(PyExc_ValueError, "readinto() returned an invalid byte count.");
+                }
+                goto error;
+            }
+            copied = (size_t)count;
+            break;
+        }
+
+        PyObject *chunk;
+        if (body->read != NULL) {
+            chunk = PyObject_CallFunction(body->read, "n", (Py_ssize_t)capacity);
+        } else {
+            chunk = PyIter_Next(body->iterator);
+            if (chunk == NULL && !PyErr_Occurred()) {
+                break;
+            }
+        }
+        if (chunk == NULL) {
+            goto error;
+        }
+        int rc = body_get_buffer(chunk, &body->chunk);
+        Py_DECREF(chunk);
+        if (rc < 0) {
+            goto error;
+        }
+        if (body->chunk.len == 0) {
+            PyBuffer_Release(&body->chunk);
+            if (body->read != NULL) {
+                break;
+            }
+        }
+    }
+
+    PyGILState_Release(gil);
+    return copied;
+
+error:
+    PyErr_Fetch(&body->error_type, &body->error_value, &body->error_traceback);
+    PyGILState_Release(gil);
+    return CURL_READFUNC_ABORT;
+}
+
+static void request_body_apply(CURL *curl, RequestBody *body) {
+    curl_easy_setopt(curl, CURLOPT_HTTPHEADER, body->headers);
+    if (body->compressed != NULL) {
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)body->compressed_size);
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDS, body->compressed);
+        return;
+    }
+    if (body->view.obj != NULL) {
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)body->view.len);
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDS, body->view.buf);
+        return;
+    }
+
+    curl_easy_setopt(curl, CURLOPT_POSTFIELDS, NULL);
+    curl_easy_setopt(curl, CURLOPT_POST, 1L);
+    curl_easy_setopt(curl, CURLOPT_READFUNCTION, request_body_read_callback);
+    curl_easy_setopt(curl, CURLOPT_READDATA, body);
+    curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, body->size);
+}
+
+/* Frees the curl handles and response buffers. The caller holds the session lock or its last reference. */
+static void session_close_handles(Session *session) {
+    if (session->curl != NULL) {
+        curl_easy_cleanup(session->curl);
+        session->curl = NULL;
+    }
+    if (session->multi != NULL) {
+        curl_multi_cleanup(session->multi);
+        session->multi = NULL;
+    }
+    buffer_free(&session->response);
+    buffer_free(&session->headers);
+    curl_slist_free_all(session->resolve);
+    session->resolve = NULL;
+}
+
+static int Session_traverse(Session *session, visitproc visit, void *arg) {
+    Py_VISIT(session->share);
+    Py_VISIT(session->stats);
+    Py_VISIT(session->prepared);
+    return 0;
+}
+
+/* The share stays until dealloc because the curl handle uses it until curl_easy_cleanup. */
+static int Session_clear(Session *session) {
+    if (session->prepared != NULL && session->curl != NULL) {
+        request_reset(session->curl);
+    }
+    Py_CLEAR(session->prepared);
+    Py_CLEAR(session->stats);
+    return 0;
+}
+
+static void Session_dealloc(Session *session) {
+    PyObject_GC_UnTrack(session);
+    if (session->weakreflist != NULL) {
+        PyObject_ClearWeakRefs((PyObject *)session);
+    }
+    Session_clear(session);
+    session_close_handles(session);
+    Py_CLEAR(session->share);
+    free(session->user_agent);
+    free(session->proxy);
+    free(session->cookie_file);
+    free(session->ssl_cert);
+    free(session->ssl_key);
+    if (session->lock != NULL) {
+        PyThread_free_lock(session->lock);
+    }
+    Py_TYPE(session)->tp_free((PyObject *)session);
+}
+
+static PyObject* session_new(CURL *curl, PyObject *share, CURLSH *curl_share) {
+    if (curl == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "Failed to initialize curl handle.");
+        return NULL;
+    }
+
+    Session *session = (Session *)SessionType.tp_alloc(&SessionType, 0);
+    if (session == NULL) {
+        curl_easy_cleanup(curl);
+        return NULL;
+    }
+    session->curl = curl;
+    Py_XINCREF(share);
+    session->share = share;
+    session->curl_share = curl_share;
+    session->compress_level = Z_DEFAULT_COMPRESSION;
+
+    session->lock = PyThread_allocate_lock();
+    if (session->lock == NULL) {
+        Py_DECREF(session);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to allocate session lock.");
+        return NULL;
+    }
+
+    curl_easy_setopt(session->curl, CURLOPT_WRITEFUNCTION, write_callback);
+    curl_easy_setopt(session->curl, CURLOPT_WRITEDATA, &session->response);
+    curl_easy_setopt(session->curl, CURLOPT_HEADERFUNCTION, write_callback);
+    curl_easy_setopt(session->curl, CURLOPT_HEADERDATA, &session->headers);
+    curl_easy_setopt(session->curl, CURLOPT_NOSIGNAL, 1L);
+    curl_easy_setopt(session->curl, CURLOPT_HTTP_VERSION, CURL_HTTP_VERSION_1_1);
+    return (PyObject *)session;
+}
+
+static PyObject* session_create(PyObject *share_capsule) {
+    Share *share = NULL;
+    if (share_capsule != Py_None) {
+        share = (Share *)PyCapsule_GetPointer(share_capsule, "Share");
+        if (share == NULL) {
+            return NULL;
+        }
+    }
+
+    CURL *curl = curl_easy_init();
+    if (curl != NULL && share != NULL) {
+        curl_easy_setopt(curl, CURLOPT_SHARE, share->share);
+        if (share->cookies) {
+            /* A handle only sends and stores cookies once its cookie engine is on, even with a shared jar. "" turns
+               it on without reading a file. */
+            curl_easy_setopt(curl, CURLOPT_COOKIEFILE, "");
+        }
+    }
+    return session_new(curl, share != NULL ? share_capsule : NULL, share != NULL ? share->share : NULL);
+}
+
+static PyObject* create_session(PyObject* self, PyObject* args) {
+    PyObject *share_capsule = Py_None;
+
+    if (!PyArg_ParseTuple(args, "|O", &share_capsule)) {
+        return NULL;
+    }
+    return session_create(share_capsule);
+}
+
+static PyObject* Session_new(PyTypeObject *type, PyObject *args, PyObject *kwargs) {
+    static char *keywords[] = {"share", NULL};
+    PyObject *share_capsule = Py_None;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O:Session", keywords, &share_capsule)) {
+        return NULL;
+    }
+    return session_create(share_capsule);
+}
+
+static char* strdup_or_null(const char *value) {
+    return value != NULL ? strdup(value) : NULL;
+}
+
+static PyObject* session_clone(Session *session) {
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    PyObject *clone_object = session_new(session_duphandle(session), session->share, session->curl_share);
+    Session *clone = (Session *)clone_object;
+    if (clone != NULL) {
+        clone->user_agent = strdup_or_null(session->user_agent);
+        clone->proxy = strdup_or_null(session->proxy);
+        clone->cookie_file = strdup_or_null(session->cookie_file);
+        clone->ssl_cert = strdup_or_null(session->ssl_cert);
+        clone->ssl_key = strdup_or_null(session->ssl_key);
+        clone->timeout = session->timeout;
+        clone->response.size_hint = session->response.size_hint;
+        clone->response.max_size = session->response.max_size;
+        Py_XINCREF(session->stats);
+        clone->stats = session->stats;
+        clone->max_streams = session->max_streams;
+        clone->max_connections = session->max_connections;
+        clone->resolve = slist_copy(session->resolve);
+        curl_easy_setopt(clone->curl, CURLOPT_RESOLVE, clone->resolve);
+        clone->compress_threshold = session->compress_threshold;
+        clone->compress_level = session->compress_level;
+        if (session->cookie_file != NULL) {
+            /* curl_easy_duphandle gives the copy an empty jar; carry the cookies over. */
+            struct curl_slist *cookies = NULL;
+            curl_easy_getinfo(session->curl, CURLINFO_COOKIELIST, &cookies);
+            for (struct curl_slist *line = cookies; line != NULL; line = line->next) {
+                curl_easy_setopt(clone->curl, CURLOPT_COOKIELIST, line->data);
+            }
+            curl_slist_free_all(cookies);
+        }
+    }
+    session_release(session);
+    return clone_object;
+}
+
+static PyObject* Session_clone(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+    return session_clone(session);
+}
+
+static void share_lock_callback(CURL *handle, curl_lock_data data, curl_lock_access access, void *userp) {
+    Share *share = (Share *)userp;
+    PyThread_acquire_lock(share->locks[data], WAIT_LOCK);
+}
+
+static void share_unlock_callback(CURL *handle, curl_lock_data data, void *userp) {
+    Share *share = (Share *)userp;
+    PyThread_release_lock(share->locks[data]);
+}
+
+static void share_free(Share *share) {
+    if (share->share && curl_share_cleanup(share->share) != CURLSHE_OK) {
+        /* Still attached to a handle that will call the lock callbacks; leak rather than free the locks. */
+        return;
+    }
+    for (int i = 0; i < CURL_LOCK_DATA_LAST; i++) {
+        if (share->locks[i]) {
+            PyThread_free_lock(share->locks[i]);
+        }
+    }
+    free(share->cookie_file);
+    free(share);
+}
+
+/* Loads cookie_file into the shared jar (command "RELOAD") or writes the jar to it ("FLUSH") through a handle
+   that is attached to the share only for the call. libcurl writes the jar to a temporary file and renames it. */
+static CURLcode share_cookie_command(Share *share, const char *cookie_file, const char *command) {
+    CURL *curl = curl_easy_init();
+    if (curl == NULL) {
+        return CURLE_OUT_OF_MEMORY;
+    }
+    CURLcode res = curl_easy_setopt(curl, CURLOPT_SHARE, share->share);
+    if (res == CURLE_OK) {
+        res = curl_easy_setopt(curl, strcmp(command, "FLUSH") == 0 ? CURLOPT_COOKIEJAR : CURLOPT_COOKIEFILE,
+                               cookie_file);
+    }
+    if (res == CURLE_OK) {
+        res = curl_easy_setopt(curl, CURLOPT_COOKIELIST, command);
+    }
+    /* Without a jar file, cleanup does not write the jar a second time. */
+    curl_easy_setopt(curl, CURLOPT_COOKIEJAR, NULL);
+    curl_easy_cleanup(curl);
+    return res;
+}
+
+static void share_destructor(PyObject *capsule) {
+    Share *share = (Share *)PyCapsule_GetPointer(capsule, "Share");
+    if (share) {
+        if (share->cookie_file) {
+            share_cookie_command(share, share->cookie_file, "FLUSH");
+        }
+        share_free(share);
+    }
+}
+
+static PyObject* create_share(PyObject* self, PyObject* args, PyObject* kwargs) {
+    static char *keywords[] = {"cookies", "cookie_file", NULL};
+    int cookies = 0;
+    const char *cookie_file = NULL;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|pz:create_share", keywords, &cookies, &cookie_file)) {
+        return NULL;
+    }
+
+    Share *share = (Share *)calloc(1, sizeof(Share));
+    if (share == NULL) {
+        return PyErr_NoMemory();
+    }
+
+    for (int i = 0; i < CURL_LOCK_DATA_LAST; i++) {
+        share->locks[i] = PyThread_allocate_lock();
+        if (share->locks[i] == NULL) {
+            share_free(share);
+            PyErr_SetString(PyExc_RuntimeError, "Failed to allocate share lock.");
+            return NULL;
+        }
+    }
+
+    share->share = curl_share_init();
+    if (share->share == NULL) {
+        share_free(share);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to initialize curl share handle.");
+        return NULL;
+    }
+
+    curl_share_setopt(share->share, CURLSHOPT_LOCKFUNC, share_lock_callback);
+    curl_share_setopt(share->share, CURLSHOPT_UNLOCKFUNC, share_unlock_callback);
+    curl_share_setopt(share->share, CURLSHOPT_USERDATA, share);
+    curl_share_setopt(share->share, CURLSHOPT_SHARE, CURL_LOCK_DATA_DNS);
+    curl_share_setopt(share->share, CURLSHOPT_SHARE, CURL_LOCK_DATA_SSL_SESSION);
+    CURLSHcode sc = curl_share_setopt(share->share, CURLSHOPT_SHARE, CURL_LOCK_DATA_CONNECT);
+    if (sc == CURLSHE_OK && (cookies || cookie_file)) {
+        sc = curl_share_setopt(share->share, CURLSHOPT_SHARE, CURL_LOCK_DATA_COOKIE);
+        share->cookies = 1;
+    }
+    if (sc != CURLSHE_OK) {
+        share_free(share);
+        PyErr_SetString(PyExc_RuntimeError, curl_share_strerror(sc));
+        return NULL;
+    }
+
+    if (cookie_file) {
+        share->cookie_file = strdup(cookie_file);
+        if (share->cookie_file == NULL) {
+            share_free(share);
+            return PyErr_NoMemory();
+        }
+        /* A missing file is an empty jar, as for CURLOPT_COOKIEFILE. */
+        CURLcode res = share_cookie_command(share, share->cookie_file, "RELOAD");
+        if (res != CURLE_OK) {
+            share_free(share);
+            PyErr_Format(PyExc_RuntimeError, "Failed to load cookies: %s", curl_easy_strerror(res));
+            return NULL;
+        }
+    }
+
+    PyObject *capsule = PyCapsule_New(share, "Share", share_destructor);
+    if (capsule == NULL) {
+        share_free(share);
+    }
+    return capsule;
+}
+
+/* Writes the share's cookie jar to cookie_file, or to the file given to create_share() when it is None. */
+static PyObject* flush_share_cookies(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *cookie_file = NULL;
+
+    if (!PyArg_ParseTuple(args, "O|z", &capsule, &cookie_file)) {
+        return NULL;
+    }
+
+    Share *share = (Share *)PyCapsule_GetPointer(capsule, "Share");
+    if (share == NULL) {
+        return NULL;
+    }
+    if (cookie_file == NULL) {
+        cookie_file = share->cookie_file;
+    }
+    if (cookie_file == NULL) {
+        PyErr_SetString(PyExc_ValueError, "The share has no cookie file; pass one.");
+        return NULL;
+    }
+
+    CURLcode res;
+    Py_BEGIN_ALLOW_THREADS
+    res = share_cookie_command(share, cookie_file, "FLUSH");
+    Py_END_ALLOW_THREADS
+    if (res != CURLE_OK) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to flush cookies: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_user_agent(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *agent;
+
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &agent)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    if (session->user_agent != NULL) {
+        free(session->user_agent);
+    }
+
+    session->user_agent = strdup(agent);
+    curl_easy_setopt(session->curl, CURLOPT_USERAGENT, session->user_agent);
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_proxy(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *proxy;
+
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &proxy)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    if (session->proxy) {
+        free(session->proxy);
+    }
+    session->proxy = strdup(proxy);
+    curl_easy_setopt(session->curl, CURLOPT_PROXY, session->proxy);
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+/* Reads a cookie file through a handle of its own and returns its cookies as Netscape cookie file lines. libcurl
+   reads every CURLOPT_COOKIEFILE again at the start of each transfer, so sessions load the file once this way. */
+static CURLcode cookie_file_lines(const char *cookie_file, struct curl_slist **lines) {
+    *lines = NULL;
+    CURL *curl = curl_easy_init();
+    if (curl == NULL) {
+        return CURLE_OUT_OF_MEMORY;
+    }
+    CURLcode res = curl_easy_setopt(curl, CURLOPT_COOKIEFILE, cookie_file);
+    if (res == CURLE_OK) {
+        res = curl_easy_setopt(curl, CURLOPT_COOKIELIST, "RELOAD");
+    }
+    if (res == CURLE_OK) {
+        res = curl_easy_getinfo(curl, CURLINFO_COOKIELIST, lines);
+    }
+    curl_easy_cleanup(curl);
+    return res;
+}
+
+static PyObject* Session_set_cookie_file(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *cookie_file;
+
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &cookie_file)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    struct curl_slist *lines;
+    CURLcode res;
+    Py_BEGIN_ALLOW_THREADS
+    res = cookie_file_lines(cookie_file, &lines);
+    Py_END_ALLOW_THREADS
+    if (res != CURLE_OK) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to load cookies: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        curl_slist_free_all(lines);
+        return NULL;
+    }
+    if (session->cookie_file) {
+        free(session->cookie_file);
+    } else {
+        curl_easy_setopt(session->curl, CURLOPT_COOKIEFILE, "");
+    }
+    session->cookie_file = strdup(cookie_file);
+    /* The file's cookies are added to the jar now, and the jar is written back when the session is closed or
+       flush_cookies() is called. */
+    for (struct curl_slist *line = lines; line != NULL; line = line->next) {
+        curl_easy_setopt(session->curl, CURLOPT_COOKIELIST, line->data);
+    }
+    curl_easy_setopt(session->curl, CURLOPT_COOKIEJAR, session->cookie_file);
+    session_release(session);
+    curl_slist_free_all(lines);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_flush_cookies(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    if (session->cookie_file == NULL) {
+        session_release(session);
+        PyErr_SetString(PyExc_ValueError, "No cookie file is set.");
+        return NULL;
+    }
+    CURLcode res;
+    Py_BEGIN_ALLOW_THREADS
+    res = curl_easy_setopt(session->curl, CURLOPT_COOKIELIST, "FLUSH");
+    Py_END_ALLOW_THREADS
+    session_release(session);
+
+    if (res != CURLE_OK) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to flush cookies: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+/* Returns the session's cookies (the share's, when it shares them) as Netscape cookie file lines. */
+static PyObject* Session_get_cookies(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    struct curl_slist *cookies = NULL;
+    CURLcode res = curl_easy_getinfo(session->curl, CURLINFO_COOKIELIST, &cookies);
+    session_release(session);
+
+    if (res != CURLE_OK) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to get cookies: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+    PyObject *list = PyList_New(0);
+    for (struct curl_slist *item = cookies; list != NULL && item != NULL; item = item->next) {
+        PyObject *line = PyUnicode_DecodeLatin1(item->data, strlen(item->data), NULL);
+        if (line == NULL || PyList_Append(list, line) < 0) {
+            Py_CLEAR(list);
+        }
+        Py_XDECREF(line);
+    }
+    curl_slist_free_all(cookies);
+    return list;
+}
+
+static PyObject* Session_set_ssl_cert(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *ssl_cert;
+
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &ssl_cert)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    if (session->ssl_cert) {
+        free(session->ssl_cert);
+    }
+    session->ssl_cert = strdup(ssl_cert);
+    curl_easy_setopt(session->curl, CURLOPT_SSLCERT, session->ssl_cert);
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_ssl_key(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *ssl_key;
+
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &ssl_key)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    if (session->ssl_key) {
+        free(session->ssl_key);
+    }
+    session->ssl_key = strdup(ssl_key);
+    curl_easy_setopt(session->curl, CURLOPT_SSLKEY, session->ssl_key);
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_timeout(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    long timeout;
+
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &timeout)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    session->timeout = timeout;
+    curl_easy_setopt(session->curl, CURLOPT_TIMEOUT, session->timeout);
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_http_version(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    long version;
+
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &version)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (version != CURL_HTTP_VERSION_1_1 && version != CURL_HTTP_VERSION_2TLS &&
+        version != CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE) {
+        PyErr_SetString(PyExc_ValueError, "version must be HTTP_1_1, HTTP_2 or HTTP_2_PRIOR_KNOWLEDGE.");
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    CURLcode res = curl_easy_setopt(session->curl, CURLOPT_HTTP_VERSION, version);
+    if (res == CURLE_OK) {
+        /* Wait for a connection that may multiplex rather than opening a new one per request. */
+        curl_easy_setopt(session->curl, CURLOPT_PIPEWAIT, version != CURL_HTTP_VERSION_1_1 ? 1L : 0L);
+    }
+    session_release(session);
+
+    if (res != CURLE_OK) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to set HTTP version: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_max_concurrent_streams(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    long max_streams;
+
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &max_streams)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (max_streams < 0) {
+        PyErr_SetString(PyExc_ValueError, "max_streams must not be negative.");
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    session->max_streams = max_streams;
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_tcp_options(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    int nodelay;
+    long keepalive_idle = 0;
+    long keepalive_interval = 0;
+    int fastopen = 0;
+
+    if (!PyArg_ParseTuple(args, "Op|llp", &capsule, &nodelay, &keepalive_idle, &keepalive_interval, &fastopen)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (keepalive_idle < 0 || keepalive_interval < 0) {
+        PyErr_SetString(PyExc_ValueError, "keepalive_idle and keepalive_interval must not be negative.");
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    curl_easy_setopt(session->curl, CURLOPT_TCP_NODELAY, (long)nodelay);
+    curl_easy_setopt(session->curl, CURLOPT_TCP_KEEPALIVE, keepalive_idle > 0 ? 1L : 0L);
+    if (keepalive_idle > 0) {
+        curl_easy_setopt(session->curl, CURLOPT_TCP_KEEPIDLE, keepalive_idle);
+        curl_easy_setopt(session->curl, CURLOPT_TCP_KEEPINTVL, keepalive_interval > 0 ? keepalive_interval : keepalive_idle);
+    }
+    /* TCP Fast Open is not available on every platform; only asking for it can fail. */
+    CURLcode res = curl_easy_setopt(session->curl, CURLOPT_TCP_FASTOPEN, (long)fastopen);
+    session_release(session);
+
+    if (res != CURLE_OK && fastopen) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to enable TCP Fast Open: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_max_connection_age(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    long max_age;
+
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &max_age)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (max_age < 0) {
+        PyErr_SetString(PyExc_ValueError, "max_age must not be negative.");
+        return NULL;
+    }
+
+#if LIBCURL_VERSION_NUM >= 0x075000
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    CURLcode res = curl_easy_setopt(session->curl, CURLOPT_MAXLIFETIME_CONN, max_age);
+    session_release(session);
+
+    if (res != CURLE_OK) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to set the maximum connection age: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+    Py_RETURN_NONE;
+#else
+    PyErr_SetString(PyExc_RuntimeError, "The maximum connection age needs libcurl 7.80.0 or later.");
+    return NULL;
+#endif
+}
+
+static PyObject* Session_set_max_connections(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    long max_connections;
+
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &max_connections)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (max_connections < 0) {
+        PyErr_SetString(PyExc_ValueError, "max_connections must not be negative.");
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    session->max_connections = max_connections;
+    /* 5 is libcurl's default for an easy handle's own connection cache. */
+    curl_easy_setopt(session->curl, CURLOPT_MAXCONNECTS, max_connections > 0 ? max_connections : 5L);
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_ca_file(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *ca_file;
+
+    if (!PyArg_ParseTuple(args, "Oz", &capsule, &ca_file)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    CURLcode res = curl_easy_setopt(session->curl, CURLOPT_CAINFO, ca_file);
+    session_release(session);
+
+    if (res != CURLE_OK) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to set CA file: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+/* Pins host names to addresses with CURLOPT_RESOLVE entries ("host:port:address[,address...]", or "-host:port" to
+   drop a pin). libcurl loads them into the DNS cache at the start of the next transfer, as entries that never
+   expire, so a list only needs to change when an address does. */
+static PyObject* Session_set_resolve(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    PyObject *entries;
+
+    if (!PyArg_ParseTuple(args, "OO", &capsule, &entries)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    struct curl_slist *list = NULL;
+    if (entries != Py_None) {
+        PyObject *items = PySequence_Fast(entries, "entries must be a sequence of str or None.");
+        if (items == NULL) {
+            return NULL;
+        }
+        for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(items); i++) {
+            PyObject *item = PySequence_Fast_GET_ITEM(items, i);
+            const char *entry = PyUnicode_Check(item) ? PyUnicode_AsUTF8(item) : NULL;
+            if (entry == NULL) {
+                if (!PyErr_Occurred()) {
+                    PyErr_SetString(PyExc_TypeError, "entries must be a sequence of str or None.");
+                }
+                curl_slist_free_all(list);
+                Py_DECREF(items);
+                return NULL;
+            }
+            struct curl_slist *appended = curl_slist_append(list, entry);
+            if (appended == NULL) {
+                curl_slist_free_all(list);
+                Py_DECREF(items);
+                return PyErr_NoMemory();
+            }
+            list = appended;
+        }
+        Py_DECREF(items);
+    }
+
+    if (session_acquire(session) < 0) {
+        curl_slist_free_all(list);
+        return NULL;
+    }
+    struct curl_slist *previous = session->resolve;
+    session->resolve = list;
+    curl_easy_setopt(session->curl, CURLOPT_RESOLVE, list);
+    session_release(session);
+    curl_slist_free_all(previous);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_accept_encoding(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *encodings;
+
+    if (!PyArg_ParseTuple(args, "Oz", &capsule, &encodings)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    CURLcode res = curl_easy_setopt(session->curl, CURLOPT_ACCEPT_ENCODING, encodings);
+    session_release(session);
+
+    if (res != CURLE_OK) {
+        PyErr_Format(PyExc_RuntimeError, "Failed to set accepted encodings: %s", curl_easy_strerror(res));
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_request_compression(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    Py_ssize_t threshold;
+    int level = Z_DEFAULT_COMPRESSION;
+
+    if (!PyArg_ParseTuple(args, "On|i", &capsule, &threshold, &level)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (threshold < 0) {
+        PyErr_SetString(PyExc_ValueError, "threshold must not be negative.");
+        return NULL;
+    }
+    if (level < Z_DEFAULT_COMPRESSION || level > Z_BEST_COMPRESSION) {
+        PyErr_SetString(PyExc_ValueError, "level must be between -1 and 9.");
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    session->compress_threshold = threshold;
+    session->compress_level = level;
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+static void session_configure_multi(Session *session, CURLM *multi) {
+    curl_multi_setopt(multi, CURLMOPT_PIPELINING, CURLPIPE_MULTIPLEX);
+    if (session->max_streams > 0) {
+        curl_multi_setopt(multi, CURLMOPT_MAX_CONCURRENT_STREAMS, session->max_streams);
+    }
+    curl_multi_setopt(multi, CURLMOPT_MAXCONNECTS, session->max_connections);
+}
+
+static PyObject* Session_set_buffer_size_hint(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    Py_ssize_t size_hint;
+
+    if (!PyArg_ParseTuple(args, "On", &capsule, &size_hint)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (size_hint < 0) {
+        PyErr_SetString(PyExc_ValueError, "size_hint must not be negative.");
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    session->response.size_hint = (size_t)size_hint;
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject* Session_set_max_response_size(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    Py_ssize_t max_size;
+
+    if (!PyArg_ParseTuple(args, "On", &capsule, &max_size)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (max_size < 0) {
+        PyErr_SetString(PyExc_ValueError, "max_size must not be negative.");
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    session->response.max_size = (size_t)max_size;
+    session_release(session);
+
+    Py_RETURN_NONE;
+}
+
+/* Runs a GET, DELETE or HEAD request on the session handle. */
+static PyObject* session_request(Session *session, const char *method, const char *url) {
+    int get = strcmp(method, "GET") == 0;
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    session_unprepare(session);
+    curl_easy_setopt(session->curl, CURLOPT_URL, url);
+    if (strcmp(method, "HEAD") == 0) {
+        curl_easy_setopt(session->curl, CURLOPT_NOBODY, 1L);
+    } else if (!get) {
+        curl_easy_setopt(session->curl, CURLOPT_CUSTOMREQUEST, method);
+    }
+    buffer_reset(&session->response);
+    buffer_reset(&session->headers);
+
+    CURLcode res = session_perform(session);
+    if (!get) {
+        request_reset(session->curl);
+    }
+    if (res != CURLE_OK) {
+        PyErr_SetString(PyExc_RuntimeError, buffer_strerror(&session->response, res));
+        session_release(session);
+        return NULL;
+    }
+
+    PyObject *result = session_response(session);
+    session_release(session);
+    return result;
+}
+
+/* Runs a POST or PUT request with a body on the session handle. */
+static PyObject* session_request_body(Session *session, const char *method, const char *url, PyObject *data,
+                                      const char *content_type) {
+    RequestBody body;
+
+    if (request_body_init(&body, data) < 0 || request_body_set_content_type(&body, content_type) < 0) {
+        request_body_release(&body);
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        request_body_release(&body);
+        return NULL;
+    }
+    if (request_body_compress(&body, session->compress_threshold, session->compress_level) < 0) {
+        session_release(session);
+        request_body_release(&body);
+        return NULL;
+    }
+    session_unprepare(session);
+    curl_easy_setopt(session->curl, CURLOPT_URL, url);
+    curl_easy_setopt(session->curl, CURLOPT_CUSTOMREQUEST, method);
+    request_body_apply(session->curl, &body);
+    buffer_reset(&session->response);
+    buffer_reset(&session->headers);
+
+    CURLcode res = session_perform(session);
+    request_reset(session->curl);
+    if (res != CURLE_OK) {
+        if (!request_body_restore_error(&body)) {
+            PyErr_SetString(PyExc_RuntimeError, buffer_strerror(&session->response, res));
+        }
+        session_release(session);
+        request_body_release(&body);
+        return NULL;
+    }
+
+    PyObject *result = session_response(session);
+    session_release(session);
+    request_body_release(&body);
+    return result;
+}
+
+static PyObject* session_http_url(PyObject *args, const char *method) {
+    PyObject *capsule;
+    const char *url;
+
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &url)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+    return session_request(session, method, url);
+}
+
+static PyObject* session_http_body(PyObject *args, const char *method) {
+    PyObject *capsule;
+    const char *url;
+    PyObject *data;
+    const char *content_type = NULL;
+
+    if (!PyArg_ParseTuple(args, "OsO|z", &capsule, &url, &data, &content_type)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+    return session_request_body(session, method, url, data, content_type);
+}
+
+static PyObject* Session_http_get(PyObject* self, PyObject* args) {
+    return session_http_url(args, "GET");
+}
+
+static PyObject* Session_http_post(PyObject* self, PyObject* args) {
+    return session_http_body(args, "POST");
+}
+
+static PyObject* Session_http_put(PyObject* self, PyObject* args) {
+    return session_http_body(args, "PUT");
+}
+
+static PyObject* Session_http_delete(PyObject* self, PyObject* args) {
+    return session_http_url(args, "DELETE");
+}
+
+static PyObject* Session_http_head(PyObject* self, PyObject* args) {
+    return session_http_url(args, "HEAD");
+}
+
+static void prepared_free(Prepared *prepared) {
+    free(prepared->method);
+    free(prepared->url);
+#ifdef HAVE_CURLU
+    if (prepared->curlu != NULL) {
+        curl_url_cleanup(prepared->curlu);
+    }
+#endif
+    curl_slist_free_all(prepared->headers);
+    free(prepared->body);
+    free(prepared);
+}
+
+static void prepared_destructor(PyObject *capsule) {
+    Prepared *prepared = (Prepared *)PyCapsule_GetPointer(capsule, "Prepared");
+    if (prepared) {
+        prepared_free(prepared);
+    }
+}
+
+static int prepared_add_header(Prepared *prepared, const char *header) {
+    struct curl_slist *headers = curl_slist_append(prepared->headers, header);
+    if (headers == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    prepared->headers = headers;
+    return 0;
+}
+
+/* Accepts a mapping of names to values or an iterable of "Name: value" strings. */
+static int prepared_set_headers(Prepared *prepared, PyObject *headers) {
+    PyObject *items = PyObject_HasAttrString(headers, "items") ? PyObject_CallMethod(headers, "items", NULL) : NULL;
+    if (items == NULL && PyErr_Occurred()) {
+        return -1;
+    }
+    PyObject *iterator = PyObject_GetIter(items != NULL ? items : headers);
+    Py_XDECREF(items);
+    if (iterator == NULL) {
+        return -1;
+    }
+
+    PyObject *item;
+    while ((item = PyIter_Next(iterator)) != NULL) {
+        PyObject *header = PyTuple_Check(item) && PyTuple_GET_SIZE(item) == 2
+            ? PyUnicode_FromFormat("%S: %S", PyTuple_GET_ITEM(item, 0), PyTuple_GET_ITEM(item, 1))
+            : (Py_INCREF(item), item);
+        Py_DECREF(item);
+        const char *value = header != NULL && PyUnicode_Check(header) ? PyUnicode_AsUTF8(header) : NULL;
+        if (value == NULL) {
+            if (!PyErr_Occurred()) {
+                PyErr_SetString(PyExc_TypeError, "headers must be a mapping or an iterable of \"Name: value\" strings.");
+            }
+            Py_XDECREF(header);
+            Py_DECREF(iterator);
+            return -1;
+        }
+        int rc = prepared_add_header(prepared, value);
+        Py_DECREF(header);
+        if (rc < 0) {
+            Py_DECREF(iterator);
+            return -1;
+        }
+    }
+    Py_DECREF(iterator);
+    return PyErr_Occurred() ? -1 : 0;
+}
+
+static int prepared_set_url(Prepared *prepared, const char *url) {
+    prepared->url = strdup(url);
+    if (prepared->url == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+#ifdef HAVE_CURLU
+    prepared->curlu = curl_url();
+    if (prepared->curlu == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    CURLUcode rc = curl_url_set(prepared->curlu, CURLUPART_URL, url, CURLU_GUESS_SCHEME);
+    if (rc != CURLUE_OK) {
+#if LIBCURL_VERSION_NUM >= 0x075000
+        PyErr_Format(PyExc_ValueError, "Invalid URL: %s", curl_url_strerror(rc));
+#else
+        PyErr_Format(PyExc_ValueError, "Invalid URL (error %d).", (int)rc);
+#endif
+        return -1;
+    }
+#endif
+    return 0;
+}
+
+static int prepared_set_body(Prepared *prepared, PyObject *body) {
+    Py_buffer view;
+
+    if (!PyUnicode_Check(body) && !PyObject_CheckBuffer(body)) {
+        PyErr_SetString(PyExc_TypeError, "body must be None, str or a bytes-like object.");
+        return -1;
+    }
+    if (body_get_buffer(body, &view) < 0) {
+        return -1;
+    }
+    /* Keep a private copy so the request does not change when a bytearray it was built from does. */
+    prepared->body = (char *)malloc(view.len > 0 ? (size_t)view.len : 1);
+    if (prepared->body == NULL) {
+        PyBuffer_Release(&view);
+        PyErr_NoMemory();
+        return -1;
+    }
+    memcpy(prepared->body, view.buf, (size_t)view.len);
+    prepared->body_size = (size_t)view.len;
+    PyBuffer_Release(&view);
+    return 0;
+}
+
+static PyObject* create_prepared(PyObject* self, PyObject* args) {
+    const char *method;
+    const char *url;
+    PyObject *body = Py_None;
+    PyObject *headers = Py_None;
+    const char *content_type = NULL;
+
+    if (!PyArg_ParseTuple(args, "ss|OOz", &method, &url, &body, &headers, &content_type)) {
+        return NULL;
+    }
+    if (method[0] == '\0') {
+        PyErr_SetString(PyExc_ValueError, "method must not be empty.");
+        return NULL;
+    }
+
+    Prepared *prepared = (Prepared *)calloc(1, sizeof(Prepared));
+    if (prepared == NULL) {
+        return PyErr_NoMemory();
+    }
+    prepared->method = strdup(method);
+    if (prepared->method == NULL) {
+        prepared_free(prepared);
+        return PyErr_NoMemory();
+    }
+    if (prepared_set_url(prepared, url) < 0
+            || (headers != Py_None && prepared_set_headers(prepared, headers) < 0)
+            || (body != Py_None && prepared_set_body(prepared, body) < 0)) {
+        prepared_free(prepared);
+        return NULL;
+    }
+    if (content_type != NULL) {
+        struct curl_slist *appended = content_type_header(prepared->headers, content_type);
+        if (appended == NULL) {
+            prepared_free(prepared);
+            return PyErr_NoMemory();
+        }
+        prepared->headers = appended;
+    }
+
+    PyObject *capsule = PyCapsule_New(prepared, "Prepared", prepared_destructor);
+    if (capsule == NULL) {
+        prepared_free(prepared);
+    }
+    return capsule;
+}
+
+/* Sets every option of a prepared request on a handle in its plain GET state. */
+static void prepared_apply(CURL *curl, const Prepared *prepared) {
+#ifdef HAVE_CURLU
+    curl_easy_setopt(curl, CURLOPT_CURLU, prepared->curlu);
+#else
+    curl_easy_setopt(curl, CURLOPT_URL, prepared->url);
+#endif
+    if (prepared->body != NULL) {
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)prepared->body_size);
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDS, prepared->body);
+    }
+    if (strcmp(prepared->method, "HEAD") == 0) {
+        curl_easy_setopt(curl, CURLOPT_NOBODY, 1L);
+    } else if (strcmp(prepared->method, prepared->body != NULL ? "POST" : "GET") != 0) {
+        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, prepared->method);
+    }
+    curl_easy_setopt(curl, CURLOPT_HTTPHEADER, prepared->headers);
+}
+
+static PyObject* session_send_prepared(Session *session, PyObject *prepared_capsule) {
+    Prepared *prepared = (Prepared *)PyCapsule_GetPointer(prepared_capsule, "Prepared");
+    if (prepared == NULL) {
+        return NULL;
+    }
+
+    if (session_acquire(session) < 0) {
+        return NULL;
+    }
+    /* Running the same prepared request again needs no setopt at all; the session keeps a reference to it
+       so the URL handle, header list and body it points curl at stay alive. */
+    if (session->prepared != prepared_capsule) {
+        session_unprepare(session);
+        prepared_apply(session->curl, prepared);
+        Py_INCREF(prepared_capsule);
+        session->prepared = prepared_capsule;
+    }
+    buffer_reset(&session->response);
+    buffer_reset(&session->headers);
+
+    CURLcode res = session_perform(session);
+    if (res != CURLE_OK) {
+        PyErr_SetString(PyExc_RuntimeError, buffer_strerror(&session->response, res));
+        session_release(session);
+        return NULL;
+    }
+
+    PyObject *result = session_response(session);
+    session_release(session);
+    return result;
+}
+
+static PyObject* Session_http_prepared(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    PyObject *prepared_capsule;
+
+    if (!PyArg_ParseTuple(args, "OO", &capsule, &prepared_capsule)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+    return session_send_prepared(session, prepared_capsule);
+}
+
+static void request_apply(CURL *curl, const BatchRequest *request) {
+    request_reset(curl);
+    curl_easy_setopt(curl, CURLOPT_URL, request->url);
+
+    if (strcmp(request->method, "HEAD") == 0) {
+        curl_easy_setopt(curl, CURLOPT_NOBODY, 1L);
+    } else if (strcmp(request->method, "GET") != 0) {
+        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, request->method);
+    }
+
+    if (request->body != NULL) {
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)request->body_size);
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDS, request->body);
+    }
+    curl_easy_setopt(curl, CURLOPT_HTTPHEADER, request->headers);
+}
+
+static void transfer_prepare(Transfer *transfer, const BatchRequest *request, Py_ssize_t index) {
+    transfer->index = index;
+    buffer_reset(&transfer->response);
+    request_apply(transfer->curl, request);
+}
+
+static PyObject* transfer_result(Transfer *transfer, CURLcode res) {
+    long status = 0;
+
+    if (res != CURLE_OK) {
+        return Py_BuildValue("(lOs)", status, Py_None, buffer_strerror(&transfer->response, res));
+    }
+
+    curl_easy_getinfo(transfer->curl, CURLINFO_RESPONSE_CODE, &status);
+    PyObject *body = buffer_to_bytes(&transfer->response);
+    if (body == NULL) {
+        return NULL;
+    }
+    return Py_BuildValue("(lNO)", status, body, Py_None);
+}
+
+static PyObject* session_run_batch(Session *session, const BatchRequest *requests, Py_ssize_t count, Py_ssize_t max_in_flight) {
+    PyObject *results = PyList_New(count);
+    if (results == NULL) {
+        return NULL;
+    }
+
+    if (session->multi == NULL) {
+        session->multi = curl_multi_init();
+        if (session->multi == NULL) {
+            Py_DECREF(results);
+            PyErr_SetString(PyExc_RuntimeError, "Failed to initialize curl multi handle.");
+            return NULL;
+        }
+    }
+    session_configure_multi(session, session->multi);
+
+    Py_ssize_t slots = count < max_in_flight ? count : max_in_flight;
+    Transfer *transfers = (Transfer *)calloc(slots > 0 ? slots : 1, sizeof(Transfer));
+    if (transfers == NULL) {
+        Py_DECREF(results);
+        return PyErr_NoMemory();
+    }
+
+    for (Py_ssize_t i = 0; i < slots; i++) {
+        transfers[i].curl = session_duphandle(session);
+        if (transfers[i].curl == NULL) {
+            for (Py_ssize_t j = 0; j < i; j++) {
+                curl_easy_cleanup(transfers[j].curl);
+            }
+            free(transfers);
+            Py_DECREF(results);
+            PyErr_SetString(PyExc_RuntimeError, "Failed to duplicate curl handle.");
+            return NULL;
+        }
+        transfers[i].response.size_hint = session->response.size_hint;
+        transfers[i].response.max_size = session->response.max_size;
+        curl_easy_setopt(transfers[i].curl, CURLOPT_WRITEFUNCTION, write_callback);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_WRITEDATA, &transfers[i].response);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_PRIVATE, &transfers[i]);
+    }
+
+    Py_ssize_t next = 0;
+    Py_ssize_t active = 0;
+    int failed = 0;
+    CURLMcode mc = CURLM_OK;
+
+    Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t i = 0; i < slots; i++) {
+        transfer_prepare(&transfers[i], &requests[next], next);
+        next++;
+        curl_multi_add_handle(session->multi, transfers[i].curl);
+        active++;
+    }
+
+    while (active > 0 && !failed) {
+        int running = 0;
+        mc = curl_multi_perform(session->multi, &running);
+        if (mc != CURLM_OK) {
+            break;
+        }
+
+        CURLMsg *msg;
+        int queued;
+        while ((msg = curl_multi_info_read(session->multi, &queued)) != NULL) {
+            if (msg->msg != CURLMSG_DONE) {
+                continue;
+            }
+
+            Transfer *transfer;
+            curl_easy_getinfo(msg->easy_handle, CURLINFO_PRIVATE, (char **)&transfer);
+            CURLcode res = msg->data.result;
+            curl_multi_remove_handle(session->multi, transfer->curl);
+            active--;
+
+            Py_BLOCK_THREADS
+            session_record(session, transfer->curl, res);
+            PyObject *item = transfer_result(transfer, res);
+            if (item == NULL) {
+                failed = 1;
+            } else {
+                PyList_SET_ITEM(results, transfer->index, item);
+            }
+            Py_UNBLOCK_THREADS
+
+            if (failed) {
+                break;
+            }
+
+            if (next < count) {
+                transfer_prepare(transfer, &requests[next], next);
+                next++;
+                curl_multi_add_handle(session->multi, transfer->curl);
+                active++;
+            }
+        }
+
+        if (active > 0 && !failed) {
+            mc = curl_multi_poll(session->multi, NULL, 0, 1000, NULL);
+            if (mc != CURLM_OK) {
+                break;
+            }
+        }
+    }
+
+    for (Py_ssize_t i = 0; i < slots; i++) {
+        curl_multi_remove_handle(session->multi, transfers[i].curl);
+        curl_easy_cleanup(transfers[i].curl);
+        buffer_free(&transfers[i].response);
+    }
+    Py_END_ALLOW_THREADS
+
+    free(transfers);
+
+    if (failed) {
+        Py_DECREF(results);
+        return NULL;
+    }
+    if (mc != CURLM_OK) {
+        Py_DECREF(results);
+        PyErr_SetString(PyExc_RuntimeError, curl_multi_strerror(mc));
+        return NULL;
+    }
+    return results;
+}
+
+static int parse_batch_request(PyObject *item, BatchRequest *request) {
+    PyObject *method;
+    PyObject *url;
+    PyObject *body = Py_None;
+
+    if (!PyTuple_Check(item) || !PyArg_ParseTuple(item, "UU|O", &method, &url, &body)) {
+        if (!PyErr_Occurred() || PyErr_ExceptionMatches(PyExc_TypeError)) {
+            PyErr_Clear();
+            PyErr_SetString(PyExc_TypeError, "Each request must be a (method, url[, body]) tuple.");
+        }
+        return -1;
+    }
+
+    request->method = PyUnicode_AsUTF8(method);
+    request->url = PyUnicode_AsUTF8(url);
+    if (request->method == NULL || request->url == NULL) {
+        return -1;
+    }
+
+    return request_set_body(request, body);
+}
+
+static PyObject* Session_http_request_many(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    PyObject *sequence;
+    Py_ssize_t max_in_flight = 16;
+    const char *content_type = NULL;
+
+    if (!PyArg_ParseTuple(args, "OO|nz", &capsule, &sequence, &max_in_flight, &content_type)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (max_in_flight < 1) {
+        PyErr_SetString(PyExc_ValueError, "max_in_flight must be at least 1.");
+        return NULL;
+    }
+
+    struct curl_slist *headers = NULL;
+    if (content_type != NULL) {
+        headers = content_type_header(NULL, content_type);
+        if (headers == NULL) {
+            return PyErr_NoMemory();
+        }
+    }
+
+    PyObject *items = PySequence_Fast(sequence, "requests must be a sequence.");
+    if (items == NULL) {
+        curl_slist_free_all(headers);
+        return NULL;
+    }
+
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(items);
+    BatchRequest *requests = (BatchRequest *)calloc(count > 0 ? count : 1, sizeof(BatchRequest));
+    if (requests == NULL) {
+        curl_slist_free_all(headers);
+        Py_DECREF(items);
+        return PyErr_NoMemory();
+    }
+
+    PyObject *results = NULL;
+    Py_ssize_t parsed = 0;
+    while (parsed < count && parse_batch_request(PySequence_Fast_GET_ITEM(items, parsed), &requests[parsed]) == 0) {
+        if (requests[parsed].body != NULL) {
+            requests[parsed].headers = headers;
+        }
+        parsed++;
+    }
+
+    if (parsed == count && session_acquire(session) == 0) {
+        results = session_run_batch(session, requests, count, max_in_flight);
+        session_release(session);
+    }
+
+    for (Py_ssize_t i = 0; i < parsed; i++) {
+        request_release(&requests[i]);
+    }
+    free(requests);
+    curl_slist_free_all(headers);
+    Py_DECREF(items);
+    return results;
+}
+
+static PyObject* Session_http_get_many(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    PyObject *sequence;
+    Py_ssize_t max_in_flight = 16;
+
+    if (!PyArg_ParseTuple(args, "OO|n", &capsule, &sequence, &max_in_flight)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (max_in_flight < 1) {
+        PyErr_SetString(PyExc_ValueError, "max_in_flight must be at least 1.");
+        return NULL;
+    }
+
+    PyObject *items = PySequence_Fast(sequence, "urls must be a sequence.");
+    if (items == NULL) {
+        return NULL;
+    }
+
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(items);
+    BatchRequest *requests = (BatchRequest *)calloc(count > 0 ? count : 1, sizeof(BatchRequest));
+    if (requests == NULL) {
+        Py_DECREF(items);
+        return PyErr_NoMemory();
+    }
+
+    for (Py_ssize_t i = 0; i < count; i++) {
+        requests[i].method = "GET";
+        requests[i].url = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(items, i));
+        if (requests[i].url == NULL) {
+            free(requests);
+            Py_DECREF(items);
+            return NULL;
+        }
+    }
+
+    if (session_acquire(session) < 0) {
+        free(requests);
+        Py_DECREF(items);
+        return NULL;
+    }
+    PyObject *results = session_run_batch(session, requests, count, max_in_flight);
+    session_release(session);
+
+    free(requests);
+    Py_DECREF(items);
+    return results;
+}
+
+/* Runs a HEAD request to every URL on the session handle so its own connection cache holds a connection per host. */
+static void session_warm_handle(Session *session, const char **urls, Py_ssize_t count, long *connections,
+                                CURLcode *errors) {
+    session_unprepare(session);
+    curl_easy_setopt(session->curl, CURLOPT_NOBODY, 1L);
+    for (Py_ssize_t i = 0; i < count; i++) {
+        long opened = 0;
+        curl_easy_setopt(session->curl, CURLOPT_URL, urls[i]);
+        CURLcode res;
+        Py_BEGIN_ALLOW_THREADS
+        res = curl_easy_perform(session->curl);
+        Py_END_ALLOW_THREADS
+        curl_easy_getinfo(session->curl, CURLINFO_NUM_CONNECTS, &opened);
+        connections[i] += opened;
+        if (res != CURLE_OK) {
+            errors[i] = res;
+        }
+    }
+    request_reset(session->curl);
+    buffer_reset(&session->response);
+    buffer_reset(&session->headers);
+}
+
+/* Runs per_host concurrent HEAD requests to every URL on the session's multi handle. Returns 0, or -1 with an
+   exception set. */
+static int session_warm_multi(Session *session, const char **urls, Py_ssize_t count, Py_ssize_t per_host,
+                              long *connections, CURLcode *errors) {
+    Py_ssize_t total = count * per_host;
+    if (total == 0) {
+        return 0;
+    }
+    if (session->multi == NULL) {
+        session->multi = curl_multi_init();
+        if (session->multi == NULL) {
+            PyErr_SetString(PyExc_RuntimeError, "Failed to initialize curl multi handle.");
+            return -1;
+        }
+    }
+    session_configure_multi(session, session->multi);
+
+    Transfer *transfers = (Transfer *)calloc(total, sizeof(Transfer));
+    if (transfers == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (Py_ssize_t i = 0; i < total; i++) {
+        transfers[i].curl = session_duphandle(session);
+        if (transfers[i].curl == NULL) {
+            for (Py_ssize_t j = 0; j < i; j++) {
+                curl_easy_cleanup(transfers[j].curl);
+            }
+            free(transfers);
+            PyErr_SetString(PyExc_RuntimeError, "Failed to duplicate curl handle.");
+            return -1;
+        }
+        transfers[i].index = i / per_host;
+        curl_easy_setopt(transfers[i].curl, CURLOPT_URL, urls[transfers[i].index]);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_NOBODY, 1L);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_WRITEFUNCTION, write_callback);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_WRITEDATA, &transfers[i].response);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_PRIVATE, &transfers[i]);
+    }
+
+    CURLMcode mc = CURLM_OK;
+    Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t i = 0; i < total; i++) {
+        curl_multi_add_handle(session->multi, transfers[i].curl);
+    }
+    Py_ssize_t active = total;
+    while (active > 0) {
+        int running = 0;
+        mc = curl_multi_perform(session->multi, &running);
+        if (mc != CURLM_OK) {
+            break;
+        }
+
+        CURLMsg *msg;
+        int queued;
+        while ((msg = curl_multi_info_read(session->multi, &queued)) != NULL) {
+            if (msg->msg != CURLMSG_DONE) {
+                continue;
+            }
+            Transfer *transfer;
+            long opened = 0;
+            curl_easy_getinfo(msg->easy_handle, CURLINFO_PRIVATE, (char **)&transfer);
+            curl_easy_getinfo(msg->easy_handle, CURLINFO_NUM_CONNECTS, &opened);
+            connections[transfer->index] += opened;
+            if (msg->data.result != CURLE_OK && errors[transfer->index] == CURLE_OK) {
+                errors[transfer->index] = msg->data.result;
+            }
+            curl_multi_remove_handle(session->multi, transfer->curl);
+            active--;
+        }
+
+        if (active > 0) {
+            mc = curl_multi_poll(session->multi, NULL, 0, 1000, NULL);
+            if (mc != CURLM_OK) {
+                break;
+            }
+        }
+    }
+    for (Py_ssize_t i = 0; i < total; i++) {
+        curl_multi_remove_handle(session->multi, transfers[i].curl);
+        curl_easy_cleanup(transfers[i].curl);
+        buffer_free(&transfers[i].response);
+    }
+    Py_END_ALLOW_THREADS
+
+    free(transfers);
+    if (mc != CURLM_OK) {
+        PyErr_SetString(PyExc_RuntimeError, curl_multi_strerror(mc));
+        return -1;
+    }
+    return 0;
+}
+
+/* Opens connections ahead of the first real request with HEAD requests whose answers are dropped. libcurl does not
+   hand CURLOPT_CONNECT_ONLY connections to later transfers, so a request is the only way to park a connection in a
+   cache. With a share, every transfer uses the share's cache and per_host connections are opened there. Without
+   one, the session handle and the multi handle behind batches and hedging keep separate caches, so the handle
+   gets one connection per URL and the multi handle per_host. */
+static PyObject* Session_warm(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    PyObject *urls_object;
+    Py_ssize_t per_host = 1;
+
+    if (!PyArg_ParseTuple(args, "OO|n", &capsule, &urls_object, &per_host)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (per_host < 1) {
+        PyErr_SetString(PyExc_ValueError, "connections_per_host must be at least 1.");
+        return NULL;
+    }
+
+    PyObject *items = PySequence_Fast(urls_object, "urls must be a sequence of str.");
+    if (items == NULL) {
+        return NULL;
+    }
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(items);
+    const char **urls = (const char **)calloc(count > 0 ? count : 1, sizeof(char *));
+    long *connections = (long *)calloc(count > 0 ? count : 1, sizeof(long));
+    CURLcode *errors = (CURLcode *)calloc(count > 0 ? count : 1, sizeof(CURLcode));
+    PyObject *result = NULL;
+    if (urls == NULL || connections == NULL || errors == NULL) {
+        PyErr_NoMemory();
+        goto done;
+    }
+    for (Py_ssize_t i = 0; i < count; i++) {
+        PyObject *url = PySequence_Fast_GET_ITEM(items, i);
+        if (!PyUnicode_Check(url)) {
+            PyErr_SetString(PyExc_TypeError, "urls must be a sequence of str.");
+            goto done;
+        }
+        if ((urls[i] = PyUnicode_AsUTF8(url)) == NULL) {
+            goto done;
+        }
+    }
+
+    if (session_acquire(session) < 0) {
+        goto done;
+    }
+    if (session->curl_share == NULL) {
+        session_warm_handle(session, urls, count, connections, errors);
+    }
+    int warmed = session_warm_multi(session, urls, count, per_host, connections, errors);
+    session_release(session);
+    if (warmed < 0) {
+        goto done;
+    }
+
+    result = PyDict_New();
+    for (Py_ssize_t i = 0; result != NULL && i < count; i++) {
+        PyObject *value = errors[i] == CURLE_OK
+            ? Py_BuildValue("(lO)", connections[i], Py_None)
+            : Py_BuildValue("(ls)", connections[i], curl_easy_strerror(errors[i]));
+        if (value == NULL || PyDict_SetItem(result, PySequence_Fast_GET_ITEM(items, i), value) < 0) {
+            Py_CLEAR(result);
+        }
+        Py_XDECREF(value);
+    }
+
+done:
+    free(urls);
+    free(connections);
+    free(errors);
+    Py_DECREF(items);
+    return result;
+}
+
+/*
+ * Run one request and, while it is still running after hedge_delay, start up to max_hedges duplicates on
+ * other connections. The first copy to succeed wins and the others are cancelled. A copy that fails is
+ * only reported when no other copy is left running or to be started.
+ */
+static PyObject* Session_http_hedged(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    BatchRequest request;
+    PyObject *body = Py_None;
+    double hedge_delay;
+    int max_hedges = 1;
+    const char *content_type = NULL;
+
+    if (!PyArg_ParseTuple(args, "OssOd|iz", &capsule, &request.method, &request.url, &body, &hedge_delay,
+                          &max_hedges, &content_type)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (hedge_delay < 0 || max_hedges < 0) {
+        PyErr_SetString(PyExc_ValueError, "hedge_delay and max_hedges must not be negative.");
+        return NULL;
+    }
+
+    if (request_set_body(&request, body) < 0) {
+        return NULL;
+    }
+    if (content_type != NULL && request.body != NULL) {
+        request.headers = content_type_header(NULL, content_type);
+        if (request.headers == NULL) {
+            request_release(&request);
+            return PyErr_NoMemory();
+        }
+    }
+
+    int copies = max_hedges + 1;
+    Transfer *transfers = (Transfer *)calloc(copies, sizeof(Transfer));
+    if (transfers == NULL) {
+        curl_slist_free_all(request.headers);
+        request_release(&request);
+        return PyErr_NoMemory();
+    }
+
+    if (session_acquire(session) < 0) {
+        free(transfers);
+        curl_slist_free_all(request.headers);
+        request_release(&request);
+        return NULL;
+    }
+    if (session->multi == NULL) {
+        session->multi = curl_multi_init();
+    }
+    int ready = session->multi != NULL;
+    for (int i = 0; ready && i < copies; i++) {
+        transfers[i].curl = session_duphandle(session);
+        if (transfers[i].curl == NULL) {
+            ready = 0;
+            break;
+        }
+        transfers[i].index = i;
+        transfers[i].response.size_hint = session->response.size_hint;
+        transfers[i].response.max_size = session->response.max_size;
+        curl_easy_setopt(transfers[i].curl, CURLOPT_WRITEFUNCTION, write_callback);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_WRITEDATA, &transfers[i].response);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_HEADERFUNCTION, write_callback);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_HEADERDATA, &transfers[i].headers);
+        curl_easy_setopt(transfers[i].curl, CURLOPT_PRIVATE, &transfers[i]);
+        request_apply(transfers[i].curl, &request);
+    }
+
+    Transfer *winner = NULL;
+    CURLcode winner_res = CURLE_OK;
+    CURLMcode mc = CURLM_OK;
+
+    if (ready) {
+        session_configure_multi(session, session->multi);
+        long long delay_ms = (long long)(hedge_delay * 1000.0);
+        int started = 0;
+        int active = 0;
+
+        Py_BEGIN_ALLOW_THREADS
+        long long next_hedge = monotonic_ms() + delay_ms;
+        curl_multi_add_handle(session->multi, transfers[started++].curl);
+        active++;
+
+        while (winner == NULL) {
+            int running = 0;
+            mc = curl_multi_perform(session->multi, &running);
+            if (mc != CURLM_OK) {
+                break;
+            }
+
+            CURLMsg *msg;
+            int queued;
+            while (winner == NULL && (msg = curl_multi_info_read(session->multi, &queued)) != NULL) {
+                if (msg->msg != CURLMSG_DONE) {
+                    continue;
+                }
+                Transfer *transfer;
+                curl_easy_getinfo(msg->easy_handle, CURLINFO_PRIVATE, (char **)&transfer);
+                CURLcode res = msg->data.result;
+                curl_multi_remove_handle(session->multi, transfer->curl);
+                active--;
+                if (res == CURLE_OK || (active == 0 && started == copies)) {
+                    winner = transfer;
+                    winner_res = res;
+                } else if (active == 0) {
+                    next_hedge = 0;
+                }
+            }
+            if (winner != NULL) {
+                break;
+            }
+
+            long long now = monotonic_ms();
+            if (started < copies && now >= next_hedge) {
+                curl_multi_add_handle(session->multi, transfers[started++].curl);
+                active++;
+                next_hedge = now + delay_ms;
+                continue;
+            }
+
+            int timeout = 1000;
+            if (started < copies && next_hedge - now < timeout) {
+                timeout = (int)(next_hedge - now);
+            }
+            mc = curl_multi_poll(session->multi, NULL, 0, timeout, NULL);
+            if (mc != CURLM_OK) {
+                break;
+            }
+        }
+
+        for (int i = 0; i < started; i++) {
+            curl_multi_remove_handle(session->multi, transfers[i].curl);
+        }
+        Py_END_ALLOW_THREADS
+    }
+
+    PyObject *result = NULL;
+    if (!ready) {
+        PyErr_SetString(PyExc_RuntimeError, "Failed to prepare the hedged request.");
+    } else if (winner == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, curl_multi_strerror(mc));
+    } else {
+        session_record(session, winner->curl, winner_res);
+        if (winner_res != CURLE_OK) {
+            PyErr_SetString(PyExc_RuntimeError, buffer_strerror(&winner->response, winner_res));
+        } else {
+            result = Py_BuildValue("(lNNi)", session->timing.status, buffer_to_bytes(&winner->response),
+                                   buffer_to_bytes(&winner->headers), (int)winner->index);
+        }
+    }
+
+    for (int i = 0; i < copies; i++) {
+        if (transfers[i].curl != NULL) {
+            curl_easy_cleanup(transfers[i].curl);
+        }
+        buffer_free(&transfers[i].response);
+        buffer_free(&transfers[i].headers);
+    }
+    session_release(session);
+    free(transfers);
+    curl_slist_free_all(request.headers);
+    request_release(&request);
+    return result;
+}
+
+/* zlib's crc32(), fed in pieces because its length is a uInt. */
+static uint32_t crc32_update(uint32_t crc, const unsigned char *data, size_t size) {
+    while (size > 0) {
+        uInt piece = size > 0x40000000 ? 0x40000000 : (uInt)size;
+        crc = (uint32_t)crc32(crc, data, piece);
+        data += piece;
+        size -= piece;
+    }
+    return crc;
+}
+
+static size_t download_write_callback(void *contents, size_t size, size_t nmemb, void *userp) {
+    size_t total_size = size * nmemb;
+    Download *download = (Download *)userp;
+
+    const char *data = (const char *)contents;
+    size_t remaining = total_size;
+    while (remaining > 0) {
+        unsigned int request = remaining > 0x40000000 ? 0x40000000 : (unsigned int)remaining;
+        long written = (long)file_write(download->fd, data, request);
+        if (written < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            download->error = errno;
+            return 0;
+        }
+        data += written;
+        remaining -= (size_t)written;
+    }
+
+    download->crc = crc32_update(download->crc, (const unsigned char *)contents, total_size);
+    download->written += (curl_off_t)total_size;
+    return total_size;
+}
+
+static int download_checksum_existing(Download *download) {
+    unsigned char chunk[65536];
+    curl_off_t remaining = download->resume_from;
+
+    if (file_seek(download->fd, 0, SEEK_SET) < 0) {
+        return -1;
+    }
+    while (remaining > 0) {
+        unsigned int request = remaining > (curl_off_t)sizeof(chunk) ? (unsigned int)sizeof(chunk) : (unsigned int)remaining;
+        long got = (long)file_read(download->fd, chunk, request);
+        if (got < 0 && errno == EINTR) {
+            continue;
+        }
+        if (got <= 0) {
+            return -1;
+        }
+        download->crc = crc32_update(download->crc, chunk, (size_t)got);
+        remaining -= got;
+    }
+    return 0;
+}
+
+static PyObject* Session_http_download(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    const char *url;
+    PyObject *path;
+    int resume = 1;
+
+    if (!PyArg_ParseTuple(args, "OsO&|p", &capsule, &url, PyUnicode_FSConverter, &path, &resume)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        Py_DECREF(path);
+        return NULL;
+    }
+
+    Download download;
+    memset(&download, 0, sizeof(download));
+
+    if (session_acquire(session) < 0) {
+        Py_DECREF(path);
+        return NULL;
+    }
+    /* The transfer runs after the lock is released, so it needs its own copy of the resolve list. */
+    download.curl = session_duphandle_owned(session, &download.resolve);
+    session_release(session);
+    if (download.curl == NULL) {
+        Py_DECREF(path);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to duplicate curl handle.");
+        return NULL;
+    }
+
+    CURLcode res = CURLE_OK;
+    long status = 0;
+    curl_off_t total_time = 0;
+    curl_off_t speed = 0;
+    int failed_open = 0;
+    int failed_sync = 0;
+
+    Py_BEGIN_ALLOW_THREADS
+    download.fd = file_open(PyBytes_AS_STRING(path), O_RDWR | O_CREAT | (resume ? 0 : O_TRUNC));
+    if (download.fd < 0) {
+        download.error = errno;
+        failed_open = 1;
+    } else {
+        if (resume) {
+            curl_off_t size = (curl_off_t)file_seek(download.fd, 0, SEEK_END);
+            download.resume_from = size > 0 ? size : 0;
+            if (download.resume_from > 0 && download_checksum_existing(&download) < 0) {
+                download.error = errno ? errno : EIO;
+                failed_open = 1;
+            }
+        }
+    }
+
+    if (!failed_open) {
+        file_seek(download.fd, 0, SEEK_END);
+        curl_easy_setopt(download.curl, CURLOPT_URL, url);
+        curl_easy_setopt(download.curl, CURLOPT_HTTPGET, 1L);
+        curl_easy_setopt(download.curl, CURLOPT_CUSTOMREQUEST, NULL);
+        curl_easy_setopt(download.curl, CURLOPT_FAILONERROR, 1L);
+        curl_easy_setopt(download.curl, CURLOPT_RESUME_FROM_LARGE, download.resume_from);
+        curl_easy_setopt(download.curl, CURLOPT_WRITEFUNCTION, download_write_callback);
+        curl_easy_setopt(download.curl, CURLOPT_WRITEDATA, &download);
+
+        res = curl_easy_perform(download.curl);
+        if (res == CURLE_RANGE_ERROR && download.resume_from > 0) {
+            /* The server ignored the Range request: start over from an empty file. */
+            if (file_truncate(download.fd) == 0 && file_seek(download.fd, 0, SEEK_SET) == 0) {
+                download.resume_from = 0;
+                download.crc = 0;
+                curl_easy_setopt(download.curl, CURLOPT_RESUME_FROM_LARGE, (curl_off_t)0);
+                res = curl_easy_perform(download.curl);
+            }
+        }
+        curl_easy_getinfo(download.curl, CURLINFO_RESPONSE_CODE, &status);
+        curl_easy_getinfo(download.curl, CURLINFO_TOTAL_TIME_T, &total_time);
+        curl_easy_getinfo(download.curl, CURLINFO_SPEED_DOWNLOAD_T, &speed);
+
+        if (res == CURLE_HTTP_RETURNED_ERROR && status == 416 && download.resume_from > 0) {
+            res = CURLE_OK;
+        }
+        if (res == CURLE_OK && file_sync(download.fd) != 0) {
+            download.error = errno;
+            failed_sync = 1;
+        }
+    }
+    if (download.fd >= 0) {
+        file_close(download.fd);
+    }
+    Py_END_ALLOW_THREADS
+
+    if (!failed_open) {
+        session_record_detached(session, download.curl, res);
+    }
+    Py_BEGIN_ALLOW_THREADS
+    curl_easy_cleanup(download.curl);
+    curl_slist_free_all(download.resolve);
+    Py_END_ALLOW_THREADS
+
+    if (failed_open || failed_sync) {
+        errno = download.error;
+        PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, path);
+        Py_DECREF(path);
+        return NULL;
+    }
+    Py_DECREF(path);
+
+    if (res != CURLE_OK) {
+        if (res == CURLE_WRITE_ERROR && download.error) {
+            errno = download.error;
+            return PyErr_SetFromErrno(PyExc_OSError);
+        }
+        PyErr_SetString(PyExc_RuntimeError, curl_easy_strerror(res));
+        return NULL;
+    }
+
+    return Py_BuildValue("{s:l,s:L,s:L,s:L,s:k,s:d,s:L}",
+        "status", status,
+        "size", (long long)(download.resume_from + download.written),
+        "downloaded", (long long)download.written,
+        "resumed_from", (long long)download.resume_from,
+        "crc32", (unsigned long)download.crc,
+        "total_time", (double)total_time / 1000000.0,
+        "speed", (long long)speed);
+}
+
+static size_t stream_write_callback(void *contents, size_t size, size_t nmemb, void *userp) {
+    Stream *stream = (Stream *)userp;
+
+    if (stream->buffer.size >= stream->chunk_size) {
+        stream->paused = 1;
+        return CURL_WRITEFUNC_PAUSE;
+    }
+    return write_callback(contents, size, nmemb, &stream->buffer);
+}
+
+static void stream_close(Stream *stream) {
+    if (stream->multi) {
+        curl_multi_remove_handle(stream->multi, stream->curl);
+        curl_multi_cleanup(stream->multi);
+        stream->multi = NULL;
+    }
+    if (stream->curl) {
+        curl_easy_cleanup(stream->curl);
+        stream->curl = NULL;
+    }
+    curl_slist_free_all(stream->resolve);
+    stream->resolve = NULL;
+    buffer_free(&stream->buffer);
+    Py_CLEAR(stream->session);
+}
+
+static void stream_destructor(PyObject *capsule) {
+    Stream *stream = (Stream *)PyCapsule_GetPointer(capsule, "Stream");
+    if (stream) {
+        stream_close(stream);
+        free(stream);
+    }
+}
+
+static PyObject* Session_stream_open(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+    BatchRequest request;
+    PyObject *body = Py_None;
+    Py_ssize_t chunk_size = 65536;
+
+    if (!PyArg_ParseTuple(args, "Oss|On", &capsule, &request.method, &request.url, &body, &chunk_size)) {
+        return NULL;
+    }
+
+    Session *session = session_from_object(capsule);
+    if (session == NULL) {
+        return NULL;
+    }
+
+    if (chunk_size < 1) {
+        PyErr_SetString(PyExc_ValueError, "chunk_size must be at least 1.");
+        return NULL;
+    }
+
+    Stream *stream = (Stream *)calloc(1, sizeof(Stream));
+    if (stream == NULL) {
+        return PyErr_NoMemory();
+    }
+    stream->chunk_size = (size_t)chunk_size;
+    stream->buffer.size_hint = (size_t)chunk_size;
+
+    if (session_acquire(session) < 0) {
+        free(stream);
+        return NULL;
+    }
+    stream->curl = session_duphandle_owned(session, &stream->resolve);
+    session_release(session);
+    Py_INCREF(session);
+    stream->session = (PyObject *)session;
+    stream->multi = curl_multi_init();
+    if (stream->curl == NULL || stream->multi == NULL) {
+        stream_close(stream);
+        free(stream);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to initialize curl handles.");
+        return NULL;
+    }
+
+    curl_easy_setopt(stream->curl, CURLOPT_WRITEFUNCTION, stream_write_callback);
+    curl_easy_setopt(stream->curl, CURLOPT_WRITEDATA, stream);
+    if (request_set_body(&request, body) < 0) {
+        stream_close(stream);
+        free(stream);
+        return NULL;
+    }
+    request_apply(stream->curl, &request);
+    if (request.body != NULL) {
+        curl_easy_setopt(stream->curl, CURLOPT_COPYPOSTFIELDS, request.body);
+    }
+    request_release(&request);
+    curl_multi_add_handle(stream->multi, stream->curl);
+
+    PyObject *stream_capsule = PyCapsule_New(stream, "Stream", stream_destructor);
+    if (stream_capsule == NULL) {
+        stream_close(stream);
+        free(stream);
+    }
+    return stream_capsule;
+}
+
+static PyObject* Stream_read(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
+        return NULL;
+    }
+
+    Stream *stream = (Stream *)PyCapsule_GetPointer(capsule, "Stream");
+    if (stream == NULL) {
+        return NULL;
+    }
+    if (stream->curl == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "Stream is closed.");
+        return NULL;
+    }
+    if (stream->busy) {
+        PyErr_SetString(PyExc_RuntimeError, "Stream is being read by another thread.");
+        return NULL;
+    }
+
+    stream->busy = 1;
+    CURLMcode mc = CURLM_OK;
+
+    Py_BEGIN_ALLOW_THREADS
+    while (!stream->done && stream->buffer.size < stream->chunk_size) {
+        int running = 0;
+        mc = curl_multi_perform(stream->multi, &running);
+        if (mc != CURLM_OK) {
+            break;
+        }
+
+        CURLMsg *msg;
+        int queued;
+        while ((msg = curl_multi_info_read(stream->multi, &queued)) != NULL) {
+            if (msg->msg == CURLMSG_DONE) {
+                stream->done = 1;
+                stream->result = msg->data.result;
+            }
+        }
+
+        if (!stream->done && stream->buffer.size < stream->chunk_size) {
+            mc = curl_multi_poll(stream->multi, NULL, 0, 1000, NULL);
+            if (mc != CURLM_OK) {
+                break;
+            }
+        }
+    }
+    Py_END_ALLOW_THREADS
+
+    stream->busy = 0;
+
+    if (stream->done && !stream->recorded) {
+        stream->recorded = 1;
+        session_record_detached((Session *)stream->session, stream->curl, stream->result);
+    }
+    if (mc != CURLM_OK) {
+        PyErr_SetString(PyExc_RuntimeError, curl_multi_strerror(mc));
+        return NULL;
+    }
+    if (stream->done && stream->result != CURLE_OK) {
+        PyErr_SetString(PyExc_RuntimeError, buffer_strerror(&stream->buffer, stream->result));
+        return NULL;
+    }
+
+    size_t size = stream->buffer.size < stream->chunk_size ? stream->buffer.size : stream->chunk_size;
+    PyObject *chunk = PyBytes_FromStringAndSize(stream->buffer.data ? stream->buffer.data : "", (Py_ssize_t)size);
+    if (chunk == NULL) {
+        return NULL;
+    }
+
+    stream->buffer.size -= size;
+    memmove(stream->buffer.data, stream->buffer.data + size, stream->buffer.size);
+    if (stream->paused) {
+        stream->paused = 0;
+        curl_easy_pause(stream->curl, CURLPAUSE_CONT);
+    }
+    return chunk;
+}
+
+static PyObject* Stream_status(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
+        return NULL;
+    }
+
+    Stream *stream = (Stream *)PyCapsule_GetPointer(capsule, "Stream");
+    if (stream == NULL) {
+        return NULL;
+    }
+
+    long status = 0;
+    if (stream->curl) {
+        curl_easy_getinfo(stream->curl, CURLINFO_RESPONSE_CODE, &status);
+    }
+    return PyLong_FromLong(status);
+}
+
+static PyObject* Stream_close(PyObject* self, PyObject* args) {
+    PyObject *capsule;
+
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
+        return NULL;
+    }
+
+    Stream *stream = (Stream *)PyCapsule_GetPointer(capsule, "Stream");
+    if (stream == NULL) {
+        return NULL;
+    }
+    if (stream->busy) {
+        PyErr_SetString(PyExc_RuntimeError, "Stream is being read by another thread.");
+        return NULL;
+    }
+
+    stream_close(stream);
+    Py_RETURN_NONE;
+}
+
+static int multi_socket_callback(CURL *easy, curl_socket_t fd, int action, void *userp, void *socketp) {
+    Multi *multi = (Multi *)userp;
+
+    if (multi->socket_callback == NULL) {
+        return 0;
+    }
+    if (PyErr_Occurred()) {
+        return -1;
+    }
 
-    if (total_size < sizeof(session->response_buffer) - 1) {
-        strncat(session->response_buffer, contents, total_size);
-        return total_size;
+    PyObject *result = PyObject_CallFunction(multi->socket_callback, "ii", (int)fd, action);
+    if (result == NULL) {
+        return -1;
     }
+    Py_DECREF(result);
     return 0;
 }
 
-static void session_destructor(PyObject *capsule) {
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session) {
-        curl_easy_cleanup(session->curl);
-        free(session->user_agent);
-        free(session->proxy);
-        free(session->cookie_file);
-        free(session->ssl_cert);
-        free(session->ssl_key);
-        free(session);
+static int multi_timer_callback(CURLM *handle, long timeout_ms, void *userp) {
+    Multi *multi = (Multi *)userp;
+
+    if (multi->timer_callback == NULL) {
+        return 0;
     }
+    if (PyErr_Occurred()) {
+        return -1;
+    }
+
+    PyObject *result = PyObject_CallFunction(multi->timer_callback, "l", timeout_ms);
+    if (result == NULL) {
+        return -1;
+    }
+    Py_DECREF(result);
+    return 0;
 }
 
-static PyObject* create_session(PyObject* self, PyObject* args) {
-    Session *session = (Session *)malloc(sizeof(Session));
-    if (session == NULL) {
-        PyErr_NoMemory();
-        return NULL;
+static size_t multi_stream_callback(void *contents, size_t size, size_t nmemb, void *userp) {
+    size_t total_size = size * nmemb;
+    Transfer *transfer = (Transfer *)userp;
+
+    if (PyErr_Occurred()) {
+        return 0;
     }
 
-    session->curl = curl_easy_init();
-    session->user_agent = NULL;
-    session->proxy = NULL;
-    session->cookie_file = NULL;
-    session->ssl_cert = NULL;
-    session->ssl_key = NULL;
-    session->timeout = 0;
-    memset(session->response_buffer, 0, sizeof(session->response_buffer)); 
+    PyObject *chunk = PyBytes_FromStringAndSize((const char *)contents, (Py_ssize_t)total_size);
+    if (chunk == NULL) {
+        return 0;
+    }
 
-    curl_easy_setopt(session->curl, CURLOPT_WRITEFUNCTION, write_callback);
-    curl_easy_setopt(session->curl, CURLOPT_WRITEDATA, session);
+    PyObject *result = PyObject_CallFunctionObjArgs(transfer->on_data, chunk, NULL);
+    Py_DECREF(chunk);
+    if (result == NULL) {
+        return 0;
+    }
 
-    PyObject *capsule = PyCapsule_New(session, "Session", session_destructor);
-    return capsule;
+    int accepted = PyObject_IsTrue(result);
+    Py_DECREF(result);
+    if (accepted < 0) {
+        return 0;
+    }
+    return accepted ? total_size : CURL_WRITEFUNC_PAUSE;
 }
 
-static PyObject* Session_set_user_agent(PyObject* self, PyObject* args) {
-    PyObject *capsule;
-    const char *agent;
+static void multi_discard(Multi *multi, Transfer *transfer) {
+    if (transfer->prev) {
+        transfer->prev->next = transfer->next;
+    } else {
+        multi->transfers = transfer->next;
+    }
+    if (transfer->next) {
+        transfer->next->prev = transfer->prev;
+    }
 
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &agent)) {
+    curl_multi_remove_handle(multi->multi, transfer->curl);
+    curl_easy_cleanup(transfer->curl);
+    curl_slist_free_all(transfer->resolve);
+    buffer_free(&transfer->response);
+    buffer_free(&transfer->headers);
+    Py_CLEAR(transfer->on_data);
+    Py_CLEAR(transfer->session);
+    free(transfer);
+}
+
+static void multi_close(Multi *multi) {
+    Py_CLEAR(multi->socket_callback);
+    Py_CLEAR(multi->timer_callback);
+
+    while (multi->transfers) {
+        multi_discard(multi, multi->transfers);
+    }
+    if (multi->multi) {
+        curl_multi_cleanup(multi->multi);
+        multi->multi = NULL;
+    }
+}
+
+static void multi_destructor(PyObject *capsule) {
+    Multi *multi = (Multi *)PyCapsule_GetPointer(capsule, "Multi");
+    if (multi) {
+        multi_close(multi);
+        free(multi);
+    }
+}
+
+static Multi* get_open_multi(PyObject *capsule) {
+    Multi *multi = (Multi *)PyCapsule_GetPointer(capsule, "Multi");
+    if (multi == NULL) {
+        return NULL;
+    }
+    if (multi->multi == NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "Multi handle is closed.");
         return NULL;
     }
+    return multi;
+}
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session == NULL) {
+static PyObject* create_multi(PyObject* self, PyObject* args) {
+    PyObject *socket_callback;
+    PyObject *timer_callback;
+
+    if (!PyArg_ParseTuple(args, "OO", &socket_callback, &timer_callback)) {
         return NULL;
     }
 
-    if (session->user_agent != NULL) {
-        free(session->user_agent);
+    if (!PyCallable_Check(socket_callback) || !PyCallable_Check(timer_callback)) {
+        PyErr_SetString(PyExc_TypeError, "socket_callback and timer_callback must be callable.");
+        return NULL;
     }
 
-    session->user_agent = strdup(agent);
-    curl_easy_setopt(session->curl, CURLOPT_USERAGENT, session->user_agent);
+    Multi *multi = (Multi *)calloc(1, sizeof(Multi));
+    if (multi == NULL) {
+        return PyErr_NoMemory();
+    }
 
-    Py_RETURN_NONE;
+    multi->multi = curl_multi_init();
+    if (multi->multi == NULL) {
+        free(multi);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to initialize curl multi handle.");
+        return NULL;
+    }
+
+    Py_INCREF(socket_callback);
+    Py_INCREF(timer_callback);
+    multi->socket_callback = socket_callback;
+    multi->timer_callback = timer_callback;
+
+    curl_multi_setopt(multi->multi, CURLMOPT_SOCKETFUNCTION, multi_socket_callback);
+    curl_multi_setopt(multi->multi, CURLMOPT_SOCKETDATA, multi);
+    curl_multi_setopt(multi->multi, CURLMOPT_TIMERFUNCTION, multi_timer_callback);
+    curl_multi_setopt(multi->multi, CURLMOPT_TIMERDATA, multi);
+
+    PyObject *capsule = PyCapsule_New(multi, "Multi", multi_destructor);
+    if (capsule == NULL) {
+        multi_close(multi);
+        free(multi);
+    }
+    return capsule;
 }
 
-static PyObject* Session_set_proxy(PyObject* self, PyObject* args) {
-    PyObject *capsule;
-    const char *proxy;
+static PyObject* Multi_add(PyObject* self, PyObject* args) {
+    PyObject *multi_capsule;
+    PyObject *session_capsule;
+    BatchRequest request;
+    PyObject *body = Py_None;
+    PyObject *on_data = Py_None;
 
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &proxy)) {
+    if (!PyArg_ParseTuple(args, "OOss|OO", &multi_capsule, &session_capsule, &request.method, &request.url, &body, &on_data)) {
+        return NULL;
+    }
+
+    if (on_data != Py_None && !PyCallable_Check(on_data)) {
+        PyErr_SetString(PyExc_TypeError, "on_data must be callable.");
+        return NULL;
+    }
+
+    Multi *multi = get_open_multi(multi_capsule);
+    if (multi == NULL) {
         return NULL;
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
+    Session *session = session_from_object(session_capsule);
     if (session == NULL) {
         return NULL;
     }
 
-    if (session->proxy) {
-        free(session->proxy);
+    Transfer *transfer = (Transfer *)calloc(1, sizeof(Transfer));
+    if (transfer == NULL) {
+        return PyErr_NoMemory();
     }
-    session->proxy = strdup(proxy);
-    curl_easy_setopt(session->curl, CURLOPT_PROXY, session->proxy);
 
-    Py_RETURN_NONE;
+    if (session_acquire(session) < 0) {
+        free(transfer);
+        return NULL;
+    }
+    transfer->curl = session_duphandle_owned(session, &transfer->resolve);
+    transfer->response.size_hint = session->response.size_hint;
+    transfer->response.max_size = session->response.max_size;
+    session_configure_multi(session, multi->multi);
+    session_release(session);
+    if (transfer->curl == NULL) {
+        free(transfer);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to duplicate curl handle.");
+        return NULL;
+    }
+
+    if (on_data != Py_None) {
+        Py_INCREF(on_data);
+        transfer->on_data = on_data;
+        curl_easy_setopt(transfer->curl, CURLOPT_WRITEFUNCTION, multi_stream_callback);
+        curl_easy_setopt(transfer->curl, CURLOPT_WRITEDATA, transfer);
+    } else {
+        curl_easy_setopt(transfer->curl, CURLOPT_WRITEFUNCTION, write_callback);
+        curl_easy_setopt(transfer->curl, CURLOPT_WRITEDATA, &transfer->response);
+    }
+    curl_easy_setopt(transfer->curl, CURLOPT_HEADERFUNCTION, write_callback);
+    curl_easy_setopt(transfer->curl, CURLOPT_HEADERDATA, &transfer->headers);
+    curl_easy_setopt(transfer->curl, CURLOPT_PRIVATE, transfer);
+    if (request_set_body(&request, body) < 0) {
+        curl_easy_cleanup(transfer->curl);
+        curl_slist_free_all(transfer->resolve);
+        Py_XDECREF(transfer->on_data);
+        free(transfer);
+        return NULL;
+    }
+    Py_INCREF(session);
+    transfer->session = (PyObject *)session;
+    transfer_prepare(transfer, &request, multi->next_id++);
+    if (request.body != NULL) {
+        curl_easy_setopt(transfer->curl, CURLOPT_COPYPOSTFIELDS, request.body);
+    }
+    request_release(&request);
+
+    transfer->next = multi->transfers;
+    if (multi->transfers) {
+        multi->transfers->prev = transfer;
+    }
+    multi->transfers = transfer;
+
+    CURLMcode mc = curl_multi_add_handle(multi->multi, transfer->curl);
+    if (PyErr_Occurred() || mc != CURLM_OK) {
+        multi_discard(multi, transfer);
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(PyExc_RuntimeError, curl_multi_strerror(mc));
+        }
+        return NULL;
+    }
+
+    return PyLong_FromSsize_t(transfer->index);
 }
 
-static PyObject* Session_set_cookie_file(PyObject* self, PyObject* args) {
+static PyObject* Multi_remove(PyObject* self, PyObject* args) {
     PyObject *capsule;
-    const char *cookie_file;
+    Py_ssize_t index;
 
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &cookie_file)) {
+    if (!PyArg_ParseTuple(args, "On", &capsule, &index)) {
         return NULL;
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session == NULL) {
+    Multi *multi = get_open_multi(capsule);
+    if (multi == NULL) {
         return NULL;
     }
 
-    if (session->cookie_file) {
-        free(session->cookie_file);
+    for (Transfer *transfer = multi->transfers; transfer != NULL; transfer = transfer->next) {
+        if (transfer->index == index) {
+            multi_discard(multi, transfer);
+            if (PyErr_Occurred()) {
+                return NULL;
+            }
+            Py_RETURN_TRUE;
+        }
     }
-    session->cookie_file = strdup(cookie_file);
-    curl_easy_setopt(session->curl, CURLOPT_COOKIEJAR, session->cookie_file);
-
-    Py_RETURN_NONE;
+    Py_RETURN_FALSE;
 }
 
-static PyObject* Session_set_ssl_cert(PyObject* self, PyObject* args) {
+static PyObject* Multi_resume(PyObject* self, PyObject* args) {
     PyObject *capsule;
-    const char *ssl_cert;
+    Py_ssize_t index;
 
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &ssl_cert)) {
+    if (!PyArg_ParseTuple(args, "On", &capsule, &index)) {
         return NULL;
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session == NULL) {
+    Multi *multi = get_open_multi(capsule);
+    if (multi == NULL) {
         return NULL;
     }
 
-    if (session->ssl_cert) {
-        free(session->ssl_cert);
+    for (Transfer *transfer = multi->transfers; transfer != NULL; transfer = transfer->next) {
+        if (transfer->index == index) {
+            CURLcode res = curl_easy_pause(transfer->curl, CURLPAUSE_CONT);
+            if (PyErr_Occurred()) {
+                return NULL;
+            }
+            if (res != CURLE_OK) {
+                PyErr_SetString(PyExc_RuntimeError, curl_easy_strerror(res));
+                return NULL;
+            }
+            Py_RETURN_TRUE;
+        }
     }
-    session->ssl_cert = strdup(ssl_cert);
-    curl_easy_setopt(session->curl, CURLOPT_SSLCERT, session->ssl_cert);
+    Py_RETURN_FALSE;
+}
 
-    Py_RETURN_NONE;
+/* Returns (status, body, headers, error) for a finished multi transfer; body and headers are None on failure. */
+static PyObject* multi_transfer_result(Transfer *transfer, CURLcode res) {
+    long status = 0;
+
+    if (res != CURLE_OK) {
+        return Py_BuildValue("(lOOs)", status, Py_None, Py_None, buffer_strerror(&transfer->response, res));
+    }
+
+    curl_easy_getinfo(transfer->curl, CURLINFO_RESPONSE_CODE, &status);
+    PyObject *body = buffer_to_bytes(&transfer->response);
+    if (body == NULL) {
+        return NULL;
+    }
+    PyObject *headers = buffer_to_bytes(&transfer->headers);
+    if (headers == NULL) {
+        Py_DECREF(body);
+        return NULL;
+    }
+    return Py_BuildValue("(lNNO)", status, body, headers, Py_None);
 }
 
-static PyObject* Session_set_ssl_key(PyObject* self, PyObject* args) {
+static PyObject* Multi_socket_action(PyObject* self, PyObject* args) {
     PyObject *capsule;
-    const char *ssl_key;
+    int fd;
+    int events;
 
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &ssl_key)) {
+    if (!PyArg_ParseTuple(args, "Oii", &capsule, &fd, &events)) {
         return NULL;
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session == NULL) {
+    Multi *multi = get_open_multi(capsule);
+    if (multi == NULL) {
         return NULL;
     }
 
-    if (session->ssl_key) {
-        free(session->ssl_key);
+    int running = 0;
+    CURLMcode mc = curl_multi_socket_action(multi->multi, (curl_socket_t)fd, events, &running);
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+    if (mc != CURLM_OK) {
+        PyErr_SetString(PyExc_RuntimeError, curl_multi_strerror(mc));
+        return NULL;
     }
-    session->ssl_key = strdup(ssl_key);
-    curl_easy_setopt(session->curl, CURLOPT_SSLKEY, session->ssl_key);
 
-    Py_RETURN_NONE;
+    PyObject *completed = PyList_New(0);
+    if (completed == NULL) {
+        return NULL;
+    }
+
+    CURLMsg *msg;
+    int queued;
+    while ((msg = curl_multi_info_read(multi->multi, &queued)) != NULL) {
+        if (msg->msg != CURLMSG_DONE) {
+            continue;
+        }
+
+        Transfer *transfer;
+        curl_easy_getinfo(msg->easy_handle, CURLINFO_PRIVATE, (char **)&transfer);
+        session_record_detached((Session *)transfer->session, transfer->curl, msg->data.result);
+        PyObject *result = multi_transfer_result(transfer, msg->data.result);
+        PyObject *item = result ? Py_BuildValue("(nN)", transfer->index, result) : NULL;
+        multi_discard(multi, transfer);
+
+        if (item == NULL || PyErr_Occurred() || PyList_Append(completed, item) < 0) {
+            Py_XDECREF(item);
+            Py_DECREF(completed);
+            return NULL;
+        }
+        Py_DECREF(item);
+    }
+
+    return completed;
 }
 
-static PyObject* Session_set_timeout(PyObject* self, PyObject* args) {
+static PyObject* Multi_close(PyObject* self, PyObject* args) {
     PyObject *capsule;
-    long timeout;
 
-    if (!PyArg_ParseTuple(args, "Ol", &capsule, &timeout)) {
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
         return NULL;
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session == NULL) {
+    Multi *multi = (Multi *)PyCapsule_GetPointer(capsule, "Multi");
+    if (multi == NULL) {
         return NULL;
     }
 
-    session->timeout = timeout;
-    curl_easy_setopt(session->curl, CURLOPT_TIMEOUT, session->timeout);
-
+    multi_close(multi);
     Py_RETURN_NONE;
 }
 
-static PyObject* Session_http_get(PyObject* self, PyObject* args) {
+static PyObject* Session_get_timing(PyObject* self, PyObject* args) {
     PyObject *capsule;
-    const char *url;
 
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &url)) {
+    if (!PyArg_ParseTuple(args, "O", &capsule)) {
         return NULL;
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
+    Session *session = session_from_object(capsule);
     if (session == NULL) {
         return NULL;
     }
 
-    curl_easy_setopt(session->curl, CURLOPT_URL, url);
-    memset(session->response_buffer, 0, sizeof(session->response_buffer));
+    if (!session->has_timing) {
+        Py_RETURN_NONE;
+    }
+    return timing_to_dict(&session->timing);
+}
 
-    CURLcode res = curl_easy_perform(session->curl);
-    if (res != CURLE_OK) {
-        PyErr_SetString(PyExc_RuntimeError, curl_easy_strerror(res));
-        return NULL;
+static void stats_destructor(PyObject *capsule) {
+    Stats *stats = (Stats *)PyCapsule_GetPointer(capsule, "Stats");
+    if (stats) {
+        stats_clear(stats);
+        free(stats);
+    }
+}
+
+static PyObject* create_stats(PyObject* self, PyObject* args) {
+    Stats *stats = (Stats *)calloc(1, sizeof(Stats));
+    if (stats == NULL) {
+        return PyErr_NoMemory();
     }
 
-    return Py_BuildValue("s", session->response_buffer);
+    PyObject *capsule = PyCapsule_New(stats, "Stats", stats_destructor);
+    if (capsule == NULL) {
+        free(stats);
+    }
+    return capsule;
 }
 
-static PyObject* Session_http_post(PyObject* self, PyObject* args) {
+static PyObject* Session_set_stats(PyObject* self, PyObject* args) {
     PyObject *capsule;
-    const char *url;
-    const char *data;
+    PyObject *stats;
 
-    if (!PyArg_ParseTuple(args, "Oss", &capsule, &url, &data)) {
+    if (!PyArg_ParseTuple(args, "OO", &capsule, &stats)) {
         return NULL;
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
+    Session *session = session_from_object(capsule);
     if (session == NULL) {
         return NULL;
     }
 
-    curl_easy_setopt(session->curl, CURLOPT_URL, url);
-    curl_easy_setopt(session->curl, CURLOPT_CUSTOMREQUEST, "POST");
-    curl_easy_setopt(session->curl, CURLOPT_POSTFIELDS, data);
-    memset(session->response_buffer, 0, sizeof(session->response_buffer));
+    if (stats != Py_None && PyCapsule_GetPointer(stats, "Stats") == NULL) {
+        return NULL;
+    }
 
-    CURLcode res = curl_easy_perform(session->curl);
-    if (res != CURLE_OK) {
-        PyErr_SetString(PyExc_RuntimeError, curl_easy_strerror(res));
+    PyObject *previous;
+    if (session_acquire(session) < 0) {
         return NULL;
     }
+    previous = session->stats;
+    session->stats = stats != Py_None ? stats : NULL;
+    Py_XINCREF(session->stats);
+    session_release(session);
+    Py_XDECREF(previous);
 
-    return Py_BuildValue("s", session->response_buffer);
+    Py_RETURN_NONE;
 }
 
-static PyObject* Session_http_put(PyObject* self, PyObject* args) {
+static PyObject* Stats_snapshot(PyObject* self, PyObject* args) {
     PyObject *capsule;
-    const char *url;
-    const char *data;
+    int reset = 0;
 
-    if (!PyArg_ParseTuple(args, "Oss", &capsule, &url, &data)) {
+    if (!PyArg_ParseTuple(args, "O|p", &capsule, &reset)) {
         return NULL;
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session == NULL) {
+    Stats *stats = (Stats *)PyCapsule_GetPointer(capsule, "Stats");
+    if (stats == NULL) {
         return NULL;
     }
 
-    curl_easy_setopt(session->curl, CURLOPT_URL, url);
-    curl_easy_setopt(session->curl, CURLOPT_CUSTOMREQUEST, "PUT");
-    curl_easy_setopt(session->curl, CURLOPT_POSTFIELDS, data);
-    memset(session->response_buffer, 0, sizeof(session->response_buffer));
-
-    CURLcode res = curl_easy_perform(session->curl);
-    if (res != CURLE_OK) {
-        PyErr_SetString(PyExc_RuntimeError, curl_easy_strerror(res));
+    PyObject *snapshot = PyDict_New();
+    if (snapshot == NULL) {
         return NULL;
     }
 
-    return Py_BuildValue("s", session->response_buffer);
+    for (Py_ssize_t i = 0; i < stats->count; i++) {
+        PyObject *host = host_stats_to_dict(stats->hosts[i]);
+        if (host == NULL || PyDict_SetItemString(snapshot, stats->hosts[i]->host, host) < 0) {
+            Py_XDECREF(host);
+            Py_DECREF(snapshot);
+            return NULL;
+        }
+        Py_DECREF(host);
+    }
+
+    if (reset) {
+        stats_clear(stats);
+    }
+    return snapshot;
 }
 
-static PyObject* Session_http_delete(PyObject* self, PyObject* args) {
-    PyObject *capsule;
-    const char *url;
+/*
+ * Matches METH_FASTCALL | METH_KEYWORDS arguments to the NULL-terminated parameter names, by position or by
+ * keyword. values[] gets a borrowed reference per parameter, NULL for an optional one that was not passed.
+ */
+static int fastcall_parse(const char *function, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames,
+                          const char *const *names, Py_ssize_t required, PyObject **values) {
+    Py_ssize_t count = 0;
+    while (names[count] != NULL) {
+        count++;
+    }
+    if (nargs > count) {
+        PyErr_Format(PyExc_TypeError, "%s() takes at most %zd arguments (%zd given)", function, count, nargs);
+        return -1;
+    }
+    for (Py_ssize_t i = 0; i < count; i++) {
+        values[i] = i < nargs ? args[i] : NULL;
+    }
 
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &url)) {
-        return NULL;
+    Py_ssize_t keywords = kwnames != NULL ? PyTuple_GET_SIZE(kwnames) : 0;
+    for (Py_ssize_t k = 0; k < keywords; k++) {
+        PyObject *name = PyTuple_GET_ITEM(kwnames, k);
+        Py_ssize_t i = 0;
+        while (i < count && PyUnicode_CompareWithASCIIString(name, names[i]) != 0) {
+            i++;
+        }
+        if (i == count) {
+            PyErr_Format(PyExc_TypeError, "%s() got an unexpected keyword argument '%U'", function, name);
+            return -1;
+        }
+        if (values[i] != NULL) {
+            PyErr_Format(PyExc_TypeError, "%s() got multiple values for argument '%s'", function, names[i]);
+            return -1;
+        }
+        values[i] = args[nargs + k];
     }
 
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session == NULL) {
+    for (Py_ssize_t i = 0; i < required; i++) {
+        if (values[i] == NULL) {
+            PyErr_Format(PyExc_TypeError, "%s() missing required argument '%s'", function, names[i]);
+            return -1;
+        }
+    }
+    return 0;
+}
+
+/* Returns the UTF-8 form of a str argument, or NULL for None when none_ok is set or with TypeError set. */
+static const char* fastcall_str(PyObject *value, const char *name, int none_ok) {
+    if (value == NULL || (none_ok && value == Py_None)) {
+        return NULL;
+    }
+    if (!PyUnicode_Check(value)) {
+        PyErr_Format(PyExc_TypeError, "%s must be str%s, not %.200s", name, none_ok ? " or None" : "",
+                     Py_TYPE(value)->tp_name);
         return NULL;
     }
+    return PyUnicode_AsUTF8(value);
+}
 
-    curl_easy_setopt(session->curl, CURLOPT_URL, url);
-    curl_easy_setopt(session->curl, CURLOPT_CUSTOMREQUEST, "DELETE");
-    memset(session->response_buffer, 0, sizeof(session->response_buffer));
+static const char *const url_parameters[] = {"url", NULL};
+static const char *const body_parameters[] = {"url", "body", "content_type", NULL};
+static const char *const prepared_parameters[] = {"prepared", NULL};
 
-    CURLcode res = curl_easy_perform(session->curl);
-    if (res != CURLE_OK) {
-        PyErr_SetString(PyExc_RuntimeError, curl_easy_strerror(res));
+static PyObject* session_method_url(Session *session, const char *method, const char *function,
+                                    PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames) {
+    PyObject *values[1];
+    const char *url;
+
+    if (fastcall_parse(function, args, nargs, kwnames, url_parameters, 1, values) < 0
+            || (url = fastcall_str(values[0], "url", 0)) == NULL) {
         return NULL;
     }
-
-    return Py_BuildValue("s", session->response_buffer);
+    return session_request(session, method, url);
 }
 
-static PyObject* Session_http_head(PyObject* self, PyObject* args) {
-    PyObject *capsule;
+static PyObject* session_method_body(Session *session, const char *method, const char *function,
+                                     PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames) {
+    PyObject *values[3];
     const char *url;
 
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &url)) {
+    if (fastcall_parse(function, args, nargs, kwnames, body_parameters, 2, values) < 0
+            || (url = fastcall_str(values[0], "url", 0)) == NULL) {
         return NULL;
     }
-
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    if (session == NULL) {
+    const char *content_type = fastcall_str(values[2], "content_type", 1);
+    if (content_type == NULL && PyErr_Occurred()) {
         return NULL;
     }
+    return session_request_body(session, method, url, values[1], content_type);
+}
 
-    curl_easy_setopt(session->curl, CURLOPT_URL, url);
-    curl_easy_setopt(session->curl, CURLOPT_NOBODY, 1L);
-    memset(session->response_buffer, 0, sizeof(session->response_buffer));
+static PyObject* SessionType_get(Session *session, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames) {
+    return session_method_url(session, "GET", "get", args, nargs, kwnames);
+}
 
-    CURLcode res = curl_easy_perform(session->curl);
-    if (res != CURLE_OK) {
-        PyErr_SetString(PyExc_RuntimeError, curl_easy_strerror(res));
+static PyObject* SessionType_post(Session *session, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames) {
+    return session_method_body(session, "POST", "post", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_put(Session *session, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames) {
+    return session_method_body(session, "PUT", "put", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_delete(Session *session, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames) {
+    return session_method_url(session, "DELETE", "delete", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_head(Session *session, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames) {
+    return session_method_url(session, "HEAD", "head", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_send(Session *session, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames) {
+    PyObject *values[1];
+
+    if (fastcall_parse("send", args, nargs, kwnames, prepared_parameters, 1, values) < 0) {
         return NULL;
     }
+    return session_send_prepared(session, values[0]);
+}
+
+static PyObject* SessionType_clone(Session *session, PyObject *Py_UNUSED(ignored)) {
+    return session_clone(session);
+}
+
+/* Frees the curl handle and its connections now instead of when the last reference goes. Idempotent. */
+static PyObject* SessionType_close(Session *session, PyObject *Py_UNUSED(ignored)) {
+    session_lock(session);
+    PyObject *prepared = session->prepared;
+    session->prepared = NULL;
+    session_close_handles(session);
+    session_release(session);
+    Py_XDECREF(prepared);
+    Py_RETURN_NONE;
+}
 
-    return Py_BuildValue("s", session->response_buffer);
+static PyObject* SessionType_enter(Session *session, PyObject *Py_UNUSED(ignored)) {
+    Py_INCREF(session);
+    return (PyObject *)session;
 }
 
+static PyObject* SessionType_exit(Session *session, PyObject *const *args, Py_ssize_t nargs) {
+    return SessionType_close(session, NULL);
+}
+
+static PyObject* SessionType_closed(Session *session, void *Py_UNUSED(closure)) {
+    return PyBool_FromLong(session->curl == NULL);
+}
+
+static PyMethodDef SessionType_methods[] = {
+    {"get", (PyCFunction)(void(*)(void))SessionType_get, METH_FASTCALL | METH_KEYWORDS, "get(url) -> (status, body, headers)"},
+    {"post", (PyCFunction)(void(*)(void))SessionType_post, METH_FASTCALL | METH_KEYWORDS, "post(url, body, content_type=None) -> (status, body, headers)"},
+    {"put", (PyCFunction)(void(*)(void))SessionType_put, METH_FASTCALL | METH_KEYWORDS, "put(url, body, content_type=None) -> (status, body, headers)"},
+    {"delete", (PyCFunction)(void(*)(void))SessionType_delete, METH_FASTCALL | METH_KEYWORDS, "delete(url) -> (status, body, headers)"},
+    {"head", (PyCFunction)(void(*)(void))SessionType_head, METH_FASTCALL | METH_KEYWORDS, "head(url) -> (status, body, headers)"},
+    {"send", (PyCFunction)(void(*)(void))SessionType_send, METH_FASTCALL | METH_KEYWORDS, "send(prepared) -> (status, body, headers) for a request from create_prepared()"},
+    {"clone", (PyCFunction)SessionType_clone, METH_NOARGS, "Create a new session with the same configuration and share."},
+    {"close", (PyCFunction)SessionType_close, METH_NOARGS, "Free the curl handle and its connections; later requests raise RuntimeError."},
+    {"__enter__", (PyCFunction)SessionType_enter, METH_NOARGS, NULL},
+    {"__exit__", (PyCFunction)(void(*)(void))SessionType_exit, METH_FASTCALL, NULL},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef SessionType_getset[] = {
+    {"closed", (getter)SessionType_closed, NULL, "Whether close() has been called.", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject SessionType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "CHTTP.Session",
+    .tp_basicsize = sizeof(Session),
+    .tp_dealloc = (destructor)Session_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+    .tp_doc = "Session(share=None)\n--\n\n"
+              "A curl easy handle with its options, connection cache and response buffers. The methods run one\n"
+              "request and return (status, body, headers); the module functions take the session as their\n"
+              "first argument. A session is a context manager that closes it on exit.",
+    .tp_traverse = (traverseproc)Session_traverse,
+    .tp_clear = (inquiry)Session_clear,
+    .tp_weaklistoffset = offsetof(Session, weakreflist),
+    .tp_methods = SessionType_methods,
+    .tp_getset = SessionType_getset,
+    .tp_new = Session_new,
+};
+
 static PyMethodDef HttpRequestMethods[] = {
-    {"create_session", create_session, METH_NOARGS, "Create a new session."},
+    {"create_session", create_session, METH_VARARGS, "Create a new session, optionally attached to a share."},
+    {"create_share", (PyCFunction)(void(*)(void))create_share, METH_VARARGS | METH_KEYWORDS, "Create a share for connections, DNS and TLS sessions, and with cookies=True or a cookie_file, one cookie jar."},
+    {"flush_share_cookies", flush_share_cookies, METH_VARARGS, "Write a share's cookie jar to its cookie file, or to the given file."},
+    {"clone_session", Session_clone, METH_VARARGS, "Create a new session with the same configuration and share."},
     {"set_user_agent", Session_set_user_agent, METH_VARARGS, "Set user agent."},
     {"set_proxy", Session_set_proxy, METH_VARARGS, "Set proxy."},
-    {"set_cookie_file", Session_set_cookie_file, METH_VARARGS, "Set cookie file."},
+    {"set_cookie_file", Session_set_cookie_file, METH_VARARGS, "Load cookies from a file and write them back to it when the session closes."},
+    {"flush_cookies", Session_flush_cookies, METH_VARARGS, "Write the session's cookies to its cookie file now."},
+    {"get_cookies", Session_get_cookies, METH_VARARGS, "Get the session's cookies as Netscape cookie file lines."},
     {"set_ssl_cert", Session_set_ssl_cert, METH_VARARGS, "Set SSL certificate."},
     {"set_ssl_key", Session_set_ssl_key, METH_VARARGS, "Set SSL key."},
     {"set_timeout", Session_set_timeout, METH_VARARGS, "Set timeout."},
+    {"set_http_version", Session_set_http_version, METH_VARARGS, "Set the HTTP version (HTTP_1_1, HTTP_2 or HTTP_2_PRIOR_KNOWLEDGE)."},
+    {"set_max_concurrent_streams", Session_set_max_concurrent_streams, METH_VARARGS, "Set the HTTP/2 stream limit per connection for batches (0 for the libcurl default)."},
+    {"set_accept_encoding", Session_set_accept_encoding, METH_VARARGS, "Set the accepted response encodings (\"\" for all supported, None to disable)."},
+    {"set_request_compression", Session_set_request_compression, METH_VARARGS, "Gzip POST/PUT bodies of at least threshold bytes (0 to disable)."},
+    {"set_tcp_options", Session_set_tcp_options, METH_VARARGS, "Set TCP_NODELAY, TCP keepalive idle and interval seconds (0 to disable) and TCP Fast Open."},
+    {"set_max_connection_age", Session_set_max_connection_age, METH_VARARGS, "Stop reusing connections older than max_age seconds (0 for no limit)."},
+    {"set_max_connections", Session_set_max_connections, METH_VARARGS, "Set how many idle connections the session keeps (0 for the libcurl default)."},
+    {"set_ca_file", Session_set_ca_file, METH_VARARGS, "Set the CA bundle used to verify servers (None for the default)."},
+    {"set_resolve", Session_set_resolve, METH_VARARGS, "Pin host names to addresses with CURLOPT_RESOLVE entries (None to clear the list)."},
+    {"warm", Session_warm, METH_VARARGS, "Open connections to each URL ahead of the first request; returns {url: (connections, error)}."},
+    {"set_buffer_size_hint", Session_set_buffer_size_hint, METH_VARARGS, "Set the initial response buffer size."},
+    {"set_max_response_size", Session_set_max_response_size, METH_VARARGS, "Set the maximum response body size (0 for no limit)."},
+    {"get_timing", Session_get_timing, METH_VARARGS, "Get the timing breakdown of the session's last request."},
+    {"create_stats", create_stats, METH_NOARGS, "Create a per-host latency histogram aggregator."},
+    {"set_stats", Session_set_stats, METH_VARARGS, "Attach a stats aggregator to a session (None to detach)."},
+    {"stats_snapshot", Stats_snapshot, METH_VARARGS, "Get per-host latency statistics, optionally resetting them."},
     {"http_get", Session_http_get, METH_VARARGS, "Perform an HTTP GET request."},
     {"http_post", Session_http_post, METH_VARARGS, "Perform an HTTP POST request."},
     {"http_put", Session_http_put, METH_VARARGS, "Perform an HTTP PUT request."},
     {"http_delete", Session_http_delete, METH_VARARGS, "Perform an HTTP DELETE request."},
     {"http_head", Session_http_head, METH_VARARGS, "Perform an HTTP HEAD request."},
+    {"create_prepared", create_prepared, METH_VARARGS, "Compile a request's method, URL, headers and body once for repeated use."},
+    {"http_prepared", Session_http_prepared, METH_VARARGS, "Perform a prepared request (repeating the session's last one sets no options)."},
+    {"http_get_many", Session_http_get_many, METH_VARARGS, "Perform many HTTP GET requests concurrently."},
+    {"http_request_many", Session_http_request_many, METH_VARARGS, "Perform many HTTP requests concurrently."},
+    {"http_hedged", Session_http_hedged, METH_VARARGS, "Perform a request, starting duplicates while it runs longer than hedge_delay."},
+    {"http_download", Session_http_download, METH_VARARGS, "Download a URL straight to a file, resuming a partial file."},
+    {"stream_open", Session_stream_open, METH_VARARGS, "Start a streaming HTTP request."},
+    {"stream_read", Stream_read, METH_VARARGS, "Read the next body chunk of a stream (empty at the end)."},
+    {"stream_status", Stream_status, METH_VARARGS, "Get the HTTP status code of a stream."},
+    {"stream_close", Stream_close, METH_VARARGS, "Close a stream and abort its transfer."},
+    {"create_multi", create_multi, METH_VARARGS, "Create a multi handle driven by socket and timer callbacks."},
+    {"multi_add", Multi_add, METH_VARARGS, "Start a request on a multi handle."},
+    {"multi_remove", Multi_remove, METH_VARARGS, "Cancel a request running on a multi handle."},
+    {"multi_resume", Multi_resume, METH_VARARGS, "Resume a streaming request paused by its on_data callback."},
+    {"multi_socket_action", Multi_socket_action, METH_VARARGS, "Drive a multi handle after socket activity or a timeout; returns [(id, (status, body, headers, error))]."},
+    {"multi_close", Multi_close, METH_VARARGS, "Close a multi handle and cancel its requests."},
     {NULL, NULL, 0, NULL}
 };
 
@@ -372,5 +4064,42 @@ static struct PyModuleDef http_request_module = {
 };
 
 PyMODINIT_FUNC PyInit_CHTTP(void) {
-    return PyModule_Create(&http_request_module);
+    /* Initialize libcurl here, once and under the import lock, rather than implicitly and thread-unsafely
+     * in the first curl_easy_init(). libcurl counts calls, so loading both extensions is fine. */
+    CURLcode init = curl_global_init(CURL_GLOBAL_DEFAULT);
+    if (init != CURLE_OK) {
+        PyErr_Format(PyExc_ImportError, "curl_global_init failed: %s", curl_easy_strerror(init));
+        return NULL;
+    }
+
+    if (PyType_Ready(&SessionType) < 0) {
+        return NULL;
+    }
+    PyObject *module = PyModule_Create(&http_request_module);
+    if (module == NULL) {
+        return NULL;
+    }
+    Py_INCREF(&SessionType);
+    if (PyModule_AddObject(module, "Session", (PyObject *)&SessionType) < 0) {
+        Py_DECREF(&SessionType);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    if (PyModule_AddIntConstant(module, "POLL_IN", CURL_POLL_IN) < 0 ||
+        PyModule_AddIntConstant(module, "POLL_OUT", CURL_POLL_OUT) < 0 ||
+        PyModule_AddIntConstant(module, "POLL_INOUT", CURL_POLL_INOUT) < 0 ||
+        PyModule_AddIntConstant(module, "POLL_REMOVE", CURL_POLL_REMOVE) < 0 ||
+        PyModule_AddIntConstant(module, "CSELECT_IN", CURL_CSELECT_IN) < 0 ||
+        PyModule_AddIntConstant(module, "CSELECT_OUT", CURL_CSELECT_OUT) < 0 ||
+        PyModule_AddIntConstant(module, "CSELECT_ERR", CURL_CSELECT_ERR) < 0 ||
+        PyModule_AddIntConstant(module, "SOCKET_TIMEOUT", (long)CURL_SOCKET_TIMEOUT) < 0 ||
+        PyModule_AddIntConstant(module, "HTTP_1_1", CURL_HTTP_VERSION_1_1) < 0 ||
+        PyModule_AddIntConstant(module, "HTTP_2", CURL_HTTP_VERSION_2TLS) < 0 ||
+        PyModule_AddIntConstant(module, "HTTP_2_PRIOR_KNOWLEDGE", CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE) < 0) {
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    return module;
 }
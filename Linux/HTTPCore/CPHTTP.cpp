@@ -23,10 +23,282 @@
 
 #include <Python.h>
 #include <curl/curl.h>
+#include <fcntl.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <zlib.h>
+#include <algorithm>
+#include <chrono>
+#include <cerrno>
+#include <cstdint>
 #include <cstdlib>
 #include <cstring>
+#include <map>
+#include <memory>
+#include <mutex>
 #include <stdexcept>
 #include <string>
+#include <vector>
+
+// CURLOPT_CURLU, which lets a prepared request hand libcurl its URL already parsed, needs libcurl 7.63.
+#if LIBCURL_VERSION_NUM >= 0x073f00
+#define HAVE_CURLU 1
+#endif
+
+static int getBodyBuffer(PyObject* obj, Py_buffer* view) {
+    if (PyUnicode_Check(obj)) {
+        Py_ssize_t size;
+        const char* data = PyUnicode_AsUTF8AndSize(obj, &size);
+        if (!data) return -1;
+        return PyBuffer_FillInfo(view, obj, (void*)data, size, 1, PyBUF_SIMPLE);
+    }
+    return PyObject_GetBuffer(obj, view, PyBUF_SIMPLE);
+}
+
+struct BatchRequest {
+    const char* method = nullptr;
+    const char* url = nullptr;
+    const char* body = nullptr;
+    Py_ssize_t body_size = 0;
+    Py_buffer view = {};
+    struct curl_slist* headers = nullptr;
+
+    BatchRequest() = default;
+    BatchRequest(const BatchRequest&) = delete;
+    BatchRequest& operator=(const BatchRequest&) = delete;
+
+    ~BatchRequest() {
+        PyBuffer_Release(&view);
+    }
+
+    bool setBody(PyObject* obj) {
+        if (obj == Py_None) return true;
+        if (!PyUnicode_Check(obj) && !PyObject_CheckBuffer(obj)) {
+            PyErr_SetString(PyExc_TypeError, "body must be str or a bytes-like object.");
+            return false;
+        }
+        if (getBodyBuffer(obj, &view) < 0) return false;
+        body = (const char*)view.buf;
+        body_size = view.len;
+        return true;
+    }
+};
+
+class RequestBody {
+public:
+    RequestBody()
+        : view(), chunk(), readinto(nullptr), read(nullptr), iterator(nullptr), offset(0), size(-1),
+          error_type(nullptr), error_value(nullptr), error_traceback(nullptr), headers(nullptr) {}
+
+    RequestBody(const RequestBody&) = delete;
+    RequestBody& operator=(const RequestBody&) = delete;
+
+    ~RequestBody() {
+        PyBuffer_Release(&view);
+        PyBuffer_Release(&chunk);
+        Py_XDECREF(readinto);
+        Py_XDECREF(read);
+        Py_XDECREF(iterator);
+        Py_XDECREF(error_type);
+        Py_XDECREF(error_value);
+        Py_XDECREF(error_traceback);
+        curl_slist_free_all(headers);
+    }
+
+    bool init(PyObject* obj) {
+        if (PyUnicode_Check(obj) || PyObject_CheckBuffer(obj)) {
+            return getBodyBuffer(obj, &view) == 0;
+        }
+
+        if (PyObject_HasAttrString(obj, "readinto")) {
+            readinto = PyObject_GetAttrString(obj, "readinto");
+        } else if (PyObject_HasAttrString(obj, "read")) {
+            read = PyObject_GetAttrString(obj, "read");
+        } else {
+            iterator = PyObject_GetIter(obj);
+            if (!iterator) {
+                PyErr_Clear();
+                PyErr_SetString(PyExc_TypeError, "body must be str, a bytes-like object, a file object or an iterable of chunks.");
+                return false;
+            }
+            return true;
+        }
+        if (!readinto && !read) return false;
+        size = fileSize(obj);
+        return true;
+    }
+
+    bool setContentType(const char* content_type) {
+        if (!content_type) return true;
+        struct curl_slist* appended = curl_slist_append(headers, (std::string("Content-Type: ") + content_type).c_str());
+        if (!appended) {
+            PyErr_NoMemory();
+            return false;
+        }
+        headers = appended;
+        return true;
+    }
+
+    // Gzip an in-memory body of at least threshold bytes. Streamed and incompressible bodies are sent as is.
+    void compress(Py_ssize_t threshold, int level) {
+        if (threshold <= 0 || !view.obj || view.len < threshold || view.len > (Py_ssize_t)UINT_MAX) return;
+
+        z_stream stream;
+        memset(&stream, 0, sizeof(stream));
+        if (deflateInit2(&stream, level, Z_DEFLATED, 15 + 16, 8, Z_DEFAULT_STRATEGY) != Z_OK) {
+            throw std::runtime_error("Failed to initialize gzip compression.");
+        }
+        uLong bound = deflateBound(&stream, (uLong)view.len);
+        if (bound > UINT_MAX) {
+            deflateEnd(&stream);
+            return;
+        }
+        std::string output(bound, '\0');
+
+        int rc;
+        stream.next_in = (Bytef*)view.buf;
+        stream.avail_in = (uInt)view.len;
+        stream.next_out = (Bytef*)&output[0];
+        stream.avail_out = (uInt)bound;
+        Py_BEGIN_ALLOW_THREADS
+        rc = deflate(&stream, Z_FINISH);
+        Py_END_ALLOW_THREADS
+        output.resize(stream.total_out);
+        deflateEnd(&stream);
+
+        if (rc != Z_STREAM_END) throw std::runtime_error("Failed to compress the request body.");
+        if (output.size() >= (size_t)view.len) return;
+
+        struct curl_slist* appended = curl_slist_append(headers, "Content-Encoding: gzip");
+        if (!appended) throw std::bad_alloc();
+        headers = appended;
+        compressed.swap(output);
+    }
+
+    void apply(CURL* curl) {
+        curl_easy_setopt(curl, CURLOPT_HTTPHEADER, headers);
+        if (!compressed.empty()) {
+            curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)compressed.size());
+            curl_easy_setopt(curl, CURLOPT_POSTFIELDS, compressed.data());
+            return;
+        }
+        if (view.obj) {
+            curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)view.len);
+            curl_easy_setopt(curl, CURLOPT_POSTFIELDS, view.buf);
+            return;
+        }
+
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDS, nullptr);
+        curl_easy_setopt(curl, CURLOPT_POST, 1L);
+        curl_easy_setopt(curl, CURLOPT_READFUNCTION, ReadCallback);
+        curl_easy_setopt(curl, CURLOPT_READDATA, this);
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, size);
+    }
+
+    bool restoreError() {
+        if (!error_type) return false;
+        PyErr_Restore(error_type, error_value, error_traceback);
+        error_type = error_value = error_traceback = nullptr;
+        return true;
+    }
+
+private:
+    Py_buffer view;
+    Py_buffer chunk;
+    PyObject* readinto;
+    PyObject* read;
+    PyObject* iterator;
+    Py_ssize_t offset;
+    curl_off_t size;
+    PyObject* error_type;
+    PyObject* error_value;
+    PyObject* error_traceback;
+    std::string compressed;
+    struct curl_slist* headers;
+
+    static curl_off_t fileSize(PyObject* file) {
+        struct stat st;
+        PyObject* fileno = PyObject_CallMethod(file, "fileno", nullptr);
+        int fd = fileno ? (int)PyLong_AsLong(fileno) : -1;
+        Py_XDECREF(fileno);
+        if (PyErr_Occurred() || fstat(fd, &st) != 0 || !S_ISREG(st.st_mode)) {
+            PyErr_Clear();
+            return -1;
+        }
+
+        PyObject* position = PyObject_CallMethod(file, "tell", nullptr);
+        long long offset = position ? PyLong_AsLongLong(position) : -1;
+        Py_XDECREF(position);
+        if (PyErr_Occurred() || offset < 0 || offset > (long long)st.st_size) {
+            PyErr_Clear();
+            return -1;
+        }
+        return (curl_off_t)(st.st_size - offset);
+    }
+
+    static size_t ReadCallback(char* dest, size_t size, size_t nitems, void* userp) {
+        RequestBody* body = (RequestBody*)userp;
+        PyGILState_STATE gil = PyGILState_Ensure();
+        size_t copied = body->fill(dest, size * nitems);
+        if (PyErr_Occurred()) {
+            PyErr_Fetch(&body->error_type, &body->error_value, &body->error_traceback);
+            copied = CURL_READFUNC_ABORT;
+        }
+        PyGILState_Release(gil);
+        return copied;
+    }
+
+    size_t fill(char* dest, size_t capacity) {
+        while (true) {
+            if (chunk.obj) {
+                size_t copied = std::min((size_t)(chunk.len - offset), capacity);
+                memcpy(dest, (const char*)chunk.buf + offset, copied);
+                offset += (Py_ssize_t)copied;
+                if (offset >= chunk.len) {
+                    PyBuffer_Release(&chunk);
+                    offset = 0;
+                }
+                if (copied > 0) return copied;
+                continue;
+            }
+
+            if (readinto) {
+                PyObject* memory = PyMemoryView_FromMemory(dest, (Py_ssize_t)capacity, PyBUF_WRITE);
+                PyObject* result = memory ? PyObject_CallFunctionObjArgs(readinto, memory, nullptr) : nullptr;
+                Py_XDECREF(memory);
+                if (!result) return 0;
+                Py_ssize_t count = result == Py_None ? 0 : PyLong_AsSsize_t(result);
+                Py_DECREF(result);
+                if ((count < 0 || (size_t)count > capacity) && !PyErr_Occurred()) {
+                    PyErr_SetString(PyExc_ValueError, "readinto() returned an invalid byte count.");
+                }
+                return PyErr_Occurred() ? 0 : (size_t)count;
+            }
+
+            PyObject* next;
+            if (read) {
+                next = PyObject_CallFunction(read, "n", (Py_ssize_t)capacity);
+            } else {
+                next = PyIter_Next(iterator);
+            }
+            if (!next) return 0;
+            int rc = getBodyBuffer(next, &chunk);
+            Py_DECREF(next);
+            if (rc < 0) return 0;
+            if (chunk.len == 0) {
+                PyBuffer_Release(&chunk);
+                if (read) return 0;
+            }
+        }
+    }
+};
+
+struct Transfer {
+    CURL* curl;
+    Py_ssize_t index;
+    std::string response_data;
+    std::string header_data;
+};
 
 static size_t WriteCallback(void* contents, size_t size, size_t nmemb, void* userp) {
     std::string* response = (std::string*)userp;
@@ -35,8 +307,354 @@ static size_t WriteCallback(void* contents, size_t size, size_t nmemb, void* use
     return total_size;
 }
 
+// Put a handle back into the state of a plain GET without body or extra headers, so a request never inherits
+// the method, body or headers of the one before it. POSTFIELDS goes first because setting it switches the
+// handle to POST, and HTTPGET also clears NOBODY and UPLOAD.
+static void resetRequest(CURL* curl) {
+    curl_easy_setopt(curl, CURLOPT_POSTFIELDS, nullptr);
+    curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)-1);
+    curl_easy_setopt(curl, CURLOPT_READFUNCTION, nullptr);
+    curl_easy_setopt(curl, CURLOPT_READDATA, nullptr);
+    curl_easy_setopt(curl, CURLOPT_HTTPGET, 1L);
+    curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, nullptr);
+    curl_easy_setopt(curl, CURLOPT_HTTPHEADER, nullptr);
+#ifdef HAVE_CURLU
+    curl_easy_setopt(curl, CURLOPT_CURLU, nullptr);
+#endif
+}
+
+static void applyRequest(CURL* curl, const BatchRequest& request) {
+    resetRequest(curl);
+    curl_easy_setopt(curl, CURLOPT_URL, request.url);
+
+    if (strcmp(request.method, "HEAD") == 0) {
+        curl_easy_setopt(curl, CURLOPT_NOBODY, 1L);
+    } else if (strcmp(request.method, "GET") != 0) {
+        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, request.method);
+    }
+
+    if (request.body) {
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)request.body_size);
+        curl_easy_setopt(curl, CURLOPT_POSTFIELDS, request.body);
+    }
+    curl_easy_setopt(curl, CURLOPT_HTTPHEADER, request.headers);
+}
+
+class Prepared {
+public:
+    std::string method;
+    std::string url;
+    std::string body;
+    bool has_body;
+#ifdef HAVE_CURLU
+    CURLU* curlu;
+#endif
+    struct curl_slist* headers;
+
+    Prepared(const char* method, const char* url)
+        : method(method), url(url), has_body(false),
+#ifdef HAVE_CURLU
+          curlu(curl_url()),
+#endif
+          headers(nullptr) {
+        if (this->method.empty()) throw std::invalid_argument("method must not be empty.");
+#ifdef HAVE_CURLU
+        if (!curlu) throw std::bad_alloc();
+        CURLUcode rc = curl_url_set(curlu, CURLUPART_URL, url, CURLU_GUESS_SCHEME);
+        if (rc != CURLUE_OK) {
+            curl_url_cleanup(curlu);
+#if LIBCURL_VERSION_NUM >= 0x075000
+            throw std::invalid_argument(std::string("Invalid URL: ") + curl_url_strerror(rc));
+#else
+            throw std::invalid_argument("Invalid URL (error " + std::to_string((int)rc) + ").");
+#endif
+        }
+#endif
+    }
+
+    Prepared(const Prepared&) = delete;
+    Prepared& operator=(const Prepared&) = delete;
+
+    ~Prepared() {
+#ifdef HAVE_CURLU
+        curl_url_cleanup(curlu);
+#endif
+        curl_slist_free_all(headers);
+    }
+
+    void addHeader(const std::string& header) {
+        struct curl_slist* appended = curl_slist_append(headers, header.c_str());
+        if (!appended) throw std::bad_alloc();
+        headers = appended;
+    }
+
+    // Accepts a mapping of names to values or an iterable of "Name: value" strings.
+    bool setHeaders(PyObject* obj) {
+        PyObject* items = PyObject_HasAttrString(obj, "items") ? PyObject_CallMethod(obj, "items", NULL) : nullptr;
+        if (!items && PyErr_Occurred()) return false;
+        PyObject* iterator = PyObject_GetIter(items ? items : obj);
+        Py_XDECREF(items);
+        if (!iterator) return false;
+
+        PyObject* item;
+        while ((item = PyIter_Next(iterator))) {
+            PyObject* header = PyTuple_Check(item) && PyTuple_GET_SIZE(item) == 2
+                ? PyUnicode_FromFormat("%S: %S", PyTuple_GET_ITEM(item, 0), PyTuple_GET_ITEM(item, 1))
+                : (Py_INCREF(item), item);
+            Py_DECREF(item);
+            const char* value = header && PyUnicode_Check(header) ? PyUnicode_AsUTF8(header) : nullptr;
+            if (value) addHeader(value);
+            Py_XDECREF(header);
+            if (!value) {
+                if (!PyErr_Occurred()) {
+                    PyErr_SetString(PyExc_TypeError, "headers must be a mapping or an iterable of \"Name: value\" strings.");
+                }
+                Py_DECREF(iterator);
+                return false;
+            }
+        }
+        Py_DECREF(iterator);
+        return !PyErr_Occurred();
+    }
+
+    // Keep a private copy so the request does not change when a bytearray it was built from does.
+    bool setBody(PyObject* obj) {
+        if (!PyUnicode_Check(obj) && !PyObject_CheckBuffer(obj)) {
+            PyErr_SetString(PyExc_TypeError, "body must be None, str or a bytes-like object.");
+            return false;
+        }
+        Py_buffer view;
+        if (getBodyBuffer(obj, &view) < 0) return false;
+        body.assign((const char*)view.buf, view.len);
+        has_body = true;
+        PyBuffer_Release(&view);
+        return true;
+    }
+
+    // Set every option of the request on a handle in its plain GET state.
+    void apply(CURL* curl) const {
+#ifdef HAVE_CURLU
+        curl_easy_setopt(curl, CURLOPT_CURLU, curlu);
+#else
+        curl_easy_setopt(curl, CURLOPT_URL, url.c_str());
+#endif
+        if (has_body) {
+            curl_easy_setopt(curl, CURLOPT_POSTFIELDSIZE_LARGE, (curl_off_t)body.size());
+            curl_easy_setopt(curl, CURLOPT_POSTFIELDS, body.data());
+        }
+        if (method == "HEAD") {
+            curl_easy_setopt(curl, CURLOPT_NOBODY, 1L);
+        } else if (method != (has_body ? "POST" : "GET")) {
+            curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, method.c_str());
+        }
+        curl_easy_setopt(curl, CURLOPT_HTTPHEADER, headers);
+    }
+};
+
+struct Timing {
+    CURLcode result = CURLE_OK;
+    long status = 0;
+    curl_off_t namelookup = 0;
+    curl_off_t connect = 0;
+    curl_off_t appconnect = 0;
+    curl_off_t pretransfer = 0;
+    curl_off_t starttransfer = 0;
+    curl_off_t total = 0;
+    curl_off_t size_download = 0;
+    curl_off_t size_upload = 0;
+    long num_connects = 0;
+
+    void capture(CURL* curl, CURLcode res) {
+        *this = Timing();
+        result = res;
+        curl_easy_getinfo(curl, CURLINFO_RESPONSE_CODE, &status);
+        curl_easy_getinfo(curl, CURLINFO_NAMELOOKUP_TIME_T, &namelookup);
+        curl_easy_getinfo(curl, CURLINFO_CONNECT_TIME_T, &connect);
+        curl_easy_getinfo(curl, CURLINFO_APPCONNECT_TIME_T, &appconnect);
+        curl_easy_getinfo(curl, CURLINFO_PRETRANSFER_TIME_T, &pretransfer);
+        curl_easy_getinfo(curl, CURLINFO_STARTTRANSFER_TIME_T, &starttransfer);
+        curl_easy_getinfo(curl, CURLINFO_TOTAL_TIME_T, &total);
+        curl_easy_getinfo(curl, CURLINFO_SIZE_DOWNLOAD_T, &size_download);
+        curl_easy_getinfo(curl, CURLINFO_SIZE_UPLOAD_T, &size_upload);
+        curl_easy_getinfo(curl, CURLINFO_NUM_CONNECTS, &num_connects);
+    }
+
+    PyObject* toDict() const {
+        return Py_BuildValue("{s:l,s:d,s:d,s:d,s:d,s:d,s:d,s:L,s:L,s:l,s:O,s:z}",
+            "status", status,
+            "namelookup_time", seconds(namelookup),
+            "connect_time", seconds(connect),
+            "appconnect_time", seconds(appconnect),
+            "pretransfer_time", seconds(pretransfer),
+            "starttransfer_time", seconds(starttransfer),
+            "total_time", seconds(total),
+            "size_download", (long long)size_download,
+            "size_upload", (long long)size_upload,
+            "num_connects", num_connects,
+            "connection_reused", num_connects == 0 && result == CURLE_OK ? Py_True : Py_False,
+            "error", result == CURLE_OK ? nullptr : curl_easy_strerror(result));
+    }
+
+    static double seconds(curl_off_t microseconds) {
+        return (double)microseconds / 1000000.0;
+    }
+};
+
+class HostStats {
+public:
+    static const size_t SUB_BUCKETS = 64;
+    static const size_t BUCKETS = SUB_BUCKETS * 32;
+
+    HostStats()
+        : counts(BUCKETS), count(0), errors(0), new_connections(0), reused_connections(0), min(0), max(0),
+          total(0), namelookup(0), connect(0), appconnect(0), wait(0), transfer(0) {}
+
+    void record(const Timing& timing) {
+        if (timing.result != CURLE_OK) {
+            errors++;
+            return;
+        }
+
+        counts[bucket(timing.total)]++;
+        if (count == 0 || timing.total < min) min = timing.total;
+        if (timing.total > max) max = timing.total;
+        count++;
+        total += timing.total;
+        namelookup += timing.namelookup;
+        connect += std::max<curl_off_t>(timing.connect - timing.namelookup, 0);
+        appconnect += std::max<curl_off_t>(timing.appconnect - timing.connect, 0);
+        wait += std::max<curl_off_t>(timing.starttransfer - timing.pretransfer, 0);
+        transfer += std::max<curl_off_t>(timing.total - timing.starttransfer, 0);
+        if (timing.num_connects > 0) {
+            new_connections += (uint64_t)timing.num_connects;
+        } else {
+            reused_connections++;
+        }
+    }
+
+    PyObject* toDict() const {
+        double n = count ? (double)count : 1.0;
+        return Py_BuildValue("{s:K,s:K,s:K,s:K,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d}",
+            "count", (unsigned long long)count,
+            "errors", (unsigned long long)errors,
+            "new_connections", (unsigned long long)new_connections,
+            "reused_connections", (unsigned long long)reused_connections,
+            "min", Timing::seconds(min),
+            "max", Timing::seconds(max),
+            "mean", Timing::seconds(total) / n,
+            "p50", Timing::seconds(percentile(50.0)),
+            "p90", Timing::seconds(percentile(90.0)),
+            "p95", Timing::seconds(percentile(95.0)),
+            "p99", Timing::seconds(percentile(99.0)),
+            "p999", Timing::seconds(percentile(99.9)),
+            "dns", Timing::seconds(namelookup) / n,
+            "connect", Timing::seconds(connect) / n,
+            "tls", Timing::seconds(appconnect) / n,
+            "wait", Timing::seconds(wait) / n,
+            "transfer", Timing::seconds(transfer) / n);
+    }
+
+private:
+    std::vector<uint64_t> counts;
+    uint64_t count;
+    uint64_t errors;
+    uint64_t new_connections;
+    uint64_t reused_connections;
+    curl_off_t min;
+    curl_off_t max;
+    curl_off_t total;
+    curl_off_t namelookup;
+    curl_off_t connect;
+    curl_off_t appconnect;
+    curl_off_t wait;
+    curl_off_t transfer;
+
+    static size_t bucket(curl_off_t value) {
+        if (value < (curl_off_t)SUB_BUCKETS * 2) return value < 0 ? 0 : (size_t)value;
+
+        unsigned int shift = 0;
+        while ((value >> shift) >= (curl_off_t)SUB_BUCKETS * 2) shift++;
+        size_t index = SUB_BUCKETS * (shift + 1) + (size_t)((value >> shift) - (curl_off_t)SUB_BUCKETS);
+        return std::min(index, BUCKETS - 1);
+    }
+
+    static curl_off_t bucketMax(size_t index) {
+        if (index < SUB_BUCKETS * 2) return (curl_off_t)index;
+
+        unsigned int shift = (unsigned int)(index / SUB_BUCKETS) - 1;
+        curl_off_t top = (curl_off_t)(index % SUB_BUCKETS + SUB_BUCKETS);
+        return ((top + 1) << shift) - 1;
+    }
+
+    curl_off_t percentile(double percent) const {
+        uint64_t target = std::max<uint64_t>((uint64_t)(percent / 100.0 * (double)count + 0.5), 1);
+        uint64_t seen = 0;
+        for (size_t i = 0; i < BUCKETS; i++) {
+            seen += counts[i];
+            if (seen >= target) return std::min(bucketMax(i), max);
+        }
+        return max;
+    }
+};
+
+// Updated with the GIL held, which serializes sessions that share one Stats.
+class Stats {
+public:
+    void record(CURL* curl, const Timing& timing) {
+        const char* url = nullptr;
+        curl_easy_getinfo(curl, CURLINFO_EFFECTIVE_URL, &url);
+        std::string host(url ? url : "");
+
+        size_t start = host.find("://");
+        start = start == std::string::npos ? 0 : start + 3;
+        size_t end = host.find_first_of("/?#", start);
+        host = host.substr(start, end == std::string::npos ? std::string::npos : end - start);
+        size_t at = host.find('@');
+        if (at != std::string::npos) host.erase(0, at + 1);
+
+        hosts[host].record(timing);
+    }
+
+    PyObject* snapshot(bool reset) {
+        PyObject* result = PyDict_New();
+        if (!result) return NULL;
+        for (const auto& entry : hosts) {
+            PyObject* host = entry.second.toDict();
+            if (!host || PyDict_SetItemString(result, entry.first.c_str(), host) < 0) {
+                Py_XDECREF(host);
+                Py_DECREF(result);
+                return NULL;
+            }
+            Py_DECREF(host);
+        }
+        if (reset) hosts.clear();
+        return result;
+    }
+
+private:
+    std::map<std::string, HostStats> hosts;
+};
+
+// Reads a cookie file through a handle of its own and returns its cookies as Netscape cookie file lines. libcurl
+// reads every CURLOPT_COOKIEFILE again at the start of each transfer, so sessions load the file once this way.
+static struct curl_slist* readCookieFile(const char* cookie_file) {
+    CURL* curl = curl_easy_init();
+    if (!curl) throw std::runtime_error("Failed to initialize curl handle.");
+    struct curl_slist* lines = nullptr;
+    CURLcode res = curl_easy_setopt(curl, CURLOPT_COOKIEFILE, cookie_file);
+    if (res == CURLE_OK) res = curl_easy_setopt(curl, CURLOPT_COOKIELIST, "RELOAD");
+    if (res == CURLE_OK) res = curl_easy_getinfo(curl, CURLINFO_COOKIELIST, &lines);
+    curl_easy_cleanup(curl);
+    if (res != CURLE_OK) {
+        throw std::runtime_error(std::string("Failed to load cookies: ") + curl_easy_strerror(res));
+    }
+    return lines;
+}
+
 class Session {
 public:
+    static const size_t RETAINED_CAPACITY = 1024 * 1024;
+
     CURL *curl;
     char *user_agent;
     char *proxy;
@@ -45,18 +663,46 @@ public:
     char *ssl_key;
     long timeout;
     std::string response_data;
+    std::string header_data;
+    CURLM *multi;
+    std::mutex mutex;
+    Timing timing;
+    bool has_timing;
+    PyObject *stats;
+    long max_streams;
+    long max_connections;
+    Py_ssize_t compress_threshold;
+    int compress_level;
+    // The Prepared capsule whose options are set on curl, or nullptr when curl is in its plain GET state.
+    PyObject *prepared;
+    // The CURLOPT_RESOLVE entries from set_resolve(). Handles duplicated for the length of a call borrow it.
+    struct curl_slist *resolve;
 
     Session() 
         : curl(curl_easy_init()), user_agent(nullptr), proxy(nullptr),
-          cookie_file(nullptr), ssl_cert(nullptr), ssl_key(nullptr), timeout(0) {}
+          cookie_file(nullptr), ssl_cert(nullptr), ssl_key(nullptr), timeout(0), multi(nullptr),
+          has_timing(false), stats(nullptr), max_streams(0), max_connections(0), compress_threshold(0),
+          compress_level(Z_DEFAULT_COMPRESSION), prepared(nullptr), resolve(nullptr) {
+        if (!curl) throw std::runtime_error("Failed to initialize curl handle.");
+        curl_easy_setopt(curl, CURLOPT_NOSIGNAL, 1L);
+        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, WriteCallback);
+        curl_easy_setopt(curl, CURLOPT_WRITEDATA, &response_data);
+        curl_easy_setopt(curl, CURLOPT_HEADERFUNCTION, WriteCallback);
+        curl_easy_setopt(curl, CURLOPT_HEADERDATA, &header_data);
+        curl_easy_setopt(curl, CURLOPT_HTTP_VERSION, CURL_HTTP_VERSION_1_1);
+    }
 
     ~Session() {
         curl_easy_cleanup(curl);
+        Py_XDECREF(prepared);
+        if (multi) curl_multi_cleanup(multi);
         free(user_agent);
         free(proxy);
         free(cookie_file);
         free(ssl_cert);
         free(ssl_key);
+        Py_XDECREF(stats);
+        curl_slist_free_all(resolve);
     }
 
     void setUserAgent(const char* agent) {
@@ -71,113 +717,1440 @@ public:
         curl_easy_setopt(curl, CURLOPT_PROXY, this->proxy);
     }
 
-    void setCookieFile(const char* cookie_file) {
+    // Adds lines, the cookies read from cookie_file by readCookieFile(), to the jar and writes the jar back to the
+    // file when the session is closed or flushCookies() is called.
+    void setCookieFile(const char* cookie_file, const struct curl_slist* lines) {
         if (this->cookie_file) free(this->cookie_file);
+        else curl_easy_setopt(curl, CURLOPT_COOKIEFILE, "");
         this->cookie_file = strdup(cookie_file);
+        for (; lines; lines = lines->next) {
+            curl_easy_setopt(curl, CURLOPT_COOKIELIST, lines->data);
+        }
         curl_easy_setopt(curl, CURLOPT_COOKIEJAR, this->cookie_file);
     }
 
-    void setSslCert(const char* ssl_cert) {
-        if (this->ssl_cert) free(this->ssl_cert);
-        this->ssl_cert = strdup(ssl_cert);
-        curl_easy_setopt(curl, CURLOPT_SSLCERT, this->ssl_cert);
+    void flushCookies() {
+        if (!cookie_file) throw std::invalid_argument("No cookie file is set.");
+        CURLcode res = curl_easy_setopt(curl, CURLOPT_COOKIELIST, "FLUSH");
+        if (res != CURLE_OK) {
+            throw std::runtime_error(std::string("Failed to flush cookies: ") + curl_easy_strerror(res));
+        }
+    }
+
+    // The cookies in the jar as Netscape cookie file lines; the caller frees the list.
+    struct curl_slist* cookies() {
+        struct curl_slist* lines = nullptr;
+        CURLcode res = curl_easy_getinfo(curl, CURLINFO_COOKIELIST, &lines);
+        if (res != CURLE_OK) {
+            throw std::runtime_error(std::string("Failed to get cookies: ") + curl_easy_strerror(res));
+        }
+        return lines;
+    }
+
+    void setSslCert(const char* ssl_cert) {
+        if (this->ssl_cert) free(this->ssl_cert);
+        this->ssl_cert = strdup(ssl_cert);
+        curl_easy_setopt(curl, CURLOPT_SSLCERT, this->ssl_cert);
+    }
+
+    void setSslKey(const char* ssl_key) {
+        if (this->ssl_key) free(this->ssl_key);
+        this->ssl_key = strdup(ssl_key);
+        curl_easy_setopt(curl, CURLOPT_SSLKEY, this->ssl_key);
+    }
+
+    void setTimeout(long timeout) {
+        this->timeout = timeout;
+        curl_easy_setopt(curl, CURLOPT_TIMEOUT, timeout);
+    }
+
+    void setHttpVersion(long version) {
+        if (version != CURL_HTTP_VERSION_1_1 && version != CURL_HTTP_VERSION_2TLS &&
+            version != CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE) {
+            throw std::invalid_argument("version must be HTTP_1_1, HTTP_2 or HTTP_2_PRIOR_KNOWLEDGE.");
+        }
+        CURLcode res = curl_easy_setopt(curl, CURLOPT_HTTP_VERSION, version);
+        if (res != CURLE_OK) {
+            throw std::runtime_error(std::string("Failed to set HTTP version: ") + curl_easy_strerror(res));
+        }
+        // Wait for a connection that may multiplex rather than opening a new one per request.
+        curl_easy_setopt(curl, CURLOPT_PIPEWAIT, version != CURL_HTTP_VERSION_1_1 ? 1L : 0L);
+    }
+
+    void setMaxConcurrentStreams(long max_streams) {
+        if (max_streams < 0) throw std::invalid_argument("max_streams must not be negative.");
+        this->max_streams = max_streams;
+    }
+
+    void setTcpOptions(bool nodelay, long keepalive_idle, long keepalive_interval, bool fastopen) {
+        if (keepalive_idle < 0 || keepalive_interval < 0) {
+            throw std::invalid_argument("keepalive_idle and keepalive_interval must not be negative.");
+        }
+        curl_easy_setopt(curl, CURLOPT_TCP_NODELAY, nodelay ? 1L : 0L);
+        curl_easy_setopt(curl, CURLOPT_TCP_KEEPALIVE, keepalive_idle > 0 ? 1L : 0L);
+        if (keepalive_idle > 0) {
+            curl_easy_setopt(curl, CURLOPT_TCP_KEEPIDLE, keepalive_idle);
+            curl_easy_setopt(curl, CURLOPT_TCP_KEEPINTVL, keepalive_interval > 0 ? keepalive_interval : keepalive_idle);
+        }
+        // TCP Fast Open is not available on every platform; only asking for it can fail.
+        CURLcode res = curl_easy_setopt(curl, CURLOPT_TCP_FASTOPEN, fastopen ? 1L : 0L);
+        if (res != CURLE_OK && fastopen) {
+            throw std::runtime_error(std::string("Failed to enable TCP Fast Open: ") + curl_easy_strerror(res));
+        }
+    }
+
+    void setMaxConnectionAge(long max_age) {
+        if (max_age < 0) throw std::invalid_argument("max_age must not be negative.");
+#if LIBCURL_VERSION_NUM >= 0x075000
+        CURLcode res = curl_easy_setopt(curl, CURLOPT_MAXLIFETIME_CONN, max_age);
+        if (res != CURLE_OK) {
+            throw std::runtime_error(std::string("Failed to set the maximum connection age: ") + curl_easy_strerror(res));
+        }
+#else
+        throw std::runtime_error("The maximum connection age needs libcurl 7.80.0 or later.");
+#endif
+    }
+
+    void setMaxConnections(long max_connections) {
+        if (max_connections < 0) throw std::invalid_argument("max_connections must not be negative.");
+        this->max_connections = max_connections;
+        // 5 is libcurl's default for an easy handle's own connection cache.
+        curl_easy_setopt(curl, CURLOPT_MAXCONNECTS, max_connections > 0 ? max_connections : 5L);
+    }
+
+    void setCaFile(const char* ca_file) {
+        CURLcode res = curl_easy_setopt(curl, CURLOPT_CAINFO, ca_file);
+        if (res != CURLE_OK) {
+            throw std::runtime_error(std::string("Failed to set CA file: ") + curl_easy_strerror(res));
+        }
+    }
+
+    void setAcceptEncoding(const char* encodings) {
+        CURLcode res = curl_easy_setopt(curl, CURLOPT_ACCEPT_ENCODING, encodings);
+        if (res != CURLE_OK) {
+            throw std::runtime_error(std::string("Failed to set accepted encodings: ") + curl_easy_strerror(res));
+        }
+    }
+
+    void setRequestCompression(Py_ssize_t threshold, int level) {
+        if (threshold < 0) throw std::invalid_argument("threshold must not be negative.");
+        if (level < Z_DEFAULT_COMPRESSION || level > Z_BEST_COMPRESSION) {
+            throw std::invalid_argument("level must be between -1 and 9.");
+        }
+        compress_threshold = threshold;
+        compress_level = level;
+    }
+
+    void resetResponse() {
+        if (response_data.capacity() > RETAINED_CAPACITY) {
+            std::string().swap(response_data);
+        }
+        response_data.clear();
+        header_data.clear();
+    }
+
+    // Duplicate the handle for a transfer that ends before the session lock is released. A transfer that may
+    // outlive the call must set CURLOPT_RESOLVE to its own copy of the list, because setResolve() frees it.
+    CURL* duphandle() {
+        CURL* handle = curl_easy_duphandle(curl);
+        if (handle) {
+            curl_easy_setopt(handle, CURLOPT_HEADERFUNCTION, nullptr);
+            curl_easy_setopt(handle, CURLOPT_HEADERDATA, nullptr);
+            curl_easy_setopt(handle, CURLOPT_RESOLVE, resolve);
+            resetRequest(handle);
+        }
+        return handle;
+    }
+
+    // Pin host names to addresses. Takes ownership of list; libcurl loads the entries into the DNS cache at the
+    // start of the next transfer as entries that never expire.
+    void setResolve(struct curl_slist* list) {
+        struct curl_slist* previous = resolve;
+        resolve = list;
+        curl_easy_setopt(curl, CURLOPT_RESOLVE, list);
+        curl_slist_free_all(previous);
+    }
+
+    // Free the curl handle and its connections. Called with the session locked; later requests throw.
+    void close() {
+        curl_easy_cleanup(curl);
+        curl = nullptr;
+        if (multi) curl_multi_cleanup(multi);
+        multi = nullptr;
+        std::string().swap(response_data);
+        std::string().swap(header_data);
+    }
+
+    // Drop the options of the prepared request last executed on the session, if any.
+    void unprepare() {
+        if (prepared) {
+            resetRequest(curl);
+            Py_CLEAR(prepared);
+        }
+    }
+
+    PyObject* response() {
+        PyObject* result = PyTuple_New(3);
+        if (!result) return NULL;
+        PyObject* status = PyLong_FromLong(timing.status);
+        PyObject* body = PyBytes_FromStringAndSize(response_data.data(), response_data.size());
+        PyObject* headers = PyBytes_FromStringAndSize(header_data.data(), header_data.size());
+        PyTuple_SET_ITEM(result, 0, status);
+        PyTuple_SET_ITEM(result, 1, body);
+        PyTuple_SET_ITEM(result, 2, headers);
+        if (!status || !body || !headers) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        return result;
+    }
+
+    CURLcode perform() {
+        CURLcode res;
+        Py_BEGIN_ALLOW_THREADS
+        res = curl_easy_perform(curl);
+        Py_END_ALLOW_THREADS
+        record(curl, res);
+        return res;
+    }
+
+    void record(CURL* handle, CURLcode res) {
+        timing.capture(handle, res);
+        has_timing = true;
+        if (stats) {
+            Stats* aggregator = (Stats*)PyCapsule_GetPointer(stats, "Stats");
+            if (aggregator) aggregator->record(handle, timing);
+        }
+    }
+
+    PyObject* httpGet(const char* url) {
+        unprepare();
+        curl_easy_setopt(curl, CURLOPT_URL, url);
+        resetResponse();
+
+        CURLcode res = perform();
+        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+
+        return response();
+    }
+
+    PyObject* httpPost(const char* url, RequestBody& body) {
+        body.compress(compress_threshold, compress_level);
+        unprepare();
+        curl_easy_setopt(curl, CURLOPT_URL, url);
+        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, "POST");
+        body.apply(curl);
+        resetResponse();
+
+        CURLcode res = perform();
+        resetRequest(curl);
+        if (res != CURLE_OK) {
+            if (body.restoreError()) return NULL;
+            throw std::runtime_error(curl_easy_strerror(res));
+        }
+
+        return response();
+    }
+
+    PyObject* httpPut(const char* url, RequestBody& body) {
+        body.compress(compress_threshold, compress_level);
+        unprepare();
+        curl_easy_setopt(curl, CURLOPT_URL, url);
+        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, "PUT");
+        body.apply(curl);
+        resetResponse();
+
+        CURLcode res = perform();
+        resetRequest(curl);
+        if (res != CURLE_OK) {
+            if (body.restoreError()) return NULL;
+            throw std::runtime_error(curl_easy_strerror(res));
+        }
+
+        return response();
+    }
+
+    PyObject* httpDelete(const char* url) {
+        unprepare();
+        curl_easy_setopt(curl, CURLOPT_URL, url);
+        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, "DELETE");
+        resetResponse();
+
+        CURLcode res = perform();
+        resetRequest(curl);
+        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+
+        return response();
+    }
+
+    PyObject* httpHead(const char* url) {
+        unprepare();
+        curl_easy_setopt(curl, CURLOPT_URL, url);
+        curl_easy_setopt(curl, CURLOPT_NOBODY, 1L);
+        resetResponse();
+
+        CURLcode res = perform();
+        resetRequest(curl);
+        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+
+        return response();
+    }
+
+    // Running the same prepared request again needs no setopt at all; the session keeps a reference to it so
+    // the URL handle, header list and body it points curl at stay alive.
+    PyObject* httpPrepared(PyObject* capsule, const Prepared& request) {
+        if (prepared != capsule) {
+            unprepare();
+            request.apply(curl);
+            Py_INCREF(capsule);
+            prepared = capsule;
+        }
+        resetResponse();
+
+        CURLcode res = perform();
+        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+
+        return response();
+    }
+
+    void prepareMulti() {
+        if (!multi) {
+            multi = curl_multi_init();
+            if (!multi) throw std::runtime_error("Failed to initialize curl multi handle.");
+        }
+        curl_multi_setopt(multi, CURLMOPT_PIPELINING, CURLPIPE_MULTIPLEX);
+        if (max_streams > 0) {
+            curl_multi_setopt(multi, CURLMOPT_MAX_CONCURRENT_STREAMS, max_streams);
+        }
+        curl_multi_setopt(multi, CURLMOPT_MAXCONNECTS, max_connections);
+    }
+
+    // Open connections ahead of the first real request with HEAD requests whose answers are dropped. libcurl does
+    // not hand CURLOPT_CONNECT_ONLY connections to later transfers, so a request is the only way to park a
+    // connection in a cache. The session handle and the multi handle behind batches and hedging keep separate
+    // caches, so the handle gets one connection per URL and the multi handle per_host. Returns
+    // {url: (connections opened, error or None)}.
+    PyObject* warm(PyObject* items, const std::vector<const char*>& urls, Py_ssize_t per_host) {
+        std::vector<long> connections(urls.size(), 0);
+        std::vector<CURLcode> errors(urls.size(), CURLE_OK);
+
+        unprepare();
+        curl_easy_setopt(curl, CURLOPT_NOBODY, 1L);
+        for (size_t i = 0; i < urls.size(); i++) {
+            long opened = 0;
+            curl_easy_setopt(curl, CURLOPT_URL, urls[i]);
+            CURLcode res;
+            Py_BEGIN_ALLOW_THREADS
+            res = curl_easy_perform(curl);
+            Py_END_ALLOW_THREADS
+            curl_easy_getinfo(curl, CURLINFO_NUM_CONNECTS, &opened);
+            connections[i] += opened;
+            if (res != CURLE_OK) errors[i] = res;
+        }
+        resetRequest(curl);
+        resetResponse();
+
+        if (!urls.empty()) warmMulti(urls, per_host, connections, errors);
+
+        PyObject* result = PyDict_New();
+        for (size_t i = 0; result && i < urls.size(); i++) {
+            PyObject* value = errors[i] == CURLE_OK
+                ? Py_BuildValue("(lO)", connections[i], Py_None)
+                : Py_BuildValue("(ls)", connections[i], curl_easy_strerror(errors[i]));
+            if (!value || PyDict_SetItem(result, PySequence_Fast_GET_ITEM(items, i), value) < 0) Py_CLEAR(result);
+            Py_XDECREF(value);
+        }
+        return result;
+    }
+
+    void warmMulti(const std::vector<const char*>& urls, Py_ssize_t per_host, std::vector<long>& connections,
+                   std::vector<CURLcode>& errors) {
+        prepareMulti();
+        std::vector<Transfer> transfers(urls.size() * per_host);
+        for (size_t i = 0; i < transfers.size(); i++) {
+            Transfer& transfer = transfers[i];
+            transfer.curl = duphandle();
+            if (!transfer.curl) {
+                for (Transfer& other : transfers) {
+                    if (other.curl) curl_easy_cleanup(other.curl);
+                }
+                throw std::runtime_error("Failed to duplicate curl handle.");
+            }
+            transfer.index = i / per_host;
+            curl_easy_setopt(transfer.curl, CURLOPT_URL, urls[transfer.index]);
+            curl_easy_setopt(transfer.curl, CURLOPT_NOBODY, 1L);
+            curl_easy_setopt(transfer.curl, CURLOPT_WRITEFUNCTION, WriteCallback);
+            curl_easy_setopt(transfer.curl, CURLOPT_WRITEDATA, &transfer.response_data);
+            curl_easy_setopt(transfer.curl, CURLOPT_PRIVATE, &transfer);
+        }
+
+        CURLMcode mc = CURLM_OK;
+        Py_BEGIN_ALLOW_THREADS
+        for (Transfer& transfer : transfers) curl_multi_add_handle(multi, transfer.curl);
+        size_t active = transfers.size();
+        while (active > 0) {
+            int running = 0;
+            mc = curl_multi_perform(multi, &running);
+            if (mc != CURLM_OK) break;
+
+            CURLMsg* msg;
+            int queued;
+            while ((msg = curl_multi_info_read(multi, &queued)) != nullptr) {
+                if (msg->msg != CURLMSG_DONE) continue;
+                Transfer* transfer;
+                long opened = 0;
+                curl_easy_getinfo(msg->easy_handle, CURLINFO_PRIVATE, (char**)&transfer);
+                curl_easy_getinfo(msg->easy_handle, CURLINFO_NUM_CONNECTS, &opened);
+                connections[transfer->index] += opened;
+                if (msg->data.result != CURLE_OK && errors[transfer->index] == CURLE_OK) {
+                    errors[transfer->index] = msg->data.result;
+                }
+                curl_multi_remove_handle(multi, transfer->curl);
+                active--;
+            }
+
+            if (active > 0) {
+                mc = curl_multi_poll(multi, nullptr, 0, 1000, nullptr);
+                if (mc != CURLM_OK) break;
+            }
+        }
+        for (Transfer& transfer : transfers) {
+            curl_multi_remove_handle(multi, transfer.curl);
+            curl_easy_cleanup(transfer.curl);
+        }
+        Py_END_ALLOW_THREADS
+
+        if (mc != CURLM_OK) throw std::runtime_error(curl_multi_strerror(mc));
+    }
+
+    // Run one request and, while it is still running after hedge_delay, start up to max_hedges duplicates on
+    // other connections. The first copy to succeed wins and the others are cancelled. A copy that fails is
+    // only reported when no other copy is left running or to be started.
+    PyObject* httpHedged(const BatchRequest& request, double hedge_delay, int max_hedges) {
+        prepareMulti();
+
+        std::vector<Transfer> transfers(max_hedges + 1);
+        for (size_t i = 0; i < transfers.size(); i++) {
+            Transfer& transfer = transfers[i];
+            transfer.curl = duphandle();
+            if (!transfer.curl) {
+                for (Transfer& other : transfers) {
+                    if (other.curl) curl_easy_cleanup(other.curl);
+                }
+                throw std::runtime_error("Failed to duplicate curl handle.");
+            }
+            transfer.index = (Py_ssize_t)i;
+            curl_easy_setopt(transfer.curl, CURLOPT_WRITEFUNCTION, WriteCallback);
+            curl_easy_setopt(transfer.curl, CURLOPT_WRITEDATA, &transfer.response_data);
+            curl_easy_setopt(transfer.curl, CURLOPT_HEADERFUNCTION, WriteCallback);
+            curl_easy_setopt(transfer.curl, CURLOPT_HEADERDATA, &transfer.header_data);
+            curl_easy_setopt(transfer.curl, CURLOPT_PRIVATE, &transfer);
+            applyRequest(transfer.curl, request);
+        }
+
+        auto delay = std::chrono::milliseconds((long long)(hedge_delay * 1000.0));
+        Transfer* winner = nullptr;
+        CURLcode winner_res = CURLE_OK;
+        CURLMcode mc = CURLM_OK;
+        size_t started = 0;
+        int active = 0;
+
+        Py_BEGIN_ALLOW_THREADS
+        auto next_hedge = std::chrono::steady_clock::now() + delay;
+        curl_multi_add_handle(multi, transfers[started++].curl);
+        active++;
+
+        while (!winner) {
+            int running = 0;
+            mc = curl_multi_perform(multi, &running);
+            if (mc != CURLM_OK) break;
+
+            CURLMsg* msg;
+            int queued;
+            while (!winner && (msg = curl_multi_info_read(multi, &queued)) != nullptr) {
+                if (msg->msg != CURLMSG_DONE) continue;
+
+                Transfer* transfer;
+                curl_easy_getinfo(msg->easy_handle, CURLINFO_PRIVATE, (char**)&transfer);
+                CURLcode res = msg->data.result;
+                curl_multi_remove_handle(multi, transfer->curl);
+                active--;
+                if (res == CURLE_OK || (active == 0 && started == transfers.size())) {
+                    winner = transfer;
+                    winner_res = res;
+                } else if (active == 0) {
+                    next_hedge = std::chrono::steady_clock::now();
+                }
+            }
+            if (winner) break;
+
+            auto now = std::chrono::steady_clock::now();
+            if (started < transfers.size() && now >= next_hedge) {
+                curl_multi_add_handle(multi, transfers[started++].curl);
+                active++;
+                next_hedge = now + delay;
+                continue;
+            }
+
+            int timeout = 1000;
+            if (started < transfers.size()) {
+                auto remaining = std::chrono::duration_cast<std::chrono::milliseconds>(next_hedge - now).count();
+                if (remaining < timeout) timeout = (int)remaining;
+            }
+            mc = curl_multi_poll(multi, nullptr, 0, timeout, nullptr);
+            if (mc != CURLM_OK) break;
+        }
+
+        for (size_t i = 0; i < started; i++) {
+            curl_multi_remove_handle(multi, transfers[i].curl);
+        }
+        Py_END_ALLOW_THREADS
+
+        PyObject* result = nullptr;
+        std::string error;
+        if (!winner) {
+            error = curl_multi_strerror(mc);
+        } else {
+            record(winner->curl, winner_res);
+            if (winner_res != CURLE_OK) {
+                error = curl_easy_strerror(winner_res);
+            } else {
+                result = Py_BuildValue("(lNNi)", timing.status,
+                    PyBytes_FromStringAndSize(winner->response_data.data(), winner->response_data.size()),
+                    PyBytes_FromStringAndSize(winner->header_data.data(), winner->header_data.size()),
+                    (int)winner->index);
+            }
+        }
+        for (Transfer& transfer : transfers) {
+            curl_easy_cleanup(transfer.curl);
+        }
+        if (!error.empty()) throw std::runtime_error(error);
+        return result;
+    }
+
+    PyObject* httpRequestMany(const std::vector<BatchRequest>& requests, Py_ssize_t max_in_flight) {
+        Py_ssize_t count = (Py_ssize_t)requests.size();
+        PyObject* results = PyList_New(count);
+        if (!results) return NULL;
+
+        try {
+            prepareMulti();
+        } catch (...) {
+            Py_DECREF(results);
+            throw;
+        }
+
+        std::vector<Transfer> transfers(std::min(count, max_in_flight));
+        for (Transfer& transfer : transfers) {
+            transfer.curl = duphandle();
+            if (!transfer.curl) {
+                for (Transfer& other : transfers) {
+                    if (other.curl) curl_easy_cleanup(other.curl);
+                }
+                Py_DECREF(results);
+                throw std::runtime_error("Failed to duplicate curl handle.");
+            }
+            curl_easy_setopt(transfer.curl, CURLOPT_WRITEFUNCTION, WriteCallback);
+            curl_easy_setopt(transfer.curl, CURLOPT_WRITEDATA, &transfer.response_data);
+            curl_easy_setopt(transfer.curl, CURLOPT_PRIVATE, &transfer);
+        }
+
+        Py_ssize_t next = 0;
+        Py_ssize_t active = 0;
+        bool failed = false;
+        CURLMcode mc = CURLM_OK;
+
+        Py_BEGIN_ALLOW_THREADS
+        for (Transfer& transfer : transfers) {
+            prepareTransfer(transfer, requests[next], next);
+            next++;
+            curl_multi_add_handle(multi, transfer.curl);
+            active++;
+        }
+
+        while (active > 0 && !failed) {
+            int running = 0;
+            mc = curl_multi_perform(multi, &running);
+            if (mc != CURLM_OK) break;
+
+            CURLMsg* msg;
+            int queued;
+            while ((msg = curl_multi_info_read(multi, &queued)) != nullptr) {
+                if (msg->msg != CURLMSG_DONE) continue;
+
+                Transfer* transfer;
+                curl_easy_getinfo(msg->easy_handle, CURLINFO_PRIVATE, (char**)&transfer);
+                CURLcode res = msg->data.result;
+                curl_multi_remove_handle(multi, transfer->curl);
+                active--;
+
+                Py_BLOCK_THREADS
+                record(transfer->curl, res);
+                PyObject* item = transferResult(*transfer, res);
+                if (item) {
+                    PyList_SET_ITEM(results, transfer->index, item);
+                } else {
+                    failed = true;
+                }
+                Py_UNBLOCK_THREADS
+
+                if (failed) break;
+
+                if (next < count) {
+                    prepareTransfer(*transfer, requests[next], next);
+                    next++;
+                    curl_multi_add_handle(multi, transfer->curl);
+                    active++;
+                }
+            }
+
+            if (active > 0 && !failed) {
+                mc = curl_multi_poll(multi, nullptr, 0, 1000, nullptr);
+                if (mc != CURLM_OK) break;
+            }
+        }
+
+        for (Transfer& transfer : transfers) {
+            curl_multi_remove_handle(multi, transfer.curl);
+            curl_easy_cleanup(transfer.curl);
+        }
+        Py_END_ALLOW_THREADS
+
+        if (failed) {
+            Py_DECREF(results);
+            return NULL;
+        }
+        if (mc != CURLM_OK) {
+            Py_DECREF(results);
+            throw std::runtime_error(curl_multi_strerror(mc));
+        }
+        return results;
+    }
+
+private:
+    static void prepareTransfer(Transfer& transfer, const BatchRequest& request, Py_ssize_t index) {
+        transfer.index = index;
+        transfer.response_data.clear();
+        applyRequest(transfer.curl, request);
+    }
+
+    static PyObject* transferResult(const Transfer& transfer, CURLcode res) {
+        long status = 0;
+        if (res != CURLE_OK) {
+            return Py_BuildValue("(lOs)", status, Py_None, curl_easy_strerror(res));
+        }
+
+        curl_easy_getinfo(transfer.curl, CURLINFO_RESPONSE_CODE, &status);
+        PyObject* body = PyBytes_FromStringAndSize(transfer.response_data.data(), transfer.response_data.size());
+        if (!body) return NULL;
+        return Py_BuildValue("(lNO)", status, body, Py_None);
+    }
+};
+
+class SessionLock {
+public:
+    // Lock the session for a request; throw once it is closed, unless closing is what the lock is for.
+    explicit SessionLock(Session* session, bool allow_closed = false) : session(session) {
+        if (!session->mutex.try_lock()) {
+            Py_BEGIN_ALLOW_THREADS
+            session->mutex.lock();
+            Py_END_ALLOW_THREADS
+        }
+        if (!session->curl && !allow_closed) {
+            session->mutex.unlock();
+            throw std::runtime_error("The session is closed.");
+        }
+    }
+
+    ~SessionLock() {
+        session->mutex.unlock();
+    }
+
+private:
+    Session* session;
+};
+
+// Records a transfer that ran on its own handle after the lock was released. A closed session is skipped.
+static void recordDetached(Session* session, CURL* handle, CURLcode res) {
+    try {
+        SessionLock lock(session);
+        session->record(handle, res);
+    } catch (const std::exception&) {
+    }
+}
+
+// zlib's crc32(), fed in pieces because its length is a uInt.
+static uint32_t crc32Update(uint32_t crc, const unsigned char* data, size_t size) {
+    while (size > 0) {
+        uInt piece = size > 0x40000000 ? 0x40000000 : (uInt)size;
+        crc = (uint32_t)crc32(crc, data, piece);
+        data += piece;
+        size -= piece;
+    }
+    return crc;
+}
+
+static struct curl_slist* copySlist(const struct curl_slist* list) {
+    struct curl_slist* copy = nullptr;
+    for (; list; list = list->next) {
+        struct curl_slist* appended = curl_slist_append(copy, list->data);
+        if (!appended) {
+            curl_slist_free_all(copy);
+            return nullptr;
+        }
+        copy = appended;
+    }
+    return copy;
+}
+
+class Download {
+public:
+    CURL* curl;
+    int fd;
+    curl_off_t resume_from;
+    curl_off_t written;
+    uint32_t crc;
+    int error;
+    long status;
+    curl_off_t total_time;
+    curl_off_t speed;
+    struct curl_slist* resolve;
+    bool performed;
+
+    Download(Session* session)
+        : curl(session->duphandle()), fd(-1), resume_from(0), written(0), crc(0),
+          error(0), status(0), total_time(0), speed(0), resolve(copySlist(session->resolve)), performed(false) {
+        if (!curl) {
+            curl_slist_free_all(resolve);
+            throw std::runtime_error("Failed to duplicate curl handle.");
+        }
+        // The download runs after the session lock is released, so it must not borrow the session's list.
+        curl_easy_setopt(curl, CURLOPT_RESOLVE, resolve);
+    }
+
+    ~Download() {
+        if (fd >= 0) ::close(fd);
+        curl_easy_cleanup(curl);
+        curl_slist_free_all(resolve);
+    }
+
+    // Runs without the GIL. Returns false with errno-style error set on a file error.
+    bool run(const char* url, const char* path, bool resume, CURLcode& res) {
+        fd = ::open(path, O_RDWR | O_CREAT | (resume ? 0 : O_TRUNC), 0644);
+        if (fd < 0) {
+            error = errno;
+            return false;
+        }
+
+        if (resume) {
+            off_t size = lseek(fd, 0, SEEK_END);
+            resume_from = size > 0 ? size : 0;
+            if (resume_from > 0 && !checksumExisting()) {
+                error = errno ? errno : EIO;
+                return false;
+            }
+        }
+        lseek(fd, 0, SEEK_END);
+
+        curl_easy_setopt(curl, CURLOPT_URL, url);
+        curl_easy_setopt(curl, CURLOPT_HTTPGET, 1L);
+        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, nullptr);
+        curl_easy_setopt(curl, CURLOPT_FAILONERROR, 1L);
+        curl_easy_setopt(curl, CURLOPT_RESUME_FROM_LARGE, resume_from);
+        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, WriteCallback);
+        curl_easy_setopt(curl, CURLOPT_WRITEDATA, this);
+
+        res = curl_easy_perform(curl);
+        performed = true;
+        if (res == CURLE_RANGE_ERROR && resume_from > 0) {
+            // The server ignored the Range request: start over from an empty file.
+            if (ftruncate(fd, 0) == 0 && lseek(fd, 0, SEEK_SET) == 0) {
+                resume_from = 0;
+                crc = 0;
+                curl_easy_setopt(curl, CURLOPT_RESUME_FROM_LARGE, (curl_off_t)0);
+                res = curl_easy_perform(curl);
+            }
+        }
+        curl_easy_getinfo(curl, CURLINFO_RESPONSE_CODE, &status);
+        curl_easy_getinfo(curl, CURLINFO_TOTAL_TIME_T, &total_time);
+        curl_easy_getinfo(curl, CURLINFO_SPEED_DOWNLOAD_T, &speed);
+
+        if (res == CURLE_HTTP_RETURNED_ERROR && status == 416 && resume_from > 0) {
+            res = CURLE_OK;
+        }
+        if (res == CURLE_OK && fsync(fd) != 0) {
+            error = errno;
+            return false;
+        }
+        return true;
+    }
+
+private:
+    bool checksumExisting() {
+        unsigned char chunk[65536];
+        curl_off_t remaining = resume_from;
+        if (lseek(fd, 0, SEEK_SET) < 0) return false;
+        while (remaining > 0) {
+            ssize_t got = ::read(fd, chunk, std::min((curl_off_t)sizeof(chunk), remaining));
+            if (got < 0 && errno == EINTR) continue;
+            if (got <= 0) return false;
+            crc = crc32Update(crc, chunk, (size_t)got);
+            remaining -= got;
+        }
+        return true;
+    }
+
+    static size_t WriteCallback(void* contents, size_t size, size_t nmemb, void* userp) {
+        Download* download = (Download*)userp;
+        size_t total_size = size * nmemb;
+        const char* data = (const char*)contents;
+        size_t remaining = total_size;
+        while (remaining > 0) {
+            ssize_t written = ::write(download->fd, data, remaining);
+            if (written < 0) {
+                if (errno == EINTR) continue;
+                download->error = errno;
+                return 0;
+            }
+            data += written;
+            remaining -= (size_t)written;
+        }
+        download->crc = crc32Update(download->crc, (const unsigned char*)contents, total_size);
+        download->written += (curl_off_t)total_size;
+        return total_size;
+    }
+};
+
+class Stream {
+public:
+    CURL* curl;
+    CURLM* multi;
+    struct curl_slist* resolve;
+    std::string buffer;
+    size_t chunk_size;
+    bool paused;
+    bool done;
+    bool recorded;
+    bool busy;
+    CURLcode result;
+    PyObject* owner;
+
+    Stream(Session* session, const BatchRequest& request, size_t chunk_size)
+        : curl(session->duphandle()), multi(curl_multi_init()), resolve(copySlist(session->resolve)),
+          chunk_size(chunk_size), paused(false), done(false), recorded(false), busy(false), result(CURLE_OK),
+          owner(nullptr) {
+        if (!curl || !multi) {
+            close();
+            throw std::runtime_error("Failed to initialize curl handles.");
+        }
+        buffer.reserve(chunk_size);
+
+        // The stream outlives the session lock, so it must not borrow the session's list.
+        curl_easy_setopt(curl, CURLOPT_RESOLVE, resolve);
+        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, WriteCallback);
+        curl_easy_setopt(curl, CURLOPT_WRITEDATA, this);
+        applyRequest(curl, request);
+        if (request.body) curl_easy_setopt(curl, CURLOPT_COPYPOSTFIELDS, request.body);
+        curl_multi_add_handle(multi, curl);
+    }
+
+    ~Stream() {
+        close();
+    }
+
+    void close() {
+        if (multi) {
+            if (curl) curl_multi_remove_handle(multi, curl);
+            curl_multi_cleanup(multi);
+            multi = nullptr;
+        }
+        if (curl) {
+            curl_easy_cleanup(curl);
+            curl = nullptr;
+        }
+        curl_slist_free_all(resolve);
+        resolve = nullptr;
+        std::string().swap(buffer);
+        Py_CLEAR(owner);
+    }
+
+    PyObject* read() {
+        if (!curl) throw std::runtime_error("Stream is closed.");
+
+        CURLMcode mc = CURLM_OK;
+        Py_BEGIN_ALLOW_THREADS
+        while (!done && buffer.size() < chunk_size) {
+            int running = 0;
+            mc = curl_multi_perform(multi, &running);
+            if (mc != CURLM_OK) break;
+
+            CURLMsg* msg;
+            int queued;
+            while ((msg = curl_multi_info_read(multi, &queued)) != nullptr) {
+                if (msg->msg == CURLMSG_DONE) {
+                    done = true;
+                    result = msg->data.result;
+                }
+            }
+
+            if (!done && buffer.size() < chunk_size) {
+                mc = curl_multi_poll(multi, nullptr, 0, 1000, nullptr);
+                if (mc != CURLM_OK) break;
+            }
+        }
+        Py_END_ALLOW_THREADS
+
+        if (mc != CURLM_OK) throw std::runtime_error(curl_multi_strerror(mc));
+        if (done && result != CURLE_OK) throw std::runtime_error(curl_easy_strerror(result));
+
+        size_t size = std::min(buffer.size(), chunk_size);
+        PyObject* chunk = PyBytes_FromStringAndSize(buffer.data(), size);
+        if (!chunk) return NULL;
+
+        buffer.erase(0, size);
+        if (paused) {
+            paused = false;
+            curl_easy_pause(curl, CURLPAUSE_CONT);
+        }
+        return chunk;
+    }
+
+    long status() {
+        long code = 0;
+        if (curl) curl_easy_getinfo(curl, CURLINFO_RESPONSE_CODE, &code);
+        return code;
+    }
+
+private:
+    static size_t WriteCallback(void* contents, size_t size, size_t nmemb, void* userp) {
+        Stream* stream = (Stream*)userp;
+        if (stream->buffer.size() >= stream->chunk_size) {
+            stream->paused = true;
+            return CURL_WRITEFUNC_PAUSE;
+        }
+        size_t total_size = size * nmemb;
+        stream->buffer.append((char*)contents, total_size);
+        return total_size;
+    }
+};
+
+// The Python object behind CPHTTP.Session; it owns the C++ Session.
+struct SessionObject {
+    PyObject_HEAD
+    Session* session;
+    PyObject* weakreflist;
+};
+
+static PyTypeObject SessionType = {PyVarObject_HEAD_INIT(NULL, 0)};
+
+static int session_traverse(SessionObject* self, visitproc visit, void* arg) {
+    if (self->session) {
+        Py_VISIT(self->session->stats);
+        Py_VISIT(self->session->prepared);
+    }
+    return 0;
+}
+
+static int session_clear(SessionObject* self) {
+    if (self->session) {
+        self->session->unprepare();
+        Py_CLEAR(self->session->stats);
+    }
+    return 0;
+}
+
+static void session_dealloc(SessionObject* self) {
+    PyObject_GC_UnTrack(self);
+    if (self->weakreflist) PyObject_ClearWeakRefs((PyObject*)self);
+    delete self->session;
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyObject* session_create() {
+    SessionObject* self = (SessionObject*)SessionType.tp_alloc(&SessionType, 0);
+    if (!self) return NULL;
+    try {
+        self->session = new Session();
+    } catch (const std::exception& e) {
+        Py_DECREF(self);
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    return (PyObject*)self;
+}
+
+static PyObject* create_session(PyObject* self, PyObject* args) {
+    return session_create();
+}
+
+static PyObject* session_new(PyTypeObject* type, PyObject* args, PyObject* kwargs) {
+    static char* keywords[] = {nullptr};
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, ":Session", keywords)) return NULL;
+    return session_create();
+}
+
+// Return the Session passed as a session argument, or NULL with TypeError set for anything else.
+static Session* get_session(PyObject* obj) {
+    if (!PyObject_TypeCheck(obj, &SessionType)) {
+        PyErr_Format(PyExc_TypeError, "session must be a CPHTTP.Session, not %.200s.", Py_TYPE(obj)->tp_name);
+        return NULL;
+    }
+    return ((SessionObject*)obj)->session;
+}
+
+static PyObject* set_user_agent(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    const char* agent;
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &agent)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setUserAgent(agent);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* set_proxy(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    const char* proxy;
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &proxy)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setProxy(proxy);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* set_cookie_file(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    const char* cookie_file;
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &cookie_file)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    std::unique_ptr<struct curl_slist, void (*)(struct curl_slist*)> lines(nullptr, curl_slist_free_all);
+    std::string error;
+    Py_BEGIN_ALLOW_THREADS
+    try {
+        lines.reset(readCookieFile(cookie_file));
+    } catch (const std::exception& e) {
+        error = e.what();
+    }
+    Py_END_ALLOW_THREADS
+    if (!error.empty()) {
+        PyErr_SetString(PyExc_RuntimeError, error.c_str());
+        return NULL;
+    }
+    try {
+        SessionLock lock(session);
+        session->setCookieFile(cookie_file, lines.get());
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* flush_cookies(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    if (!PyArg_ParseTuple(args, "O", &capsule)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->flushCookies();
+    } catch (const std::invalid_argument& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return NULL;
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* get_cookies(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    if (!PyArg_ParseTuple(args, "O", &capsule)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    std::unique_ptr<struct curl_slist, void (*)(struct curl_slist*)> lines(nullptr, curl_slist_free_all);
+    try {
+        SessionLock lock(session);
+        lines.reset(session->cookies());
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    PyObject* list = PyList_New(0);
+    for (const struct curl_slist* line = lines.get(); list && line; line = line->next) {
+        PyObject* item = PyUnicode_DecodeLatin1(line->data, strlen(line->data), NULL);
+        if (!item || PyList_Append(list, item) < 0) Py_CLEAR(list);
+        Py_XDECREF(item);
+    }
+    return list;
+}
+
+static PyObject* set_ssl_cert(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    const char* ssl_cert;
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &ssl_cert)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setSslCert(ssl_cert);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* set_ssl_key(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    const char* ssl_key;
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &ssl_key)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setSslKey(ssl_key);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* set_timeout(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    long timeout;
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &timeout)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setTimeout(timeout);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* set_http_version(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    long version;
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &version)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setHttpVersion(version);
+    } catch (const std::invalid_argument& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return NULL;
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* set_max_concurrent_streams(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    long max_streams;
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &max_streams)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setMaxConcurrentStreams(max_streams);
+    } catch (const std::invalid_argument& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return NULL;
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* set_accept_encoding(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    const char* encodings;
+    if (!PyArg_ParseTuple(args, "Oz", &capsule, &encodings)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setAcceptEncoding(encodings);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* set_request_compression(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    Py_ssize_t threshold;
+    int level = Z_DEFAULT_COMPRESSION;
+    if (!PyArg_ParseTuple(args, "On|i", &capsule, &threshold, &level)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    try {
+        SessionLock lock(session);
+        session->setRequestCompression(threshold, level);
+    } catch (const std::invalid_argument& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return NULL;
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+typedef PyObject* (Session::*UrlRequest)(const char*);
+typedef PyObject* (Session::*BodyRequest)(const char*, RequestBody&);
+
+static PyObject* session_url_request(Session* session, UrlRequest request, const char* url) {
+    try {
+        SessionLock lock(session);
+        return (session->*request)(url);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+}
+
+static PyObject* session_body_request(Session* session, BodyRequest request, const char* url, PyObject* data,
+                                      const char* content_type) {
+    RequestBody body;
+    if (!body.init(data) || !body.setContentType(content_type)) return NULL;
+    try {
+        SessionLock lock(session);
+        return (session->*request)(url, body);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
     }
+}
 
-    void setSslKey(const char* ssl_key) {
-        if (this->ssl_key) free(this->ssl_key);
-        this->ssl_key = strdup(ssl_key);
-        curl_easy_setopt(curl, CURLOPT_SSLKEY, this->ssl_key);
-    }
+static PyObject* http_url(PyObject* args, UrlRequest request) {
+    PyObject* capsule;
+    const char* url;
+    if (!PyArg_ParseTuple(args, "Os", &capsule, &url)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    return session_url_request(session, request, url);
+}
 
-    void setTimeout(long timeout) {
-        this->timeout = timeout;
-        curl_easy_setopt(curl, CURLOPT_TIMEOUT, timeout);
-    }
+static PyObject* http_body(PyObject* args, BodyRequest request) {
+    PyObject* capsule;
+    const char* url;
+    PyObject* data;
+    const char* content_type = nullptr;
+    if (!PyArg_ParseTuple(args, "OsO|z", &capsule, &url, &data, &content_type)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    return session_body_request(session, request, url, data, content_type);
+}
 
-    PyObject* httpGet(const char* url) {
-        curl_easy_setopt(curl, CURLOPT_URL, url);
-        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, WriteCallback);
-        curl_easy_setopt(curl, CURLOPT_WRITEDATA, &response_data);
+static PyObject* http_get(PyObject* self, PyObject* args) {
+    return http_url(args, &Session::httpGet);
+}
 
-        CURLcode res = curl_easy_perform(curl);
-        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+static PyObject* http_post(PyObject* self, PyObject* args) {
+    return http_body(args, &Session::httpPost);
+}
 
-        return PyUnicode_FromString(response_data.c_str());
-    }
+static PyObject* http_put(PyObject* self, PyObject* args) {
+    return http_body(args, &Session::httpPut);
+}
 
-    PyObject* httpPost(const char* url, const char* data) {
-        curl_easy_setopt(curl, CURLOPT_URL, url);
-        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, "POST");
-        curl_easy_setopt(curl, CURLOPT_POSTFIELDS, data);
-        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, WriteCallback);
-        curl_easy_setopt(curl, CURLOPT_WRITEDATA, &response_data);
+static PyObject* http_delete(PyObject* self, PyObject* args) {
+    return http_url(args, &Session::httpDelete);
+}
 
-        CURLcode res = curl_easy_perform(curl);
-        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+static PyObject* http_head(PyObject* self, PyObject* args) {
+    return http_url(args, &Session::httpHead);
+}
+
+static void prepared_destructor(PyObject* capsule) {
+    Prepared* prepared = (Prepared*)PyCapsule_GetPointer(capsule, "Prepared");
+    delete prepared;
+}
 
-        return PyUnicode_FromString(response_data.c_str());
+static PyObject* create_prepared(PyObject* self, PyObject* args) {
+    const char* method;
+    const char* url;
+    PyObject* body = Py_None;
+    PyObject* headers = Py_None;
+    const char* content_type = nullptr;
+    if (!PyArg_ParseTuple(args, "ss|OOz", &method, &url, &body, &headers, &content_type)) return NULL;
+
+    std::unique_ptr<Prepared> prepared;
+    try {
+        prepared.reset(new Prepared(method, url));
+        if (headers != Py_None && !prepared->setHeaders(headers)) return NULL;
+        if (body != Py_None && !prepared->setBody(body)) return NULL;
+        if (content_type) prepared->addHeader(std::string("Content-Type: ") + content_type);
+    } catch (const std::invalid_argument& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return NULL;
+    } catch (const std::bad_alloc&) {
+        return PyErr_NoMemory();
     }
 
-    PyObject* httpPut(const char* url, const char* data) {
-        curl_easy_setopt(curl, CURLOPT_URL, url);
-        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, "PUT");
-        curl_easy_setopt(curl, CURLOPT_POSTFIELDS, data);
-        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, WriteCallback);
-        curl_easy_setopt(curl, CURLOPT_WRITEDATA, &response_data);
+    PyObject* capsule = PyCapsule_New(prepared.get(), "Prepared", prepared_destructor);
+    if (capsule) prepared.release();
+    return capsule;
+}
 
-        CURLcode res = curl_easy_perform(curl);
-        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+static PyObject* session_send_prepared(Session* session, PyObject* prepared_capsule) {
+    Prepared* prepared = (Prepared*)PyCapsule_GetPointer(prepared_capsule, "Prepared");
+    if (!prepared) return NULL;
+    try {
+        SessionLock lock(session);
+        return session->httpPrepared(prepared_capsule, *prepared);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
+}
+
+static PyObject* http_prepared(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    PyObject* prepared_capsule;
+    if (!PyArg_ParseTuple(args, "OO", &capsule, &prepared_capsule)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    return session_send_prepared(session, prepared_capsule);
+}
 
-        return PyUnicode_FromString(response_data.c_str());
+static bool parse_batch_request(PyObject* item, BatchRequest* request) {
+    PyObject* method;
+    PyObject* url;
+    PyObject* body = Py_None;
+    if (!PyTuple_Check(item) || !PyArg_ParseTuple(item, "UU|O", &method, &url, &body)) {
+        if (!PyErr_Occurred() || PyErr_ExceptionMatches(PyExc_TypeError)) {
+            PyErr_Clear();
+            PyErr_SetString(PyExc_TypeError, "Each request must be a (method, url[, body]) tuple.");
+        }
+        return false;
     }
 
-    PyObject* httpDelete(const char* url) {
-        curl_easy_setopt(curl, CURLOPT_URL, url);
-        curl_easy_setopt(curl, CURLOPT_CUSTOMREQUEST, "DELETE");
-        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, WriteCallback);
-        curl_easy_setopt(curl, CURLOPT_WRITEDATA, &response_data);
+    request->method = PyUnicode_AsUTF8(method);
+    request->url = PyUnicode_AsUTF8(url);
+    if (!request->method || !request->url) return false;
 
-        CURLcode res = curl_easy_perform(curl);
-        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+    return request->setBody(body);
+}
 
-        return PyUnicode_FromString(response_data.c_str());
+static PyObject* http_request_many(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    PyObject* sequence;
+    Py_ssize_t max_in_flight = 16;
+    const char* content_type = nullptr;
+    if (!PyArg_ParseTuple(args, "OO|nz", &capsule, &sequence, &max_in_flight, &content_type)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    if (max_in_flight < 1) {
+        PyErr_SetString(PyExc_ValueError, "max_in_flight must be at least 1.");
+        return NULL;
     }
 
-    PyObject* httpHead(const char* url) {
-        curl_easy_setopt(curl, CURLOPT_URL, url);
-        curl_easy_setopt(curl, CURLOPT_NOBODY, 1L);
-        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, WriteCallback);
-        curl_easy_setopt(curl, CURLOPT_WRITEDATA, &response_data);
+    std::unique_ptr<struct curl_slist, void (*)(struct curl_slist*)> headers(nullptr, curl_slist_free_all);
+    if (content_type) {
+        headers.reset(curl_slist_append(nullptr, (std::string("Content-Type: ") + content_type).c_str()));
+        if (!headers) return PyErr_NoMemory();
+    }
 
-        CURLcode res = curl_easy_perform(curl);
-        if (res != CURLE_OK) throw std::runtime_error(curl_easy_strerror(res));
+    PyObject* items = PySequence_Fast(sequence, "requests must be a sequence.");
+    if (!items) return NULL;
 
-        return PyUnicode_FromString(response_data.c_str());
+    std::vector<BatchRequest> requests(PySequence_Fast_GET_SIZE(items));
+    for (size_t i = 0; i < requests.size(); i++) {
+        if (!parse_batch_request(PySequence_Fast_GET_ITEM(items, i), &requests[i])) {
+            Py_DECREF(items);
+            return NULL;
+        }
+        if (requests[i].body) requests[i].headers = headers.get();
     }
-};
 
-static void session_destructor(PyObject *capsule) {
-    Session *session = (Session *)PyCapsule_GetPointer(capsule, "Session");
-    delete session;
+    PyObject* results;
+    try {
+        SessionLock lock(session);
+        results = session->httpRequestMany(requests, max_in_flight);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        results = NULL;
+    }
+    Py_DECREF(items);
+    return results;
 }
 
-static PyObject* create_session(PyObject* self, PyObject* args) {
-    Session* session = new Session();
-    return PyCapsule_New(session, "Session", session_destructor);
-}
+static PyObject* http_hedged(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    BatchRequest request;
+    PyObject* body = Py_None;
+    double hedge_delay;
+    int max_hedges = 1;
+    const char* content_type = nullptr;
+    if (!PyArg_ParseTuple(args, "OssOd|iz", &capsule, &request.method, &request.url, &body, &hedge_delay,
+                          &max_hedges, &content_type)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    if (hedge_delay < 0 || max_hedges < 0) {
+        PyErr_SetString(PyExc_ValueError, "hedge_delay and max_hedges must not be negative.");
+        return NULL;
+    }
+    if (!request.setBody(body)) return NULL;
 
-static Session* get_session_from_capsule(PyObject* capsule) {
-    return (Session*)PyCapsule_GetPointer(capsule, "Session");
+    std::unique_ptr<struct curl_slist, void (*)(struct curl_slist*)> headers(nullptr, curl_slist_free_all);
+    if (content_type && request.body) {
+        headers.reset(curl_slist_append(nullptr, (std::string("Content-Type: ") + content_type).c_str()));
+        if (!headers) return PyErr_NoMemory();
+        request.headers = headers.get();
+    }
+
+    try {
+        SessionLock lock(session);
+        return session->httpHedged(request, hedge_delay, max_hedges);
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_RuntimeError, e.what());
+        return NULL;
+    }
 }
 
-static PyObject* set_user_agent(PyObject* self, PyObject* args) {
+static PyObject* set_tcp_options(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* agent;
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &agent)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    int nodelay;
+    long keepalive_idle = 0;
+    long keepalive_interval = 0;
+    int fastopen = 0;
+    if (!PyArg_ParseTuple(args, "Op|llp", &capsule, &nodelay, &keepalive_idle, &keepalive_interval, &fastopen)) {
+        return NULL;
+    }
+    Session* session = get_session(capsule);
     if (!session) return NULL;
     try {
-        session->setUserAgent(agent);
+        SessionLock lock(session);
+        session->setTcpOptions(nodelay, keepalive_idle, keepalive_interval, fastopen);
+    } catch (const std::invalid_argument& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return NULL;
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
         return NULL;
@@ -185,14 +2158,18 @@ static PyObject* set_user_agent(PyObject* self, PyObject* args) {
     Py_RETURN_NONE;
 }
 
-static PyObject* set_proxy(PyObject* self, PyObject* args) {
+static PyObject* set_max_connection_age(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* proxy;
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &proxy)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    long max_age;
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &max_age)) return NULL;
+    Session* session = get_session(capsule);
     if (!session) return NULL;
     try {
-        session->setProxy(proxy);
+        SessionLock lock(session);
+        session->setMaxConnectionAge(max_age);
+    } catch (const std::invalid_argument& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return NULL;
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
         return NULL;
@@ -200,14 +2177,18 @@ static PyObject* set_proxy(PyObject* self, PyObject* args) {
     Py_RETURN_NONE;
 }
 
-static PyObject* set_cookie_file(PyObject* self, PyObject* args) {
+static PyObject* set_max_connections(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* cookie_file;
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &cookie_file)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    long max_connections;
+    if (!PyArg_ParseTuple(args, "Ol", &capsule, &max_connections)) return NULL;
+    Session* session = get_session(capsule);
     if (!session) return NULL;
     try {
-        session->setCookieFile(cookie_file);
+        SessionLock lock(session);
+        session->setMaxConnections(max_connections);
+    } catch (const std::invalid_argument& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return NULL;
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
         return NULL;
@@ -215,14 +2196,15 @@ static PyObject* set_cookie_file(PyObject* self, PyObject* args) {
     Py_RETURN_NONE;
 }
 
-static PyObject* set_ssl_cert(PyObject* self, PyObject* args) {
+static PyObject* set_ca_file(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* ssl_cert;
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &ssl_cert)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    const char* ca_file;
+    if (!PyArg_ParseTuple(args, "Oz", &capsule, &ca_file)) return NULL;
+    Session* session = get_session(capsule);
     if (!session) return NULL;
     try {
-        session->setSslCert(ssl_cert);
+        SessionLock lock(session);
+        session->setCaFile(ca_file);
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
         return NULL;
@@ -230,14 +2212,41 @@ static PyObject* set_ssl_cert(PyObject* self, PyObject* args) {
     Py_RETURN_NONE;
 }
 
-static PyObject* set_ssl_key(PyObject* self, PyObject* args) {
+// Pin host names to addresses with CURLOPT_RESOLVE entries ("host:port:address[,address...]", or "-host:port" to
+// drop a pin), or clear the list with None.
+static PyObject* set_resolve(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* ssl_key;
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &ssl_key)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    PyObject* entries;
+    if (!PyArg_ParseTuple(args, "OO", &capsule, &entries)) return NULL;
+    Session* session = get_session(capsule);
     if (!session) return NULL;
+
+    std::unique_ptr<struct curl_slist, void (*)(struct curl_slist*)> list(nullptr, curl_slist_free_all);
+    if (entries != Py_None) {
+        PyObject* items = PySequence_Fast(entries, "entries must be a sequence of str or None.");
+        if (!items) return NULL;
+        for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(items); i++) {
+            PyObject* item = PySequence_Fast_GET_ITEM(items, i);
+            const char* entry = PyUnicode_Check(item) ? PyUnicode_AsUTF8(item) : nullptr;
+            if (!entry) {
+                if (!PyErr_Occurred()) PyErr_SetString(PyExc_TypeError, "entries must be a sequence of str or None.");
+                Py_DECREF(items);
+                return NULL;
+            }
+            struct curl_slist* appended = curl_slist_append(list.get(), entry);
+            if (!appended) {
+                Py_DECREF(items);
+                return PyErr_NoMemory();
+            }
+            list.release();
+            list.reset(appended);
+        }
+        Py_DECREF(items);
+    }
+
     try {
-        session->setSslKey(ssl_key);
+        SessionLock lock(session);
+        session->setResolve(list.release());
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
         return NULL;
@@ -245,106 +2254,458 @@ static PyObject* set_ssl_key(PyObject* self, PyObject* args) {
     Py_RETURN_NONE;
 }
 
-static PyObject* set_timeout(PyObject* self, PyObject* args) {
+static PyObject* warm(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    long timeout;
-    if (!PyArg_ParseTuple(args, "Ol", &capsule, &timeout)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    PyObject* sequence;
+    Py_ssize_t per_host = 1;
+    if (!PyArg_ParseTuple(args, "OO|n", &capsule, &sequence, &per_host)) return NULL;
+    Session* session = get_session(capsule);
     if (!session) return NULL;
+    if (per_host < 1) {
+        PyErr_SetString(PyExc_ValueError, "connections_per_host must be at least 1.");
+        return NULL;
+    }
+
+    PyObject* items = PySequence_Fast(sequence, "urls must be a sequence of str.");
+    if (!items) return NULL;
+
+    std::vector<const char*> urls(PySequence_Fast_GET_SIZE(items));
+    for (size_t i = 0; i < urls.size(); i++) {
+        PyObject* url = PySequence_Fast_GET_ITEM(items, i);
+        if (!PyUnicode_Check(url)) {
+            PyErr_SetString(PyExc_TypeError, "urls must be a sequence of str.");
+            Py_DECREF(items);
+            return NULL;
+        }
+        urls[i] = PyUnicode_AsUTF8(url);
+        if (!urls[i]) {
+            Py_DECREF(items);
+            return NULL;
+        }
+    }
+
+    PyObject* result;
     try {
-        session->setTimeout(timeout);
+        SessionLock lock(session);
+        result = session->warm(items, urls, per_host);
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
-        return NULL;
+        result = NULL;
     }
-    Py_RETURN_NONE;
+    Py_DECREF(items);
+    return result;
 }
 
-static PyObject* http_get(PyObject* self, PyObject* args) {
+static PyObject* http_get_many(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* url;
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &url)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    PyObject* sequence;
+    Py_ssize_t max_in_flight = 16;
+    if (!PyArg_ParseTuple(args, "OO|n", &capsule, &sequence, &max_in_flight)) return NULL;
+    Session* session = get_session(capsule);
     if (!session) return NULL;
+    if (max_in_flight < 1) {
+        PyErr_SetString(PyExc_ValueError, "max_in_flight must be at least 1.");
+        return NULL;
+    }
+
+    PyObject* items = PySequence_Fast(sequence, "urls must be a sequence.");
+    if (!items) return NULL;
+
+    std::vector<BatchRequest> requests(PySequence_Fast_GET_SIZE(items));
+    for (size_t i = 0; i < requests.size(); i++) {
+        requests[i].method = "GET";
+        requests[i].url = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(items, i));
+        if (!requests[i].url) {
+            Py_DECREF(items);
+            return NULL;
+        }
+    }
+
+    PyObject* results;
     try {
-        return session->httpGet(url);
+        SessionLock lock(session);
+        results = session->httpRequestMany(requests, max_in_flight);
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
-        return NULL;
+        results = NULL;
     }
+    Py_DECREF(items);
+    return results;
 }
 
-static PyObject* http_post(PyObject* self, PyObject* args) {
+static PyObject* http_download(PyObject* self, PyObject* args) {
     PyObject* capsule;
     const char* url;
-    const char* data;
-    if (!PyArg_ParseTuple(args, "Oss", &capsule, &url, &data)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
-    if (!session) return NULL;
+    PyObject* path;
+    int resume = 1;
+    if (!PyArg_ParseTuple(args, "OsO&|p", &capsule, &url, PyUnicode_FSConverter, &path, &resume)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) {
+        Py_DECREF(path);
+        return NULL;
+    }
+
+    Download* download;
     try {
-        return session->httpPost(url, data);
+        SessionLock lock(session);
+        download = new Download(session);
     } catch (const std::exception& e) {
+        Py_DECREF(path);
         PyErr_SetString(PyExc_RuntimeError, e.what());
         return NULL;
     }
+
+    CURLcode res = CURLE_OK;
+    bool file_ok;
+    Py_BEGIN_ALLOW_THREADS
+    file_ok = download->run(url, PyBytes_AS_STRING(path), resume, res);
+    Py_END_ALLOW_THREADS
+    if (download->performed) recordDetached(session, download->curl, res);
+
+    PyObject* result = NULL;
+    if (!file_ok) {
+        errno = download->error;
+        PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, path);
+    } else if (res == CURLE_WRITE_ERROR && download->error) {
+        errno = download->error;
+        PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, path);
+    } else if (res != CURLE_OK) {
+        PyErr_SetString(PyExc_RuntimeError, curl_easy_strerror(res));
+    } else {
+        result = Py_BuildValue("{s:l,s:L,s:L,s:L,s:k,s:d,s:L}",
+            "status", download->status,
+            "size", (long long)(download->resume_from + download->written),
+            "downloaded", (long long)download->written,
+            "resumed_from", (long long)download->resume_from,
+            "crc32", (unsigned long)download->crc,
+            "total_time", (double)download->total_time / 1000000.0,
+            "speed", (long long)download->speed);
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    delete download;
+    Py_END_ALLOW_THREADS
+    Py_DECREF(path);
+    return result;
 }
 
-static PyObject* http_put(PyObject* self, PyObject* args) {
+static void stream_destructor(PyObject* capsule) {
+    Stream* stream = (Stream*)PyCapsule_GetPointer(capsule, "Stream");
+    delete stream;
+}
+
+static Stream* get_stream_from_capsule(PyObject* capsule) {
+    Stream* stream = (Stream*)PyCapsule_GetPointer(capsule, "Stream");
+    if (stream && stream->busy) {
+        PyErr_SetString(PyExc_RuntimeError, "Stream is being read by another thread.");
+        return NULL;
+    }
+    return stream;
+}
+
+static PyObject* stream_open(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* url;
-    const char* data;
-    if (!PyArg_ParseTuple(args, "Oss", &capsule, &url, &data)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    BatchRequest request;
+    PyObject* body = Py_None;
+    Py_ssize_t chunk_size = 65536;
+    if (!PyArg_ParseTuple(args, "Oss|On", &capsule, &request.method, &request.url, &body, &chunk_size)) return NULL;
+    Session* session = get_session(capsule);
     if (!session) return NULL;
+    if (chunk_size < 1) {
+        PyErr_SetString(PyExc_ValueError, "chunk_size must be at least 1.");
+        return NULL;
+    }
+
+    if (!request.setBody(body)) return NULL;
+
+    Stream* stream;
     try {
-        return session->httpPut(url, data);
+        SessionLock lock(session);
+        stream = new Stream(session, request, (size_t)chunk_size);
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
         return NULL;
     }
+    // Keeps the session alive until the stream has recorded its timing.
+    Py_INCREF(capsule);
+    stream->owner = capsule;
+    PyObject* stream_capsule = PyCapsule_New(stream, "Stream", stream_destructor);
+    if (!stream_capsule) delete stream;
+    return stream_capsule;
 }
 
-static PyObject* http_delete(PyObject* self, PyObject* args) {
+static PyObject* stream_read(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* url;
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &url)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
-    if (!session) return NULL;
+    if (!PyArg_ParseTuple(args, "O", &capsule)) return NULL;
+    Stream* stream = get_stream_from_capsule(capsule);
+    if (!stream) return NULL;
+    PyObject* chunk;
+    stream->busy = true;
     try {
-        return session->httpDelete(url);
+        chunk = stream->read();
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
-        return NULL;
+        chunk = NULL;
     }
+    stream->busy = false;
+    if (stream->done && !stream->recorded && stream->owner) {
+        stream->recorded = true;
+        recordDetached(get_session(stream->owner), stream->curl, stream->result);
+    }
+    return chunk;
 }
 
-static PyObject* http_head(PyObject* self, PyObject* args) {
+static PyObject* stream_status(PyObject* self, PyObject* args) {
     PyObject* capsule;
-    const char* url;
-    if (!PyArg_ParseTuple(args, "Os", &capsule, &url)) return NULL;
-    Session* session = get_session_from_capsule(capsule);
+    if (!PyArg_ParseTuple(args, "O", &capsule)) return NULL;
+    Stream* stream = (Stream*)PyCapsule_GetPointer(capsule, "Stream");
+    if (!stream) return NULL;
+    return PyLong_FromLong(stream->status());
+}
+
+static PyObject* stream_close(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    if (!PyArg_ParseTuple(args, "O", &capsule)) return NULL;
+    Stream* stream = get_stream_from_capsule(capsule);
+    if (!stream) return NULL;
+    stream->close();
+    Py_RETURN_NONE;
+}
+
+static PyObject* get_timing(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    if (!PyArg_ParseTuple(args, "O", &capsule)) return NULL;
+    Session* session = get_session(capsule);
+    if (!session) return NULL;
+    if (!session->has_timing) Py_RETURN_NONE;
+    return session->timing.toDict();
+}
+
+static void stats_destructor(PyObject* capsule) {
+    Stats* stats = (Stats*)PyCapsule_GetPointer(capsule, "Stats");
+    delete stats;
+}
+
+static PyObject* create_stats(PyObject* self, PyObject* args) {
+    Stats* stats = new Stats();
+    PyObject* capsule = PyCapsule_New(stats, "Stats", stats_destructor);
+    if (!capsule) delete stats;
+    return capsule;
+}
+
+static PyObject* set_stats(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    PyObject* stats;
+    if (!PyArg_ParseTuple(args, "OO", &capsule, &stats)) return NULL;
+    Session* session = get_session(capsule);
     if (!session) return NULL;
+    if (stats != Py_None && !PyCapsule_GetPointer(stats, "Stats")) return NULL;
+
+    PyObject* previous;
     try {
-        return session->httpHead(url);
+        SessionLock lock(session);
+        previous = session->stats;
+        session->stats = stats != Py_None ? stats : nullptr;
+        Py_XINCREF(session->stats);
     } catch (const std::exception& e) {
         PyErr_SetString(PyExc_RuntimeError, e.what());
         return NULL;
     }
+    Py_XDECREF(previous);
+    Py_RETURN_NONE;
+}
+
+static PyObject* stats_snapshot(PyObject* self, PyObject* args) {
+    PyObject* capsule;
+    int reset = 0;
+    if (!PyArg_ParseTuple(args, "O|p", &capsule, &reset)) return NULL;
+    Stats* stats = (Stats*)PyCapsule_GetPointer(capsule, "Stats");
+    if (!stats) return NULL;
+    return stats->snapshot(reset);
+}
+
+// Parse vectorcall arguments against a NULL-terminated list of parameter names without building a tuple
+// or dict. values gets one borrowed reference per name, NULL for an optional argument that was not passed.
+static bool fastcall_parse(const char* function, PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames,
+                           const char* const* names, Py_ssize_t required, PyObject** values) {
+    Py_ssize_t count = 0;
+    while (names[count]) count++;
+    if (nargs > count) {
+        PyErr_Format(PyExc_TypeError, "%s() takes at most %zd arguments (%zd given)", function, count, nargs);
+        return false;
+    }
+    for (Py_ssize_t i = 0; i < count; i++) values[i] = i < nargs ? args[i] : nullptr;
+
+    Py_ssize_t keywords = kwnames ? PyTuple_GET_SIZE(kwnames) : 0;
+    for (Py_ssize_t k = 0; k < keywords; k++) {
+        PyObject* name = PyTuple_GET_ITEM(kwnames, k);
+        Py_ssize_t i = 0;
+        while (i < count && PyUnicode_CompareWithASCIIString(name, names[i]) != 0) i++;
+        if (i == count) {
+            PyErr_Format(PyExc_TypeError, "%s() got an unexpected keyword argument '%U'", function, name);
+            return false;
+        }
+        if (values[i]) {
+            PyErr_Format(PyExc_TypeError, "%s() got multiple values for argument '%s'", function, names[i]);
+            return false;
+        }
+        values[i] = args[nargs + k];
+    }
+
+    for (Py_ssize_t i = 0; i < required; i++) {
+        if (!values[i]) {
+            PyErr_Format(PyExc_TypeError, "%s() missing required argument '%s'", function, names[i]);
+            return false;
+        }
+    }
+    return true;
+}
+
+// Return the UTF-8 form of a str argument, or NULL for None when none_ok is set or with TypeError set.
+static const char* fastcall_str(PyObject* value, const char* name, bool none_ok) {
+    if (!value || (none_ok && value == Py_None)) return nullptr;
+    if (!PyUnicode_Check(value)) {
+        PyErr_Format(PyExc_TypeError, "%s must be str%s, not %.200s", name, none_ok ? " or None" : "",
+                     Py_TYPE(value)->tp_name);
+        return nullptr;
+    }
+    return PyUnicode_AsUTF8(value);
+}
+
+static const char* const url_parameters[] = {"url", nullptr};
+static const char* const body_parameters[] = {"url", "body", "content_type", nullptr};
+static const char* const prepared_parameters[] = {"prepared", nullptr};
+
+static PyObject* session_method_url(SessionObject* self, UrlRequest request, const char* function,
+                                    PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames) {
+    PyObject* values[1];
+    const char* url;
+    if (!fastcall_parse(function, args, nargs, kwnames, url_parameters, 1, values) ||
+        !(url = fastcall_str(values[0], "url", false))) return NULL;
+    return session_url_request(self->session, request, url);
+}
+
+static PyObject* session_method_body(SessionObject* self, BodyRequest request, const char* function,
+                                     PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames) {
+    PyObject* values[3];
+    const char* url;
+    if (!fastcall_parse(function, args, nargs, kwnames, body_parameters, 2, values) ||
+        !(url = fastcall_str(values[0], "url", false))) return NULL;
+    const char* content_type = fastcall_str(values[2], "content_type", true);
+    if (!content_type && PyErr_Occurred()) return NULL;
+    return session_body_request(self->session, request, url, values[1], content_type);
+}
+
+static PyObject* SessionType_get(SessionObject* self, PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames) {
+    return session_method_url(self, &Session::httpGet, "get", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_post(SessionObject* self, PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames) {
+    return session_method_body(self, &Session::httpPost, "post", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_put(SessionObject* self, PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames) {
+    return session_method_body(self, &Session::httpPut, "put", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_delete(SessionObject* self, PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames) {
+    return session_method_url(self, &Session::httpDelete, "delete", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_head(SessionObject* self, PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames) {
+    return session_method_url(self, &Session::httpHead, "head", args, nargs, kwnames);
+}
+
+static PyObject* SessionType_send(SessionObject* self, PyObject* const* args, Py_ssize_t nargs, PyObject* kwnames) {
+    PyObject* values[1];
+    if (!fastcall_parse("send", args, nargs, kwnames, prepared_parameters, 1, values)) return NULL;
+    return session_send_prepared(self->session, values[0]);
+}
+
+// Free the curl handle and its connections now instead of when the last reference goes. Idempotent.
+static PyObject* SessionType_close(SessionObject* self, PyObject* Py_UNUSED(ignored)) {
+    Session* session = self->session;
+    PyObject* prepared;
+    {
+        SessionLock lock(session, true);
+        prepared = session->prepared;
+        session->prepared = nullptr;
+        if (session->curl) session->close();
+    }
+    Py_XDECREF(prepared);
+    Py_RETURN_NONE;
+}
+
+static PyObject* SessionType_enter(SessionObject* self, PyObject* Py_UNUSED(ignored)) {
+    Py_INCREF(self);
+    return (PyObject*)self;
+}
+
+static PyObject* SessionType_exit(SessionObject* self, PyObject* const* args, Py_ssize_t nargs) {
+    return SessionType_close(self, nullptr);
+}
+
+static PyObject* SessionType_closed(SessionObject* self, void* Py_UNUSED(closure)) {
+    return PyBool_FromLong(self->session->curl == nullptr);
 }
 
+static PyMethodDef SessionType_methods[] = {
+    {"get", (PyCFunction)(void(*)(void))SessionType_get, METH_FASTCALL | METH_KEYWORDS, "get(url) -> (status, body, headers)"},
+    {"post", (PyCFunction)(void(*)(void))SessionType_post, METH_FASTCALL | METH_KEYWORDS, "post(url, body, content_type=None) -> (status, body, headers)"},
+    {"put", (PyCFunction)(void(*)(void))SessionType_put, METH_FASTCALL | METH_KEYWORDS, "put(url, body, content_type=None) -> (status, body, headers)"},
+    {"delete", (PyCFunction)(void(*)(void))SessionType_delete, METH_FASTCALL | METH_KEYWORDS, "delete(url) -> (status, body, headers)"},
+    {"head", (PyCFunction)(void(*)(void))SessionType_head, METH_FASTCALL | METH_KEYWORDS, "head(url) -> (status, body, headers)"},
+    {"send", (PyCFunction)(void(*)(void))SessionType_send, METH_FASTCALL | METH_KEYWORDS, "send(prepared) -> (status, body, headers) for a request from create_prepared()"},
+    {"close", (PyCFunction)SessionType_close, METH_NOARGS, "Free the curl handle and its connections; later requests raise RuntimeError."},
+    {"__enter__", (PyCFunction)SessionType_enter, METH_NOARGS, NULL},
+    {"__exit__", (PyCFunction)(void(*)(void))SessionType_exit, METH_FASTCALL, NULL},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef SessionType_getset[] = {
+    {"closed", (getter)SessionType_closed, NULL, "Whether close() has been called.", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
 static PyMethodDef HttpRequestMethods[] = {
     {"create_session", create_session, METH_NOARGS, "Create a new session."},
     {"set_user_agent", set_user_agent, METH_VARARGS, "Set user agent."},
     {"set_proxy", set_proxy, METH_VARARGS, "Set proxy."},
-    {"set_cookie_file", set_cookie_file, METH_VARARGS, "Set cookie file."},
+    {"set_cookie_file", set_cookie_file, METH_VARARGS, "Load cookies from a file and write them back to it when the session closes."},
+    {"flush_cookies", flush_cookies, METH_VARARGS, "Write the session's cookies to its cookie file now."},
+    {"get_cookies", get_cookies, METH_VARARGS, "Get the session's cookies as Netscape cookie file lines."},
     {"set_ssl_cert", set_ssl_cert, METH_VARARGS, "Set SSL certificate."},
     {"set_ssl_key", set_ssl_key, METH_VARARGS, "Set SSL key."},
     {"set_timeout", set_timeout, METH_VARARGS, "Set timeout."},
+    {"set_http_version", set_http_version, METH_VARARGS, "Set the HTTP version (HTTP_1_1, HTTP_2 or HTTP_2_PRIOR_KNOWLEDGE)."},
+    {"set_max_concurrent_streams", set_max_concurrent_streams, METH_VARARGS, "Set the HTTP/2 stream limit per connection for batches (0 for the libcurl default)."},
+    {"set_accept_encoding", set_accept_encoding, METH_VARARGS, "Set the accepted response encodings (\"\" for all supported, None to disable)."},
+    {"set_request_compression", set_request_compression, METH_VARARGS, "Gzip POST/PUT bodies of at least threshold bytes (0 to disable)."},
+    {"set_tcp_options", set_tcp_options, METH_VARARGS, "Set TCP_NODELAY, TCP keepalive idle and interval seconds (0 to disable) and TCP Fast Open."},
+    {"set_max_connection_age", set_max_connection_age, METH_VARARGS, "Stop reusing connections older than max_age seconds (0 for no limit)."},
+    {"set_max_connections", set_max_connections, METH_VARARGS, "Set how many idle connections the session keeps (0 for the libcurl default)."},
+    {"set_ca_file", set_ca_file, METH_VARARGS, "Set the CA bundle used to verify servers (None for the default)."},
+    {"set_resolve", set_resolve, METH_VARARGS, "Pin host names to addresses with CURLOPT_RESOLVE entries (None to clear the list)."},
+    {"warm", warm, METH_VARARGS, "Open connections to each URL ahead of the first request; returns {url: (connections, error)}."},
+    {"get_timing", get_timing, METH_VARARGS, "Get the timing breakdown of the session's last request."},
+    {"create_stats", create_stats, METH_NOARGS, "Create a per-host latency histogram aggregator."},
+    {"set_stats", set_stats, METH_VARARGS, "Attach a stats aggregator to a session (None to detach)."},
+    {"stats_snapshot", stats_snapshot, METH_VARARGS, "Get per-host latency statistics, optionally resetting them."},
     {"http_get", http_get, METH_VARARGS, "Perform an HTTP GET request."},
     {"http_post", http_post, METH_VARARGS, "Perform an HTTP POST request."},
     {"http_put", http_put, METH_VARARGS, "Perform an HTTP PUT request."},
     {"http_delete", http_delete, METH_VARARGS, "Perform an HTTP DELETE request."},
     {"http_head", http_head, METH_VARARGS, "Perform an HTTP HEAD request."},
+    {"create_prepared", create_prepared, METH_VARARGS, "Compile a request's method, URL, headers and body once for repeated use."},
+    {"http_prepared", http_prepared, METH_VARARGS, "Perform a prepared request (repeating the session's last one sets no options)."},
+    {"http_get_many", http_get_many, METH_VARARGS, "Perform many HTTP GET requests concurrently."},
+    {"http_request_many", http_request_many, METH_VARARGS, "Perform many HTTP requests concurrently."},
+    {"http_hedged", http_hedged, METH_VARARGS, "Perform a request, starting duplicates while it runs longer than hedge_delay."},
+    {"http_download", http_download, METH_VARARGS, "Download a URL straight to a file, resuming a partial file."},
+    {"stream_open", stream_open, METH_VARARGS, "Start a streaming HTTP request."},
+    {"stream_read", stream_read, METH_VARARGS, "Read the next body chunk of a stream (empty at the end)."},
+    {"stream_status", stream_status, METH_VARARGS, "Get the HTTP status code of a stream."},
+    {"stream_close", stream_close, METH_VARARGS, "Close a stream and abort its transfer."},
     {NULL, NULL, 0, NULL}
 };
 
@@ -357,5 +2718,41 @@ static struct PyModuleDef http_request_module = {
 };
 
 PyMODINIT_FUNC PyInit_CPHTTP(void) {
-    return PyModule_Create(&http_request_module);
+    // Initialize libcurl here, once and under the import lock, rather than implicitly and thread-unsafely
+    // in the first curl_easy_init(). libcurl counts calls, so loading both extensions is fine.
+    CURLcode init = curl_global_init(CURL_GLOBAL_DEFAULT);
+    if (init != CURLE_OK) {
+        PyErr_Format(PyExc_ImportError, "curl_global_init failed: %s", curl_easy_strerror(init));
+        return NULL;
+    }
+    SessionType.tp_name = "CPHTTP.Session";
+    SessionType.tp_doc = "Session()\n--\n\n"
+        "A curl easy handle with its options, connection cache and response buffers. The methods run one\n"
+        "request and return (status, body, headers); the module functions take the session as their\n"
+        "first argument. A session is a context manager that closes it on exit.";
+    SessionType.tp_basicsize = sizeof(SessionObject);
+    SessionType.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC;
+    SessionType.tp_dealloc = (destructor)session_dealloc;
+    SessionType.tp_traverse = (traverseproc)session_traverse;
+    SessionType.tp_clear = (inquiry)session_clear;
+    SessionType.tp_weaklistoffset = offsetof(SessionObject, weakreflist);
+    SessionType.tp_methods = SessionType_methods;
+    SessionType.tp_getset = SessionType_getset;
+    SessionType.tp_new = session_new;
+    if (PyType_Ready(&SessionType) < 0) return NULL;
+    PyObject* module = PyModule_Create(&http_request_module);
+    if (!module) return NULL;
+    Py_INCREF(&SessionType);
+    if (PyModule_AddObject(module, "Session", (PyObject*)&SessionType) < 0) {
+        Py_DECREF(&SessionType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    if (PyModule_AddIntConstant(module, "HTTP_1_1", CURL_HTTP_VERSION_1_1) < 0 ||
+        PyModule_AddIntConstant(module, "HTTP_2", CURL_HTTP_VERSION_2TLS) < 0 ||
+        PyModule_AddIntConstant(module, "HTTP_2_PRIOR_KNOWLEDGE", CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE) < 0) {
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
 }
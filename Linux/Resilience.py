@@ -0,0 +1,176 @@
+"""
+Retry and hedging policies shared by the clients.
+
+RetryPolicy re-sends idempotent requests that failed in transport or answered
+with a retryable status, sleeping an exponentially growing, fully jittered
+delay between attempts and honouring Retry-After. HedgePolicy decides how long
+to wait before a duplicate of a slow request is started, either a fixed delay
+or a latency percentile of the host taken from the client's statistics.
+Clients take them through set_retry_policy() and set_hedging(). The modules
+only needed once a request is retried or hedged are imported on first use.
+"""
+
+import time
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"))
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "TRACE"))
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def stats_key(url):
+    """Returns the "host:port" key the extensions use for url in a stats snapshot."""
+    from urllib.parse import urlsplit
+    return urlsplit(url).netloc.rpartition("@")[2]
+
+
+def retry_after_seconds(value, now=None):
+    """
+    Parses a Retry-After header value.
+
+    Returns:
+        float or None: The seconds to wait, or None when the value is neither a number of seconds nor an HTTP-date.
+    """
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from datetime import datetime, timezone
+    from email.utils import parsedate_to_datetime
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Retries idempotent requests that fail in transport (the extension raises RuntimeError) or answer with
+    one of the retry statuses.
+
+    The delay before retry n (counting from 0) is drawn uniformly from 0 to min(max_backoff, backoff * 2 ** n),
+    so clients that failed together do not retry together. A Retry-After header on a retryable response
+    replaces that delay; when it asks for longer than max_backoff the response is returned instead.
+
+    Example:
+        client.set_retry_policy(RetryPolicy(retries=5, backoff=0.2))
+    """
+
+    def __init__(self, retries=3, backoff=0.1, max_backoff=10.0, statuses=RETRY_STATUSES,
+                 methods=IDEMPOTENT_METHODS):
+        if retries < 0 or backoff < 0 or max_backoff < 0:
+            raise ValueError("retries, backoff and max_backoff must not be negative.")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+
+    def backoff_delay(self, attempt):
+        """Returns a full-jitter delay in seconds before retry number attempt."""
+        import random
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def retry_delay(self, attempt, response):
+        """Returns the delay before retrying response, or None when its Retry-After is too long to wait for."""
+        retry_after = response.headers.get("retry-after")
+        if retry_after is not None:
+            seconds = retry_after_seconds(retry_after)
+            if seconds is not None:
+                return seconds if seconds <= self.max_backoff else None
+        return self.backoff_delay(attempt)
+
+    def run(self, send):
+        """
+        Calls send() until it returns a response that should not be retried or the retries are used up.
+
+        Parameters:
+            send (callable): Performs one attempt and returns a Response, raising RuntimeError on transport errors.
+
+        Returns:
+            Response: The last response received.
+
+        Raises:
+            RuntimeError: The transport error of the last attempt.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = send()
+            except RuntimeError:
+                if attempt >= self.retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+            else:
+                if response.status_code not in self.statuses or attempt >= self.retries:
+                    return response
+                delay = self.retry_delay(attempt, response)
+                if delay is None:
+                    return response
+            time.sleep(delay)
+            attempt += 1
+
+
+class HedgePolicy:
+    """
+    Decides when to start a duplicate of a request that is still running.
+
+    delay is either a number of seconds or a percentile name ("p50", "p90", "p95", "p99" or "p999"). With a
+    percentile, the delay for a host is read from the client's latency statistics, refreshed at most once
+    every refresh seconds, and requests are not hedged until the host has min_samples successful requests.
+
+    Example:
+        client.set_hedging("p95", max_hedges=1)
+    """
+
+    PERCENTILES = ("p50", "p90", "p95", "p99", "p999")
+
+    def __init__(self, delay, max_hedges=1, min_samples=20, refresh=1.0):
+        if isinstance(delay, str):
+            if delay not in self.PERCENTILES:
+                raise ValueError(f"delay must be a number of seconds or one of {', '.join(self.PERCENTILES)}.")
+        elif delay < 0:
+            raise ValueError("delay must not be negative.")
+        if max_hedges < 1:
+            raise ValueError("max_hedges must be at least 1.")
+        self.delay = delay
+        self.max_hedges = max_hedges
+        self.min_samples = min_samples
+        self.refresh = refresh
+        self._delays = {}
+        self._refreshed = None
+
+    @property
+    def adaptive(self):
+        """bool: Whether the delay comes from latency statistics."""
+        return isinstance(self.delay, str)
+
+    def delay_for(self, url, snapshot):
+        """
+        Returns the hedge delay for url in seconds, or None when the request should not be hedged.
+
+        Parameters:
+            url (str): The request URL.
+            snapshot (callable or None): Returns the client's stats snapshot; None when statistics are off.
+        """
+        if not self.adaptive:
+            return self.delay
+        if snapshot is None:
+            return None
+
+        now = time.monotonic()
+        if self._refreshed is None or now - self._refreshed >= self.refresh:
+            self._delays = {
+                host: stats[self.delay]
+                for host, stats in snapshot().items()
+                if stats["count"] >= self.min_samples
+            }
+            self._refreshed = now
+        return self._delays.get(stats_key(url))
+
+
+def replayable(body):
+    """Returns whether body can be sent again: None, str or bytes-like, but not a file object or iterable."""
+    return body is None or isinstance(body, (bytes, bytearray, memoryview, str))
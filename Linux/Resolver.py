@@ -0,0 +1,294 @@
+"""
+An in-process DNS cache that clients pin into libcurl with CURLOPT_RESOLVE.
+
+DNSCache resolves each host once per TTL and hands the addresses to the
+sessions as "host:port:address" entries, so libcurl never blocks a request on
+its own lookup. Entries that keep being used are refreshed by a background
+thread before they expire, lookups that failed are remembered for a shorter
+negative TTL, and concurrent misses for the same host wait for one lookup.
+One cache is meant to be shared by every client in the process.
+"""
+
+import ipaddress
+import socket
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+@lru_cache(maxsize=4096)
+def split_host(url):
+    """
+    Returns the (host, port) a URL connects to, or None when the host is an IP literal or missing, since those
+    need no lookup.
+    """
+    from urllib.parse import urlsplit
+    parts = urlsplit(url)
+    host = parts.hostname
+    if not host:
+        return None
+    try:
+        ipaddress.ip_address(host)
+        return None
+    except ValueError:
+        pass
+    try:
+        port = parts.port
+    except ValueError:
+        return None
+    if port is None:
+        port = DEFAULT_PORTS.get(parts.scheme.lower())
+        if port is None:
+            return None
+    return host, port
+
+
+def system_resolve(host, port):
+    """Resolves host with getaddrinfo and returns its addresses in the order the system prefers them."""
+    addresses = []
+    for _, _, _, _, sockaddr in socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM):
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return addresses
+
+
+class _Entry:
+    __slots__ = ("addresses", "error", "expires", "used", "pending", "refreshing")
+
+    def __init__(self):
+        self.addresses = None
+        self.error = None
+        self.expires = 0.0
+        self.used = False
+        # pending: the first lookup is running and there is nothing to answer with yet.
+        # refreshing: the background thread is re-resolving an entry that still answers lookups.
+        self.pending = True
+        self.refreshing = False
+
+
+class DNSCache:
+    """
+    Caches host name lookups with a TTL and keeps hot entries fresh in the background.
+
+    A lookup that misses resolves in the calling thread; other threads asking for the same host meanwhile wait
+    for that lookup instead of starting their own. An entry that was used during its TTL is re-resolved by the
+    background thread once less than refresh_ahead of its TTL is left, so hot hosts never miss again; an entry
+    nobody used is dropped when it expires. A failed lookup is cached for negative_ttl and raises again until
+    then. getaddrinfo reports no record TTL, so ttl applies to every host.
+
+    Parameters:
+        ttl (float): Seconds a successful lookup is used for.
+        negative_ttl (float): Seconds a failed lookup is remembered for, or 0 to retry every time.
+        refresh_ahead (float): Fraction of ttl before expiry at which used entries are refreshed, between 0 and 1.
+            0 turns refreshing off, so every entry misses once it expires.
+        resolve (callable, optional): resolve(host, port) returning a list of address strings. Any exception
+            it raises counts as a failed lookup. Defaults to getaddrinfo; pass a stub to resolve from a table in tests.
+
+    Example:
+        cache = Resolver.DNSCache(ttl=30)
+        for client in clients:
+            client.set_resolver(cache)
+    """
+
+    def __init__(self, ttl=60.0, negative_ttl=5.0, refresh_ahead=0.2, resolve=None):
+        if ttl <= 0:
+            raise ValueError("ttl must be positive.")
+        if negative_ttl < 0:
+            raise ValueError("negative_ttl must not be negative.")
+        if not 0 <= refresh_ahead < 1:
+            raise ValueError("refresh_ahead must be between 0 and 1.")
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ahead = refresh_ahead
+        self.resolve = resolve if resolve is not None else system_resolve
+        self._entries = {}
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._counters = dict.fromkeys(("hits", "misses", "negative_hits", "refreshes", "prefetches", "failures"), 0)
+
+    def lookup(self, host, port):
+        """
+        Returns the cached addresses of host, resolving it first if there is no fresh entry.
+
+        Parameters:
+            host (str): The host name.
+            port (int): The port, which is part of the key because CURLOPT_RESOLVE entries are per port.
+
+        Returns:
+            list of str: The addresses, in the order to try them.
+
+        Raises:
+            RuntimeError: If the lookup failed now or within the last negative_ttl seconds.
+        """
+        key = (host, port)
+        with self._condition:
+            while True:
+                entry = self._entries.get(key)
+                if entry is None or (not entry.pending and entry.expires <= time.monotonic()):
+                    break
+                if entry.pending:
+                    self._condition.wait()
+                    continue
+                entry.used = True
+                if entry.error is not None:
+                    self._counters["negative_hits"] += 1
+                    raise RuntimeError(entry.error)
+                self._counters["hits"] += 1
+                return entry.addresses
+            self._counters["misses"] += 1
+            entry = self._entries[key] = _Entry()
+            entry.used = True
+            self._start()
+
+        self._resolve(key, entry)
+        if entry.error is not None:
+            raise RuntimeError(entry.error)
+        return entry.addresses
+
+    @staticmethod
+    def key_for(url):
+        """Returns the (host, port) key of the host url connects to, or None when it is an IP literal and needs no lookup."""
+        return split_host(url)
+
+    def entry(self, host, port):
+        """
+        Returns the CURLOPT_RESOLVE entry for host and port, "host:port:address[,address...]", looking the host
+        up as lookup() does. IPv6 addresses are written in brackets.
+
+        Raises:
+            RuntimeError: If the lookup failed.
+        """
+        addresses = ",".join(f"[{address}]" if ":" in address else address for address in self.lookup(host, port))
+        return f"{host}:{port}:{addresses}"
+
+    def prefetch(self, urls):
+        """
+        Resolves the hosts of urls in the background thread, so the first requests to them hit the cache.
+        Hosts with a fresh entry are skipped.
+
+        Parameters:
+            urls (iterable of str): URLs whose hosts to resolve.
+        """
+        with self._condition:
+            now = time.monotonic()
+            for url in urls:
+                key = split_host(url)
+                if key is None:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None and (entry.pending or entry.expires > now):
+                    continue
+                entry = self._entries[key] = _Entry()
+                self._queue.append((key, entry))
+                self._counters["prefetches"] += 1
+            self._start()
+            self._condition.notify_all()
+
+    def _resolve(self, key, entry):
+        addresses = error = None
+        try:
+            addresses = list(self.resolve(*key))
+            if not addresses:
+                raise OSError("no addresses")
+        except Exception as e:
+            # Not only OSError: getaddrinfo raises UnicodeError for a label over 63 characters, and a resolve
+            # hook may raise anything. The error is cached like any failed lookup.
+            addresses = None
+            error = f"Could not resolve host: {key[0]} ({e})"
+        finally:
+            # Runs even when the lookup was interrupted, so threads waiting on a pending entry never hang.
+            with self._condition:
+                if addresses is not None:
+                    entry.addresses, entry.error = addresses, None
+                    entry.expires = time.monotonic() + self.ttl
+                elif entry.addresses is not None and entry.expires > time.monotonic():
+                    # A failed refresh keeps the addresses that are still valid; the next refresh tries again.
+                    self._counters["failures"] += 1
+                else:
+                    entry.addresses = None
+                    entry.error = error or f"Could not resolve host: {key[0]} (lookup interrupted)"
+                    entry.expires = time.monotonic() + self.negative_ttl
+                    self._counters["failures"] += 1
+                entry.pending = entry.refreshing = False
+                self._condition.notify_all()
+
+    def _start(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="DNSCache", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return
+                    if self._queue:
+                        key, entry = self._queue.popleft()
+                        break
+                    key, entry, wait = self._next_refresh(time.monotonic())
+                    if key is not None:
+                        self._counters["refreshes"] += 1
+                        break
+                    self._condition.wait(wait)
+            self._resolve(key, entry)
+
+    def _next_refresh(self, now):
+        """Drops expired entries nobody used and returns (key, entry, None) for the first used entry due for a refresh, or (None, None, seconds until the next one is due)."""
+        ahead = self.ttl * self.refresh_ahead
+        wait = None
+        for key, entry in list(self._entries.items()):
+            if entry.pending or entry.refreshing:
+                continue
+            hot = ahead > 0 and entry.error is None and entry.used
+            if hot and entry.expires - ahead <= now:
+                entry.used = False
+                entry.refreshing = True
+                return key, entry, None
+            if entry.expires <= now:
+                del self._entries[key]
+                continue
+            due = entry.expires - (ahead if hot else 0.0)
+            wait = due - now if wait is None else min(wait, due - now)
+        return None, None, wait
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: hits, misses, negative_hits (lookups answered by a cached failure), refreshes (background
+            re-resolves of hot entries), prefetches, failures (lookups that failed) and entries (hosts cached now).
+        """
+        with self._condition:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            return stats
+
+    def clear(self):
+        """Forgets every cached entry. Lookups in progress finish but their results are not kept."""
+        with self._condition:
+            for entry in self._entries.values():
+                entry.pending = False
+            self._entries.clear()
+            self._queue.clear()
+            self._condition.notify_all()
+
+    def close(self):
+        """Stops the background thread. Lookups still work afterwards but nothing is refreshed or prefetched."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,95 @@
+import JSONCodec
+
+
+class Response:
+    """
+    The result of an HTTP request.
+
+    The status code, raw body bytes and raw header block are stored as returned by the extension.
+    Headers are parsed the first time headers is read and the body is decoded the first time text is
+    read, so code that only looks at status_code or content pays for neither.
+
+    Example:
+        response = client.http_get("http://example.com")
+        if response.ok:
+            print(response.headers.get("content-type"), len(response.content))
+    """
+
+    __slots__ = ("status_code", "content", "raw_headers", "_headers", "_text")
+
+    def __init__(self, status_code, content, raw_headers):
+        self.status_code = status_code
+        self.content = content
+        self.raw_headers = raw_headers
+        self._headers = None
+        self._text = None
+
+    @property
+    def ok(self):
+        """bool: Whether the status code is below 400."""
+        return 0 < self.status_code < 400
+
+    @property
+    def headers(self):
+        """
+        dict: The response headers with lower-cased names. Repeated headers are joined with ", ".
+        When the request followed redirects or received a 100 Continue, only the final response's
+        headers are included.
+        """
+        if self._headers is None:
+            self._headers = _parse_headers(self.raw_headers)
+        return self._headers
+
+    @property
+    def encoding(self):
+        """str: The charset from the Content-Type header, or "utf-8" when none is given."""
+        content_type = self.headers.get("content-type", "")
+        for parameter in content_type.split(";")[1:]:
+            name, _, value = parameter.partition("=")
+            if name.strip().lower() == "charset" and value.strip():
+                return value.strip().strip('"')
+        return "utf-8"
+
+    @property
+    def text(self):
+        """str: The body decoded with the response's encoding. Undecodable bytes are replaced."""
+        if self._text is None:
+            try:
+                self._text = self.content.decode(self.encoding, "replace")
+            except LookupError:
+                self._text = self.content.decode("utf-8", "replace")
+        return self._text
+
+    def json(self):
+        """
+        Parses the body as JSON, straight from the body bytes.
+
+        Returns:
+            The decoded JSON value.
+
+        Raises:
+            ValueError: If the body is not valid JSON.
+        """
+        return JSONCodec.loads(self.content)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"<Response [{self.status_code}]>"
+
+
+def _parse_headers(raw_headers):
+    blocks = [block for block in raw_headers.split(b"\r\n\r\n") if block.strip()]
+    headers = {}
+    if not blocks:
+        return headers
+
+    for line in blocks[-1].decode("latin-1").split("\r\n")[1:]:
+        name, separator, value = line.partition(":")
+        if not separator:
+            continue
+        name = name.strip().lower()
+        value = value.strip()
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return headers
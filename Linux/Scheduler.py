@@ -0,0 +1,296 @@
+"""
+Per-host admission control shared by clients and batches.
+
+HostScheduler caps the number of requests in flight to each host and, when
+given a rate, meters them through a token bucket. The cap adapts with AIMD:
+it grows by about one request per round trip while the host keeps up, and
+is cut by a constant factor when the host answers 429 or 503, fails in
+transport, or its smoothed latency climbs past the target. One scheduler is
+meant to be shared by every client and thread that talks to the same hosts.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+from Resilience import retry_after_seconds, stats_key
+
+THROTTLE_STATUSES = (429, 503)
+
+
+class _Host:
+    __slots__ = ("limit", "in_flight", "tokens", "refilled", "blocked_until", "latency", "min_latency",
+                 "min_latency_at", "decreased_at", "completed", "throttled", "errors")
+
+    def __init__(self, limit, tokens, now):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.tokens = tokens
+        self.refilled = now
+        self.blocked_until = 0.0
+        self.latency = None
+        self.min_latency = None
+        self.min_latency_at = now
+        self.decreased_at = 0.0
+        self.completed = 0
+        self.throttled = 0
+        self.errors = 0
+
+
+class HostScheduler:
+    """
+    Limits and adapts the number of concurrent requests per host.
+
+    Every request takes a slot with acquire() and gives it back with release(), or runs through call(),
+    which does both. A host starts at initial_limit slots. Each success while the host's slots are all in
+    use adds 1 / limit, so the limit grows by one per window of requests. A 429 or 503 response, a transport
+    error, or a smoothed latency above latency_target (by default latency_tolerance times the lowest latency
+    seen recently) multiplies the limit by decrease, at most once per round trip. A Retry-After header on
+    a throttled response also pauses the host until it has passed.
+
+    Parameters:
+        initial_limit (int): Slots per host before any feedback.
+        min_limit (int): The limit is never cut below this.
+        max_limit (int): The limit never grows beyond this.
+        rate (float or None): Requests per second per host allowed by the token bucket, or None for no rate limit.
+        burst (int or None): Token bucket size, which is how many requests may start at once after an idle
+            period. Defaults to the rate rounded up, and at least 1.
+        latency_target (float or None): Smoothed latency in seconds above which the limit is cut.
+        latency_tolerance (float): Used when latency_target is None: how many times the recent minimum
+            latency the smoothed latency may reach before the limit is cut.
+        decrease (float): Factor the limit is multiplied by on congestion.
+
+    Example:
+        scheduler = HostScheduler(initial_limit=8, max_limit=128, rate=200)
+        for client in clients:
+            client.set_scheduler(scheduler)
+    """
+
+    MIN_LATENCY_WINDOW = 10.0
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=256, rate=None, burst=None, latency_target=None,
+                 latency_tolerance=2.0, decrease=0.5):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit.")
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive.")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1.")
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.rate = rate
+        self.burst = max(1, burst if burst is not None else math.ceil(rate or 1))
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.decrease = decrease
+        self._hosts = {}
+        self._condition = threading.Condition()
+
+    def _host(self, key, now):
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = _Host(self.initial_limit, self.burst, now)
+        return host
+
+    def _refill(self, host, now):
+        if self.rate is not None:
+            host.tokens = min(self.burst, host.tokens + (now - host.refilled) * self.rate)
+        host.refilled = now
+
+    def acquire(self, url, timeout=None):
+        """
+        Waits until the host of url has a free slot (and a token, with a rate limit) and takes it.
+
+        Parameters:
+            url (str): The request URL.
+            timeout (float or None): The longest time to wait in seconds, or None to wait as long as it takes.
+
+        Returns:
+            str: The host key, to pass to release().
+
+        Raises:
+            TimeoutError: If no slot became free within timeout.
+        """
+        key = stats_key(url)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                host = self._host(key, now)
+                self._refill(host, now)
+                if host.blocked_until > now:
+                    wait = host.blocked_until - now
+                elif host.in_flight >= int(host.limit):
+                    wait = None
+                elif self.rate is not None and host.tokens < 1:
+                    wait = (1 - host.tokens) / self.rate
+                else:
+                    host.in_flight += 1
+                    if self.rate is not None:
+                        host.tokens -= 1
+                    return key
+
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError(f"No slot for {key} became free within {timeout} seconds.")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+
+    def release(self, key, latency=None, status=None, error=False, retry_after=None):
+        """
+        Returns a slot taken by acquire() and feeds the outcome of the request back into the host's limit.
+
+        Parameters:
+            key (str): The host key returned by acquire().
+            latency (float or None): How long the request took in seconds, or None if unknown.
+            status (int or None): The response status code.
+            error (bool): Whether the request failed in transport.
+            retry_after (float or None): Seconds the server asked to wait, from a Retry-After header.
+        """
+        with self._condition:
+            now = time.monotonic()
+            host = self._hosts[key]
+            saturated = host.in_flight >= int(host.limit)
+            host.in_flight -= 1
+
+            if error or status in THROTTLE_STATUSES:
+                if error:
+                    host.errors += 1
+                else:
+                    host.throttled += 1
+                if retry_after:
+                    host.blocked_until = max(host.blocked_until, now + retry_after)
+                self._decrease(host, now)
+            else:
+                host.completed += 1
+                if latency is not None and self._observe_latency(host, latency, now):
+                    self._decrease(host, now)
+                elif saturated:
+                    host.limit = min(self.max_limit, host.limit + 1.0 / host.limit)
+            self._condition.notify_all()
+
+    def _observe_latency(self, host, latency, now):
+        """Updates the smoothed and minimum latency; returns whether the host looks congested."""
+        if host.latency is None:
+            host.latency = latency
+        else:
+            host.latency += self.LATENCY_SMOOTHING * (latency - host.latency)
+        if host.min_latency is None or latency < host.min_latency or \
+                now - host.min_latency_at > self.MIN_LATENCY_WINDOW:
+            host.min_latency = min(latency, host.latency)
+            host.min_latency_at = now
+        target = self.latency_target
+        if target is None:
+            target = host.min_latency * self.latency_tolerance
+        return host.latency > target
+
+    def _decrease(self, host, now):
+        # One cut per round trip, so a burst of failures from the same window counts as one signal.
+        if now - host.decreased_at < (host.latency or 0.0):
+            return
+        host.limit = max(float(self.min_limit), host.limit * self.decrease)
+        host.decreased_at = now
+
+    def call(self, url, send):
+        """
+        Runs send() in a slot for the host of url and reports its outcome.
+
+        Parameters:
+            url (str): The request URL.
+            send (callable): Performs the request and returns a Response, raising RuntimeError on transport errors.
+
+        Returns:
+            Response: What send() returned.
+        """
+        key = self.acquire(url)
+        start = time.monotonic()
+        try:
+            response = send()
+        except RuntimeError:
+            self.release(key, error=True)
+            raise
+        except BaseException:
+            self.release(key)
+            raise
+        retry_after = None
+        if response.status_code in THROTTLE_STATUSES:
+            value = response.headers.get("retry-after")
+            retry_after = retry_after_seconds(value) if value is not None else None
+        self.release(key, time.monotonic() - start, response.status_code, retry_after=retry_after)
+        return response
+
+    def request_many(self, client, requests):
+        """
+        Sends requests through client.http_request_many in rounds, each taking as many requests per host
+        as the host has free slots and tokens, and feeds the statuses back into the limits. Batch results
+        carry no per-request timing, so only statuses and errors adapt the limits here.
+
+        Parameters:
+            client: A CHTTPClient, CPHTTPClient or anything else with a compatible http_request_many.
+            requests (list of tuple): (method, url) or (method, url, payload) tuples.
+
+        Returns:
+            list of tuple: One (status_code, body, error) tuple per request, in input order.
+        """
+        results = [None] * len(requests)
+        pending = {}
+        for index, request in enumerate(requests):
+            pending.setdefault(stats_key(request[1]), deque()).append(index)
+
+        while pending:
+            batch, keys = [], []
+            for key, queue in list(pending.items()):
+                while queue:
+                    try:
+                        self.acquire(requests[queue[0]][1], timeout=0 if batch else None)
+                    except TimeoutError:
+                        break
+                    batch.append(queue.popleft())
+                    keys.append(key)
+                if not queue:
+                    del pending[key]
+
+            try:
+                batch_results = client.http_request_many([requests[index] for index in batch],
+                                                         max_in_flight=len(batch))
+            except BaseException:
+                # The slots taken for this round would otherwise stay in flight for good.
+                for key in keys:
+                    self.release(key, error=True)
+                raise
+            for index, key, result in zip(batch, keys, batch_results):
+                status, _, error = result
+                self.release(key, status=status, error=error is not None)
+                results[index] = result
+        return results
+
+    def snapshot(self):
+        """
+        Returns the live state of every host the scheduler has seen.
+
+        Returns:
+            dict: Maps "host:port" to a dict with limit (current slots), in_flight, tokens (None without a
+            rate), latency (smoothed, in seconds), min_latency, blocked_for (seconds left of a Retry-After
+            pause), and the completed, throttled and errors counters.
+        """
+        with self._condition:
+            now = time.monotonic()
+            snapshot = {}
+            for key, host in self._hosts.items():
+                self._refill(host, now)
+                snapshot[key] = {
+                    "limit": int(host.limit),
+                    "in_flight": host.in_flight,
+                    "tokens": host.tokens if self.rate is not None else None,
+                    "latency": host.latency,
+                    "min_latency": host.min_latency,
+                    "blocked_for": max(0.0, host.blocked_until - now),
+                    "completed": host.completed,
+                    "throttled": host.throttled,
+                    "errors": host.errors,
+                }
+            return snapshot
@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import pytest
+
+from AsyncCHTTP import AsyncCHTTPClient
+from Benchmarks.local_server import LocalServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 30))
+
+
+def test_concurrent_gets(server):
+    async def main():
+        async with AsyncCHTTPClient() as client:
+            start = time.monotonic()
+            bodies = await asyncio.gather(*(client.get(server.url(f"/?size={i + 1}&delay=200")) for i in range(50)))
+            return bodies, time.monotonic() - start, client
+
+    bodies, elapsed, client = run(main())
+    assert [response.content for response in bodies] == [b"x" * (i + 1) for i in range(50)]
+    # Fifty 200 ms answers one after another would take 10 s.
+    assert elapsed < 3
+    assert not client.futures
+
+
+def test_cancelled_request_is_removed(server):
+    async def main():
+        async with AsyncCHTTPClient() as client:
+            task = asyncio.ensure_future(client.get(server.url("/?delay=5000")))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert not client.futures
+            return (await client.get(server.url("/?size=3"))).content
+
+    assert run(main()) == b"xxx"
+
+
+def test_breaking_out_of_stream(server):
+    async def main():
+        async with AsyncCHTTPClient() as client:
+            chunks = 0
+            async for chunk in client.stream("GET", server.url("/?size=20000000"), chunk_size=65536):
+                assert len(chunk) == 65536
+                chunks += 1
+                if chunks == 2:
+                    break
+            # The abandoned generator is closed by the event loop's finalizer hook, which removes the transfer.
+            for _ in range(10):
+                if not client.streams:
+                    break
+                await asyncio.sleep(0)
+            assert not client.streams
+            return (await client.get(server.url("/?size=3"))).content
+
+    assert run(main()) == b"xxx"
+
+
+def test_breaking_out_of_stream_with_aclose(server):
+    async def main():
+        async with AsyncCHTTPClient() as client:
+            stream = client.stream("GET", server.url("/?size=20000000"), chunk_size=65536)
+            assert len(await stream.__anext__()) == 65536
+            await stream.aclose()
+            assert not client.streams
+            return (await client.get(server.url("/?size=3"))).content
+
+    assert run(main()) == b"xxx"
+
+
+def test_close_with_transfers_running(server):
+    async def main():
+        client = AsyncCHTTPClient()
+        requests = [asyncio.ensure_future(client.get(server.url("/?delay=5000"))) for _ in range(5)]
+
+        async def consume():
+            async for _ in client.stream("GET", server.url("/?size=100&delay=5000")):
+                pass
+
+        stream = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.2)
+        start = time.monotonic()
+        await client.close()
+        results = await asyncio.gather(*requests, stream, return_exceptions=True)
+        return results, time.monotonic() - start, client
+
+    results, elapsed, client = run(main())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results[:5])
+    assert isinstance(results[5], RuntimeError) and "closed" in str(results[5])
+    assert elapsed < 1
+    assert not client.futures and not client.streams and not client.watched
+
+
+def test_dict_payload_uses_json_codec(server):
+    import JSONCodec
+
+    value = {"name": "é", "items": [1, 2.5, None, True]}
+
+    async def main():
+        async with AsyncCHTTPClient() as client:
+            posted = await client.post(server.url("/?echo=1"), value)
+            streamed = b""
+            async for chunk in client.stream("PUT", server.url("/?echo=1"), value):
+                streamed += chunk
+            return posted, streamed
+
+    posted, streamed = run(main())
+    assert posted.content == JSONCodec.dumps(value)
+    assert streamed == JSONCodec.dumps(value)
+
+
+def test_response_carries_status_headers_and_binary_body(server):
+    async def main():
+        async with AsyncCHTTPClient() as client:
+            binary = await client.get(server.url("/?size=512&binary=1&type=image/png"))
+            missing = await client.get(server.url("/?status=404&size=0"))
+            head = await client.head(server.url("/?size=10"))
+            return binary, missing, head
+
+    binary, missing, head = run(main())
+    assert binary.status_code == 200
+    assert binary.content == (bytes(range(256)) * 2)
+    assert binary.headers["content-type"] == "image/png"
+    assert missing.status_code == 404 and not missing.ok
+    assert missing.content == b""
+    assert head.status_code == 200 and head.headers["content-length"] == "10" and head.content == b""
+
+
+def test_requests_are_timed(server):
+    from HTTPCore import CHTTP
+
+    async def main():
+        async with AsyncCHTTPClient() as client:
+            stats = CHTTP.create_stats()
+            CHTTP.set_stats(client.capsule, stats)
+            await asyncio.gather(*(client.get(server.url("/?size=10")) for _ in range(5)))
+            await client.get(server.url("/?size=700&delay=50"))
+            return CHTTP.get_timing(client.capsule), CHTTP.stats_snapshot(stats, False)
+
+    timing, stats = run(main())
+    assert timing["size_download"] == 700 and timing["total_time"] >= 0.05
+    assert stats[f"{server.host}:{server.port}"]["count"] == 6
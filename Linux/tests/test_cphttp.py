@@ -0,0 +1,43 @@
+import pytest
+
+import CPHTTP
+import HTTPLib.client
+import Scheduler
+from Benchmarks.local_server import LocalServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def test_shares_the_client_implementation():
+    assert issubclass(CPHTTP.CPHTTPClient, HTTPLib.client.CHTTPClient)
+
+
+def test_requests(server):
+    with CPHTTP.CPHTTPClient() as client:
+        assert len(client.http_get(server.url("/?size=5")).content) == 5
+        response = client.http_post(server.url("/?echo=1"), b"body")
+        assert response.status_code == 200 and response.content == b"body"
+        assert client.post_json(server.url("/?echo=1"), {"a": [1, 2]}) == {"a": [1, 2]}
+        assert client.send(client.prepare("PUT", server.url("/?echo=1"), b"put")).content == b"put"
+
+
+def test_request_errors_come_back_as_messages(server):
+    with CPHTTP.CPHTTPClient() as client:
+        message = client.http_get("http://127.0.0.1:1/")
+        assert isinstance(message, str) and message.startswith("Error: ")
+        assert client.http_delete("not a url").startswith("Error: ")
+        with pytest.raises(RuntimeError):
+            client.get_json("http://127.0.0.1:1/")
+
+
+def test_policies_apply(server):
+    scheduler = Scheduler.HostScheduler(initial_limit=2)
+    with CPHTTP.CPHTTPClient() as client:
+        client.set_scheduler(scheduler)
+        client.http_get(server.url("/?size=1"))
+        client.post_json(server.url("/?echo=1"), {})
+    assert scheduler.snapshot()[f"{server.host}:{server.port}"]["completed"] == 2
@@ -0,0 +1,50 @@
+import importlib
+import zlib
+
+import pytest
+
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient
+
+
+@pytest.fixture(scope="module")
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+@pytest.mark.parametrize("module_name", ["CHTTP", "CPHTTP"])
+def test_crc32_matches_zlib(tmp_path, server, module_name):
+    module = importlib.import_module(f"HTTPCore.{module_name}")
+    body = (bytes(range(256)) * 1024)[:200003]
+    path = tmp_path / "artifact.bin"
+    with CHTTPClient(module) as client:
+        info = client.http_download(server.url("/?size=200003&binary=1"), str(path), resume=False)
+        assert info["status"] == 200
+        assert info["crc32"] == zlib.crc32(body)
+
+        # A resumed download checksums the existing head before the new tail.
+        with open(path, "r+b") as f:
+            f.truncate(70001)
+        info = client.http_download(server.url("/?size=200003&binary=1"), str(path))
+        assert info["status"] == 206 and info["resumed_from"] == 70001
+        assert info["crc32"] == zlib.crc32(body)
+        assert path.read_bytes() == body
+
+
+@pytest.mark.parametrize("module_name", ["CHTTP", "CPHTTP"])
+def test_streams_and_downloads_are_timed(tmp_path, server, module_name):
+    module = importlib.import_module(f"HTTPCore.{module_name}")
+    with CHTTPClient(module) as client:
+        client.enable_stats()
+        client.http_download(server.url("/?size=1000&delay=50"), str(tmp_path / "a.bin"), resume=False)
+        timing = client.last_timing()
+        assert timing["size_download"] == 1000 and timing["total_time"] >= 0.05
+
+        assert b"".join(client.stream("GET", server.url("/?size=3000"), chunk_size=1024)) == b"x" * 3000
+        assert client.last_timing()["size_download"] == 3000
+
+        with pytest.raises(RuntimeError):
+            client.http_download(server.url("/?status=500"), str(tmp_path / "b.bin"), resume=False)
+        stats = client.stats_snapshot()[f"{server.host}:{server.port}"]
+        assert stats["count"] == 2 and stats["errors"] == 1
@@ -0,0 +1,25 @@
+import pytest
+
+from Benchmarks.local_server import LocalServer
+from HTTPCore import CHTTP
+from HTTPLib.client import CHTTPClient
+
+
+@pytest.fixture(scope="module")
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def test_failures_report_the_session_buffer_error(server):
+    with CHTTPClient(CHTTP) as client:
+        client.set_max_response_size(100)
+        url = server.url("/?size=1000")
+        prepared = client.prepare("GET", url)
+        for call in (lambda: client.http_get(url), lambda: client.http_post(url, b"body"),
+                     lambda: client.send(prepared)):
+            with pytest.raises(RuntimeError, match="exceeds the maximum response size"):
+                call()
+        # The session is still usable after the failures.
+        client.set_max_response_size(0)
+        assert client.http_get(url).content == b"x" * 1000
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+from HTTPCore import CHTTP
+
+import HTTPCache
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient
+from Response import Response
+
+
+@pytest.fixture(scope="module")
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def response(status, *headers, body=b"body"):
+    raw = "\r\n".join([f"HTTP/1.1 {status} X", *headers]).encode("latin-1") + b"\r\n\r\n"
+    return Response(status, body, raw)
+
+
+class EvictingCache(HTTPCache.ResponseCache):
+    """Drops the entry right after handing out its validators, as a concurrent eviction would."""
+
+    def lookup(self, url, request_headers=None):
+        result = super().lookup(url, request_headers)
+        if result[1] is not None:
+            self.invalidate(url)
+        return result
+
+
+def test_304_for_a_dropped_entry_is_not_returned():
+    cache = HTTPCache.ResponseCache()
+    assert cache.store("http://a.test/", response(304, 'ETag: "v1"', body=b""), time.time()) is None
+
+
+def test_304_for_a_dropped_entry_refetches(server):
+    url = server.url("/?json=3&etag=v1&cache_control=no-cache")
+    cache = EvictingCache()
+    with CHTTPClient(CHTTP) as client:
+        client.set_cache(cache)
+        first = client.get_json(url)
+        assert len(first) == 3
+        assert client.get_json(url) == first
+        response = client.http_get(url)
+    assert response.status_code == 200
+    assert response.content
+    assert cache.stats()["not_modified"] == 0
+
+
+def test_304_revalidates_from_disk_after_memory_eviction(tmp_path):
+    cache = HTTPCache.ResponseCache(directory=tmp_path)
+    cache.store("http://a.test/", response(200, 'ETag: "v1"', "Cache-Control: no-cache"), time.time())
+    with cache._lock:
+        cache._entries.clear()
+        cache._bytes = 0
+    refreshed = cache.store("http://a.test/", response(304, 'ETag: "v1"', body=b""), time.time())
+    assert refreshed.status_code == 200
+    assert refreshed.content == b"body"
+
+
+@pytest.mark.parametrize("status, headers, stored", [
+    (200, ['ETag: "v1"'], True),
+    (404, ["Last-Modified: Mon, 01 Jan 2024 00:00:00 GMT"], True),
+    (500, ['ETag: "v1"'], False),
+    (302, ["Last-Modified: Mon, 01 Jan 2024 00:00:00 GMT"], False),
+    (500, ['ETag: "v1"', "Cache-Control: max-age=60"], True),
+    (302, ["Cache-Control: private, max-age=0", 'ETag: "v1"'], True),
+])
+def test_validators_are_stored_only_for_cacheable_statuses(status, headers, stored):
+    cache = HTTPCache.ResponseCache()
+    cache.store("http://a.test/", response(status, *headers), time.time())
+    assert (cache.stats()["stores"] == 1) is stored
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHECK = """
+import HTTPLib
+from HTTPLib import *
+for name in HTTPLib.__all__:
+    getattr(HTTPLib, name)
+"""
+
+
+@pytest.mark.parametrize("platform", ["Linux", "Windows"])
+def test_every_exported_name_imports(platform):
+    result = subprocess.run([sys.executable, "-c", CHECK], cwd=os.path.join(ROOT, platform), capture_output=True,
+                            text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,118 @@
+import json
+import time
+import uuid
+
+import pytest
+from HTTPCore import CHTTP
+
+import Resilience
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient
+
+
+@pytest.fixture(scope="module")
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+@pytest.fixture
+def key():
+    return uuid.uuid4().hex
+
+
+def counts(server, key):
+    with CHTTPClient(CHTTP) as client:
+        return json.loads(client.http_get(server.url(f"/?counts=1&key={key}")).content)
+
+
+def wait_for_cancelled(server, key, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        result = counts(server, key)
+        if result["cancelled"] or time.monotonic() > deadline:
+            return result
+        time.sleep(0.02)
+
+
+def test_503_is_retried(server, key):
+    with CHTTPClient(CHTTP) as client:
+        url = server.url(f"/?size=3&fail=2&key={key}")
+        client.set_retry_policy(Resilience.RetryPolicy(retries=3, backoff=0.01))
+        response = client.http_get(url)
+    assert response.status_code == 200
+    assert response.content == b"xxx"
+    assert counts(server, key)["requests"] == 3
+
+
+def test_503_is_returned_without_retry_policy(server, key):
+    with CHTTPClient(CHTTP) as client:
+        assert client.http_get(server.url(f"/?fail=1&key={key}")).status_code == 503
+    assert counts(server, key)["requests"] == 1
+
+
+def test_retries_give_up_after_the_limit(server, key):
+    with CHTTPClient(CHTTP) as client:
+        client.set_retry_policy(Resilience.RetryPolicy(retries=2, backoff=0.01))
+        assert client.http_get(server.url(f"/?fail=5&key={key}")).status_code == 503
+    assert counts(server, key)["requests"] == 3
+
+
+def test_dropped_connection_is_retried(server, key):
+    with CHTTPClient(CHTTP) as client:
+        client.set_retry_policy(Resilience.RetryPolicy(retries=1, backoff=0.01))
+        assert client.http_get(server.url(f"/?fail=1&fail_status=0&key={key}")).status_code == 200
+
+
+def test_retry_after_is_honoured(server, key):
+    with CHTTPClient(CHTTP) as client:
+        # With no backoff, only the Retry-After header can account for the wait.
+        client.set_retry_policy(Resilience.RetryPolicy(retries=1, backoff=0.0, max_backoff=5.0))
+        start = time.monotonic()
+        response = client.http_get(server.url(f"/?fail=1&retry_after=1&key={key}"))
+        elapsed = time.monotonic() - start
+    assert response.status_code == 200
+    assert 1.0 <= elapsed < 2.0
+
+
+def test_retry_after_beyond_max_backoff_returns_response(server, key):
+    with CHTTPClient(CHTTP) as client:
+        client.set_retry_policy(Resilience.RetryPolicy(retries=3, backoff=0.01, max_backoff=0.5))
+        start = time.monotonic()
+        response = client.http_get(server.url(f"/?fail=1&retry_after=30&key={key}"))
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "30"
+    assert time.monotonic() - start < 0.5
+    assert counts(server, key)["requests"] == 1
+
+
+def test_hedge_returns_faster_response_and_cancels_slower(server, key):
+    url = server.url(f"/?size=5&slow_first=1&slow_delay=3000&key={key}")
+    with CHTTPClient(CHTTP) as client:
+        client.set_hedging(0.05)
+        start = time.monotonic()
+        response = client.http_get(url)
+        elapsed = time.monotonic() - start
+        status, body, _, winner = CHTTP.http_hedged(client.capsule, "GET", url, None, 0.05, 1)
+    assert response.status_code == 200
+    assert response.content == b"xxxxx"
+    assert elapsed < 1.0
+    # The second call is not slow, so the first copy wins before a hedge is started.
+    assert (status, body, winner) == (200, b"xxxxx", 0)
+    result = wait_for_cancelled(server, key)
+    assert result == {"requests": 3, "cancelled": 1}
+
+
+def test_hedged_winner_is_the_duplicate(server, key):
+    url = server.url(f"/?size=1&slow_first=1&slow_delay=3000&key={key}")
+    with CHTTPClient(CHTTP) as client:
+        status, _, _, winner = CHTTP.http_hedged(client.capsule, "GET", url, None, 0.05, 1)
+    assert (status, winner) == (200, 1)
+    assert wait_for_cancelled(server, key)["cancelled"] == 1
+
+
+def test_fast_request_is_not_hedged(server, key):
+    with CHTTPClient(CHTTP) as client:
+        client.set_hedging(0.5)
+        assert client.http_get(server.url(f"/?size=1&key={key}")).status_code == 200
+    assert counts(server, key) == {"requests": 1, "cancelled": 0}
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+import Resolver
+
+
+class FlakyResolver:
+    """Returns the given addresses for the first ok lookups and raises error for the ones after."""
+
+    def __init__(self, error, ok=0, addresses=("127.0.0.1",)):
+        self.error = error
+        self.ok = ok
+        self.addresses = list(addresses)
+        self.calls = 0
+
+    def __call__(self, host, port):
+        self.calls += 1
+        if self.calls <= self.ok:
+            return self.addresses
+        raise self.error
+
+
+def lookup_in_thread(cache, host, port, timeout=2.0):
+    result = {}
+
+    def run():
+        try:
+            result["addresses"] = cache.lookup(host, port)
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "lookup hung"
+    return result
+
+
+def test_non_oserror_is_cached_as_failure():
+    stub = FlakyResolver(UnicodeError("label too long"))
+    with Resolver.DNSCache(negative_ttl=60, resolve=stub) as cache:
+        with pytest.raises(RuntimeError, match="label too long"):
+            cache.lookup("a" * 64 + ".test", 80)
+        result = lookup_in_thread(cache, "a" * 64 + ".test", 80)
+        assert isinstance(result["error"], RuntimeError)
+        stats = cache.stats()
+    assert stub.calls == 1
+    assert stats["failures"] == 1
+    assert stats["negative_hits"] == 1
+
+
+def test_waiters_are_woken_when_lookup_raises():
+    started = threading.Event()
+    release = threading.Event()
+
+    def resolve(host, port):
+        started.set()
+        release.wait()
+        raise ValueError("bad answer")
+
+    with Resolver.DNSCache(resolve=resolve) as cache:
+        first = threading.Thread(target=lookup_in_thread, args=(cache, "api.test", 80, 5.0), daemon=True)
+        first.start()
+        started.wait()
+        waiter = {}
+        second = threading.Thread(target=lambda: waiter.update(lookup_in_thread(cache, "api.test", 80, 5.0)),
+                                  daemon=True)
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+    assert isinstance(waiter["error"], RuntimeError)
+
+
+def test_refresh_thread_survives_non_oserror():
+    stub = FlakyResolver(KeyError("boom"), ok=1)
+    with Resolver.DNSCache(ttl=0.2, refresh_ahead=0.5, resolve=stub) as cache:
+        assert cache.lookup("api.test", 80) == ["127.0.0.1"]
+        cache.lookup("api.test", 80)
+        deadline = time.monotonic() + 2
+        while cache.stats()["refreshes"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # The failed refresh keeps the valid addresses until they expire.
+        assert cache.stats()["refreshes"] >= 1
+        assert cache._thread.is_alive()
+        time.sleep(0.25)
+        with pytest.raises(RuntimeError, match="boom"):
+            cache.lookup("api.test", 80)
+        cache.prefetch(["http://other.test/"])
+        deadline = time.monotonic() + 2
+        while cache.stats()["failures"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cache.stats()["failures"] >= 3
+        assert cache._thread.is_alive()
+
+
+def test_interrupted_lookup_does_not_leave_entry_pending():
+    stub = FlakyResolver(KeyboardInterrupt())
+    with Resolver.DNSCache(resolve=stub) as cache:
+        with pytest.raises(KeyboardInterrupt):
+            cache.lookup("api.test", 80)
+        result = lookup_in_thread(cache, "api.test", 80)
+    assert "interrupted" in str(result["error"])
+
+
+@pytest.mark.parametrize("module_name", ["CHTTP", "CPHTTP"])
+def test_download_keeps_its_pins_while_they_change(tmp_path, module_name):
+    import importlib
+
+    from Benchmarks.local_server import LocalServer
+    from HTTPLib.client import CHTTPClient
+
+    module = importlib.import_module(f"HTTPCore.{module_name}")
+    with LocalServer() as server, CHTTPClient(module) as client:
+        pin = f"pinned.test:{server.port}:{server.host}"
+        module.set_resolve(client.capsule, [pin])
+        stop = threading.Event()
+
+        def churn():
+            # Every call frees the session's previous list.
+            i = 0
+            while not stop.is_set():
+                module.set_resolve(client.capsule, [pin, f"other-{i}.test:80:127.0.0.{i % 250 + 1}"])
+                i += 1
+
+        thread = threading.Thread(target=churn)
+        thread.start()
+        try:
+            for i in range(20):
+                path = tmp_path / f"{i}.bin"
+                result = client.http_download(f"http://pinned.test:{server.port}/?size=65536&delay=5", str(path),
+                                              resume=False)
+                assert result["status"] == 200
+                assert path.stat().st_size == 65536
+        finally:
+            stop.set()
+            thread.join()
@@ -0,0 +1,44 @@
+import pytest
+from HTTPCore import CHTTP
+
+import Scheduler
+from Benchmarks.local_server import LocalServer
+from HTTPLib.client import CHTTPClient
+
+
+@pytest.fixture(scope="module")
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def test_request_many_releases_slots_when_batch_raises(server):
+    scheduler = Scheduler.HostScheduler(initial_limit=4)
+    with CHTTPClient(CHTTP) as client:
+        with pytest.raises(TypeError):
+            scheduler.request_many(client, [("POST", server.url("/?echo=1"), 12345)])
+        host = scheduler.snapshot()[f"{server.host}:{server.port}"]
+        assert host["in_flight"] == 0
+        assert host["errors"] == 1
+        results = scheduler.request_many(client, [("GET", server.url("/?size=3"))] * 3)
+    assert [status for status, _, _ in results] == [200] * 3
+    assert scheduler.snapshot()[f"{server.host}:{server.port}"]["in_flight"] == 0
+
+
+def test_post_json_goes_through_scheduler(server):
+    scheduler = Scheduler.HostScheduler(initial_limit=4)
+    with CHTTPClient(CHTTP) as client:
+        client.set_scheduler(scheduler)
+        assert client.post_json(server.url("/?echo=1"), {"a": 1}) == {"a": 1}
+    host = scheduler.snapshot()[f"{server.host}:{server.port}"]
+    assert host["completed"] == 1
+    assert host["in_flight"] == 0
+
+
+def test_post_json_reports_throttling(server):
+    scheduler = Scheduler.HostScheduler(initial_limit=4)
+    with CHTTPClient(CHTTP) as client:
+        client.set_scheduler(scheduler)
+        with pytest.raises(RuntimeError):
+            client.post_json(server.url("/?status=429"), {"a": 1})
+    assert scheduler.snapshot()[f"{server.host}:{server.port}"]["throttled"] == 1
@@ -0,0 +1,421 @@
+"""
+A private HTTP response cache for the clients, following RFC 9111.
+
+ResponseCache keeps GET responses that their Cache-Control, Expires or
+Last-Modified headers allow to be stored, serves them while they are fresh,
+and revalidates stale ones with If-None-Match / If-Modified-Since, so a 304
+answer costs a round trip but no body transfer. Entries live in a
+byte-bounded LRU in memory and, when a directory is given, in a second
+byte-bounded tier on disk that survives restarts. Clients take a cache
+through set_cache(); one cache can be shared by every client in the process.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+from Response import Response, _parse_headers
+
+# Statuses that may be stored with a heuristic freshness lifetime (RFC 9110 section 15.1).
+HEURISTIC_STATUSES = frozenset((200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501))
+
+# Headers a 304 does not replace in the stored response (RFC 9111 section 3.2).
+KEEP_ON_UPDATE = frozenset(("content-length", "content-encoding", "transfer-encoding", "content-range"))
+
+ENTRY_OVERHEAD = 256
+
+
+def parse_cache_control(value):
+    """Returns the directives of a Cache-Control value as a dict of lower-cased names to values, or True for directives without one."""
+    directives = {}
+    for part in value.split(","):
+        name, separator, argument = part.partition("=")
+        name = name.strip().lower()
+        if name:
+            directives[name] = argument.strip().strip('"') if separator else True
+    return directives
+
+
+def _http_date(value):
+    if value is None:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_lines(raw_headers):
+    """Splits the final header block into its status line and (name, value) lines."""
+    blocks = [block for block in raw_headers.split(b"\r\n\r\n") if block.strip()]
+    if not blocks:
+        return b"", []
+    status_line, *lines = blocks[-1].split(b"\r\n")
+    pairs = []
+    for line in lines:
+        name, separator, value = line.partition(b":")
+        if separator:
+            pairs.append((name.strip(), value.strip()))
+    return status_line, pairs
+
+
+def _merge_headers(stored, update):
+    """Returns the stored header block with the headers of a 304 answer replacing the ones with the same name."""
+    status_line, lines = _header_lines(stored)
+    _, updates = _header_lines(update)
+    replaced = {name.lower() for name, _ in updates} - {name.encode() for name in KEEP_ON_UPDATE}
+    merged = [(name, value) for name, value in lines if name.lower() not in replaced]
+    merged += [(name, value) for name, value in updates if name.lower() in replaced]
+    return b"\r\n".join([status_line] + [name + b": " + value for name, value in merged]) + b"\r\n\r\n"
+
+
+class _Entry:
+    __slots__ = ("url", "status", "body", "raw_headers", "headers", "vary", "request_time", "response_time",
+                 "lifetime", "initial_age", "no_cache", "size")
+
+    def __init__(self, url, status, body, raw_headers, vary, request_time, response_time, heuristic_fraction):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.vary = vary
+        self.request_time = request_time
+        self.size = len(body) + len(raw_headers) + ENTRY_OVERHEAD
+        self.update(raw_headers, request_time, response_time, heuristic_fraction)
+
+    def update(self, raw_headers, request_time, response_time, heuristic_fraction):
+        """Recomputes the freshness of the entry from its headers (RFC 9111 sections 4.2.1 and 4.2.3)."""
+        self.raw_headers = raw_headers
+        self.headers = headers = _parse_headers(raw_headers)
+        self.request_time = request_time
+        self.response_time = response_time
+        directives = parse_cache_control(headers.get("cache-control", ""))
+        self.no_cache = "no-cache" in directives
+
+        date = _http_date(headers.get("date"))
+        if date is None:
+            date = response_time
+        max_age = _seconds(directives.get("max-age"))
+        if max_age is not None:
+            self.lifetime = max_age
+        elif "expires" in headers:
+            expires = _http_date(headers["expires"])
+            self.lifetime = max(0.0, expires - date) if expires is not None else 0.0
+        else:
+            last_modified = _http_date(headers.get("last-modified"))
+            heuristic = self.status in HEURISTIC_STATUSES and last_modified is not None
+            self.lifetime = max(0.0, (date - last_modified) * heuristic_fraction) if heuristic else 0.0
+
+        apparent_age = max(0.0, response_time - date)
+        age = _seconds(headers.get("age")) or 0
+        self.initial_age = max(apparent_age, age + (response_time - request_time))
+
+    def fresh(self, now):
+        return not self.no_cache and self.initial_age + (now - self.response_time) < self.lifetime
+
+    def validators(self):
+        """Returns the conditional request headers for revalidating the entry, or None if it has no validator."""
+        conditions = []
+        if "etag" in self.headers:
+            conditions.append("If-None-Match: " + self.headers["etag"])
+        if "last-modified" in self.headers:
+            conditions.append("If-Modified-Since: " + self.headers["last-modified"])
+        return conditions or None
+
+    def response(self):
+        return Response(self.status, self.body, self.raw_headers)
+
+
+class ResponseCache:
+    """
+    Stores GET responses and decides when they can be reused.
+
+    A response is stored when it was answered to a GET, its Cache-Control has no no-store, its Vary is not "*",
+    its status is heuristically cacheable (200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501) or it carries
+    explicit freshness (max-age, Expires, public or private), and it has either a freshness lifetime (max-age,
+    Expires, or for those statuses a heuristic of heuristic_fraction of the time since Last-Modified) or a
+    validator (ETag or Last-Modified) to revalidate it with. It is served without a request while fresh. A stale entry, or one stored with no-cache, is
+    revalidated with a conditional request, and a 304 answer refreshes its headers and returns the stored body.
+    The request headers listed in Vary must match those of the stored response; otherwise the lookup misses.
+    POST, PUT and DELETE through a client with the cache drop the entry of their URL.
+
+    Parameters:
+        max_bytes (int): Memory budget for bodies and headers. Least recently used entries are evicted beyond it.
+        max_entry_bytes (int or None): Responses larger than this are not stored. Defaults to max_bytes / 8.
+        directory (str or os.PathLike, optional): Where to keep the disk tier. Every stored response is also
+            written there, and a memory miss is looked up on disk before it goes to the network.
+        disk_max_bytes (int): Budget of the disk tier. The files used longest ago are deleted beyond it.
+        heuristic_fraction (float): Share of the time since Last-Modified a response without explicit freshness
+            is considered fresh for, or 0 to always revalidate such responses.
+
+    Example:
+        cache = HTTPCache.ResponseCache(max_bytes=64 << 20, directory="/var/cache/myapp/http")
+        client.set_cache(cache)
+        config = client.get_json("https://config.example.com/v1/flags")
+    """
+
+    def __init__(self, max_bytes=64 << 20, max_entry_bytes=None, directory=None, disk_max_bytes=1 << 30,
+                 heuristic_fraction=0.1):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be positive.")
+        if not 0 <= heuristic_fraction <= 1:
+            raise ValueError("heuristic_fraction must be between 0 and 1.")
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max(1, max_bytes // 8)
+        self.directory = os.fspath(directory) if directory is not None else None
+        self.disk_max_bytes = disk_max_bytes
+        self.heuristic_fraction = heuristic_fraction
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(("hits", "disk_hits", "misses", "revalidations", "not_modified", "stores",
+                                        "evictions", "invalidations"), 0)
+        self._disk_bytes = 0
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    def lookup(self, url, request_headers=None):
+        """
+        Finds the stored response for a GET of url.
+
+        Parameters:
+            url (str): The request URL.
+            request_headers (dict, optional): Lower-cased names and values of the headers the request carries,
+                compared with those named in the stored response's Vary.
+
+        Returns:
+            tuple: (response, conditions). response is a fresh stored Response to use as is, or None.
+            conditions is the list of conditional headers to revalidate a stale entry with, or None when the
+            request must be sent unconditionally.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+        if entry is None and self.directory is not None:
+            entry = self._read_disk(url)
+            if entry is not None:
+                with self._lock:
+                    self._counters["disk_hits"] += 1
+                    self._insert(entry)
+
+        with self._lock:
+            if entry is None or not self._vary_matches(entry, request_headers):
+                self._counters["misses"] += 1
+                return None, None
+            if entry.fresh(now):
+                self._counters["hits"] += 1
+                return entry.response(), None
+            conditions = entry.validators()
+            self._counters["revalidations" if conditions else "misses"] += 1
+            return None, conditions
+
+    def store(self, url, response, request_time, request_headers=None):
+        """
+        Records the response to a GET of url, sent at request_time, and returns the response to hand back.
+
+        A 304 answer to a conditional request refreshes the stored entry and returns its stored response with
+        the updated headers. When the entry is gone, because it was evicted or invalidated while the request was
+        in flight, there is no body to answer with and None is returned; the caller must send the request again
+        without validators. Any other answer is stored if it may be and returned as it is.
+
+        Parameters:
+            url (str): The request URL.
+            response (Response): The response received.
+            request_time (float): time.time() when the request was sent, used to compute the response's age.
+            request_headers (dict, optional): The request headers, as for lookup().
+
+        Returns:
+            Response or None: The response for the caller, or None for a 304 that matches no stored entry.
+        """
+        now = time.time()
+        if response.status_code == 304:
+            with self._lock:
+                entry = self._entries.get(url)
+            if entry is None and self.directory is not None:
+                entry = self._read_disk(url)
+                if entry is not None:
+                    with self._lock:
+                        self._insert(entry)
+            if entry is None:
+                return None
+            with self._lock:
+                entry.update(_merge_headers(entry.raw_headers, response.raw_headers), request_time, now,
+                             self.heuristic_fraction)
+                self._counters["not_modified"] += 1
+            # The disk copy keeps its old headers rather than rewriting the body on every 304; after a restart
+            # it is revalidated once more.
+            return entry.response()
+
+        headers = response.headers
+        directives = parse_cache_control(headers.get("cache-control", ""))
+        vary_names = [name.strip().lower() for name in headers.get("vary", "").split(",") if name.strip()]
+        # Without explicit freshness, only statuses that are heuristically cacheable may be stored, even with a
+        # validator (RFC 9111 section 3). Partial content is not stored, since the cache never combines ranges.
+        explicit = "max-age" in directives or "expires" in headers or "public" in directives or \
+            "private" in directives
+        cacheable = explicit or response.status_code in HEURISTIC_STATUSES
+        if not cacheable or "no-store" in directives or "*" in vary_names or response.status_code in (0, 206):
+            self.invalidate(url)
+            return response
+
+        request_headers = request_headers or {}
+        vary = {name: request_headers.get(name) for name in vary_names}
+        entry = _Entry(url, response.status_code, response.content, response.raw_headers, vary, request_time, now,
+                       self.heuristic_fraction)
+        if entry.size > self.max_entry_bytes or (entry.lifetime <= 0 and entry.validators() is None):
+            self.invalidate(url)
+            return response
+        with self._lock:
+            self._insert(entry)
+            self._counters["stores"] += 1
+        if self.directory is not None:
+            self._write_disk(entry)
+        return response
+
+    def invalidate(self, url):
+        """Drops the stored response for url from memory and disk, if there is one."""
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                self._bytes -= entry.size
+                self._counters["invalidations"] += 1
+        if self.directory is not None:
+            path = self._disk_path(url)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                return
+            with self._lock:
+                self._disk_bytes -= size
+                if entry is None:
+                    self._counters["invalidations"] += 1
+
+    def _vary_matches(self, entry, request_headers):
+        request_headers = request_headers or {}
+        return all(request_headers.get(name) == value for name, value in entry.vary.items())
+
+    def _insert(self, entry):
+        previous = self._entries.pop(entry.url, None)
+        if previous is not None:
+            self._bytes -= previous.size
+        self._entries[entry.url] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self._counters["evictions"] += 1
+
+    def _disk_path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".cache")
+
+    def _disk_files(self):
+        files = []
+        with os.scandir(self.directory) as entries:
+            for item in entries:
+                if item.name.endswith(".cache") and item.is_file():
+                    stat = item.stat()
+                    files.append((stat.st_mtime, stat.st_size, item.path))
+        return files
+
+    def _read_disk(self, url):
+        path = self._disk_path(url)
+        try:
+            with open(path, "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        return _Entry(url, meta["status"], body, meta["headers"].encode("latin-1"), meta["vary"],
+                      meta["request_time"], meta["response_time"], self.heuristic_fraction)
+
+    def _write_disk(self, entry):
+        # Written to a temporary file and renamed, so a reader in another process never sees a partial entry.
+        path = self._disk_path(entry.url)
+        meta = json.dumps({
+            "url": entry.url, "status": entry.status, "headers": entry.raw_headers.decode("latin-1"),
+            "vary": entry.vary, "request_time": entry.request_time, "response_time": entry.response_time,
+        }).encode("utf-8")
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            with open(temporary, "wb") as f:
+                f.write(meta + b"\n")
+                f.write(entry.body)
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._disk_bytes += len(meta) + 1 + len(entry.body) - previous
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self._counters["evictions"] += 1
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: hits (answered from the cache without a request), disk_hits (entries loaded from the disk tier),
+            misses, revalidations (conditional requests sent), not_modified (304 answers served from the cache),
+            stores, evictions, invalidations, entries and bytes (in memory) and disk_bytes.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["disk_bytes"] = self._disk_bytes
+            return stats
+
+    def clear(self):
+        """Drops every entry from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.directory is not None:
+            for _, _, path in self._disk_files():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            with self._lock:
+                self._disk_bytes = 0
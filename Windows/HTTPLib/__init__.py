@@ -0,0 +1,123 @@
+"""
+The HTTP clients as one package.
+
+Importing HTTPLib has no side effects: no extension is loaded, no session is
+created and nothing touches the network. The backend extension, CHTTP or
+CPHTTP, is imported the first time a client, pool or the backend itself is
+asked for, and the other names below are imported on first access. That
+keeps the cold start of short-lived workers down to the modules they use.
+AsyncCHTTPClient and ProcessPoolFetcher are Linux-only and not part of the
+Windows package.
+
+The backend is CHTTP unless the HTTPLIB_BACKEND environment variable names
+another one or use_backend() is called before the first client is created.
+
+Example:
+    import HTTPLib
+
+    client = HTTPLib.create_client()
+    response = client.http_get("http://example.com")
+"""
+
+import importlib
+import os
+
+__all__ = [
+    "BACKENDS", "use_backend", "backend", "create_client", "create_session_pool",
+    "CHTTPClient", "SessionPool", "PreparedRequest", "Response", "RetryPolicy", "HedgePolicy", "HostScheduler",
+    "DNSCache", "ResponseCache",
+]
+
+BACKENDS = ("CHTTP", "CPHTTP")
+
+_LAZY = {
+    "CHTTPClient": "HTTPLib.client",
+    "SessionPool": "HTTPLib.client",
+    "PreparedRequest": "HTTPLib.client",
+    "Response": "Response",
+    "RetryPolicy": "Resilience",
+    "HedgePolicy": "Resilience",
+    "HostScheduler": "Scheduler",
+    "DNSCache": "Resolver",
+    "ResponseCache": "HTTPCache",
+}
+
+_backend_name = os.environ.get("HTTPLIB_BACKEND", "CHTTP")
+_backend = None
+
+
+def use_backend(name):
+    """
+    Selects the backend extension used by create_client() and create_session_pool().
+
+    Parameters:
+        name (str): "CHTTP" or "CPHTTP".
+
+    Raises:
+        ValueError: If name is not a known backend.
+        RuntimeError: If a different backend has already been loaded.
+    """
+    global _backend_name
+    if name not in BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(BACKENDS)}.")
+    if _backend is not None and name != _backend_name:
+        raise RuntimeError(f"The {_backend_name} backend is already in use.")
+    _backend_name = name
+
+
+def backend():
+    """
+    Returns the backend extension module, importing it on the first call. The extension initializes
+    libcurl once while it is imported.
+
+    Raises:
+        ValueError: If HTTPLIB_BACKEND names an unknown backend.
+    """
+    global _backend
+    if _backend is None:
+        if _backend_name not in BACKENDS:
+            raise ValueError(f"HTTPLIB_BACKEND must be one of {', '.join(BACKENDS)}.")
+        _backend = importlib.import_module("HTTPCore." + _backend_name)
+    return _backend
+
+
+def create_client(share=None):
+    """
+    Creates a CHTTPClient on the selected backend.
+
+    Parameters:
+        share (optional): A share from backend().create_share() (CHTTP only).
+
+    Returns:
+        CHTTPClient: The new client.
+    """
+    from HTTPLib.client import CHTTPClient
+    return CHTTPClient(backend(), share)
+
+
+def create_session_pool(max_size=8, idle_timeout=60.0, cookie_file=None, share_cookies=False):
+    """
+    Creates a SessionPool on the selected backend, which must be CHTTP because pools need shares.
+
+    Parameters:
+        cookie_file (str, optional): A cookie file the pool's shared cookie jar is loaded from and written to.
+        share_cookies (bool): Whether the pool's clients share one cookie jar. Implied by cookie_file.
+
+    Returns:
+        SessionPool: The new pool.
+    """
+    from HTTPLib.client import SessionPool
+    return SessionPool(backend(), max_size, idle_timeout, cookie_file, share_cookies)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
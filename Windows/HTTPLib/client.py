@@ -0,0 +1,1319 @@
+"""
+The client implementation behind CHTTPClient on every platform and backend.
+
+The backend extension module is passed in, so the same class runs on
+HTTPCore.CHTTP or HTTPCore.CPHTTP and on Linux or Windows builds.
+"""
+
+from contextlib import contextmanager
+from Response import Response
+import JSONCodec
+import Resilience
+import threading
+import time
+
+class PreparedRequest:
+    """
+    A request whose method, URL, headers and body are compiled once, from CHTTPClient.prepare().
+
+    The backend keeps the parsed URL, the header list and a private copy of the body, so sending the request
+    again skips argument parsing, header building and body conversion. A session that sends the same prepared
+    request twice in a row sets no options at all the second time. Prepared requests are immutable and can be
+    sent by any client on the same backend, from any thread.
+
+    Attributes:
+        method (str): The HTTP method.
+        url (str): The URL.
+        module (module): The backend extension the request was compiled for.
+        capsule: The compiled request.
+    """
+
+    __slots__ = ("method", "url", "module", "capsule")
+
+    def __init__(self, module, method, url, payload=None, headers=None, content_type=None):
+        self.method = method
+        self.url = url
+        self.module = module
+        self.capsule = module.create_prepared(method, url, payload, headers, content_type)
+
+    def __repr__(self):
+        return f"<PreparedRequest {self.method} {self.url}>"
+
+class CHTTPClient:
+    def __init__(self, CHTTP, share=None):
+        """
+        Initializes the CHTTPClient instance by creating a session.
+
+        Parameters:
+            CHTTP (module): The backend extension module, HTTPCore.CHTTP or HTTPCore.CPHTTP. CPHTTP has no
+                shares, clone(), set_buffer_size_hint() or set_max_response_size().
+            share (optional): A share from CHTTP.create_share(). Sessions attached to the same share reuse
+                each other's connections, DNS lookups and TLS sessions.
+
+        Raises:
+            Exception: If the session creation fails.
+        """
+        self.CHTTP = CHTTP
+        self.capsule = self.CHTTP.create_session(share) if share is not None else self.CHTTP.create_session()
+        if self.capsule is None:
+            raise Exception("Failed to create session.")
+        
+        self.default_user_agent = None
+        self.default_proxy = None
+        self.default_cookie_file = None
+        self.default_ssl_cert = None
+        self.default_ssl_key = None
+        self.default_timeout = None
+        self.default_buffer_size_hint = None
+        self.default_max_response_size = None
+        self.default_http_version = None
+        self.default_max_concurrent_streams = None
+        self.default_accept_encoding = None
+        self.default_request_compression = None
+        self.default_tcp_options = None
+        self.default_max_connection_age = None
+        self.default_max_connections = None
+        self.default_ca_file = None
+        self.retry_policy = None
+        self.hedging = None
+        self.scheduler = None
+        self.resolver = None
+        self._pinned = {}
+        self.cache = None
+        self.stats = None
+
+    def __getattr__(self, name):
+        # json_dumps and json_loads default to JSONCodec's, looked up on first use so creating a client does
+        # not import a JSON library.
+        if name in ("json_dumps", "json_loads"):
+            value = getattr(JSONCodec, name[len("json_"):])
+            setattr(self, name, value)
+            return value
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def set_user_agent(self, user_agent):
+        """
+        Sets the User-Agent header for HTTP requests.
+
+        Parameters:
+            user_agent (str): The User-Agent string to be used in HTTP requests.
+
+        Example:
+            client.set_user_agent("MyCustomUserAgent/1.0")
+        """
+        self.CHTTP.set_user_agent(self.capsule, user_agent)
+        self.default_user_agent = user_agent
+
+    def set_proxy(self, proxy_url):
+        """
+        Sets the proxy URL for HTTP requests.
+
+        Parameters:
+            proxy_url (str): The URL of the proxy server.
+
+        Example:
+            client.set_proxy("http://proxy.example.com:8080")
+        """
+        self.CHTTP.set_proxy(self.capsule, proxy_url)
+        self.default_proxy = proxy_url
+
+    def set_cookie_file(self, cookie_file_path):
+        """
+        Loads the cookies in a Netscape cookie file into the session and makes the file the session's cookie jar.
+
+        The file is read once, here; a missing file starts an empty jar. Cookies the server sets are kept in
+        memory and written back to the file when the client is closed or flush_cookies() is called.
+
+        Parameters:
+            cookie_file_path (str): The path to the cookie file.
+
+        Example:
+            client.set_cookie_file("/path/to/cookiefile")
+        """
+        self.CHTTP.set_cookie_file(self.capsule, cookie_file_path)
+        self.default_cookie_file = cookie_file_path
+
+    def flush_cookies(self):
+        """
+        Writes the session's cookies to the file given to set_cookie_file() now rather than when the client is
+        closed.
+
+        Raises:
+            ValueError: If no cookie file is set.
+
+        Example:
+            client.http_post("https://example.com/login", credentials)
+            client.flush_cookies()
+        """
+        self.CHTTP.flush_cookies(self.capsule)
+
+    def cookies(self):
+        """
+        Returns the cookies the session holds.
+
+        Returns:
+            list of str: One Netscape cookie file line per cookie: domain, subdomains flag, path, secure flag,
+            expiry and name and value, separated by tabs.
+
+        Example:
+            for line in client.cookies():
+                print(line.split("\t")[5])
+        """
+        return self.CHTTP.get_cookies(self.capsule)
+
+    def set_ssl_cert(self, cert_file_path):
+        """
+        Sets the path to the SSL certificate file for secure HTTP connections.
+
+        Parameters:
+            cert_file_path (str): The path to the SSL certificate file.
+
+        Example:
+            client.set_ssl_cert("/path/to/cert.pem")
+        """
+        self.CHTTP.set_ssl_cert(self.capsule, cert_file_path)
+        self.default_ssl_cert = cert_file_path
+
+    def set_ssl_key(self, key_file_path):
+        """
+        Sets the path to the SSL key file for secure HTTP connections.
+
+        Parameters:
+            key_file_path (str): The path to the SSL key file.
+
+        Example:
+            client.set_ssl_key("/path/to/key.pem")
+        """
+        self.CHTTP.set_ssl_key(self.capsule, key_file_path)
+        self.default_ssl_key = key_file_path
+
+    def set_timeout(self, timeout_seconds):
+        """
+        Sets the timeout for HTTP requests.
+
+        Parameters:
+            timeout_seconds (int): The timeout duration in seconds.
+
+        Example:
+            client.set_timeout(60)
+        """
+        self.CHTTP.set_timeout(self.capsule, timeout_seconds)
+        self.default_timeout = timeout_seconds
+
+    def set_buffer_size_hint(self, size_hint):
+        """
+        Sets the initial size of the response buffer.
+
+        The buffer grows geometrically from this size, so a hint close to the expected body size
+        avoids reallocations for large responses.
+
+        Parameters:
+            size_hint (int): The initial buffer size in bytes.
+
+        Example:
+            client.set_buffer_size_hint(1024 * 1024)
+        """
+        self.CHTTP.set_buffer_size_hint(self.capsule, size_hint)
+        self.default_buffer_size_hint = size_hint
+
+    def set_max_response_size(self, max_size):
+        """
+        Sets the maximum size of a response body. Larger responses fail with a RuntimeError.
+
+        Parameters:
+            max_size (int): The maximum body size in bytes, or 0 for no limit.
+
+        Example:
+            client.set_max_response_size(50 * 1024 * 1024)
+        """
+        self.CHTTP.set_max_response_size(self.capsule, max_size)
+        self.default_max_response_size = max_size
+
+    def set_http_version(self, version):
+        """
+        Sets the HTTP version for requests.
+
+        With HTTP/2, concurrent requests in http_get_many and http_request_many to the same host are
+        multiplexed as streams over a single connection instead of opening one connection each.
+
+        Parameters:
+            version (str): "1.1" (the default), "2" for HTTP/2 negotiated over TLS (plain http:// URLs stay
+                on HTTP/1.1), or "2-prior-knowledge" for HTTP/2 without TLS (h2c) to servers known to speak it.
+
+        Raises:
+            ValueError: If the version is not one of the above.
+            RuntimeError: If libcurl was built without HTTP/2 support.
+
+        Example:
+            client.set_http_version("2")
+        """
+        versions = {"1.1": self.CHTTP.HTTP_1_1, "2": self.CHTTP.HTTP_2, "2-prior-knowledge": self.CHTTP.HTTP_2_PRIOR_KNOWLEDGE}
+        if version not in versions:
+            raise ValueError('version must be "1.1", "2" or "2-prior-knowledge".')
+        self.CHTTP.set_http_version(self.capsule, versions[version])
+        self.default_http_version = versions[version]
+
+    def set_max_concurrent_streams(self, max_streams):
+        """
+        Sets how many requests of a batch may share one HTTP/2 connection. Once a connection carries this
+        many streams, further requests open another connection.
+
+        Parameters:
+            max_streams (int): The stream limit per connection, or 0 for the libcurl default (100).
+
+        Example:
+            client.set_max_concurrent_streams(32)
+        """
+        self.CHTTP.set_max_concurrent_streams(self.capsule, max_streams)
+        self.default_max_concurrent_streams = max_streams
+
+    def set_accept_encoding(self, encodings=""):
+        """
+        Sets which compressed response encodings to accept. Compressed responses are decompressed in C before
+        they reach Python, so the returned body is always the plain content.
+
+        Parameters:
+            encodings (str or None): A comma-separated list such as "gzip, br", "" for every encoding libcurl
+                supports (gzip, deflate and, where built in, br and zstd), or None to stop asking for compression.
+
+        Example:
+            client.set_accept_encoding()
+        """
+        self.CHTTP.set_accept_encoding(self.capsule, encodings)
+        self.default_accept_encoding = encodings
+
+    def set_request_compression(self, threshold, level=-1):
+        """
+        Gzips http_post and http_put bodies of at least threshold bytes and sends them with
+        "Content-Encoding: gzip". Only use it with servers that accept compressed request bodies.
+        File objects, iterables and bodies that do not shrink are sent as is.
+
+        Parameters:
+            threshold (int): The smallest body size in bytes to compress, or 0 to turn compression off.
+            level (int): The zlib compression level from 1 (fastest) to 9 (smallest), or -1 for the default.
+
+        Example:
+            client.set_request_compression(16 * 1024)
+        """
+        self.CHTTP.set_request_compression(self.capsule, threshold, level)
+        self.default_request_compression = (threshold, level)
+
+    def set_tcp_options(self, nodelay=True, keepalive_idle=0, keepalive_interval=0, fast_open=False):
+        """
+        Sets the TCP options of new connections.
+
+        Parameters:
+            nodelay (bool): Whether to disable Nagle's algorithm (TCP_NODELAY), so small requests are sent at once.
+            keepalive_idle (int): Seconds a connection may sit idle before TCP keepalive probes start, or 0 to send
+                no probes. Probes keep idle pooled connections from being dropped by NATs and load balancers.
+            keepalive_interval (int): Seconds between keepalive probes. Defaults to keepalive_idle.
+            fast_open (bool): Whether to send the request in the SYN with TCP Fast Open where the OS supports it.
+
+        Raises:
+            ValueError: If a keepalive time is negative.
+            RuntimeError: If fast_open is set and the platform does not support it.
+
+        Example:
+            client.set_tcp_options(keepalive_idle=30, keepalive_interval=10)
+        """
+        self.CHTTP.set_tcp_options(self.capsule, nodelay, keepalive_idle, keepalive_interval, fast_open)
+        self.default_tcp_options = (nodelay, keepalive_idle, keepalive_interval, fast_open)
+
+    def set_max_connection_age(self, max_age):
+        """
+        Stops reusing connections once they are older than max_age seconds, so traffic moves to new server
+        instances after a deploy or a DNS change instead of staying on long-lived connections.
+
+        Parameters:
+            max_age (int): The age in seconds, or 0 for no limit.
+
+        Raises:
+            RuntimeError: If libcurl is older than 7.80.0.
+
+        Example:
+            client.set_max_connection_age(300)
+        """
+        self.CHTTP.set_max_connection_age(self.capsule, max_age)
+        self.default_max_connection_age = max_age
+
+    def set_max_connections(self, max_connections):
+        """
+        Sets how many idle connections the session keeps open for reuse. libcurl keeps 5 by default, so a
+        client that talks to more hosts, or that warms more, should raise it.
+
+        Parameters:
+            max_connections (int): The cache size, or 0 for the libcurl default.
+
+        Example:
+            client.set_max_connections(64)
+        """
+        self.CHTTP.set_max_connections(self.capsule, max_connections)
+        self.default_max_connections = max_connections
+
+    def set_ca_file(self, ca_file):
+        """
+        Sets the CA bundle used to verify server certificates, for example to trust an internal CA.
+
+        Parameters:
+            ca_file (str or None): Path to a PEM file, or None for the system default.
+
+        Example:
+            client.set_ca_file("/etc/ssl/internal-ca.pem")
+        """
+        self.CHTTP.set_ca_file(self.capsule, ca_file)
+        self.default_ca_file = ca_file
+
+    def set_retry_policy(self, policy):
+        """
+        Retries http_get, http_put, http_delete and http_head (and get_json and put_json) when they fail in
+        transport or the server answers with a retryable status such as 503, waiting a jittered exponential
+        backoff or the server's Retry-After between attempts. Only methods listed in the policy are retried,
+        and requests with file object or iterable bodies are never retried because they cannot be re-sent.
+
+        Parameters:
+            policy (Resilience.RetryPolicy or None): The policy to apply, or None to stop retrying.
+
+        Example:
+            client.set_retry_policy(Resilience.RetryPolicy(retries=3, backoff=0.1))
+        """
+        self.retry_policy = policy
+
+    def set_hedging(self, delay=None, max_hedges=1, min_samples=20):
+        """
+        Hedges GET and HEAD requests: when a request is still running after delay, a duplicate is sent on
+        another connection, and whichever answers first is returned while the other is cancelled. This cuts
+        tail latency caused by a slow server instance or connection at the cost of a few extra requests.
+
+        Parameters:
+            delay (float, str or None): Seconds to wait before each duplicate, a percentile of the host's latency
+                such as "p95" (statistics are enabled if they are not already), or None to turn hedging off.
+            max_hedges (int): How many duplicates one request may start.
+            min_samples (int): With a percentile delay, how many requests a host needs before it is hedged.
+
+        Raises:
+            ValueError: If delay is negative or not a known percentile, or max_hedges is below 1.
+
+        Example:
+            client.set_hedging("p95")
+        """
+        if delay is None:
+            self.hedging = None
+            return
+        hedging = Resilience.HedgePolicy(delay, max_hedges, min_samples)
+        if hedging.adaptive and self.stats is None:
+            self.enable_stats()
+        self.hedging = hedging
+
+    def set_scheduler(self, scheduler):
+        """
+        Routes http_get, http_post, http_put, http_delete and http_head (and the JSON helpers) through a
+        per-host scheduler that caps concurrent requests per host, applies its rate limit, and adapts the
+        cap to the latency and 429/503 responses it sees. Share one scheduler between all clients and
+        threads that talk to the same hosts. Each retry attempt takes its own slot.
+
+        Parameters:
+            scheduler (Scheduler.HostScheduler or None): The scheduler to use, or None to stop scheduling.
+
+        Example:
+            scheduler = Scheduler.HostScheduler(initial_limit=8, rate=100)
+            client.set_scheduler(scheduler)
+        """
+        self.scheduler = scheduler
+
+    def set_resolver(self, resolver):
+        """
+        Sets the DNS cache this client takes its host addresses from, or removes it with None.
+
+        Before every request the client looks the host up in the cache and pins the addresses into the session
+        with CURLOPT_RESOLVE, so libcurl connects without a lookup of its own. A host the cache failed to
+        resolve within its negative TTL fails at once with RuntimeError; the batch methods leave such hosts to
+        libcurl, which reports the error per request. Share one cache between all clients.
+
+        Parameters:
+            resolver (Resolver.DNSCache or None): The cache to use, or None to go back to libcurl's own lookups.
+
+        Example:
+            cache = Resolver.DNSCache(ttl=30, negative_ttl=5)
+            client.set_resolver(cache)
+        """
+        self.resolver = resolver
+        if self._pinned:
+            # Pins are permanent in libcurl's DNS cache until they are removed with "-host:port".
+            self._pinned = {key: f"-{key[0]}:{key[1]}" for key in self._pinned}
+            self.CHTTP.set_resolve(self.capsule, list(self._pinned.values()))
+
+    def set_cache(self, cache):
+        """
+        Sets the response cache http_get() and get_json() answer from, or removes it with None.
+
+        A fresh stored response is returned without a request. A stale one is revalidated with If-None-Match or
+        If-Modified-Since, and a 304 answer returns the stored body. POST, PUT and DELETE requests drop the
+        stored response of their URL. The batch, streaming and download methods bypass the cache. The
+        User-Agent and Accept-Encoding set on this client are the request headers matched against Vary.
+
+        Parameters:
+            cache (HTTPCache.ResponseCache or None): The cache to use, or None to stop caching.
+
+        Example:
+            cache = HTTPCache.ResponseCache(max_bytes=32 << 20)
+            client.set_cache(cache)
+        """
+        self.cache = cache
+
+    def _cached_get(self, url):
+        """Answers a GET from the cache, revalidating or fetching through _send() when the stored response is not fresh."""
+        vary = {"user-agent": self.default_user_agent, "accept-encoding": self.default_accept_encoding}
+        response, conditions = self.cache.lookup(url, vary)
+        if response is not None:
+            return response
+        request_time = time.time()
+        if conditions is None:
+            response = self._send("GET", url, None, lambda: self.capsule.get(url))
+        else:
+            conditional = self.CHTTP.create_prepared("GET", url, None, conditions)
+            response = self._send("GET", url, None, lambda: self.capsule.send(conditional), hedge=False)
+        stored = self.cache.store(url, response, request_time, vary)
+        if stored is None:
+            # The entry the 304 refers to was dropped meanwhile, so fetch the body again unconditionally.
+            request_time = time.time()
+            response = self._send("GET", url, None, lambda: self.capsule.get(url))
+            stored = self.cache.store(url, response, request_time, vary) or response
+        return stored
+
+    def _pin(self, urls, strict=True):
+        """Pins the resolver's addresses for the hosts of urls, raising RuntimeError for a failed lookup when strict."""
+        changed = False
+        try:
+            for url in urls:
+                key = self.resolver.key_for(url)
+                if key is None:
+                    continue
+                try:
+                    entry, error = self.resolver.entry(*key), None
+                except RuntimeError as e:
+                    # Drop a pin to addresses the cache no longer vouches for.
+                    entry, error = f"-{key[0]}:{key[1]}", e
+                if self._pinned.get(key, entry if error else None) != entry:
+                    self._pinned[key] = entry
+                    changed = True
+                if error is not None and strict:
+                    raise error
+        finally:
+            if changed:
+                self.CHTTP.set_resolve(self.capsule, list(self._pinned.values()))
+
+    def _send(self, method, url, body, perform, hedge=True):
+        """Runs perform(), which returns the extension's (status, body, headers), under the scheduler, retry and hedging policies."""
+        if self.cache is not None and method not in Resilience.SAFE_METHODS:
+            self.cache.invalidate(url)
+        def attempt():
+            if self.resolver is not None:
+                self._pin((url,))
+            if hedge and self.hedging is not None and method in Resilience.SAFE_METHODS:
+                snapshot = None if self.stats is None else lambda: self.CHTTP.stats_snapshot(self.stats)
+                delay = self.hedging.delay_for(url, snapshot)
+                if delay is not None:
+                    status, content, headers, _ = self.CHTTP.http_hedged(
+                        self.capsule, method, url, None, delay, self.hedging.max_hedges)
+                    return Response(status, content, headers)
+            return Response(*perform())
+
+        if self.scheduler is not None:
+            unscheduled = attempt
+            attempt = lambda: self.scheduler.call(url, unscheduled)
+        if self.retry_policy is None or method not in self.retry_policy.methods or not Resilience.replayable(body):
+            return attempt()
+        return self.retry_policy.run(attempt)
+
+    def _direct(self):
+        """Whether no scheduler, retry, hedging policy, resolver or cache is set, so a request can call the session method directly."""
+        return self.retry_policy is None and self.hedging is None and self.scheduler is None and \
+            self.resolver is None and self.cache is None
+
+    def reset(self):
+        """
+        Resets the CHTTPClient to its default state by clearing all configurations.
+
+        This method clears the user agent, proxy settings, SSL certificates, and timeout settings. The cookie jar is
+        kept as it is, without reading the cookie file again.
+        
+        Example:
+            client.reset()
+        """
+        if self.default_user_agent:
+            self.CHTTP.set_user_agent(self.capsule, self.default_user_agent)
+        if self.default_proxy:
+            self.CHTTP.set_proxy(self.capsule, self.default_proxy)
+        if self.default_ssl_cert:
+            self.CHTTP.set_ssl_cert(self.capsule, self.default_ssl_cert)
+        if self.default_ssl_key:
+            self.CHTTP.set_ssl_key(self.capsule, self.default_ssl_key)
+        if self.default_timeout is not None:
+            self.CHTTP.set_timeout(self.capsule, self.default_timeout)
+        if self.default_buffer_size_hint is not None:
+            self.CHTTP.set_buffer_size_hint(self.capsule, self.default_buffer_size_hint)
+        if self.default_max_response_size is not None:
+            self.CHTTP.set_max_response_size(self.capsule, self.default_max_response_size)
+        if self.default_http_version is not None:
+            self.CHTTP.set_http_version(self.capsule, self.default_http_version)
+        if self.default_max_concurrent_streams is not None:
+            self.CHTTP.set_max_concurrent_streams(self.capsule, self.default_max_concurrent_streams)
+        if self.default_accept_encoding is not None:
+            self.CHTTP.set_accept_encoding(self.capsule, self.default_accept_encoding)
+        if self.default_request_compression is not None:
+            self.CHTTP.set_request_compression(self.capsule, *self.default_request_compression)
+        if self.default_tcp_options is not None:
+            self.CHTTP.set_tcp_options(self.capsule, *self.default_tcp_options)
+        if self.default_max_connection_age is not None:
+            self.CHTTP.set_max_connection_age(self.capsule, self.default_max_connection_age)
+        if self.default_max_connections is not None:
+            self.CHTTP.set_max_connections(self.capsule, self.default_max_connections)
+        if self.default_ca_file is not None:
+            self.CHTTP.set_ca_file(self.capsule, self.default_ca_file)
+
+    def http_get(self, url):
+        """
+        Performs an HTTP GET request.
+
+        Parameters:
+            url (str): The URL for the GET request.
+
+        Returns:
+            Response: The status code, body bytes and headers. Headers are parsed and the body is decoded on first access.
+
+        Example:
+            response = client.http_get("http://example.com")
+        """
+        if self._direct():
+            return Response(*self.capsule.get(url))
+        if self.cache is not None:
+            return self._cached_get(url)
+        return self._send("GET", url, None, lambda: self.capsule.get(url))
+
+    def http_post(self, url, payload):
+        """
+        Performs an HTTP POST request.
+
+        Parameters:
+            url (str): The URL for the POST request.
+            payload (dict, str, bytes-like, file object or iterable): The payload for the POST request. If a dictionary is provided, it is serialized to JSON.
+                str and bytes-like payloads are sent without copying. File objects and iterables of bytes or str chunks are streamed
+                while the request is sent, using chunked transfer encoding when the size is not known up front.
+
+        Returns:
+            Response: The status code, body bytes and headers. Headers are parsed and the body is decoded on first access.
+
+        Example:
+            payload = {"key": "value"}
+            response = client.http_post("http://example.com/api", payload)
+        """
+        if isinstance(payload, dict):
+            payload = self.json_dumps(payload)
+        if self._direct():
+            return Response(*self.capsule.post(url, payload))
+        return self._send("POST", url, payload, lambda: self.capsule.post(url, payload))
+
+    def http_put(self, url, payload):
+        """
+        Performs an HTTP PUT request.
+
+        Parameters:
+            url (str): The URL for the PUT request.
+            payload (dict, str, bytes-like, file object or iterable): The payload for the PUT request. If a dictionary is provided, it is serialized to JSON.
+                str and bytes-like payloads are sent without copying. File objects and iterables of bytes or str chunks are streamed
+                while the request is sent, using chunked transfer encoding when the size is not known up front.
+
+        Returns:
+            Response: The status code, body bytes and headers. Headers are parsed and the body is decoded on first access.
+
+        Example:
+            payload = {"key": "new_value"}
+            response = client.http_put("http://example.com/api/1", payload)
+        """
+        if isinstance(payload, dict):
+            payload = self.json_dumps(payload)
+        if self._direct():
+            return Response(*self.capsule.put(url, payload))
+        return self._send("PUT", url, payload, lambda: self.capsule.put(url, payload))
+
+    def http_delete(self, url):
+        """
+        Performs an HTTP DELETE request.
+
+        Parameters:
+            url (str): The URL for the DELETE request.
+
+        Returns:
+            Response: The status code, body bytes and headers. Headers are parsed and the body is decoded on first access.
+
+        Example:
+            response = client.http_delete("http://example.com/api/1")
+        """
+        if self._direct():
+            return Response(*self.capsule.delete(url))
+        return self._send("DELETE", url, None, lambda: self.capsule.delete(url))
+
+    def http_head(self, url):
+        """
+        Performs an HTTP HEAD request.
+
+        Parameters:
+            url (str): The URL for the HEAD request.
+
+        Returns:
+            Response: The status code, body bytes and headers. Headers are parsed and the body is decoded on first access.
+
+        Example:
+            response = client.http_head("http://example.com")
+        """
+        if self._direct():
+            return Response(*self.capsule.head(url))
+        return self._send("HEAD", url, None, lambda: self.capsule.head(url))
+
+    def prepare(self, method, url, payload=None, headers=None, content_type=None):
+        """
+        Compiles a request once so it can be sent many times with send().
+
+        Parameters:
+            method (str): The HTTP method, such as "GET" or "POST".
+            url (str): The URL for the request. It is parsed here, so a malformed URL fails now rather than on send.
+            payload (dict, str or bytes-like, optional): The request body. If a dictionary is provided, it is serialized
+                to JSON. The body is copied, so later changes to a bytearray do not affect the request.
+            headers (dict or iterable of str, optional): Extra request headers, as a mapping of names to values or
+                as "Name: value" strings.
+            content_type (str, optional): The Content-Type header to send.
+
+        Returns:
+            PreparedRequest: The compiled request.
+
+        Raises:
+            ValueError: If the URL is malformed or the method is empty.
+            TypeError: If the payload or headers have an unsupported type.
+
+        Example:
+            ping = client.prepare("POST", "http://example.com/api/ping", {"ok": True}, content_type="application/json")
+            for _ in range(1000):
+                response = client.send(ping)
+        """
+        if isinstance(payload, dict):
+            payload = self.json_dumps(payload)
+        return PreparedRequest(self.CHTTP, method, url, payload, headers, content_type)
+
+    def send(self, prepared):
+        """
+        Sends a prepared request. Every request starts from a clean option state, so a prepared GET never
+        inherits the method, body or headers of an earlier request on this client, and vice versa.
+
+        Retries and the scheduler apply as for the other methods; hedging does not, because the duplicates would
+        not carry the prepared headers.
+
+        Parameters:
+            prepared (PreparedRequest): A request from prepare().
+
+        Returns:
+            Response: The status code, body bytes and headers. Headers are parsed and the body is decoded on first access.
+
+        Raises:
+            ValueError: If the request was prepared for a different backend.
+
+        Example:
+            response = client.send(ping)
+        """
+        if prepared.module is not self.CHTTP:
+            raise ValueError("The request was prepared for a different backend.")
+        if self._direct():
+            return Response(*self.capsule.send(prepared.capsule))
+        return self._send(prepared.method, prepared.url, None, lambda: self.capsule.send(prepared.capsule),
+                          hedge=False)
+
+    def warm(self, urls, connections_per_host=1):
+        """
+        Opens connections to each URL ahead of the first real request, so a fresh client does not pay DNS,
+        TCP and TLS setup on the requests that matter, e.g. right after a deploy or scale-out. Each connection
+        is opened with a HEAD request to the URL whose answer is dropped; these requests are not recorded in
+        the latency statistics.
+
+            Clients of a SessionPool share one connection cache, so warming the pool's template warms every
+            client. Otherwise the single-request handle keeps one connection per URL and the batch methods get
+            connections_per_host of their own. Raise set_max_connections() above the number of hosts warmed.
+
+        Parameters:
+            urls (iterable of str): URLs on the hosts to connect to, such as a health check endpoint.
+            connections_per_host (int): How many connections to open to each URL at the same time.
+
+        Returns:
+            dict: Maps each URL to (connections opened, error), where error is None on success. A URL that
+            already had idle connections opens fewer.
+
+        Raises:
+            ValueError: If connections_per_host is below 1.
+
+        Example:
+            client.warm(["https://api.example.com/health"], connections_per_host=4)
+        """
+        urls = list(urls)
+        if self.resolver is not None:
+            self._pin(urls, strict=False)
+        return self.CHTTP.warm(self.capsule, urls, connections_per_host)
+
+    def http_get_many(self, urls, max_in_flight=16):
+        """
+        Performs many HTTP GET requests concurrently.
+
+        Parameters:
+            urls (list of str): The URLs to fetch.
+            max_in_flight (int): The maximum number of requests running at the same time.
+
+        Returns:
+            list of tuple: One (status_code, body, error) tuple per URL, in input order. A failed
+            request has a status code of 0, a body of None and the error message in error.
+
+        Example:
+            results = client.http_get_many(["http://example.com/a", "http://example.com/b"])
+        """
+        urls = list(urls)
+        if self.resolver is not None:
+            self._pin(urls, strict=False)
+        return self._decode_results(self.CHTTP.http_get_many(self.capsule, urls, max_in_flight))
+
+    def http_request_many(self, requests, max_in_flight=16):
+        """
+        Performs many HTTP requests concurrently.
+
+        Parameters:
+            requests (list of tuple): (method, url) or (method, url, payload) tuples. A dictionary payload
+                is serialized to JSON; str and bytes-like payloads are sent as-is.
+            max_in_flight (int): The maximum number of requests running at the same time.
+
+        Returns:
+            list of tuple: One (status_code, body, error) tuple per request, in input order. A failed
+            request has a status code of 0, a body of None and the error message in error.
+
+        Example:
+            results = client.http_request_many([
+                ("GET", "http://example.com"),
+                ("POST", "http://example.com/api", {"key": "value"}),
+            ])
+        """
+        batch = []
+        for request in requests:
+            if len(request) > 2 and isinstance(request[2], dict):
+                request = (request[0], request[1], self.json_dumps(request[2]))
+            batch.append(tuple(request))
+        if self.cache is not None:
+            self._invalidate_unsafe(batch)
+        if self.resolver is not None:
+            self._pin((request[1] for request in batch), strict=False)
+        return self._decode_results(self.CHTTP.http_request_many(self.capsule, batch, max_in_flight))
+
+    def _invalidate_unsafe(self, batch):
+        for request in batch:
+            if request[0].upper() not in Resilience.SAFE_METHODS:
+                self.cache.invalidate(request[1])
+
+    def _decode_results(self, results):
+        return [
+            (status, body.decode("utf-8", "replace") if body is not None else None, error)
+            for status, body, error in results
+        ]
+
+    def set_json_codec(self, dumps=None, loads=None):
+        """
+        Sets the functions used to encode and decode JSON bodies.
+
+        By default JSON is encoded with JSONCodec.dumps and decoded with JSONCodec.loads, which use orjson when it
+        is installed and the json module otherwise.
+
+        Parameters:
+            dumps (callable, optional): Serializes a value to bytes (or str). None restores the default.
+            loads (callable, optional): Parses bytes into a value. None restores the default.
+
+        Example:
+            client.set_json_codec(dumps=orjson.dumps, loads=orjson.loads)
+        """
+        self.json_dumps = dumps if dumps is not None else JSONCodec.dumps
+        self.json_loads = loads if loads is not None else JSONCodec.loads
+
+    def get_json(self, url):
+        """
+        Performs an HTTP GET request and parses the JSON response body straight from the response bytes.
+
+        Parameters:
+            url (str): The URL for the GET request.
+
+        Returns:
+            The decoded JSON value.
+
+        Raises:
+            RuntimeError: If the request fails or the server answers with a status of 400 or above.
+            ValueError: If the body is not valid JSON.
+
+        Example:
+            items = client.get_json("http://example.com/api/items")
+        """
+        if self._direct():
+            return self._parse_json(*self.capsule.get(url))
+        if self.cache is not None:
+            response = self._cached_get(url)
+        else:
+            response = self._send("GET", url, None, lambda: self.capsule.get(url))
+        return self._parse_json(response.status_code, response.content, response.raw_headers)
+
+    def post_json(self, url, value):
+        """
+        Sends value as a JSON body with an HTTP POST request and parses the JSON response body.
+
+        The value is serialized straight to UTF-8 bytes and sent with "Content-Type: application/json".
+
+        Parameters:
+            url (str): The URL for the POST request.
+            value: Any value the JSON encoder accepts.
+
+        Returns:
+            The decoded JSON value, or None if the response has no body.
+
+        Raises:
+            RuntimeError: If the request fails or the server answers with a status of 400 or above.
+            ValueError: If the body is not valid JSON.
+
+        Example:
+            created = client.post_json("http://example.com/api/items", {"name": "item"})
+        """
+        body = self.json_dumps(value)
+        if self._direct():
+            return self._parse_json(*self.capsule.post(url, body, "application/json"))
+        response = self._send("POST", url, body, lambda: self.capsule.post(url, body, "application/json"))
+        return self._parse_json(response.status_code, response.content, response.raw_headers)
+
+    def put_json(self, url, value):
+        """
+        Sends value as a JSON body with an HTTP PUT request and parses the JSON response body.
+
+        The value is serialized straight to UTF-8 bytes and sent with "Content-Type: application/json".
+
+        Parameters:
+            url (str): The URL for the PUT request.
+            value: Any value the JSON encoder accepts.
+
+        Returns:
+            The decoded JSON value, or None if the response has no body.
+
+        Raises:
+            RuntimeError: If the request fails or the server answers with a status of 400 or above.
+            ValueError: If the body is not valid JSON.
+
+        Example:
+            updated = client.put_json("http://example.com/api/items/1", {"name": "renamed"})
+        """
+        body = self.json_dumps(value)
+        if self._direct():
+            return self._parse_json(*self.capsule.put(url, body, "application/json"))
+        response = self._send("PUT", url, body, lambda: self.capsule.put(url, body, "application/json"))
+        return self._parse_json(response.status_code, response.content, response.raw_headers)
+
+    def json_request_many(self, requests, max_in_flight=16):
+        """
+        Performs many JSON requests concurrently.
+
+        Bodies are serialized straight to UTF-8 bytes and sent with "Content-Type: application/json", and
+        response bodies are parsed straight from the response bytes.
+
+        Parameters:
+            requests (list of tuple): (method, url) or (method, url, value) tuples. A value of None sends no body.
+            max_in_flight (int): The maximum number of requests running at the same time.
+
+        Returns:
+            list of tuple: One (status_code, value, error) tuple per request, in input order. value is the decoded
+            response body, or None if the body is empty or the request failed. A failed request has a status code
+            of 0 and the error message in error; a body that is not valid JSON is reported in error as well.
+
+        Example:
+            results = client.json_request_many([
+                ("GET", "http://example.com/api/items/1"),
+                ("POST", "http://example.com/api/items", {"name": "item"}),
+            ])
+        """
+        batch = []
+        for request in requests:
+            if len(request) > 2 and request[2] is not None:
+                request = (request[0], request[1], self.json_dumps(request[2]))
+            else:
+                request = (request[0], request[1])
+            batch.append(request)
+        if self.cache is not None:
+            self._invalidate_unsafe(batch)
+        if self.resolver is not None:
+            self._pin((request[1] for request in batch), strict=False)
+
+        results = []
+        for status, body, error in self.CHTTP.http_request_many(self.capsule, batch, max_in_flight, "application/json"):
+            value = None
+            if body:
+                try:
+                    value = self.json_loads(body)
+                except ValueError as e:
+                    error = f"Invalid JSON response: {e}"
+            results.append((status, value, error))
+        return results
+
+    def _parse_json(self, status, body, headers):
+        if status >= 400:
+            raise RuntimeError(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+        return self.json_loads(body) if body else None
+
+    def http_download(self, url, path, resume=True):
+        """
+        Downloads a URL straight to a file without passing the body through Python.
+
+        If the file already exists and resume is True, only the missing tail is requested with a
+        Range header. If the server does not support ranges, the file is downloaded again from
+        the start. The file is fsynced once the transfer completes.
+
+        Parameters:
+            url (str): The URL to download.
+            path (str or os.PathLike): The destination file.
+            resume (bool): Whether to resume a partial file instead of overwriting it.
+
+        Returns:
+            dict: Download metadata with the keys status, size (file size), downloaded (bytes
+            transferred by this call), resumed_from, crc32 (checksum of the whole file),
+            total_time (seconds) and speed (bytes per second).
+
+        Raises:
+            RuntimeError: If the transfer fails or the server answers with an error status.
+            OSError: If the file cannot be opened, written or synced.
+
+        Example:
+            info = client.http_download("http://example.com/artifact.tar.gz", "artifact.tar.gz")
+        """
+        if self.resolver is not None:
+            self._pin((url,))
+        return self.CHTTP.http_download(self.capsule, url, path, resume)
+
+    def stream(self, method, url, payload=None, chunk_size=65536):
+        """
+        Performs an HTTP request and yields the response body in chunks as it arrives.
+
+        The transfer is paused while the caller is not consuming chunks, so memory use stays
+        around chunk_size regardless of the body size.
+
+        Parameters:
+            method (str): The HTTP method, such as "GET" or "POST".
+            url (str): The URL for the request.
+            payload (dict, str or bytes-like, optional): The request body. If a dictionary is provided, it is serialized to JSON.
+            chunk_size (int): The size of the yielded chunks in bytes. The last chunk may be shorter.
+
+        Yields:
+            bytes: The next chunk of the response body.
+
+        Raises:
+            RuntimeError: If the transfer fails.
+
+        Example:
+            with open("export.csv", "wb") as f:
+                for chunk in client.stream("GET", "http://example.com/export.csv"):
+                    f.write(chunk)
+        """
+        if isinstance(payload, dict):
+            payload = self.json_dumps(payload)
+        if self.resolver is not None:
+            self._pin((url,))
+        handle = self.CHTTP.stream_open(self.capsule, method, url, payload, chunk_size)
+        try:
+            while True:
+                chunk = self.CHTTP.stream_read(handle)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.CHTTP.stream_close(handle)
+
+    def last_timing(self):
+        """
+        Returns the timing breakdown of the last request made on this client.
+
+        Times are in seconds from the start of the request, as reported by libcurl: namelookup_time
+        (DNS done), connect_time (TCP connected), appconnect_time (TLS done), pretransfer_time,
+        starttransfer_time (first response byte) and total_time. A connect_time or appconnect_time of
+        0 means that stage was skipped because a connection was reused. A stream or download counts
+        as a request once it finishes.
+
+        Returns:
+            dict or None: The keys above plus status, size_download, size_upload, num_connects (new
+            connections opened), connection_reused and error (None on success), or None before the first request.
+
+        Example:
+            client.http_get("http://example.com")
+            print(client.last_timing()["starttransfer_time"])
+        """
+        return self.CHTTP.get_timing(self.capsule)
+
+    def enable_stats(self, stats=None):
+        """
+        Starts recording per-host latency histograms for every request made on this client.
+
+        Streams and downloads are recorded when they finish, with their total time covering the whole body.
+
+        Parameters:
+            stats (optional): An aggregator from CHTTP.create_stats() to share with other clients. A new one is created by default.
+
+        Returns:
+            The aggregator, which can be passed to other clients' enable_stats().
+
+        Example:
+            client.enable_stats()
+        """
+        if stats is None:
+            stats = self.CHTTP.create_stats()
+        self.CHTTP.set_stats(self.capsule, stats)
+        self.stats = stats
+        return stats
+
+    def disable_stats(self):
+        """
+        Stops recording latency statistics on this client.
+
+        Example:
+            client.disable_stats()
+        """
+        self.CHTTP.set_stats(self.capsule, None)
+        self.stats = None
+
+    def stats_snapshot(self, reset=False):
+        """
+        Returns the latency statistics recorded since enable_stats() or the last reset.
+
+        Parameters:
+            reset (bool): Whether to clear the statistics after taking the snapshot.
+
+        Returns:
+            dict: Maps "host:port" to a dict with count, errors, new_connections, reused_connections,
+            min, max, mean, p50, p90, p95, p99 and p999 of the total time, and the mean time spent in each
+            stage: dns, connect, tls, wait (server time to first byte) and transfer. Times are in seconds.
+
+        Raises:
+            RuntimeError: If statistics are not enabled.
+
+        Example:
+            for host, stats in client.stats_snapshot().items():
+                print(host, stats["p99"], stats["reused_connections"])
+        """
+        if self.stats is None:
+            raise RuntimeError("Statistics are not enabled; call enable_stats() first.")
+        return self.CHTTP.stats_snapshot(self.stats, reset)
+
+    def clone(self):
+        """
+        Creates a new client with the same configuration as this one.
+
+        The clone's session is copied from this session's curl handle with curl_easy_duphandle, so it is
+        ready without replaying every setting, and it shares the same connection, DNS and TLS session
+        caches when this client was created by a SessionPool.
+
+        Returns:
+            CHTTPClient: The new client.
+
+        Example:
+            worker_client = client.clone()
+        """
+        client = type(self).__new__(type(self))
+        client.__dict__.update(self.__dict__)
+        client.capsule = self.CHTTP.clone_session(self.capsule)
+        client._pinned = dict(self._pinned)
+        return client
+
+    def close(self):
+        """
+        Closes the HTTP session, freeing its curl handle and connections now rather than when the client is
+        garbage collected. Requests made after close() raise RuntimeError. Closing twice is harmless.
+
+        Example:
+            client.close()
+        """
+        self.capsule.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SessionPool:
+    """
+    A thread-safe pool of CHTTPClient instances that share one connection cache, DNS cache and TLS
+    session cache through a curl share handle, so a client checked out for a host that any other
+    client has already talked to skips the DNS lookup, TCP connect and TLS handshake.
+
+    Clients are cloned from the pool's template client, so configure the template before the first
+    checkout.
+
+    With share_cookies or a cookie_file, the clients also share one in-memory cookie jar, so a cookie one
+    client logs in with is sent by all of them. The file is read once when the pool is created and written
+    back at most every cookie_flush_interval seconds, when a client is checked in, as well as by
+    flush_cookies() and close(). Use the pool's cookie_file rather than set_cookie_file() on the template,
+    which would make every client write the jar when it is closed.
+    """
+
+    def __init__(self, CHTTP, max_size=8, idle_timeout=60.0, cookie_file=None, share_cookies=False,
+                 cookie_flush_interval=60.0):
+        """
+        Initializes the SessionPool.
+
+        Parameters:
+            CHTTP (module): The compiled CHTTP extension module.
+            max_size (int): The maximum number of clients the pool creates.
+            idle_timeout (float): Seconds an idle client is kept before it is closed, or None to keep it.
+            cookie_file (str, optional): A Netscape cookie file to load the shared cookie jar from and persist it to.
+            share_cookies (bool): Whether the clients share one cookie jar. Implied by cookie_file.
+            cookie_flush_interval (float or None): The least number of seconds between two writes of the cookie
+                file on checkin, or None to write it only on flush_cookies() and close().
+
+        Example:
+            pool = SessionPool(CHTTP, max_size=16, cookie_file="cookies.txt")
+            pool.template.set_user_agent("MyCustomUserAgent/1.0")
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.cookie_file = cookie_file
+        self.cookie_flush_interval = cookie_flush_interval
+        self.share = CHTTP.create_share(cookies=share_cookies, cookie_file=cookie_file)
+        self.template = CHTTPClient(CHTTP, self.share)
+        self.idle = []
+        self.size = 0
+        self.condition = threading.Condition()
+        self._cookies_flushed = time.monotonic()
+
+    def checkout(self, timeout=None):
+        """
+        Takes a client from the pool, creating one if the pool is below max_size.
+
+        The most recently returned client is handed out first, so its connections are the most likely to
+        still be open.
+
+        Parameters:
+            timeout (float, optional): Seconds to wait for a client when the pool is exhausted. Waits forever by default.
+
+        Returns:
+            CHTTPClient: A client that must be given back with checkin().
+
+        Raises:
+            TimeoutError: If no client becomes available within the timeout.
+
+        Example:
+            client = pool.checkout()
+            try:
+                client.http_get("http://example.com")
+            finally:
+                pool.checkin(client)
+        """
+        with self.condition:
+            self._evict_idle()
+            while not self.idle and self.size >= self.max_size:
+                if not self.condition.wait(timeout):
+                    raise TimeoutError("No session became available in the pool.")
+            if self.idle:
+                client, _ = self.idle.pop()
+                return client
+            self.size += 1
+
+        try:
+            return self.template.clone()
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def checkin(self, client):
+        """
+        Returns a client to the pool.
+
+        Parameters:
+            client (CHTTPClient): A client obtained from checkout().
+
+        Example:
+            pool.checkin(client)
+        """
+        client.reset()
+        with self.condition:
+            now = time.monotonic()
+            self.idle.append((client, now))
+            self._evict_idle()
+            self.condition.notify()
+            flush = self.cookie_file is not None and self.cookie_flush_interval is not None and \
+                now - self._cookies_flushed >= self.cookie_flush_interval
+            if flush:
+                self._cookies_flushed = now
+        if flush:
+            self.flush_cookies()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """
+        Checks a client out for the duration of a with block.
+
+        Example:
+            with pool.session() as client:
+                response = client.http_get("http://example.com")
+        """
+        client = self.checkout(timeout)
+        try:
+            yield client
+        finally:
+            self.checkin(client)
+
+    def warm(self, urls, connections_per_host=1):
+        """
+        Opens connections_per_host connections to each URL in the pool's shared connection cache, so the first
+        requests of every client skip DNS, TCP and TLS setup. Call it after configuring the template; see
+        CHTTPClient.warm().
+
+        Returns:
+            dict: Maps each URL to (connections opened, error), where error is None on success.
+
+        Example:
+            pool.warm(["https://api.example.com/health"], connections_per_host=pool.max_size)
+        """
+        return self.template.warm(urls, connections_per_host)
+
+    def flush_cookies(self, cookie_file=None):
+        """
+        Writes the shared cookie jar to a file now. libcurl writes a temporary file and renames it over the old one.
+
+        Parameters:
+            cookie_file (str, optional): Where to write the jar. Defaults to the pool's cookie_file.
+
+        Raises:
+            ValueError: If neither the pool nor the call names a cookie file.
+
+        Example:
+            pool.flush_cookies()
+        """
+        self.template.CHTTP.flush_share_cookies(self.share, cookie_file)
+
+    def close(self):
+        """
+        Closes the idle clients and writes the shared cookie jar to the pool's cookie_file. Clients that are
+        checked out are closed when they are checked in.
+
+        Example:
+            pool.close()
+        """
+        with self.condition:
+            self.idle_timeout = 0
+            self._evict_idle()
+        if self.cookie_file is not None:
+            self.flush_cookies()
+
+    def _evict_idle(self):
+        if self.idle_timeout is None:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        while self.idle and self.idle[0][1] <= deadline:
+            client, _ = self.idle.pop(0)
+            client.close()
+            self.size -= 1
+            self.condition.notify()
@@ -0,0 +1,34 @@
+"""
+JSON encoding and decoding shared by the clients.
+
+dumps() serializes straight to UTF-8 bytes, which the extensions send without
+another copy, and loads() parses response bytes without decoding them to a str
+first. Both use orjson when it is installed and the standard library otherwise.
+Neither library is imported until dumps or loads is first looked up, so
+importing the clients stays cheap. Clients can swap in another codec with
+set_json_codec().
+"""
+
+
+def _load():
+    global dumps, loads
+    try:
+        import orjson
+    except ImportError:
+        import json
+
+        def dumps(value):
+            """Serializes value to compact JSON as UTF-8 bytes."""
+            return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+        loads = json.loads
+    else:
+        dumps = orjson.dumps
+        loads = orjson.loads
+
+
+def __getattr__(name):
+    if name in ("dumps", "loads"):
+        _load()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")